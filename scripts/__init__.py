@@ -0,0 +1,13 @@
+"""
+AI 代理规则工具集：安装后作为 ai_proxy_rules 包提供 ai-rules 命令
+AI proxy rule tooling, installed as the ai_proxy_rules package
+"""
+
+import sys
+from pathlib import Path
+
+# 各脚本既可以 `python xxx.py` 直接运行，也按模块名互相导入（from psl import get_psl）；
+# 作为包安装时把包目录放到 sys.path 最前面，保持同样的导入方式，且不在 site-packages 顶层安装 cli、psl 等通用模块名
+_PACKAGE_DIR = str(Path(__file__).parent)
+if _PACKAGE_DIR not in sys.path:
+    sys.path.insert(0, _PACKAGE_DIR)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+ASN 展开为 CIDR：基于本地 IP-ASN 数据集（iptoasn TSV 或 MMDB）
+Expand ASNs into aggregated CIDR lists from a local ip-to-ASN dataset
+"""
+
+import sys
+import gzip
+import json
+import bisect
+import hashlib
+import marshal
+import ipaddress
+from array import array
+from typing import List, Dict, Iterable, Iterator, Tuple
+from pathlib import Path
+
+try:
+    import maxminddb
+except ImportError:  # 可选依赖：只在读取 MMDB 数据集时需要
+    maxminddb = None
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 索引缓存目录，按数据集路径、大小和修改时间区分
+ASN_CACHE_DIR = PROJECT_ROOT / '.cache' / 'asn'
+
+# 缓存格式版本，结构变化时递增
+INDEX_VERSION = 1
+
+
+def _iter_tsv(path: Path) -> Iterator[Tuple[int, int, int, int]]:
+    """读取 iptoasn 格式：range_start range_end AS_number country AS_description"""
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            parts = line.split('\t', 3)
+            if len(parts) < 3:
+                continue
+            try:
+                asn = int(parts[2])
+                start = ipaddress.ip_address(parts[0].strip())
+                end = ipaddress.ip_address(parts[1].strip())
+            except ValueError:
+                continue
+            # AS0 表示未路由的地址段
+            if asn:
+                yield asn, int(start), int(end), start.version
+
+
+def _iter_mmdb(path: Path) -> Iterator[Tuple[int, int, int, int]]:
+    """读取 GeoLite2-ASN 等 MMDB 数据集"""
+    if maxminddb is None:
+        raise RuntimeError("maxminddb is required to read MMDB datasets: pip install maxminddb")
+    with maxminddb.open_database(str(path)) as reader:
+        for network, record in reader:
+            asn = (record or {}).get('autonomous_system_number')
+            if asn:
+                yield asn, int(network.network_address), int(network.broadcast_address), network.version
+
+
+class AsnIndex:
+    """按 (ASN, 起始地址) 排序的紧凑区间表
+
+    ASN、偏移和 IPv4 区间均存为 32 位无符号数组，IPv6 区间存为定长 16 字节记录；
+    每个 ASN 在数组中占据一段连续区域，通过二分查找定位。
+    """
+
+    def __init__(self, asns: array, v4_offsets: array, v4_starts: array, v4_ends: array,
+                 v6_offsets: array, v6_ranges: bytes):
+        self.asns = asns
+        self.v4_offsets = v4_offsets
+        self.v4_starts = v4_starts
+        self.v4_ends = v4_ends
+        self.v6_offsets = v6_offsets
+        self.v6_ranges = v6_ranges
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, int, int, int]]) -> 'AsnIndex':
+        v4, v6 = {}, {}
+        for asn, start, end, version in rows:
+            (v4 if version == 4 else v6).setdefault(asn, []).append((start, end))
+
+        asns = array('I', sorted(set(v4) | set(v6)))
+        v4_offsets, v6_offsets = array('I', [0]), array('I', [0])
+        v4_starts, v4_ends = array('I'), array('I')
+        v6_ranges = bytearray()
+        for asn in asns:
+            for start, end in sorted(v4.get(asn, ())):
+                v4_starts.append(start)
+                v4_ends.append(end)
+            v4_offsets.append(len(v4_starts))
+            for start, end in sorted(v6.get(asn, ())):
+                v6_ranges += start.to_bytes(16, 'big') + end.to_bytes(16, 'big')
+            v6_offsets.append(len(v6_ranges) // 32)
+        return cls(asns, v4_offsets, v4_starts, v4_ends, v6_offsets, bytes(v6_ranges))
+
+    def dumps(self) -> bytes:
+        return marshal.dumps((
+            INDEX_VERSION,
+            self.asns.tobytes(), self.v4_offsets.tobytes(),
+            self.v4_starts.tobytes(), self.v4_ends.tobytes(),
+            self.v6_offsets.tobytes(), self.v6_ranges,
+        ))
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'AsnIndex':
+        version, *fields = marshal.loads(data)
+        if version != INDEX_VERSION:
+            raise ValueError("stale ASN index")
+        arrays = []
+        for raw in fields[:5]:
+            values = array('I')
+            values.frombytes(raw)
+            arrays.append(values)
+        return cls(*arrays, fields[5])
+
+    def ranges(self, asn: int) -> List[Tuple[int, int, int]]:
+        """返回某个 ASN 的全部 (版本, 起始, 结束) 区间"""
+        i = bisect.bisect_left(self.asns, asn)
+        if i == len(self.asns) or self.asns[i] != asn:
+            return []
+        result = [(4, self.v4_starts[j], self.v4_ends[j])
+                  for j in range(self.v4_offsets[i], self.v4_offsets[i + 1])]
+        for j in range(self.v6_offsets[i], self.v6_offsets[i + 1]):
+            record = self.v6_ranges[j * 32:(j + 1) * 32]
+            result.append((6, int.from_bytes(record[:16], 'big'), int.from_bytes(record[16:], 'big')))
+        return result
+
+    def expand(self, asn: int) -> List[str]:
+        """把 ASN 展开为聚合后的 CIDR 列表"""
+        networks = {4: [], 6: []}
+        for version, start, end in self.ranges(asn):
+            address = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+            networks[version].extend(ipaddress.summarize_address_range(address(start), address(end)))
+        return [str(n) for version in (4, 6) for n in ipaddress.collapse_addresses(networks[version])]
+
+
+def load_asn_index(dataset: str, cache_dir: Path = ASN_CACHE_DIR) -> AsnIndex:
+    """加载数据集索引；数据集未变化时直接读取磁盘缓存"""
+    path = Path(dataset)
+    stat = path.stat()
+    cache_file = None
+    if cache_dir:
+        key = f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        cache_file = Path(cache_dir) / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.idx"
+        if cache_file.exists():
+            try:
+                return AsnIndex.loads(cache_file.read_bytes())
+            except (ValueError, EOFError, TypeError):
+                pass
+
+    rows = _iter_mmdb(path) if path.suffix == '.mmdb' else _iter_tsv(path)
+    index = AsnIndex.build(rows)
+    if cache_file:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_bytes(index.dumps())
+    return index
+
+
+def expand_asns(index: AsnIndex, asns: Iterable[str]) -> Dict[str, List[str]]:
+    """展开一组 ASN（接受 "14061" 或 "AS14061"）"""
+    result = {}
+    for asn in asns:
+        value = str(asn).upper().removeprefix('AS')
+        if value.isdigit():
+            result[str(asn)] = index.expand(int(value))
+    return result
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python asn_expand.py <ip2asn.tsv[.gz] | GeoLite2-ASN.mmdb> [ASN ...]")
+        sys.exit(1)
+
+    print("🚀 ASN to CIDR Expansion")
+    print("=" * 60)
+
+    index = load_asn_index(sys.argv[1])
+    asns = sys.argv[2:]
+    if not asns:
+        # 默认展开合并规则中的 ASN
+        data_file = PROJECT_ROOT / 'data' / 'ai_projects.json'
+        with open(data_file, 'r', encoding='utf-8') as f:
+            asns = json.load(f).get('rules', {}).get('ip_asns', [])
+
+    for asn, cidrs in expand_asns(index, asns).items():
+        print(f"✅ AS{asn.upper().removeprefix('AS')}: {len(cidrs)} CIDRs")
+        for cidr in cidrs:
+            print(f"   {cidr}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+域名表基准测试：对比 mmap 打开最小完美哈希表与解析 clash.yaml / sing-box.json 文本的加载耗时和查找吞吐
+Benchmark load time and lookup throughput of the mmap domain table against parsing the text formats
+"""
+
+import io
+import json
+import time
+import tempfile
+import argparse
+import contextlib
+from typing import Callable, List, Tuple
+from pathlib import Path
+
+import yaml
+
+from bench_pac import add_synthetic_rules, make_hosts
+from domain_table import DomainTable
+from generate_rules import DOMAIN_TABLE, generate_clash_rules, generate_domain_table, generate_singbox_rules, \
+    prepare_rules
+from rule_matcher import RuleMatcher
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Clash 规则类型 -> 规则数据中的类型
+CLASH_KINDS = {
+    'DOMAIN': 'domains',
+    'DOMAIN-SUFFIX': 'domain_suffixes',
+    'DOMAIN-KEYWORD': 'domain_keywords',
+}
+
+# sing-box 字段 -> 规则数据中的类型
+SINGBOX_KINDS = {
+    'domain': 'domains',
+    'domain_suffix': 'domain_suffixes',
+    'domain_keyword': 'domain_keywords',
+}
+
+
+def load_clash(path: Path) -> RuleMatcher:
+    """开机时解析 clash.yaml 的做法：YAML 解析后按逗号切分每条规则"""
+    rules = {kind: [] for kind in CLASH_KINDS.values()}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in yaml.safe_load(f).get('payload', []):
+            rule_type, _, value = line.partition(',')
+            if rule_type in CLASH_KINDS:
+                rules[CLASH_KINDS[rule_type]].append(value)
+    return RuleMatcher(rules)
+
+
+def load_singbox(path: Path) -> RuleMatcher:
+    rules = {kind: [] for kind in SINGBOX_KINDS.values()}
+    with open(path, 'r', encoding='utf-8') as f:
+        for rule in json.load(f).get('rules', []):
+            for field, kind in SINGBOX_KINDS.items():
+                rules[kind].extend(rule.get(field, []))
+    return RuleMatcher(rules)
+
+
+def best_time(func: Callable, repeat: int) -> Tuple[float, object]:
+    """返回最好一轮的耗时（秒）和最后一次的结果"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def lookup_time(matcher, hosts: List[str], lookups: int, repeat: int) -> float:
+    """返回每次查找的纳秒数"""
+    corpus = (hosts * (lookups // len(hosts) + 1))[:lookups]
+    match = matcher.match
+
+    def run():
+        for host in corpus:
+            match(host)
+
+    return best_time(run, repeat)[0] * 1e9 / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the mmap domain table against parsing text formats')
+    parser.add_argument('--hosts', help='hostname corpus, one per line (default: synthetic)')
+    parser.add_argument('--size', type=int, default=20000, help='synthetic corpus size')
+    parser.add_argument('--lookups', type=int, default=200000, help='lookups per round')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--synthetic-rules', type=int, default=0,
+                        help='add this many synthetic suffix rules to the real rule set')
+    args = parser.parse_args()
+
+    print("🚀 Domain Table Benchmark")
+    print("=" * 60)
+
+    # 表中不含正则规则，参考结果也不计入
+    rules = {kind: sorted(values) for kind, values in prepare_rules(PROJECT_ROOT).items()
+             if kind != 'domain_regexes'}
+    if args.synthetic_rules:
+        rules = add_synthetic_rules(rules, args.synthetic_rules)
+    if args.hosts:
+        with open(args.hosts, 'r', encoding='utf-8') as f:
+            hosts = [line.strip().lower() for line in f if line.strip() and not line.startswith('#')]
+    else:
+        hosts = make_hosts(rules, args.size)
+    reference = RuleMatcher(rules)
+    expected = [reference.match(host) for host in hosts]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        files = {'clash.yaml': generate_clash_rules, 'sing-box.json': generate_singbox_rules,
+                 DOMAIN_TABLE: generate_domain_table}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, generator in files.items():
+                generator(rules, str(tmp / name))
+
+        print(f"📄 {sum(len(v) for v in rules.values()):,} rules, {len(hosts):,} hosts "
+              f"({sum(1 for e in expected if e):,} matched), {args.lookups:,} lookups x {args.repeat}\n")
+        print(f"{'variant':>14} {'size (KB)':>10} {'load (ms)':>10} {'ns/lookup':>10} {'lookups/s':>12} "
+              f"{'mismatch':>9}")
+
+        loaders = (
+            ('clash.yaml', lambda: load_clash(tmp / 'clash.yaml')),
+            ('sing-box.json', lambda: load_singbox(tmp / 'sing-box.json')),
+            (DOMAIN_TABLE, lambda: DomainTable(str(tmp / DOMAIN_TABLE))),
+        )
+        for name, loader in loaders:
+            load, matcher = best_time(loader, args.repeat)
+            ns = lookup_time(matcher, hosts, args.lookups, args.repeat)
+            mismatches = sum(1 for host, e in zip(hosts, expected) if matcher.match(host) != e)
+            print(f"{name:>14} {(tmp / name).stat().st_size / 1024:>10.1f} {load * 1000:>10.2f} {ns:>10.1f} "
+                  f"{1e9 / ns:>12,.0f} {mismatches:>9}")
+            if isinstance(matcher, DomainTable):
+                matcher.close()
+
+
+if __name__ == '__main__':
+    main()
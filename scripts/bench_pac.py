@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+PAC 基准测试：在本地 JS 引擎中对比哈希后缀查找的 PAC 与逐条 dnsDomainIs / shExpMatch 的 PAC
+Benchmark the generated PAC against a naive rule-chain PAC under a local JS engine
+"""
+
+import sys
+import json
+import random
+import shutil
+import argparse
+import ipaddress
+import subprocess
+import tempfile
+from typing import List, Optional, Tuple
+from pathlib import Path
+
+from generate_rules import build_pac, collapsed_networks, ipv4_ranges, prepare_rules
+from rule_matcher import RuleMatcher
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 依次尝试的 JS 引擎：名称 -> 运行脚本文件的命令前缀
+ENGINES = {
+    'node': ['node'],
+    'deno': ['deno', 'run', '--quiet'],
+    'bun': ['bun', 'run'],
+    'qjs': ['qjs'],
+    'd8': ['d8'],
+    'jsc': ['jsc'],
+}
+
+# PAC 运行时提供的辅助函数。isInNet 只处理 IP 字面量：浏览器中它会对主机名做同步 DNS 解析，
+# 因此真实环境下逐条规则的 PAC 比这里测得的更慢
+RUNTIME = r'''
+var out = typeof console !== "undefined" ? function (s) { console.log(s); } : print;
+var now = typeof performance !== "undefined" ? function () { return performance.now(); } : function () { return Date.now(); };
+function dnsDomainIs(h, d) { return h.length >= d.length && h.substring(h.length - d.length) === d; }
+function shExpMatch(s, p) {
+  return new RegExp("^" + p.replace(/[.+^${}()|[\]\\]/g, "\\$&").replace(/\*/g, ".*").replace(/\?/g, ".") + "$").test(s);
+}
+function convertAddr(ip) { var b = ip.split("."); return ((b[0] * 256 + +b[1]) * 256 + +b[2]) * 256 + +b[3]; }
+function isInNet(h, p, m) {
+  if (!/^\d+\.\d+\.\d+\.\d+$/.test(h)) return false;
+  return ((convertAddr(h) & convertAddr(m)) >>> 0) === ((convertAddr(p) & convertAddr(m)) >>> 0);
+}
+'''
+
+DRIVER = r'''
+var H = %(hosts)s, U = [], flags = [], best = Infinity, i, j, r, t;
+for (i = 0; i < H.length; i++) U.push("https://" + H[i] + "/");
+for (i = 0; i < H.length; i++) flags.push(FindProxyForURL(U[i], H[i]) === "DIRECT" ? "0" : "1");
+for (r = 0; r < %(repeat)d; r++) {
+  t = now();
+  for (j = 0, i = 0; j < %(lookups)d; j++) {
+    FindProxyForURL(U[i], H[i]);
+    if (++i === H.length) i = 0;
+  }
+  t = now() - t;
+  if (t < best) best = t;
+}
+out(JSON.stringify({ms: best, flags: flags.join("")}));
+'''
+
+
+def find_engine(name: Optional[str] = None) -> Optional[Tuple[str, List[str]]]:
+    """返回第一个可用的 JS 引擎 (名称, 命令前缀)"""
+    for engine, command in ENGINES.items():
+        if name and engine != name:
+            continue
+        if shutil.which(command[0]):
+            return engine, command
+    return None
+
+
+def naive_pac(rules: dict, proxy: str = 'PROXY 127.0.0.1:7890') -> str:
+    """常见的逐条规则 PAC：每条规则一次 dnsDomainIs / shExpMatch / isInNet 调用"""
+    lines = ['function FindProxyForURL(url, host) {', '  host = host.toLowerCase();']
+    for domain in rules.get('domains', []):
+        lines.append(f'  if (host == "{domain}") return "{proxy}";')
+    for suffix in rules.get('domain_suffixes', []):
+        lines.append(f'  if (host == "{suffix}" || dnsDomainIs(host, ".{suffix}")) return "{proxy}";')
+    for keyword in rules.get('domain_keywords', []):
+        lines.append(f'  if (shExpMatch(host, "*{keyword}*")) return "{proxy}";')
+    for network in collapsed_networks(rules.get('ip_cidrs', []))[4]:
+        lines.append(f'  if (isInNet(host, "{network.network_address}", "{network.netmask}")) return "{proxy}";')
+    lines.append('  return "DIRECT";')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def add_synthetic_rules(rules: dict, count: int) -> dict:
+    """追加合成的后缀规则，观察规则数增长时两种 PAC 的扩展性"""
+    rules = {kind: list(values) for kind, values in rules.items()}
+    rules['domain_suffixes'] = sorted(set(rules.get('domain_suffixes', [])) |
+                                      {f"svc{i}.synthetic-ai{i % 97}.net" for i in range(count)})
+    return rules
+
+
+def make_hosts(rules: dict, size: int, seed: int = 1) -> List[str]:
+    """合成主机名语料：约三分之一命中规则（子域名、精确域名、IPv4 字面量），其余不命中"""
+    rng = random.Random(seed)
+    suffixes = list(rules.get('domain_suffixes', [])) or ['example.com']
+    domains = list(rules.get('domains', [])) or suffixes
+    networks = collapsed_networks(rules.get('ip_cidrs', []))[4]
+    hosts = []
+    for i in range(size):
+        roll = rng.random()
+        if roll < 0.2:
+            hosts.append(f"{rng.choice(['www', 'api', 'cdn', 'static.eu'])}.{rng.choice(suffixes)}")
+        elif roll < 0.3:
+            hosts.append(rng.choice(domains))
+        elif roll < 0.33 and networks:
+            network = rng.choice(networks)
+            hosts.append(str(network.network_address + rng.randrange(network.num_addresses)))
+        elif roll < 0.36:
+            hosts.append(str(ipaddress.IPv4Address(rng.getrandbits(32))))
+        else:
+            hosts.append(f"host{i}.site{rng.randrange(5000)}.{rng.choice(['com', 'org', 'io', 'cn'])}")
+    return hosts
+
+
+def expected_flags(rules: dict, hosts: List[str]) -> str:
+    """参考结果：域名规则按代理客户端语义匹配，IPv4 字面量查合并后的区间"""
+    matcher = RuleMatcher(rules)
+    ranges = ipv4_ranges(rules.get('ip_cidrs', []))
+    flags = []
+    for host in hosts:
+        hit = matcher.match(host) is not None
+        if not hit:
+            try:
+                value = int(ipaddress.IPv4Address(host))
+                hit = any(ranges[i] <= value <= ranges[i + 1] for i in range(0, len(ranges), 2))
+            except ValueError:
+                pass
+        flags.append('1' if hit else '0')
+    return ''.join(flags)
+
+
+def run_pac(command: List[str], pac: str, hosts: List[str], lookups: int, repeat: int) -> dict:
+    """在 JS 引擎中运行 PAC，返回最好一轮的耗时和每个主机名的结果"""
+    script = RUNTIME + pac + '\n' + DRIVER % {
+        'hosts': json.dumps(hosts), 'lookups': lookups, 'repeat': repeat}
+    with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False, encoding='utf-8') as f:
+        f.write(script)
+    try:
+        result = subprocess.run(command + [f.name], capture_output=True, text=True, check=True)
+    finally:
+        Path(f.name).unlink()
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the generated PAC under a local JS engine')
+    parser.add_argument('--hosts', help='hostname corpus, one per line (default: synthetic)')
+    parser.add_argument('--size', type=int, default=20000, help='synthetic corpus size')
+    parser.add_argument('--lookups', type=int, default=200000, help='FindProxyForURL calls per round')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--synthetic-rules', type=int, default=0,
+                        help='add this many synthetic suffix rules to the real rule set')
+    parser.add_argument('--engine', choices=sorted(ENGINES), help='JS engine (default: first one found)')
+    args = parser.parse_args()
+
+    print("🚀 PAC Benchmark")
+    print("=" * 60)
+
+    engine = find_engine(args.engine)
+    if not engine:
+        print(f"⚠️ No JS engine found (tried: {', '.join(ENGINES)}); skipping")
+        return
+
+    # PAC 不输出正则规则，参考结果也不计入
+    rules = {kind: sorted(values) for kind, values in prepare_rules(PROJECT_ROOT).items()
+             if kind != 'domain_regexes'}
+    if args.synthetic_rules:
+        rules = add_synthetic_rules(rules, args.synthetic_rules)
+    if args.hosts:
+        with open(args.hosts, 'r', encoding='utf-8') as f:
+            hosts = [line.strip().lower() for line in f if line.strip() and not line.startswith('#')]
+    else:
+        hosts = make_hosts(rules, args.size)
+    expected = expected_flags(rules, hosts)
+
+    print(f"🔧 Engine: {engine[0]}")
+    print(f"📄 {sum(len(v) for v in rules.values()):,} rules, {len(hosts):,} hosts "
+          f"({expected.count('1'):,} proxied), {args.lookups:,} lookups x {args.repeat}\n")
+    print(f"{'variant':>8} {'size (KB)':>10} {'ns/lookup':>10} {'lookups/s':>12} {'speedup':>8} {'mismatch':>9}")
+
+    baseline = None
+    for variant, pac in (('naive', naive_pac(rules)), ('hashed', build_pac(rules))):
+        try:
+            result = run_pac(engine[1], pac, hosts, args.lookups, args.repeat)
+        except (subprocess.CalledProcessError, ValueError, IndexError) as e:
+            print(f"❌ {variant}: {getattr(e, 'stderr', None) or e}")
+            sys.exit(1)
+        ns = result['ms'] * 1e6 / args.lookups
+        baseline = baseline or ns
+        mismatches = sum(1 for a, b in zip(result['flags'], expected) if a != b)
+        print(f"{variant:>8} {len(pac.encode()) / 1024:>10.1f} {ns:>10.1f} "
+              f"{args.lookups / result['ms'] * 1000:>12,.0f} {baseline / ns:>7.1f}x {mismatches:>9}")
+
+
+if __name__ == '__main__':
+    main()
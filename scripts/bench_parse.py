@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+规则解析基准测试：对比单进程与多进程分片解析的扩展性
+Benchmark sharded RuleParser parsing across process pool sizes
+"""
+
+import os
+import time
+import argparse
+
+from fetch_rules import parse_content
+
+
+def make_corpus(lines: int) -> str:
+    """生成与 Loyalsoldier proxy.txt 规模相当的合成规则列表"""
+    kinds = ['DOMAIN-SUFFIX', 'DOMAIN', 'DOMAIN-KEYWORD', 'IP-CIDR']
+    content = ["payload:"]
+    for i in range(lines):
+        kind = kinds[i % len(kinds)]
+        if kind == 'IP-CIDR':
+            value = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}/32"
+        elif kind == 'DOMAIN-KEYWORD':
+            value = f"kw{i % 997}"
+        else:
+            value = f"host{i}.example{i % 5000}.com"
+        content.append(f"  - {kind},{value}  # synthetic")
+    return '\n'.join(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sharded rule parsing')
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print("🚀 Rule Parsing Benchmark")
+    print("=" * 60)
+
+    content = make_corpus(args.lines)
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cpu_count} & set(range(1, cpu_count + 1)))
+
+    print(f"📄 {args.lines:,} lines, {len(content):,} bytes, {cpu_count} CPUs\n")
+    print(f"{'workers':>8} {'best (s)':>10} {'lines/s':>12} {'speedup':>8}")
+
+    baseline = None
+    for workers in worker_counts:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = parse_content(content, 'clash', workers=workers, threshold=0)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        baseline = baseline or best
+        print(f"{workers:>8} {best:>10.3f} {args.lines / best:>12,.0f} {baseline / best:>7.2f}x")
+
+    total = sum(len(v) for v in result.get_all_rules().values())
+    print(f"\n✅ {total:,} unique rules parsed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+冷启动导入时间回归检查：用 python -X importtime 测量子命令的导入开销
+Import-time regression check for CLI subcommands
+"""
+
+import sys
+import argparse
+import subprocess
+from typing import Dict, Tuple
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+
+# 子命令 -> 导入预算（毫秒，取多次测量的最小值）
+BUDGETS_MS = {
+    'generate': 40,
+}
+
+# 子命令不应导入的重量级模块
+FORBIDDEN = {
+    'generate': ('requests', 'urllib3', 'charset_normalizer', 'yaml', 'multiprocessing', 'brotli', 'zstandard'),
+}
+
+# 每个子命令的测量次数
+DEFAULT_RUNS = 5
+
+
+def measure(command: str) -> Tuple[float, Dict[str, int]]:
+    """在新进程中导入 cli 并加载子命令模块，返回 (导入总耗时毫秒, 模块 -> 累计微秒)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import cli; cli.load({command!r})"],
+        cwd=SCRIPT_DIR, capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # 表头
+        # 模块名前的缩进表示嵌套层级，顶层导入的累计时间之和即总导入时间
+        name = name[1:]
+        if name == 'site':
+            # 解释器启动阶段（site 及 .pth 钩子）与项目代码无关，只统计之后的导入
+            modules, total = {}, 0
+            continue
+        modules[name.strip()] = int(cumulative)
+        if not name.startswith(' '):
+            total += int(cumulative)
+    return total / 1000, modules
+
+
+def check(command: str, budget_ms: float, runs: int = DEFAULT_RUNS) -> bool:
+    samples = [measure(command) for _ in range(runs)]
+    best, modules = min(samples, key=lambda sample: sample[0])
+    forbidden = [m for m in FORBIDDEN.get(command, ()) if m in modules]
+    ok = best <= budget_ms and not forbidden
+    print(f"{'✅' if ok else '❌'} {command}: {best:.1f} ms (budget {budget_ms:.0f} ms)")
+    for module in forbidden:
+        print(f"   ❌ imports {module} ({modules[module] / 1000:.1f} ms)")
+    if not ok:
+        slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:10]
+        for name, cumulative in slowest:
+            print(f"   {cumulative / 1000:8.1f} ms  {name}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check CLI subcommand import time against budgets')
+    parser.add_argument('commands', nargs='*', default=list(BUDGETS_MS), help='subcommands to check')
+    parser.add_argument('--budget-ms', type=float, help='override the budget for all commands')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS)
+    args = parser.parse_args()
+
+    print("🚀 Import Time Check")
+    print("=" * 60)
+    results = [check(command, args.budget_ms or BUDGETS_MS.get(command, 100), args.runs)
+               for command in args.commands]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+统一命令行入口：ai-rules <子命令> [参数...]
+Single console entry point; subcommand modules are imported only when invoked
+"""
+
+import sys
+import shutil
+import argparse
+import importlib
+from typing import List, Optional
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 子命令 -> (模块, 说明)；模块在执行子命令时才导入，requests 等重量级依赖不会拖慢其他子命令
+COMMANDS = {
+    'collect': ('collect_ai_projects', 'collect AI project domains from GitHub'),
+    'crawl': ('crawl_homepages', 'crawl project homepages for third-party hosts'),
+    'fetch': ('fetch_rules', 'fetch and merge upstream rule sources'),
+    'generate': ('generate_rules', 'generate rule files for every proxy tool'),
+    'compile': ('compile_srs', 'compile sing-box rule-sets to SRS'),
+    'serve': ('serve', 'serve rule files and refresh them on a schedule'),
+    'tenants': ('tenants', 'render per-tenant rule variants'),
+    'probe': ('dns_probe', 'prune dead domains with DNS probes'),
+    'keywords': ('keyword_analysis', 'analyse and rewrite DOMAIN-KEYWORD rules'),
+    'regex': ('regex_rules', 'analyse DOMAIN-REGEX rules for suffix rewrites'),
+    'history': ('history', 'query the SQLite rule history'),
+    'logs': ('log_analytics', 'suggest rules from proxy/DNS logs'),
+    'ip-index': ('ip_index', 'prefix overlap report and lookups'),
+    'asn': ('asn_expand', 'expand ASNs into CIDRs'),
+    'geosite': ('geosite', 'inspect a geosite.dat file'),
+    'table': ('domain_table', 'query the minimal-perfect-hash domain table'),
+    'psl': ('psl', 'look up public suffixes and registrable domains'),
+    'health': ('source_health', 'show or reset per-host source health'),
+    'schedule': ('refresh_schedule', 'show or reset the per-source refresh schedule'),
+}
+
+
+def load(command: str):
+    """导入子命令对应的模块"""
+    return importlib.import_module(COMMANDS[command][0])
+
+
+def run(command: str, argv: List[str]) -> int:
+    """以 argv 运行子命令的 main()，返回退出码"""
+    module = load(command)
+    saved = sys.argv
+    sys.argv = [f"ai-rules {command}"] + list(argv)
+    try:
+        module.main()
+    except SystemExit as e:
+        if e.code in (None, 0):
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    finally:
+        sys.argv = saved
+    return 0
+
+
+def pipeline(argv: List[str]) -> int:
+    """collect -> fetch -> generate -> compile -> manifest，任一步失败即停止"""
+    parser = argparse.ArgumentParser(prog='ai-rules pipeline', description='Run the full update pipeline')
+    parser.add_argument('--offline', action='store_true', help='skip network sources (implies --skip-collect)')
+    parser.add_argument('--skip-collect', action='store_true', help='reuse data/collected_projects.json')
+    parser.add_argument('--skip-compile', action='store_true', help='do not compile sing-box SRS')
+    parser.add_argument('--max-memory', help='bounded-memory mode for fetch and generate, e.g. 512M')
+    args = parser.parse_args(argv)
+
+    memory = ['--max-memory', args.max_memory] if args.max_memory else []
+    steps = []
+    if not (args.offline or args.skip_collect):
+        steps.append(('collect', []))
+    steps.append(('fetch', (['--offline'] if args.offline else []) + memory))
+    steps.append(('generate', memory))
+    if not args.skip_compile:
+        if shutil.which('sing-box'):
+            steps.append(('compile', [str(PROJECT_ROOT / 'rules')]))
+            steps.append(('generate', ['--manifest-only']))
+        else:
+            print("ℹ️  sing-box not found, skipping SRS compilation")
+
+    for command, command_argv in steps:
+        print(f"\n▶️  ai-rules {' '.join([command] + command_argv)}")
+        code = run(command, command_argv)
+        if code:
+            print(f"❌ Step '{command}' failed with exit code {code}")
+            return code
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print("usage: ai-rules <command> [args...]\n\ncommands:")
+        for name, (_, help_text) in COMMANDS.items():
+            print(f"  {name:<10} {help_text}")
+        print(f"  {'pipeline':<10} run collect, fetch, generate and compile in order")
+        print("\nRun 'ai-rules <command> --help' for command options.")
+        return 0
+
+    command, rest = argv[0], argv[1:]
+    if command == 'pipeline':
+        return pipeline(rest)
+    if command not in COMMANDS:
+        print(f"ai-rules: unknown command '{command}'", file=sys.stderr)
+        return 2
+    return run(command, rest)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
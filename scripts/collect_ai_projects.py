@@ -6,11 +6,13 @@ Collect popular AI websites and projects
 
 import json
 import re
-import requests
+import argparse
 from datetime import datetime
 from typing import List, Dict, Set
 from pathlib import Path
 
+from psl import get_psl
+
 # 内置热门AI服务域名列表
 # 内置热门AI服务域名列表
 BUILT_IN_AI_DOMAINS = [
@@ -206,7 +208,7 @@ BUILT_IN_ASNS = [
 ]
 
 def extract_domain_from_url(url: str) -> str:
-    """从URL提取主域名"""
+    """从URL提取可注册域名"""
     if not url:
         return ""
     
@@ -217,16 +219,18 @@ def extract_domain_from_url(url: str) -> str:
     # 移除端口
     url = url.split(':')[0]
     
-    # 提取主域名（去掉www等前缀）
-    parts = url.split('.')
-    if len(parts) >= 2:
-        # 保留最后两部分作为主域名
-        return '.'.join(parts[-2:])
-    
-    return url
+    # 按公共后缀列表提取可注册域名（foo.co.uk、user.github.io）
+    # 本身就是公共后缀（如 vercel.app）时返回空串
+    return get_psl().registrable_domain(url) or ""
 
 def search_github_ai_projects(max_results: int = 100) -> List[Dict]:
-    """搜索GitHub上的热门AI项目"""
+    """搜索GitHub上的热门AI项目
+
+    每个搜索关键词作为一个来源按 refresh_schedule.py 调度，未到期的关键词复用上次的结果。
+    """
+    import requests
+    from refresh_schedule import content_digest, get_scheduler
+    
     projects = []
     
     # 多个搜索关键词
@@ -244,43 +248,51 @@ def search_github_ai_projects(max_results: int = 100) -> List[Dict]:
         'User-Agent': 'AI-Projects-Collector'
     }
     
-    seen_repos = set()
-    
-    for keyword in keywords:
+    def search(keyword: str):
         try:
             url = f"https://api.github.com/search/repositories?q={keyword}&sort=stars&order=desc&per_page=30"
             response = requests.get(url, headers=headers, timeout=10)
+            if response.status_code != 200:
+                print(f"Error searching GitHub for '{keyword}': HTTP {response.status_code}")
+                return None
+            return [{
+                'name': item.get('name', ''),
+                'full_name': item.get('full_name', ''),
+                'description': item.get('description', ''),
+                'stars': item.get('stargazers_count', 0),
+                'homepage': item.get('homepage', ''),
+                'url': item.get('html_url', ''),
+            } for item in response.json().get('items', [])]
+        except Exception as e:
+            print(f"Error searching GitHub for '{keyword}': {e}")
+            return None
+    
+    def digest(items: List[Dict]) -> str:
+        # 变化率只看项目集合和主页，star 数的日常波动不算变化；保存的仍是本次拉取到的最新项目信息
+        return content_digest(sorted([item['full_name'], item['homepage'] or ''] for item in items))
+    
+    scheduler = get_scheduler()
+    seen_repos = set()
+    
+    for keyword in keywords:
+        items = scheduler.refresh(f"github-search:{keyword}", lambda: search(keyword), lambda items: items, digest)
+        
+        for project in items or []:
+            repo_name = project['full_name']
+            if repo_name in seen_repos:
+                continue
             
-            if response.status_code == 200:
-                data = response.json()
-                items = data.get('items', [])
-                
-                for item in items:
-                    repo_name = item.get('full_name', '')
-                    if repo_name in seen_repos:
-                        continue
-                    
-                    seen_repos.add(repo_name)
-                    
-                    project = {
-                        'name': item.get('name', ''),
-                        'full_name': repo_name,
-                        'description': item.get('description', ''),
-                        'stars': item.get('stargazers_count', 0),
-                        'homepage': item.get('homepage', ''),
-                        'url': item.get('html_url', ''),
-                    }
-                    projects.append(project)
-                    
-                    if len(projects) >= max_results:
-                        break
+            seen_repos.add(repo_name)
+            projects.append(project)
             
             if len(projects) >= max_results:
                 break
-                
-        except Exception as e:
-            print(f"Error searching GitHub for '{keyword}': {e}")
-            continue
+        
+        if len(projects) >= max_results:
+            break
+    
+    scheduler.report()
+    scheduler.save()
     
     # 按star数排序
     projects.sort(key=lambda x: x['stars'], reverse=True)
@@ -296,7 +308,7 @@ def collect_domains(projects: List[Dict]) -> Set[str]:
             domain = extract_domain_from_url(homepage)
             if domain and '.' in domain:
                 # 过滤掉无效域名
-                if domain not in ['github.com', 'github.io', 'localhost']:
+                if domain not in ['github.com', 'localhost']:
                     domains.add(domain)
     
     return domains
@@ -321,7 +333,42 @@ def save_data(projects: List[Dict], domains: Set[str], output_file: str):
     print(f"📊 Total domains: {len(domains)}")
     print(f"📦 Total projects: {len(projects)}")
 
+def crawl_project_homepages(projects: List[Dict], domains: Set[str], promote_min_sites: int = 0) -> Set[str]:
+    """抓取项目主页，把第三方依赖主机的排序结果写入 data/crawl_candidates.json
+
+    promote_min_sites > 0 时，被至少这么多主页引用的新域名直接加入域名列表；
+    统计、字体、公共 CDN 等通用基础设施（crawl_homepages.GENERIC_INFRASTRUCTURE）不会被加入。
+    """
+    from crawl_homepages import (HomepageCrawler, CANDIDATES_FILE, homepage_urls, promotable,
+                                 rank_candidates, save_candidates)
+    
+    urls = homepage_urls(projects)
+    print(f"🕷️  Crawling {len(urls)} project homepages...")
+    results = HomepageCrawler().run(urls)
+    candidates = rank_candidates(results, domains)
+    save_candidates(candidates, len(results), CANDIDATES_FILE)
+    print(f"📋 {len(candidates)} third-party domains ranked in {CANDIDATES_FILE}")
+    
+    if promote_min_sites > 0:
+        promoted = set(promotable(candidates, promote_min_sites))
+        print(f"➕ Promoted {len(promoted)} domains referenced by >= {promote_min_sites} homepages")
+        domains = domains | promoted
+    return domains
+
 def main():
+    parser = argparse.ArgumentParser(description='Collect AI project domains from GitHub')
+    parser.add_argument('--crawl', action='store_true',
+                        help='crawl project homepages for third-party hosts (data/crawl_candidates.json)')
+    parser.add_argument('--crawl-promote', type=int, default=0, metavar='N',
+                        help='with --crawl, add new domains referenced by at least N homepages')
+    parser.add_argument('--refresh-all', action='store_true',
+                        help='run every GitHub search now, ignoring the per-source refresh schedule')
+    args = parser.parse_args()
+    
+    if args.refresh_all:
+        from refresh_schedule import get_scheduler
+        get_scheduler().force = True
+    
     print("🚀 Starting AI projects collection...")
     
     # 搜索GitHub项目
@@ -332,6 +379,10 @@ def main():
     print("🌐 Collecting domains...")
     domains = collect_domains(projects)
     
+    # 可选：抓取主页，发现站点依赖的 API、静态资源和鉴权主机
+    if args.crawl:
+        domains = crawl_project_homepages(projects, domains, args.crawl_promote)
+    
     # 获取脚本所在目录的父目录（项目根目录）
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
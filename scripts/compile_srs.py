@@ -2,12 +2,40 @@
 """
 Sing-box SRS 编译辅助脚本
 自动检测 sing-box 工具并编译 JSON 规则为 SRS 格式
+支持目录 / glob、并行编译，并按源文件哈希和 sing-box 版本复用 .cache/srs/ 中已编译的结果
 """
 
 import os
+import re
 import sys
+import glob
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import contextlib
 import subprocess
+from datetime import datetime
+from typing import List, Optional
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 已编译 SRS 的内容寻址缓存，按源文件哈希和 sing-box 版本命名；
+# 工作流生成前会清空 rules/，所以缓存不能依赖 rules/ 中已有的 .srs
+SRS_CACHE_DIR = PROJECT_ROOT / '.cache' / 'srs'
+
+# 超过该时间（秒）未被使用的缓存条目在编译后清理
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+# 单个文件的编译超时（秒）
+DEFAULT_TIMEOUT = 120
+
+# generate_rules.py 生成的内容哈希副本（如 sing-box.0123456789ab.json）不单独编译
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.json$')
 
 def check_singbox_installed():
     """检查 sing-box 是否已安装"""
@@ -30,6 +58,145 @@ def check_singbox_installed():
     print("   Manual:      https://github.com/SagerNet/sing-box/releases")
     return False
 
+def singbox_version() -> str:
+    """sing-box 版本号，作为缓存键的一部分，升级后自动重新编译"""
+    try:
+        result = subprocess.run(['sing-box', 'version'], capture_output=True, text=True, timeout=5)
+        return result.stdout.split('\n')[0].strip()
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return ''
+
+def file_sha256(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def is_rule_set_source(path: Path) -> bool:
+    """判断是否为 sing-box 规则集源文件（排除 manifest 和内容哈希副本）"""
+    if HASHED_NAME.search(path.name):
+        return False
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(data, dict) and 'version' in data and isinstance(data.get('rules'), list)
+
+def collect_sources(targets: List[str]) -> List[Path]:
+    """把文件、目录（递归查找 *.json）和 glob 模式展开为待编译的源文件列表"""
+    sources = []
+    for target in targets:
+        path = Path(target)
+        if path.is_dir():
+            candidates = sorted(path.rglob('*.json'))
+        elif glob.has_magic(target):
+            candidates = sorted(Path(p) for p in glob.glob(target, recursive=True))
+        else:
+            candidates = [path]
+        sources.extend(c for c in candidates if c.is_file() and is_rule_set_source(c))
+    # 去重并保持顺序
+    return list(dict.fromkeys(p.resolve() for p in sources))
+
+def cache_path(cache_dir: Path, source_sha256: str, version: str) -> Path:
+    """源文件哈希 + sing-box 版本对应的缓存文件"""
+    key = hashlib.sha256(f"{source_sha256}\0{version}".encode('utf-8')).hexdigest()
+    return cache_dir / f"{key}.srs"
+
+def _copy_atomic(source: Path, target: Path):
+    """先复制到同目录的临时文件再替换，中断时不会留下残缺的文件"""
+    fd, temp_name = tempfile.mkstemp(prefix=f".{target.name}.", suffix='.tmp', dir=target.parent)
+    os.close(fd)
+    temp_file = Path(temp_name)
+    try:
+        shutil.copyfile(source, temp_file)
+        temp_file.replace(target)
+    finally:
+        temp_file.unlink(missing_ok=True)
+
+def prune_cache(cache_dir: Path, max_age: float = CACHE_MAX_AGE, now: float = None) -> int:
+    """删除长期未使用的缓存条目，返回删除数量"""
+    now = time.time() if now is None else now
+    removed = 0
+    for path in cache_dir.glob('*.srs'):
+        if now - path.stat().st_mtime > max_age:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+def compile_one(json_file: Path, output_file: Path = None, cache_dir: Optional[Path] = None,
+                version: str = '', timeout: int = DEFAULT_TIMEOUT) -> dict:
+    """编译单个规则集，返回机器可读的结果；缓存中有相同源文件和 sing-box 版本的 SRS 时直接复制"""
+    json_file = Path(json_file)
+    output_file = Path(output_file) if output_file else json_file.with_suffix('.srs')
+    result = {
+        'source': str(json_file),
+        'output': str(output_file),
+        'status': 'failed',
+        'seconds': 0.0,
+        'json_size': json_file.stat().st_size,
+        'srs_size': None,
+        'reduction': None,
+        'source_sha256': file_sha256(json_file),
+        'srs_sha256': None,
+        'error': None,
+    }
+    
+    started = time.perf_counter()
+    cached_file = cache_path(cache_dir, result['source_sha256'], version) if cache_dir and version else None
+    if cached_file and cached_file.exists():
+        _copy_atomic(cached_file, output_file)
+        # 命中时刷新修改时间，prune_cache 按最近使用时间清理
+        os.utime(cached_file)
+        result['status'] = 'cached'
+    else:
+        # 先写到临时文件，编译失败时不会留下残缺的 .srs
+        temp_file = output_file.with_name(f".{output_file.name}.tmp")
+        try:
+            process = subprocess.run(
+                ['sing-box', 'rule-set', 'compile', '--output', str(temp_file), str(json_file)],
+                capture_output=True, text=True, timeout=timeout,
+            )
+            if process.returncode == 0 and temp_file.exists():
+                temp_file.replace(output_file)
+                result['status'] = 'compiled'
+                if cached_file:
+                    cached_file.parent.mkdir(parents=True, exist_ok=True)
+                    _copy_atomic(output_file, cached_file)
+            else:
+                result['error'] = process.stderr.strip() or f"exit code {process.returncode}"
+        except subprocess.TimeoutExpired:
+            result['error'] = f"timeout after {timeout}s"
+        except OSError as e:
+            result['error'] = str(e)
+        finally:
+            temp_file.unlink(missing_ok=True)
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    
+    if result['status'] != 'failed':
+        result['srs_size'] = output_file.stat().st_size
+        result['srs_sha256'] = file_sha256(output_file)
+        if result['json_size']:
+            result['reduction'] = round((1 - result['srs_size'] / result['json_size']) * 100, 2)
+    return result
+
+def compile_many(sources: List[Path], workers: int = None, cache_dir: Optional[Path] = SRS_CACHE_DIR,
+                 timeout: int = DEFAULT_TIMEOUT) -> List[dict]:
+    """用线程池并行编译（每个任务都是独立的 sing-box 子进程），编译结果写入缓存目录"""
+    version = singbox_version()
+    workers = workers or os.cpu_count() or 1
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda source: compile_one(source, None, cache_dir, version, timeout),
+            sources,
+        ))
+    
+    if cache_dir and cache_dir.exists():
+        prune_cache(cache_dir)
+    return results
+
 def compile_to_srs(json_file: Path, output_file: Path = None):
     """编译 JSON 规则为 SRS 格式"""
     if not json_file.exists():
@@ -40,59 +207,80 @@ def compile_to_srs(json_file: Path, output_file: Path = None):
         output_file = json_file.with_suffix('.srs')
     
     print(f"\n🔨 Compiling {json_file.name} to {output_file.name}...")
-    
-    try:
-        result = subprocess.run(
-            ['sing-box', 'rule-set', 'compile', 
-             '--output', str(output_file), 
-             str(json_file)],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        if result.returncode == 0:
-            json_size = json_file.stat().st_size
-            srs_size = output_file.stat().st_size
-            reduction = ((json_size - srs_size) / json_size) * 100
-            
-            print(f"✅ Successfully compiled!")
-            print(f"   📊 Size comparison:")
-            print(f"      JSON: {json_size:,} bytes")
-            print(f"      SRS:  {srs_size:,} bytes")
-            print(f"      Reduction: {reduction:.1f}%")
-            return True
-        else:
-            print(f"❌ Compilation failed!")
-            print(f"   Error: {result.stderr}")
-            return False
-            
-    except subprocess.TimeoutExpired:
-        print("❌ Compilation timeout!")
-        return False
-    except Exception as e:
-        print(f"❌ Error: {e}")
+    result = compile_one(json_file, output_file)
+    if result['status'] == 'failed':
+        print(f"❌ Compilation failed!")
+        print(f"   Error: {result['error']}")
         return False
+    
+    print(f"✅ Successfully compiled!")
+    print(f"   📊 Size comparison:")
+    print(f"      JSON: {result['json_size']:,} bytes")
+    print(f"      SRS:  {result['srs_size']:,} bytes")
+    print(f"      Reduction: {result['reduction']:.1f}%")
+    return True
 
 def main():
-    print("🚀 Sing-box SRS Compilation Tool")
-    print("=" * 60)
-    
-    # 检查 sing-box 是否安装
-    if not check_singbox_installed():
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Compile sing-box JSON rule-sets to SRS')
+    parser.add_argument('targets', nargs='*', help='rule-set files, directories or glob patterns (default: rules/)')
+    parser.add_argument('-j', '--workers', type=int, help='parallel compilations (default: CPU count)')
+    parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT, help='per-file timeout in seconds')
+    parser.add_argument('--no-cache', action='store_true', help='recompile even if the source hash is unchanged')
+    parser.add_argument('--json', action='store_true', help='print the machine-readable report to stdout')
+    args = parser.parse_args()
     
     # 获取项目根目录
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
     rules_dir = project_root / 'rules'
+    report_file = project_root / 'data' / 'srs_report.json'
     
-    # 编译 sing-box.json
-    json_file = rules_dir / 'sing-box.json'
-    srs_file = rules_dir / 'sing-box.srs'
+    # --json 时 stdout 只输出报告
+    log = (lambda *a: print(*a, file=sys.stderr)) if args.json else print
+    log("🚀 Sing-box SRS Compilation Tool")
+    log("=" * 60)
     
-    if compile_to_srs(json_file, srs_file):
-        print(f"\n✨ SRS file created: {srs_file}")
+    # 检查 sing-box 是否安装
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        installed = check_singbox_installed()
+    if not installed:
+        sys.exit(1)
+    
+    sources = collect_sources(args.targets or [str(rules_dir)])
+    if not sources:
+        log("❌ No sing-box rule-set sources found")
+        sys.exit(1)
+    
+    started = time.perf_counter()
+    results = compile_many(sources, args.workers, None if args.no_cache else SRS_CACHE_DIR, args.timeout)
+    report = {
+        'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'sing_box': singbox_version(),
+        'total_seconds': round(time.perf_counter() - started, 4),
+        'compiled': sum(1 for r in results if r['status'] == 'compiled'),
+        'cached': sum(1 for r in results if r['status'] == 'cached'),
+        'failed': sum(1 for r in results if r['status'] == 'failed'),
+        'files': results,
+    }
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    
+    for result in results:
+        name = Path(result['source']).name
+        if result['status'] == 'failed':
+            log(f"❌ {name}: {result['error']}")
+        else:
+            icon = '♻️ ' if result['status'] == 'cached' else '✅'
+            log(f"{icon} {name} -> {Path(result['output']).name}: {result['json_size']:,} -> "
+                f"{result['srs_size']:,} bytes ({result['reduction']}% smaller, {result['seconds']}s)")
+    log(f"📊 {report['compiled']} compiled, {report['cached']} cached, {report['failed']} failed "
+        f"in {report['total_seconds']}s")
+    log(f"💾 Report saved to {report_file}")
+    
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
         print(f"\n📝 Usage in sing-box config:")
         print("""
 {
@@ -114,7 +302,8 @@ def main():
   }
 }
         """)
-    else:
+    
+    if report['failed']:
         sys.exit(1)
 
 if __name__ == '__main__':
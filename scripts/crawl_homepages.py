@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+项目主页爬虫：抓取 AI 项目主页，从 HTML、脚本和 CSP 头中提取依赖的第三方主机名
+Crawl project homepages and rank the third-party hosts they depend on
+"""
+
+import re
+import json
+import time
+import asyncio
+import argparse
+from html.parser import HTMLParser
+from typing import List, Dict, Iterable, Optional, Set, Tuple
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from psl import get_psl
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 按 URL 缓存提取结果和 ETag / Last-Modified，下次运行用条件请求验证
+CRAWL_CACHE_FILE = PROJECT_ROOT / '.cache' / 'crawl_cache.json'
+
+# 候选域名输出
+CANDIDATES_FILE = PROJECT_ROOT / 'data' / 'crawl_candidates.json'
+
+# 全局并发数、每个主机的并发数和同一主机两次请求的最小间隔（秒）
+DEFAULT_CONCURRENCY = 8
+PER_HOST_CONCURRENCY = 1
+HOST_DELAY = 1.0
+
+DEFAULT_TIMEOUT = 10
+
+# 单个响应最多读取的字节数
+MAX_BYTES = 2 * 1024 * 1024
+
+# 每个主页最多抓取的同站脚本数，打包后的脚本里常能找到 API 和鉴权主机
+MAX_SCRIPTS = 4
+
+USER_AGENT = 'AI-Projects-Collector'
+
+# 带协议或协议相对的 URL 中的主机名
+_URL_HOST = re.compile(r'(?:\b(?:https?|wss?):)?//([a-z0-9](?:[a-z0-9-]*[a-z0-9])?(?:\.[a-z0-9](?:[a-z0-9-]*[a-z0-9])?)+)',
+                       re.IGNORECASE)
+_VALID_HOST = re.compile(r'^(?=.*[a-z])[a-z0-9-]+(?:\.[a-z0-9-]+)+$')
+
+# 带资源 URL 的标签属性 -> 来源类型；<a href> 是导航链接而非依赖，不提取
+_RESOURCE_ATTRS = {
+    ('script', 'src'): 'script',
+    ('link', 'href'): 'link',
+    ('img', 'src'): 'html',
+    ('iframe', 'src'): 'html',
+    ('source', 'src'): 'html',
+    ('video', 'src'): 'html',
+    ('audio', 'src'): 'html',
+    ('embed', 'src'): 'html',
+    ('form', 'action'): 'html',
+}
+
+CSP_HEADERS = ('content-security-policy', 'content-security-policy-report-only')
+
+# 几乎所有网站都会引用的通用基础设施（统计、标签管理、字体、公共 CDN、验证码、社交组件、支付等），
+# 按域名后缀匹配（fonts.googleapis.com 在 PSL 的 PRIVATE 部分自成一个站点）；
+# 被很多主页引用也不说明与 AI 相关，不能自动加入规则
+GENERIC_INFRASTRUCTURE = frozenset({
+    # 统计 / 标签管理 / 广告
+    'google-analytics.com', 'googletagmanager.com', 'googleadservices.com', 'googlesyndication.com',
+    'doubleclick.net', 'googleoptimize.com', 'hotjar.com', 'hotjar.io', 'segment.com', 'segment.io',
+    'mixpanel.com', 'amplitude.com', 'heap.io', 'heapanalytics.com', 'posthog.com', 'plausible.io',
+    'clarity.ms', 'fullstory.com', 'intercom.io', 'intercomcdn.com', 'crisp.chat', 'hubspot.com',
+    'hs-scripts.com', 'hs-analytics.net', 'hsforms.com', 'sentry.io', 'sentry-cdn.com', 'datadoghq.com',
+    'newrelic.com', 'nr-data.net', 'bugsnag.com', 'vercel-insights.com', 'cloudflareinsights.com',
+    # 字体 / 公共 CDN / 托管
+    'gstatic.com', 'googleapis.com', 'googleusercontent.com', 'typekit.net', 'fontawesome.com',
+    'jsdelivr.net', 'unpkg.com', 'cdnjs.com', 'cloudflare.com', 'jquery.com', 'bootstrapcdn.com',
+    'cloudfront.net', 'akamaihd.net', 'fastly.net', 'azureedge.net', 'github.io', 'githubusercontent.com',
+    'github.com', 'gitlab.com', 'vercel.app', 'netlify.app', 'pages.dev', 'imgix.net', 'cloudinary.com',
+    # 验证码 / 登录 / 支付
+    'recaptcha.net', 'hcaptcha.com', 'google.com', 'apple.com', 'stripe.com', 'stripe.network',
+    'paypal.com', 'auth0.com', 'clerk.com', 'gravatar.com', 'wp.com',
+    # 社交 / 视频嵌入
+    'facebook.com', 'facebook.net', 'fbcdn.net', 'twitter.com', 'x.com', 'twimg.com', 'linkedin.com',
+    'licdn.com', 'youtube.com', 'ytimg.com', 'youtube-nocookie.com', 'vimeo.com', 'vimeocdn.com',
+    'discord.com', 'discord.gg', 'reddit.com', 'instagram.com', 'tiktok.com',
+})
+
+
+def _normalize_host(host: str) -> Optional[str]:
+    host = host.lower().strip('.')
+    return host if _VALID_HOST.match(host) else None
+
+
+def site_of(host: str) -> str:
+    """主机的可注册域名，无法确定时（如 localhost）返回主机本身"""
+    return get_psl().registrable_domain(host) or host
+
+
+def is_generic(domain: str) -> bool:
+    """域名是否属于通用基础设施"""
+    labels = domain.split('.')
+    return any('.'.join(labels[i:]) in GENERIC_INFRASTRUCTURE for i in range(len(labels) - 1))
+
+
+def hosts_from_csp(policy: str) -> List[str]:
+    """从 CSP 策略的来源列表中提取主机名，*.example.com 记为 example.com"""
+    hosts = []
+    for directive in policy.split(';'):
+        for source in directive.split()[1:]:
+            if source.startswith("'") or source.endswith(':'):
+                continue  # 'self'、'nonce-...'、data: 等关键字
+            source = re.sub(r'^[a-z][a-z0-9+.-]*://', '', source.lower())
+            source = source.split('/')[0].split(':')[0]
+            host = _normalize_host(source.removeprefix('*.'))
+            if host:
+                hosts.append(host)
+    return hosts
+
+
+def hosts_from_text(text: str) -> List[str]:
+    """从脚本或内联代码中提取 URL 的主机名"""
+    return [h for h in (_normalize_host(m.group(1)) for m in _URL_HOST.finditer(text)) if h]
+
+
+class _ResourceExtractor(HTMLParser):
+    """收集页面引用的资源 URL、内联脚本和 <meta> 中的 CSP"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.resources: List[Tuple[str, str]] = []
+        self.inline: List[str] = []
+        self.csp: List[str] = []
+        self._in_script = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        for name, value in attrs.items():
+            if not value:
+                continue
+            source = _RESOURCE_ATTRS.get((tag, name))
+            if source:
+                self.resources.append((value, source))
+            elif name == 'srcset':
+                self.resources.extend((part.split()[0], 'html') for part in value.split(',') if part.strip())
+        if tag == 'meta' and (attrs.get('http-equiv') or '').lower() == 'content-security-policy':
+            self.csp.append(attrs.get('content') or '')
+        self._in_script = tag == 'script' and not attrs.get('src')
+
+    def handle_endtag(self, tag):
+        if tag == 'script':
+            self._in_script = False
+
+    def handle_data(self, data):
+        if self._in_script:
+            self.inline.append(data)
+
+
+def extract_page(base_url: str, html: str, headers: Dict[str, str]) -> Tuple[Dict[str, List[str]], List[str]]:
+    """返回 (主机名 -> 来源类型列表, 同站脚本 URL 列表)"""
+    extractor = _ResourceExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception:
+        pass  # 残缺的 HTML 只保留已解析的部分
+
+    found: Dict[str, Set[str]] = {}
+
+    def add(host: Optional[str], source: str):
+        if host:
+            found.setdefault(host, set()).add(source)
+
+    site = site_of(urlsplit(base_url).hostname or '')
+    scripts = []
+    for url, source in extractor.resources:
+        absolute = urljoin(base_url, url.strip())
+        parts = urlsplit(absolute)
+        if parts.scheme not in ('http', 'https'):
+            continue
+        add(_normalize_host(parts.hostname or ''), source)
+        if source == 'script' and site_of(parts.hostname or '') == site and absolute not in scripts:
+            scripts.append(absolute)
+    for text in extractor.inline:
+        for host in hosts_from_text(text):
+            add(host, 'inline-script')
+    policies = extractor.csp + [v for k, v in headers.items() if k.lower() in CSP_HEADERS]
+    for policy in policies:
+        for host in hosts_from_csp(policy):
+            add(host, 'csp')
+    return {host: sorted(sources) for host, sources in found.items()}, scripts
+
+
+class HomepageCrawler:
+    """基于 asyncio 的主页爬虫
+
+    全局并发由信号量限制，每个主机另有并发上限和最小请求间隔，并遵守 robots.txt；
+    HTTP 请求在线程池中用 requests 执行。提取结果按 URL 缓存，带 ETag / Last-Modified
+    的页面下次运行时用条件请求验证，未变化（304）时直接复用。
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, per_host: int = PER_HOST_CONCURRENCY,
+                 delay: float = HOST_DELAY, timeout: float = DEFAULT_TIMEOUT,
+                 max_scripts: int = MAX_SCRIPTS, cache_file: Optional[Path] = CRAWL_CACHE_FILE):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.timeout = timeout
+        self.max_scripts = max_scripts
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.cache: Dict[str, dict] = {}
+        if self.cache_file and self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self.stats = {'fetched': 0, 'not_modified': 0, 'failed': 0, 'disallowed': 0}
+
+    def save_cache(self):
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, indent=2, ensure_ascii=False)
+
+    def _fetch_sync(self, url: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], str, str]:
+        import requests
+        headers = {'User-Agent': USER_AGENT, **headers}
+        with requests.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            body = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                body.extend(chunk)
+                if len(body) >= MAX_BYTES:
+                    break
+            text = bytes(body[:MAX_BYTES]).decode(response.encoding or 'utf-8', 'replace')
+            return response.status_code, dict(response.headers), text, response.url
+
+    async def _request(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """遵守每主机并发和间隔限制发出请求，返回 (状态码, 响应头, 正文, 最终 URL)"""
+        host = urlsplit(url).netloc.lower()
+        slot = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        loop = asyncio.get_running_loop()
+        # 先占用主机名额再占用全局名额，等待间隔的请求不会挤占其他主机的并发
+        async with slot:
+            wait = self._last_request.get(host, float('-inf')) + self.delay - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            async with self._pool:
+                try:
+                    return await loop.run_in_executor(self._executor, self._fetch_sync, url, headers or {})
+                finally:
+                    self._last_request[host] = loop.time()
+
+    async def _allowed(self, url: str) -> bool:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin not in self._robots:
+            future = asyncio.get_running_loop().create_future()
+            self._robots[origin] = future
+            parser = None
+            try:
+                status, _, text, _ = await self._request(origin + '/robots.txt')
+                if status == 200:
+                    parser = RobotFileParser()
+                    parser.parse(text.splitlines())
+            except Exception:
+                pass
+            future.set_result(parser)
+        parser = await self._robots[origin]
+        return parser is None or parser.can_fetch(USER_AGENT, url)
+
+    async def _fetch_cached(self, url: str, page: bool) -> Optional[dict]:
+        """抓取并提取一个 URL，返回缓存条目；不允许抓取或失败时返回 None"""
+        if not await self._allowed(url):
+            self.stats['disallowed'] += 1
+            return None
+        cached = self.cache.get(url)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        try:
+            status, response_headers, text, final_url = await self._request(url, headers)
+        except Exception as e:
+            print(f"  ❌ {url}: {e}")
+            self.stats['failed'] += 1
+            return None
+        if status == 304 and cached:
+            self.stats['not_modified'] += 1
+            return cached
+        if status != 200:
+            print(f"  ⚠️ {url}: HTTP {status}")
+            self.stats['failed'] += 1
+            return None
+
+        self.stats['fetched'] += 1
+        if page:
+            hosts, scripts = extract_page(final_url, text, response_headers)
+        else:
+            hosts = {host: ['script'] for host in dict.fromkeys(hosts_from_text(text))}
+            scripts = []
+        lower = {k.lower(): v for k, v in response_headers.items()}
+        entry = {
+            'final_url': final_url,
+            'etag': lower.get('etag'),
+            'last_modified': lower.get('last-modified'),
+            'hosts': hosts,
+            'scripts': scripts,
+            'fetched_at': int(time.time()),
+        }
+        if entry['etag'] or entry['last_modified']:
+            self.cache[url] = entry
+        return entry
+
+    async def crawl_site(self, url: str) -> Optional[dict]:
+        """抓取一个主页及其同站脚本，返回 {url, site, hosts: 第三方主机 -> 来源类型}"""
+        entry = await self._fetch_cached(url, page=True)
+        if entry is None:
+            return None
+        site = site_of(urlsplit(entry['final_url']).hostname or '')
+        found: Dict[str, Set[str]] = {}
+        for host, sources in entry['hosts'].items():
+            found.setdefault(host, set()).update(sources)
+        script_entries = await asyncio.gather(
+            *(self._fetch_cached(script, page=False) for script in entry['scripts'][:self.max_scripts]))
+        for script_entry in script_entries:
+            for host, sources in (script_entry or {}).get('hosts', {}).items():
+                found.setdefault(host, set()).update(sources)
+        return {
+            'url': url,
+            'site': site,
+            'hosts': {h: sorted(s) for h, s in sorted(found.items()) if site_of(h) != site},
+        }
+
+    async def crawl(self, urls: Iterable[str]) -> List[dict]:
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._pool = asyncio.Semaphore(self.concurrency)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._last_request: Dict[str, float] = {}
+        self._robots: Dict[str, asyncio.Future] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self._executor:
+            results = await asyncio.gather(*(self.crawl_site(url) for url in dict.fromkeys(urls)))
+        return [r for r in results if r]
+
+    def run(self, urls: Iterable[str]) -> List[dict]:
+        results = asyncio.run(self.crawl(urls))
+        self.save_cache()
+        return results
+
+
+def rank_candidates(results: List[dict], known: Iterable[str] = ()) -> List[dict]:
+    """按引用它的站点数排序第三方域名（按可注册域名合并）"""
+    known = set(known)
+    candidates: Dict[str, dict] = {}
+    for result in results:
+        for host, sources in result['hosts'].items():
+            domain = site_of(host)
+            candidate = candidates.setdefault(domain, {'sites': set(), 'hosts': set(), 'sources': set()})
+            candidate['sites'].add(result['site'])
+            candidate['hosts'].add(host)
+            candidate['sources'].update(sources)
+    ranked = [
+        {
+            'domain': domain,
+            'sites': len(c['sites']),
+            'referenced_by': sorted(c['sites']),
+            'hosts': sorted(c['hosts']),
+            'sources': sorted(c['sources']),
+            'known': domain in known or any(h in known for h in c['hosts']),
+            'generic': is_generic(domain),
+        }
+        for domain, c in candidates.items()
+    ]
+    ranked.sort(key=lambda c: (-c['sites'], c['domain']))
+    return ranked
+
+
+def promotable(candidates: List[dict], min_sites: int) -> List[str]:
+    """被至少 min_sites 个主页引用、尚未收录且不是通用基础设施的候选域名"""
+    return [c['domain'] for c in candidates
+            if c['sites'] >= min_sites and not c['known'] and not c['generic']]
+
+
+def homepage_urls(projects: List[Dict]) -> List[str]:
+    urls = []
+    for project in projects:
+        homepage = (project.get('homepage') or '').strip()
+        if not homepage:
+            continue
+        if not re.match(r'^https?://', homepage):
+            homepage = 'https://' + homepage
+        urls.append(homepage)
+    return urls
+
+
+def save_candidates(candidates: List[dict], crawled: int, output_file: Path):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'crawled_sites': crawled,
+            'candidates': candidates,
+        }, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl project homepages for third-party hosts')
+    parser.add_argument('urls', nargs='*', help='homepages (default: projects in data/collected_projects.json)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--delay', type=float, default=HOST_DELAY, help='minimum seconds between requests to a host')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--output', default=str(CANDIDATES_FILE))
+    args = parser.parse_args()
+
+    print("🚀 Homepage Crawler")
+    print("=" * 60)
+
+    known = []
+    urls = args.urls
+    collected_file = PROJECT_ROOT / 'data' / 'collected_projects.json'
+    if collected_file.exists():
+        with open(collected_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        known = data.get('domains', [])
+        urls = urls or homepage_urls(data.get('projects', []))
+
+    crawler = HomepageCrawler(args.concurrency, delay=args.delay, timeout=args.timeout)
+    print(f"🕷️  Crawling {len(urls)} homepages...")
+    results = crawler.run(urls)
+    candidates = rank_candidates(results, known)
+    save_candidates(candidates, len(results), Path(args.output))
+
+    stats = crawler.stats
+    print(f"✅ {stats['fetched']} fetched, {stats['not_modified']} not modified, "
+          f"{stats['failed']} failed, {stats['disallowed']} disallowed by robots.txt")
+    for candidate in candidates[:20]:
+        mark = '  ' if candidate['known'] or candidate['generic'] else '🆕'
+        print(f"   {mark} {candidate['sites']:>3}  {candidate['domain']:<32} {', '.join(candidate['sources'])}")
+    print(f"💾 {len(candidates)} candidates saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+DNS 存活探测：并发解析合并后的域名，剔除长期失效的规则
+Async DNS liveness probe to prune dead domains from the merged rule set
+"""
+
+import json
+import random
+import socket
+import struct
+import asyncio
+import argparse
+import time
+from typing import List, Dict, Tuple, Optional
+from pathlib import Path
+
+# 默认公共 DNS 服务器
+DEFAULT_NAMESERVERS = ["1.1.1.1", "8.8.8.8"]
+
+# 默认并发数 / 单次查询超时（秒）/ 每个域名的重试次数
+DEFAULT_CONCURRENCY = 64
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_ATTEMPTS = 2
+
+# 连续 NXDOMAIN 超过宽限期（默认 7 天）才真正剔除
+DEFAULT_GRACE_SECONDS = 7 * 24 * 3600
+
+# 否定应答缺少 SOA 时使用的缓存时间，以及缓存时间上下限
+NEGATIVE_TTL = 3600
+MIN_TTL = 300
+MAX_TTL = 24 * 3600
+
+# 解析状态
+STATUS_ALIVE = "alive"
+STATUS_DEAD = "dead"
+STATUS_UNKNOWN = "unknown"
+
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+QTYPE_A = 1
+QTYPE_SOA = 6
+
+
+def parse_nameserver(spec: str) -> Tuple[str, int]:
+    """解析 nameserver 配置，支持 1.1.1.1 / 127.0.0.1:5353 / [::1]:53"""
+    spec = spec.strip()
+    if spec.startswith('['):
+        host, _, rest = spec[1:].partition(']')
+        port = int(rest[1:]) if rest.startswith(':') else 53
+        return host, port
+    if spec.count(':') == 1:
+        host, port = spec.split(':')
+        return host, int(port)
+    return spec, 53
+
+
+def build_query(domain: str, query_id: int, qtype: int = QTYPE_A) -> bytes:
+    """构造标准递归查询报文"""
+    header = struct.pack('>HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    qname = b''.join(
+        bytes([len(label)]) + label
+        for label in (p.encode('idna') for p in domain.rstrip('.').split('.'))
+    ) + b'\x00'
+    return header + qname + struct.pack('>HH', qtype, 1)
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    """跳过报文中的域名字段（支持压缩指针）"""
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+
+def parse_response(data: bytes, query_id: int) -> Optional[Tuple[int, int, int]]:
+    """解析应答，返回 (rcode, 回答数, 最小TTL)；报文不匹配时返回 None"""
+    if len(data) < 12:
+        return None
+    rid, flags, qdcount, ancount, nscount, _ = struct.unpack('>HHHHHH', data[:12])
+    if rid != query_id or not flags & 0x8000:
+        return None
+    rcode = flags & 0x000F
+
+    offset = 12
+    for _ in range(qdcount):
+        offset = _skip_name(data, offset) + 4
+
+    ttl = None
+    for index in range(ancount + nscount):
+        offset = _skip_name(data, offset)
+        rtype, _, rttl, rdlength = struct.unpack('>HHIH', data[offset:offset + 10])
+        offset += 10
+        if index >= ancount:
+            # 否定应答的缓存时间取 SOA 的 TTL（RFC 2308）
+            if rtype == QTYPE_SOA:
+                ttl = rttl if ttl is None else min(ttl, rttl)
+        elif rtype != QTYPE_SOA:
+            ttl = rttl if ttl is None else min(ttl, rttl)
+        offset += rdlength
+
+    return rcode, ancount, NEGATIVE_TTL if ttl is None else ttl
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    """单次 UDP 查询的协议对象"""
+
+    def __init__(self, query_id: int, future: asyncio.Future):
+        self.query_id = query_id
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        try:
+            result = parse_response(data, self.query_id)
+        except (IndexError, struct.error):
+            result = None
+        if result is not None and not self.future.done():
+            self.future.set_result(result)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class DNSProber:
+    """基于 asyncio 的并发 DNS 探测器"""
+
+    def __init__(self, nameservers: List[str] = None, concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT, attempts: int = DEFAULT_ATTEMPTS):
+        self.nameservers = [parse_nameserver(ns) for ns in (nameservers or DEFAULT_NAMESERVERS)]
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.attempts = attempts
+
+    async def _query_once(self, domain: str, nameserver: Tuple[str, int]) -> Tuple[int, int, int]:
+        loop = asyncio.get_running_loop()
+        query_id = random.randint(0, 0xFFFF)
+        future = loop.create_future()
+        family = socket.AF_INET6 if ':' in nameserver[0] else socket.AF_INET
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _QueryProtocol(query_id, future),
+            remote_addr=nameserver,
+            family=family,
+        )
+        try:
+            transport.sendto(build_query(domain, query_id))
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            transport.close()
+
+    async def resolve(self, domain: str) -> Tuple[str, int]:
+        """解析单个域名，返回 (状态, TTL)
+
+        NXDOMAIN 视为失效；NOERROR（含无 A 记录的 NODATA）视为存活；
+        超时和 SERVFAIL 等无法判断的情况记为 unknown，不参与剔除。
+        """
+        for attempt in range(self.attempts):
+            nameserver = self.nameservers[attempt % len(self.nameservers)]
+            try:
+                rcode, _, ttl = await self._query_once(domain, nameserver)
+            except (asyncio.TimeoutError, OSError):
+                continue
+            if rcode == RCODE_NOERROR:
+                return STATUS_ALIVE, ttl
+            if rcode == RCODE_NXDOMAIN:
+                return STATUS_DEAD, ttl
+        return STATUS_UNKNOWN, MIN_TTL
+
+    async def resolve_all(self, domains: List[str]) -> Dict[str, Tuple[str, int]]:
+        """在并发上限内解析全部域名"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def worker(domain: str):
+            async with semaphore:
+                return domain, await self.resolve(domain)
+
+        results = await asyncio.gather(*(worker(d) for d in domains))
+        return dict(results)
+
+
+class ProbeCache:
+    """持久化探测缓存，按 TTL 过期并记录首次失效时间"""
+
+    def __init__(self, cache_file: str = None):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.entries = {}
+        if self.cache_file and self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def fresh(self, domain: str, now: float) -> Optional[dict]:
+        """返回未过期的缓存条目"""
+        entry = self.entries.get(domain)
+        if entry and entry.get('expires', 0) > now:
+            return entry
+        return None
+
+    def update(self, domain: str, status: str, ttl: int, now: float) -> dict:
+        """写入一次探测结果"""
+        previous = self.entries.get(domain, {})
+        entry = {
+            'status': status,
+            'checked': now,
+            'expires': now + max(MIN_TTL, min(ttl, MAX_TTL)),
+            'first_dead': None,
+        }
+        if status == STATUS_DEAD:
+            first_dead = previous.get('first_dead')
+            entry['first_dead'] = now if first_dead is None else first_dead
+        elif status == STATUS_UNKNOWN:
+            # 无法判断时保留之前的失效记录
+            entry['first_dead'] = previous.get('first_dead')
+        self.entries[domain] = entry
+        return entry
+
+    def save(self):
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+
+
+def probe_rules(rules: dict, prober: DNSProber, cache: ProbeCache,
+                grace_seconds: int = DEFAULT_GRACE_SECONDS, now: float = None) -> Tuple[dict, dict]:
+    """探测 domains 与 domain_suffixes，返回 (剔除后的规则, 报告)"""
+    now = time.time() if now is None else now
+    targets = sorted(set(rules.get('domains', [])) | set(rules.get('domain_suffixes', [])))
+
+    pending = [d for d in targets if not cache.fresh(d, now)]
+    cached = len(targets) - len(pending)
+    if pending:
+        results = asyncio.run(prober.resolve_all(pending))
+        for domain, (status, ttl) in results.items():
+            cache.update(domain, status, ttl, now)
+
+    dropped, grace, unknown = [], [], []
+    for domain in targets:
+        entry = cache.entries.get(domain, {})
+        status = entry.get('status')
+        if status == STATUS_UNKNOWN:
+            unknown.append(domain)
+        # 只有最近一次明确是 NXDOMAIN 才剔除；超时 / SERVFAIL 只延续失效起点，不触发剔除
+        if status != STATUS_DEAD:
+            continue
+        if now - entry['first_dead'] >= grace_seconds:
+            dropped.append(domain)
+        else:
+            grace.append(domain)
+
+    dropped_set = set(dropped)
+    pruned = dict(rules)
+    pruned['domains'] = [d for d in rules.get('domains', []) if d not in dropped_set]
+    pruned['domain_suffixes'] = [d for d in rules.get('domain_suffixes', []) if d not in dropped_set]
+
+    report = {
+        'checked_at': now,
+        'total': len(targets),
+        'queried': len(pending),
+        'cached': cached,
+        'dropped': dropped,
+        'in_grace': grace,
+        'unknown': unknown,
+    }
+    return pruned, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prune dead domains from the merged rule set')
+    parser.add_argument('--nameserver', action='append', dest='nameservers',
+                        help='DNS server, e.g. 1.1.1.1 or 127.0.0.1:5353 (repeatable)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--grace-days', type=float, default=DEFAULT_GRACE_SECONDS / 86400)
+    args = parser.parse_args()
+
+    print("🚀 DNS Liveness Probe")
+    print("=" * 60)
+
+    # 获取脚本所在目录的父目录（项目根目录）
+    script_dir = Path(__file__).parent
+    project_root = script_dir.parent
+    data_file = project_root / 'data' / 'ai_projects.json'
+    cache_file = project_root / '.cache' / 'dns_cache.json'
+    report_file = project_root / 'data' / 'dns_probe_report.json'
+
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    prober = DNSProber(args.nameservers, args.concurrency, args.timeout)
+    cache = ProbeCache(str(cache_file))
+    pruned, report = probe_rules(data.get('rules', {}), prober, cache,
+                                 grace_seconds=int(args.grace_days * 86400))
+    cache.save()
+
+    data['rules'] = pruned
+    data['total_rules'] = sum(len(v) for v in pruned.values())
+    with open(data_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"📊 Checked {report['total']} domains ({report['queried']} queried, {report['cached']} cached)")
+    print(f"   - Dropped: {len(report['dropped'])}")
+    print(f"   - In grace window: {len(report['in_grace'])}")
+    print(f"   - Unknown: {len(report['unknown'])}")
+    for domain in report['dropped']:
+        print(f"   🗑️  {domain}")
+    print(f"💾 Report saved to {report_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+最小完美哈希域名表：可直接 mmap 查询的二进制规则文件（写入与读取）
+Minimal-perfect-hash domain table that can be memory-mapped and queried without parsing
+
+文件布局（小端，各段按 8 字节对齐）：
+
+    header    HEADER 结构：魔数、版本、哈希种子、各段偏移与条目数
+    disp      n_buckets 个 u32 位移值
+    slots     n_keys 个槽位 (u32 名称偏移, u16 名称长度, u8 标志, u8 保留)
+    keywords  n_keywords 个 (u32 偏移, u16 长度, u16 保留)
+    ipv4      n_v4 个 (u32 起, u32 止)，按起点排序、互不相邻的闭区间
+    ipv6      n_v6 个 (16 字节起, 16 字节止)，大端，可按字节序比较
+    arena     所有名称和关键词的 UTF-8 字节
+
+查找时先算键的 crc32 和 adler32（zlib 中两者均有现成实现），拼成 64 位 h = crc | adler << 32，
+经 splitmix64 混合得到 m = mix(h ^ seed)：桶 = (m >> 32) % n_buckets，f1 = m 低 32 位，f2 = crc；
+桶的位移 k 拆成 d0 = k // n_keys、d1 = k % n_keys，槽位 = (f1 + d0 * f2 + d1) % n_keys。
+槽位中的名称与键逐字节比较，不在表中的键不会误命中。
+"""
+
+import sys
+import mmap
+import zlib
+import struct
+import argparse
+import ipaddress
+from itertools import islice
+from typing import List, Dict, Tuple, Optional, Iterable
+
+from rule_matcher import KIND_DOMAIN, KIND_SUFFIX, KIND_KEYWORD, iter_suffixes
+
+MAGIC = b'AIMPHTBL'
+VERSION = 1
+
+# 魔数、版本、保留、种子，然后是 n_keys, n_buckets, disp_off, slot_off, arena_off, arena_size,
+# kw_off, n_kw, v4_off, n_v4, v6_off, n_v6
+HEADER = struct.Struct('<8sIIQ12I')
+SLOT = struct.Struct('<IHBx')
+KEYWORD = struct.Struct('<IHxx')
+RANGE4 = struct.Struct('<II')
+RANGE6 = struct.Struct('<16s16s')
+DISP = struct.Struct('<I')
+
+# 槽位标志：名称是精确域名和 / 或后缀
+FLAG_DOMAIN = 1
+FLAG_SUFFIX = 2
+
+# 平均每个桶的键数；越大位移表越小，构造越慢
+BUCKET_SIZE = 4
+
+# 构造失败时换种子重试的次数
+MAX_SEEDS = 16
+
+MASK64 = (1 << 64) - 1
+
+
+def _mix(x: int) -> int:
+    """splitmix64 的终结混合函数"""
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & MASK64
+    return x ^ (x >> 31)
+
+
+def key_hashes(key: bytes, seed: int) -> Tuple[int, int, int]:
+    """返回 (桶哈希, f1, f2)"""
+    crc = zlib.crc32(key)
+    m = _mix((crc | zlib.adler32(key) << 32) ^ seed)
+    return m >> 32, m & 0xFFFFFFFF, crc
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _displacement(taken: bytearray, base: List[int]) -> Optional[int]:
+    """找到使桶内所有键都落在空槽上的 d1：只需枚举第一个键可以落入的空槽
+
+    从第一个键自己的位置开始向后枚举（到末尾后回绕），而不是每次从表头开始：
+    总取最前面的空槽会让表头越填越满，位移小的桶要扫过整段密集区。
+    """
+    n = len(taken)
+    start = base[0]
+    for low, high in ((start, n), (0, start)):
+        free = taken.find(0, low, high)
+        while free != -1:
+            d1 = (free - start) % n
+            if not any(taken[(p + d1) % n] for p in base[1:]):
+                return d1
+            free = taken.find(0, free + 1, high)
+    return None
+
+
+def _place(keys: List[bytes], seed: int) -> Optional[List[int]]:
+    """为每个桶找到位移（CHD 的 hash-and-displace），返回位移表；有桶无法放置时返回 None"""
+    n = len(keys)
+    n_buckets = max(1, (n + BUCKET_SIZE - 1) // BUCKET_SIZE)
+    buckets: Dict[int, List[Tuple[int, int]]] = {}
+    for key in keys:
+        bucket, f1, f2 = key_hashes(key, seed)
+        buckets.setdefault(bucket % n_buckets, []).append((f1, f2))
+
+    disp = [0] * n_buckets
+    taken = bytearray(n)
+    next_free = 0
+    # 大桶先放，空位多时更容易找到位移；单键的桶直接放入下一个空槽
+    for bucket, members in sorted(buckets.items(), key=lambda item: -len(item[1])):
+        if len(members) == 1:
+            while taken[next_free]:
+                next_free += 1
+            f1, _ = members[0]
+            disp[bucket] = (next_free - f1) % n
+            taken[next_free] = 1
+            continue
+        for d0 in range(min(n, 0xFFFFFFFF // n)):
+            base = [(f1 + d0 * f2) % n for f1, f2 in members]
+            if len(set(base)) != len(base):
+                continue
+            d1 = _displacement(taken, base)
+            if d1 is not None:
+                break
+        else:
+            return None
+        disp[bucket] = d0 * n + d1
+        for p in base:
+            taken[(p + d1) % n] = 1
+    return disp
+
+
+def _ranges(networks: Iterable) -> List[Tuple[int, int]]:
+    """把同一地址族的网段合并为按起点排序、互不相邻的闭区间"""
+    ranges = []
+    for network in ipaddress.collapse_addresses(networks):
+        start, end = int(network.network_address), int(network.broadcast_address)
+        if ranges and start <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def build_table(rules: dict) -> bytes:
+    """由规则数据生成表的全部字节；正则和 ASN 规则不写入"""
+    flags: Dict[bytes, int] = {}
+    for domain in rules.get('domains', []):
+        key = domain.encode('utf-8')
+        flags[key] = flags.get(key, 0) | FLAG_DOMAIN
+    for suffix in rules.get('domain_suffixes', []):
+        key = suffix.encode('utf-8')
+        flags[key] = flags.get(key, 0) | FLAG_SUFFIX
+    keys = sorted(flags)
+    keywords = sorted(keyword.encode('utf-8') for keyword in rules.get('domain_keywords', []))
+
+    networks = [ipaddress.ip_network(cidr, strict=False) for cidr in rules.get('ip_cidrs', [])]
+    v4 = _ranges(n for n in networks if n.version == 4)
+    v6 = _ranges(n for n in networks if n.version == 6)
+
+    for seed in range(MAX_SEEDS):
+        disp = _place(keys, seed) if keys else []
+        if disp is not None:
+            break
+    else:
+        raise ValueError(f"could not build a perfect hash for {len(keys)} keys")
+
+    # 名称按键的原顺序写入字符串区，槽位指向其偏移
+    arena = bytearray()
+    offsets = {}
+    for key in keys + keywords:
+        offsets[key] = len(arena)
+        arena += key
+    slots = [None] * len(keys)
+    n = len(keys)
+    for key in keys:
+        bucket, f1, f2 = key_hashes(key, seed)
+        d0, d1 = divmod(disp[bucket % len(disp)], n)
+        slots[(f1 + d0 * f2 + d1) % n] = key
+
+    disp_off = _align(HEADER.size)
+    slot_off = _align(disp_off + DISP.size * len(disp))
+    kw_off = _align(slot_off + SLOT.size * n)
+    v4_off = _align(kw_off + KEYWORD.size * len(keywords))
+    v6_off = _align(v4_off + RANGE4.size * len(v4))
+    arena_off = _align(v6_off + RANGE6.size * len(v6))
+
+    out = bytearray(arena_off + len(arena))
+    HEADER.pack_into(out, 0, MAGIC, VERSION, 0, seed, n, len(disp), disp_off, slot_off,
+                     arena_off, len(arena), kw_off, len(keywords), v4_off, len(v4), v6_off, len(v6))
+    for i, value in enumerate(disp):
+        DISP.pack_into(out, disp_off + i * DISP.size, value)
+    for i, key in enumerate(slots):
+        SLOT.pack_into(out, slot_off + i * SLOT.size, offsets[key], len(key), flags[key])
+    for i, keyword in enumerate(keywords):
+        KEYWORD.pack_into(out, kw_off + i * KEYWORD.size, offsets[keyword], len(keyword))
+    for i, (start, end) in enumerate(v4):
+        RANGE4.pack_into(out, v4_off + i * RANGE4.size, start, end)
+    for i, (start, end) in enumerate(v6):
+        RANGE6.pack_into(out, v6_off + i * RANGE6.size, start.to_bytes(16, 'big'), end.to_bytes(16, 'big'))
+    out[arena_off:] = arena
+    return bytes(out)
+
+
+def write_table(path: str, rules: dict) -> dict:
+    """写出表文件，返回各类条目数"""
+    body = build_table(rules)
+    with open(path, 'wb') as f:
+        f.write(body)
+    header = HEADER.unpack_from(body)
+    return {'names': header[4], 'keywords': header[11], 'ipv4_ranges': header[13], 'ipv6_ranges': header[15]}
+
+
+class DomainTable:
+    """mmap 映射的域名表；打开时只读取文件头，关键词在首次使用时解码"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buf) < HEADER.size:
+            raise ValueError(f"{path}: truncated domain table")
+        (magic, version, _, self.seed, self.n_keys, self.n_buckets, self.disp_off, self.slot_off,
+         self.arena_off, self.arena_size, self.kw_off, self.n_keywords, self.v4_off, self.n_v4,
+         self.v6_off, self.n_v6) = HEADER.unpack_from(self.buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a version {VERSION} domain table")
+        if self.arena_off + self.arena_size > len(self.buf):
+            raise ValueError(f"{path}: truncated domain table")
+        self._keywords = None
+        # 小端机器上直接把位移表和槽位表映射为 u32 数组，省去每次查找的 struct 解包
+        self._disp = self._slots = None
+        if sys.byteorder == 'little':
+            view = memoryview(self.buf)
+            self._disp = view[self.disp_off:self.disp_off + DISP.size * self.n_buckets].cast('I')
+            self._slots = view[self.slot_off:self.slot_off + SLOT.size * self.n_keys].cast('I')
+            view.release()
+
+    def close(self):
+        for view in (self._disp, self._slots):
+            if view is not None:
+                view.release()
+        self.buf.close()
+
+    def __enter__(self) -> 'DomainTable':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.n_keys + self.n_keywords + self.n_v4 + self.n_v6
+
+    def flags(self, name: str) -> int:
+        """名称在表中的标志（FLAG_DOMAIN / FLAG_SUFFIX），不在表中时为 0"""
+        if not self.n_keys:
+            return 0
+        key = name.encode('utf-8')
+        bucket, f1, f2 = key_hashes(key, self.seed)
+        bucket %= self.n_buckets
+        if self._disp is not None:
+            d0, d1 = divmod(self._disp[bucket], self.n_keys)
+            slot = (f1 + d0 * f2 + d1) % self.n_keys
+            offset, word = self._slots[2 * slot], self._slots[2 * slot + 1]
+            length, flags = word & 0xFFFF, word >> 16 & 0xFF
+        else:
+            d0, d1 = divmod(DISP.unpack_from(self.buf, self.disp_off + bucket * DISP.size)[0], self.n_keys)
+            slot = (f1 + d0 * f2 + d1) % self.n_keys
+            offset, length, flags = SLOT.unpack_from(self.buf, self.slot_off + slot * SLOT.size)
+        start = self.arena_off + offset
+        return flags if self.buf[start:start + length] == key else 0
+
+    @property
+    def keywords(self) -> Tuple[str, ...]:
+        if self._keywords is None:
+            words = []
+            for i in range(self.n_keywords):
+                offset, length = KEYWORD.unpack_from(self.buf, self.kw_off + i * KEYWORD.size)
+                start = self.arena_off + offset
+                words.append(self.buf[start:start + length].decode('utf-8'))
+            self._keywords = tuple(words)
+        return self._keywords
+
+    def match_suffix(self, host: str) -> Optional[Tuple[str, str]]:
+        """与 RuleMatcher.match_suffix 语义相同"""
+        flags = self.flags(host)
+        if flags & FLAG_DOMAIN:
+            return KIND_DOMAIN, host
+        if flags & FLAG_SUFFIX:
+            return KIND_SUFFIX, host
+        for suffix in islice(iter_suffixes(host), 1, None):
+            if self.flags(suffix) & FLAG_SUFFIX:
+                return KIND_SUFFIX, suffix
+        return None
+
+    def match_keyword(self, host: str) -> Optional[Tuple[str, str]]:
+        for keyword in self.keywords:
+            if keyword in host:
+                return KIND_KEYWORD, keyword
+        return None
+
+    def match(self, host: str) -> Optional[Tuple[str, str]]:
+        """返回首条命中的规则，未命中时返回 None（表中没有正则规则）"""
+        host = host.lower().rstrip('.')
+        return self.match_suffix(host) or self.match_keyword(host)
+
+    def contains_ip(self, address: str) -> bool:
+        """IP 地址是否落在表中的某个区间内（二分查找）"""
+        ip = ipaddress.ip_address(address)
+        if ip.version == 4:
+            value, record, offset, count = int(ip), RANGE4, self.v4_off, self.n_v4
+        else:
+            value, record, offset, count = ip.packed, RANGE6, self.v6_off, self.n_v6
+        lo, hi = 0, count - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            start, end = record.unpack_from(self.buf, offset + mid * record.size)
+            if value < start:
+                hi = mid - 1
+            elif value > end:
+                lo = mid + 1
+            else:
+                return True
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query a minimal-perfect-hash domain table')
+    parser.add_argument('table', help='table file (e.g. rules/ai-domains.mph)')
+    parser.add_argument('queries', nargs='*', help='hostnames or IP addresses to look up')
+    args = parser.parse_args()
+
+    try:
+        table = DomainTable(args.table)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    with table:
+        if not args.queries:
+            print(f"📦 {table.n_keys} names, {table.n_keywords} keywords, "
+                  f"{table.n_v4} IPv4 / {table.n_v6} IPv6 ranges")
+            return
+        for query in args.queries:
+            try:
+                hit = table.contains_ip(query)
+                print(f"   {'✅' if hit else '➖'} {query}")
+            except ValueError:
+                result = table.match(query)
+                print(f"   {'✅' if result else '➖'} {query}" + (f"  ({result[0]},{result[1]})" if result else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+内存受限的外部排序去重：超出内存预算时把有序段溢写到临时文件，最终流式 k 路归并
+Bounded-memory external-sort dedup for rule sets larger than RAM
+"""
+
+import os
+import sys
+import json
+import heapq
+import shutil
+import weakref
+import tempfile
+from typing import List, Optional, Iterable, Iterator, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只能依靠溢写预算
+    resource = None
+
+# 集合中每个元素除字符串本身外的估算开销（哈希表槽位、扩容余量）
+ENTRY_OVERHEAD = 64
+
+# 内存上限中留给缓冲区的比例，其余留给解释器、网络库和 I/O 缓冲
+BUFFER_FRACTION = 0.5
+
+# 缓冲区预算下限，避免上限过小时每插入几条就溢写一次
+MIN_BUFFER_BYTES = 4 * 1024 * 1024
+
+# 同时打开的有序段上限，超过时先把已有的段归并为一个
+MAX_OPEN_RUNS = 64
+
+# 溢写文件的读写缓冲
+IO_BUFFER = 1024 * 1024
+
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """解析 "512M"、"2G"、"1048576" 这样的大小"""
+    text = text.strip().upper().removesuffix('B').removesuffix('I')
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * _SIZE_UNITS[unit])
+
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def current_rss() -> int:
+    """当前常驻内存（字节），无法获取时返回 0"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss() -> int:
+    """进程的峰值常驻内存（字节）"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KiB 为单位，macOS 以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def enforce_memory_limit(limit: int) -> bool:
+    """把数据段上限设为 limit，超出时分配失败抛出 MemoryError，而不是被系统 OOM 杀掉
+
+    返回是否成功设置（没有 resource 模块或权限不足时返回 False）。
+    """
+    if resource is None:
+        return False
+    try:
+        _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+        return True
+    except (ValueError, OSError):
+        return False
+
+
+class MemoryBudget:
+    """多个 ExternalSet 共享的内存预算和溢写目录
+
+    缓冲区总量超出预算时，最大的缓冲区被排序去重后写成一个有序段。
+    """
+
+    def __init__(self, limit: int, spill_dir: Optional[str] = None,
+                 fraction: float = BUFFER_FRACTION, enforce: bool = False):
+        self.limit = limit
+        available = max(0, limit - current_rss())
+        self.buffer_limit = max(MIN_BUFFER_BYTES, int(available * fraction))
+        self.used = 0
+        self.spills = 0
+        self.enforced = enforce_memory_limit(limit) if enforce else False
+        self.sets: List['ExternalSet'] = []
+        self.directory = tempfile.mkdtemp(prefix='rules-spill-', dir=spill_dir)
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def new_set(self) -> 'ExternalSet':
+        external = ExternalSet(self)
+        self.sets.append(external)
+        return external
+
+    def reserve(self, size: int):
+        self.used += size
+        while self.used > self.buffer_limit:
+            largest = max(self.sets, key=lambda s: s.buffer_bytes)
+            if not largest.buffer_bytes:
+                break
+            largest.spill()
+
+    def release(self, size: int):
+        self.used -= size
+
+    def run_path(self) -> str:
+        self.spills += 1
+        return os.path.join(self.directory, f"run-{self.spills:06d}.txt")
+
+    def close(self):
+        self._cleanup()
+
+    def __enter__(self) -> 'MemoryBudget':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self) -> dict:
+        return {
+            'limit': self.limit,
+            'buffer_limit': self.buffer_limit,
+            'spilled_runs': self.spills,
+            'peak_rss': peak_rss(),
+            'enforced': self.enforced,
+        }
+
+
+def report_memory(budget: MemoryBudget) -> bool:
+    """打印峰值内存和溢写统计并清理临时文件，峰值超出上限时返回 False"""
+    stats = budget.stats()
+    budget.close()
+    within = stats['peak_rss'] <= stats['limit']
+    print(f"{'🧮' if within else '⚠️ '} Peak RSS {format_size(stats['peak_rss'])} / "
+          f"limit {format_size(stats['limit'])}, {stats['spilled_runs']} sorted runs spilled")
+    return within
+
+
+def _read_run(path: str) -> Iterator[str]:
+    with open(path, 'r', encoding='utf-8', buffering=IO_BUFFER) as f:
+        for line in f:
+            yield line[:-1]
+
+
+def _write_run(path: str, values: Iterable[str]) -> int:
+    count = 0
+    with open(path, 'w', encoding='utf-8', buffering=IO_BUFFER) as f:
+        for value in values:
+            f.write(value)
+            f.write('\n')
+            count += 1
+    return count
+
+
+def unique_merge(*streams: Iterable[str]) -> Iterator[str]:
+    """对多个有序流做 k 路归并，边归并边去重"""
+    previous = None
+    for value in heapq.merge(*streams):
+        if value != previous:
+            yield value
+            previous = value
+
+
+class ExternalSet:
+    """只支持 add / update / 有序迭代 / len 的字符串集合，内存不足时溢写到磁盘
+
+    迭代按字典序产出去重后的元素，与 sorted(set) 的顺序一致；值中不能含换行符。
+    """
+
+    def __init__(self, budget: MemoryBudget):
+        self.budget = budget
+        self.buffer = set()
+        self.buffer_bytes = 0
+        self.runs: List[str] = []
+        self._count = None
+
+    def add(self, value: str):
+        if value in self.buffer:
+            return
+        self.buffer.add(value)
+        self._count = None
+        size = sys.getsizeof(value) + ENTRY_OVERHEAD
+        self.buffer_bytes += size
+        self.budget.reserve(size)
+
+    def update(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def spill(self):
+        """把缓冲区排序去重后写成一个有序段"""
+        if not self.buffer:
+            return
+        path = self.budget.run_path()
+        _write_run(path, sorted(self.buffer))
+        self.runs.append(path)
+        self.buffer = set()
+        self.budget.release(self.buffer_bytes)
+        self.buffer_bytes = 0
+        if len(self.runs) >= MAX_OPEN_RUNS:
+            self._compact()
+
+    def _compact(self) -> int:
+        """把所有有序段归并为一个，返回元素个数"""
+        path = self.budget.run_path()
+        count = _write_run(path, unique_merge(*(_read_run(run) for run in self.runs)))
+        for run in self.runs:
+            os.remove(run)
+        self.runs = [path]
+        return count
+
+    def __iter__(self) -> Iterator[str]:
+        # 先合成单个有序段并缓存计数，之后的 len() 不会在迭代途中改写段文件
+        len(self)
+        streams = [_read_run(run) for run in self.runs]
+        return unique_merge(sorted(self.buffer), *streams)
+
+    def __len__(self) -> int:
+        if self._count is None:
+            if self.runs:
+                # 计数需要一次完整归并，顺便把结果合成单个有序段供后续迭代
+                self.spill()
+                self._count = self._compact()
+            else:
+                self._count = len(self.buffer)
+        return self._count
+
+
+def dump_json(obj, f, indent: int = 2, level: int = 0):
+    """流式写出 JSON，输出与 json.dump(obj, f, indent=indent, ensure_ascii=False) 一致
+
+    列表以外的可迭代对象（如 ExternalSet）逐项写出，不在内存中展开。
+    """
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        f.write(json.dumps(obj, ensure_ascii=False))
+        return
+    inner = '\n' + ' ' * (indent * (level + 1))
+    if isinstance(obj, dict):
+        items, opening, closing = obj.items(), '{', '}'
+    else:
+        items, opening, closing = obj, '[', ']'
+    empty = True
+    for item in items:
+        f.write(opening + inner if empty else ',' + inner)
+        empty = False
+        if isinstance(obj, dict):
+            key, item = item
+            f.write(json.dumps(str(key), ensure_ascii=False) + ': ')
+        dump_json(item, f, indent, level + 1)
+    f.write(opening + closing if empty else '\n' + ' ' * (indent * level) + closing)
+
+
+def iter_json_arrays(path: str) -> Iterator[Tuple[Tuple[str, ...], object]]:
+    """逐行读取带缩进的 JSON 文件，产出数组中的每个标量元素 (键路径, 值)
+
+    json.dump(indent=...) 把每个数组元素写在单独一行，因此无需把整个文件载入内存；
+    没有缩进的文件退回 json.load。
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8', buffering=IO_BUFFER) as f:
+        first = f.readline().strip()
+        if first != '{' and first != '[':
+            f.seek(0)
+            yield from _iter_loaded(json.load(f), ())
+            return
+        # 每层：(是否数组, 键名)
+        stack = [(first == '[', None)]
+        for line in f:
+            text = line.strip().rstrip(',')
+            if not text:
+                continue
+            if text in (']', '}'):
+                stack.pop()
+                continue
+            key = None
+            if stack[-1][0] is False and text.startswith('"'):
+                key, end = decoder.raw_decode(text)
+                text = text[end:].lstrip()[1:].lstrip()
+            if text in ('[', '{'):
+                stack.append((text == '[', key))
+            elif stack[-1][0] and text not in ('[]', '{}'):
+                yield tuple(k for _, k in stack[1:] if k is not None), json.loads(text)
+
+
+def _iter_loaded(obj, path: Tuple[str, ...]) -> Iterator[Tuple[Tuple[str, ...], object]]:
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from _iter_loaded(value, path + (key,))
+    elif isinstance(obj, list):
+        for value in obj:
+            if isinstance(value, (dict, list)):
+                yield from _iter_loaded(value, path)
+            else:
+                yield path, value
@@ -4,13 +4,21 @@
 Auto-fetch and merge AI proxy rules from popular GitHub repositories
 """
 
+import os
 import re
+import sys
 import json
-import requests
-from typing import List, Dict, Set
+import argparse
+from typing import List, Dict, Set, Optional, Iterator
 from datetime import datetime
 from pathlib import Path
 
+from psl import get_psl
+from v2fly import V2flyLoader, KIND_DOMAIN, KIND_FULL, KIND_KEYWORD, KIND_REGEXP
+from geosite import read_geosite
+from external_sort import MemoryBudget, dump_json, parse_size, report_memory
+from regex_rules import reduce_regexes, strip_rule_options, url_regex_to_domain_regex
+
 # 热门GitHub规则源列表
 # 热门GitHub规则源列表
 RULE_SOURCES = [
@@ -56,15 +64,37 @@ IGNORED_DOMAINS = {
     "baidu.com",
 }
 
+# 单个规则源超过该行数时才启用多进程分片解析，避免小文件承担进程池启动开销
+PARALLEL_PARSE_THRESHOLD = 50000
+
+# 合并时记录来源的规则类型（CIDR 的来源单独记录在 ip_cidr_sources 中）
+SOURCE_TRACKED_KINDS = ('domains', 'domain_suffixes', 'domain_keywords', 'domain_regexes', 'ip_asns')
+
+# 正则规则行；正则中可能出现 # 和 //，需要在去除行内注释之前识别
+REGEX_RULE_PATTERN = re.compile(r'^(?:-\s*)?(DOMAIN-REGEX|URL-REGEX)\s*,\s*(.+)$', re.IGNORECASE)
+
+# 按来源缓存解析结果时保存的规则类型（见 refresh_schedule.py）
+RULE_KINDS = ('domains', 'domain_suffixes', 'domain_keywords', 'domain_regexes', 'ip_cidrs', 'ip_asns')
+
 class RuleParser:
     """规则解析器"""
     
-    def __init__(self):
-        self.domains = set()
-        self.domain_keywords = set()
-        self.domain_suffixes = set()
-        self.ip_cidrs = set()
-        self.ip_asns = set()
+    def __init__(self, name: str = None, budget: MemoryBudget = None):
+        # 来源名称，用于记录合并后每条 CIDR 的出处
+        self.name = name
+        self.ip_cidr_sources = {}
+        # 其他规则的来源：(规则类型, 值) -> 来源名称集合，由 merge_parsers 填充，供 history.py 记录出处
+        self.rule_sources = {}
+        # 指定内存预算时规则集合超出预算后溢写到磁盘（见 external_sort.py）
+        self.budget = budget
+        new_set = budget.new_set if budget else set
+        self.domains = new_set()
+        self.domain_keywords = new_set()
+        self.domain_suffixes = new_set()
+        self.ip_cidrs = new_set()
+        self.ip_asns = new_set()
+        # 正则规则区分大小写，原样保存；merge 后由 simplify_regexes 改写可以改写的部分
+        self.domain_regexes = new_set()
         
     def parse_line(self, line: str, rule_type: str = "clash"):
         """解析单行规则"""
@@ -73,6 +103,11 @@ class RuleParser:
         # 跳过注释和空行
         if not line or line.startswith('#') or line.startswith('//'):
             return
+        
+        regex_match = REGEX_RULE_PATTERN.match(line)
+        if regex_match:
+            self.add_regex(regex_match.group(1).upper(), regex_match.group(2))
+            return
             
         # 移除行内注释
         if '#' in line:
@@ -121,7 +156,7 @@ class RuleParser:
                         # 过滤宽泛域名
                         if value in IGNORED_DOMAINS:
                             continue
-                        self.domain_suffixes.add(value)
+                        self.add_suffix(value)
                 elif rule_kind == 'domain':
                     if value and self._is_valid_domain(value):
                         self.domains.add(value)
@@ -136,6 +171,23 @@ class RuleParser:
                         self.ip_asns.add(value)
                 break
     
+    def add_regex(self, rule_type: str, value: str) -> bool:
+        """添加 DOMAIN-REGEX 规则；URL-REGEX 只保留主机部分，无法提取主机时丢弃"""
+        value = strip_rule_options(value)
+        if rule_type == 'URL-REGEX':
+            value = url_regex_to_domain_regex(value)
+        if not value:
+            return False
+        self.domain_regexes.add(value)
+        return True
+    
+    def add_suffix(self, value: str) -> bool:
+        """添加域名后缀规则；ICANN 公共后缀（如 co.uk）不能作为后缀规则"""
+        if get_psl().is_public_suffix(value):
+            return False
+        self.domain_suffixes.add(value)
+        return True
+
     def _is_valid_domain(self, domain: str) -> bool:
         """验证域名格式"""
         if not domain or len(domain) > 253:
@@ -146,22 +198,55 @@ class RuleParser:
     
     def get_all_rules(self) -> Dict:
         """获取所有规则"""
+        if self.budget:
+            # 外部排序集合本身按序流式迭代，不在内存中展开
+            return {
+                'domains': self.domains,
+                'domain_suffixes': self.domain_suffixes,
+                'domain_keywords': self.domain_keywords,
+                'domain_regexes': self.domain_regexes,
+                'ip_cidrs': self.ip_cidrs,
+                'ip_asns': self.ip_asns,
+            }
         return {
             'domains': sorted(list(self.domains)),
             'domain_suffixes': sorted(list(self.domain_suffixes)),
             'domain_keywords': sorted(list(self.domain_keywords)),
+            'domain_regexes': sorted(list(self.domain_regexes)),
             'ip_cidrs': sorted(list(self.ip_cidrs)),
             'ip_asns': sorted(list(self.ip_asns)),
         }
 
+def parser_result(parser: RuleParser) -> dict:
+    """解析器的可序列化结果，供刷新调度器按来源缓存"""
+    return {kind: sorted(getattr(parser, kind)) for kind in RULE_KINDS}
+
+def update_parser(parser: RuleParser, result: dict) -> RuleParser:
+    """把缓存的解析结果写回解析器"""
+    for kind in RULE_KINDS:
+        getattr(parser, kind).update(result.get(kind, []))
+    return parser
+
+_parse_fingerprint = None
+
+def parse_fingerprint() -> str:
+    """规则解析逻辑的指纹：本文件（含 IGNORED_DOMAINS）、正则与 v2fly 解析以及公共后缀列表"""
+    global _parse_fingerprint
+    if _parse_fingerprint is None:
+        from psl import PSL_FILE
+        from refresh_schedule import code_fingerprint
+        scripts_dir = Path(__file__).parent
+        _parse_fingerprint = code_fingerprint(Path(__file__), scripts_dir / 'regex_rules.py',
+                                              scripts_dir / 'v2fly.py', PSL_FILE)
+    return _parse_fingerprint
+
 def fetch_rules_from_url(url: str) -> str:
     """从URL获取规则内容"""
+    # 按需导入：requests 及其依赖的导入开销较大，只有联网的子命令才需要
+    from source_health import fetch
     try:
         print(f"  📥 Fetching: {url}")
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=30)
+        response = fetch(url, timeout=30)
         response.raise_for_status()
         print(f"  ✅ Success: {len(response.text)} bytes")
         return response.text
@@ -169,24 +254,97 @@ def fetch_rules_from_url(url: str) -> str:
         print(f"  ❌ Failed: {e}")
         return ""
 
-def fetch_all_rules() -> RuleParser:
-    """从所有源获取规则"""
+def iter_url_lines(url: str) -> Iterator[str]:
+    """流式下载规则并逐行产出，不把整个响应读入内存"""
+    from source_health import fetch
+    try:
+        print(f"  📥 Streaming: {url}")
+        with fetch(url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
+            count = 0
+            for line in response.iter_lines(decode_unicode=True):
+                count += 1
+                yield line
+        print(f"  ✅ Success: {count} lines")
+    except Exception as e:
+        print(f"  ❌ Failed: {e}")
+
+def _parse_shard(args) -> dict:
+    """在子进程中解析一个分片，返回与按来源缓存相同的 RULE_KINDS 字典"""
+    chunk, rule_type = args
     parser = RuleParser()
+    for line in chunk.split('\n'):
+        parser.parse_line(line, rule_type)
+    return parser_result(parser)
+
+def _split_chunks(content: str, count: int) -> List[str]:
+    """按换行边界把内容切成大致等长的分片"""
+    size = len(content) // count + 1
+    chunks = []
+    start = 0
+    while start < len(content):
+        end = content.find('\n', start + size)
+        if end == -1:
+            end = len(content)
+        chunks.append(content[start:end])
+        start = end + 1
+    return chunks
+
+def parse_content(content: str, rule_type: str = "clash", workers: int = None,
+                  threshold: int = PARALLEL_PARSE_THRESHOLD) -> RuleParser:
+    """解析整份规则内容，超大内容分片到进程池并行解析"""
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or content.count('\n') + 1 < threshold:
+        parser = RuleParser()
+        for line in content.split('\n'):
+            parser.parse_line(line, rule_type)
+        return parser
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    # 每个进程分到多个分片，平衡各分片耗时差异
+    chunks = _split_chunks(content, workers * 4)
+    partials = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_parse_shard, [(chunk, rule_type) for chunk in chunks]):
+            partials.append(update_parser(RuleParser(), result))
+    
+    return merge_parsers(partials)
+
+def fetch_all_rules(budget: MemoryBudget = None) -> RuleParser:
+    """从所有源获取规则；指定内存预算时逐行流式解析"""
+    parsers = []
     
     print("🌐 Fetching rules from GitHub repositories...\n")
     
+    # 未到期的来源直接复用上次的解析结果，内容未变化的来源也不再重新解析
+    from refresh_schedule import get_scheduler
+    scheduler = get_scheduler()
+    
     for source in RULE_SOURCES:
         print(f"📦 Source: {source['name']}")
         for url in source['urls']:
-            content = fetch_rules_from_url(url)
-            if content:
-                for line in content.split('\n'):
-                    parser.parse_line(line, source['type'])
+            if budget:
+                # 流式解析不保留原始内容，每次都重新拉取
+                parsed = RuleParser(source['name'], budget)
+                for line in iter_url_lines(url):
+                    parsed.parse_line(line, source['type'])
+                parsers.append(parsed)
+                continue
+            result = scheduler.refresh(
+                url,
+                lambda: fetch_rules_from_url(url) or None,
+                lambda content: parser_result(parse_content(content, source['type'])),
+                fingerprint=parse_fingerprint(),
+            )
+            if result:
+                parsers.append(update_parser(RuleParser(source['name']), result))
         print()
     
-    return parser
+    return merge_parsers(parsers, budget)
 
-def load_custom_rules(custom_file: str) -> RuleParser:
+def load_custom_rules(custom_file: str, budget: MemoryBudget = None) -> RuleParser:
     """加载自定义规则"""
     parser = RuleParser()
     
@@ -194,27 +352,97 @@ def load_custom_rules(custom_file: str) -> RuleParser:
     if custom_path.exists():
         print(f"📄 Loading custom rules from {custom_file}")
         with open(custom_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            for line in content.split('\n'):
-                parser.parse_line(line, 'clash')
+            if budget:
+                parser = RuleParser('custom', budget)
+                for line in f:
+                    parser.parse_line(line, 'clash')
+            else:
+                parser = parse_content(f.read(), 'clash')
+                parser.name = 'custom'
     else:
         print(f"ℹ️  Custom rules file not found: {custom_file}, skipping...")
     
     return parser
 
-def merge_parsers(parsers: List[RuleParser]) -> RuleParser:
-    """合并多个解析器"""
-    merged = RuleParser()
+def merge_parsers(parsers: List[RuleParser], budget: MemoryBudget = None) -> RuleParser:
+    """合并多个解析器；指定内存预算时合并结果在外部排序集合中去重"""
+    merged = RuleParser(budget=budget)
     
     for parser in parsers:
         merged.domains.update(parser.domains)
         merged.domain_suffixes.update(parser.domain_suffixes)
         merged.domain_keywords.update(parser.domain_keywords)
+        merged.domain_regexes.update(parser.domain_regexes)
         merged.ip_cidrs.update(parser.ip_cidrs)
         merged.ip_asns.update(parser.ip_asns)
+        
+        # 保留 CIDR 来源
+        for cidr in parser.ip_cidrs:
+            sources = parser.ip_cidr_sources.get(cidr) or ([parser.name] if parser.name else [])
+            merged.ip_cidr_sources.setdefault(cidr, set()).update(sources)
+        
+        # 保留其他规则的来源；内存受限模式下不记录，避免为每条规则常驻一个集合
+        if budget is None:
+            for kind in SOURCE_TRACKED_KINDS:
+                for value in getattr(parser, kind):
+                    sources = parser.rule_sources.get((kind, value)) or ([parser.name] if parser.name else [])
+                    if sources:
+                        merged.rule_sources.setdefault((kind, value), set()).update(sources)
     
     return merged
 
+def simplify_regexes(parser: RuleParser) -> dict:
+    """把等价于有限个域名 / 后缀的正则改写为 DOMAIN / DOMAIN-SUFFIX 规则，返回改写统计"""
+    patterns = list(parser.domain_regexes)
+    rewrites, kept = reduce_regexes(patterns)
+    
+    # 改写结果含公共后缀（如 (^|\.)com$）时无法用后缀规则表达，保留原正则
+    psl = get_psl()
+    for pattern, (_, suffixes) in list(rewrites.items()):
+        if any(psl.is_public_suffix(suffix) for suffix in suffixes):
+            rewrites.pop(pattern)
+            kept.append(pattern)
+    
+    added = {'domains': set(), 'domain_suffixes': set()}
+    for pattern, (domains, suffixes) in rewrites.items():
+        # 被改写的正则的来源转移到改写后的规则上
+        sources = parser.rule_sources.pop(('domain_regexes', pattern), set())
+        for kind, values in (('domains', domains), ('domain_suffixes', suffixes)):
+            added[kind].update(values)
+            if parser.budget is None and sources:
+                for value in values:
+                    parser.rule_sources.setdefault((kind, value), set()).update(sources)
+        parser.domains.update(domains)
+        parser.domain_suffixes.update(suffixes)
+    
+    if rewrites:
+        # 外部排序集合只能追加，保留的正则写入新集合
+        remaining = parser.budget.new_set() if parser.budget else set()
+        remaining.update(kept)
+        parser.domain_regexes = remaining
+    
+    return {
+        'total': len(patterns),
+        'rewritten': len(rewrites),
+        'kept': len(kept),
+        'domains': len(added['domains']),
+        'suffixes': len(added['domain_suffixes']),
+    }
+
+def expand_parser_asns(parser: RuleParser, dataset: str):
+    """把解析器中的 ASN 展开为聚合后的 CIDR"""
+    from asn_expand import load_asn_index, expand_asns
+    
+    print(f"🔢 Expanding {len(parser.ip_asns)} ASNs with {dataset}...")
+    index = load_asn_index(dataset)
+    for asn, cidrs in expand_asns(index, parser.ip_asns).items():
+        # 规则中的 ASN 可能写作 "14061" 或 "AS14061"
+        tag = f"AS{str(asn).upper().removeprefix('AS')}"
+        parser.ip_cidrs.update(cidrs)
+        for cidr in cidrs:
+            parser.ip_cidr_sources.setdefault(cidr, set()).add(tag)
+        print(f"   ✅ {tag}: {len(cidrs)} CIDRs")
+
 def save_rules(parser: RuleParser, output_file: str):
     """保存规则到JSON文件"""
     rules = parser.get_all_rules()
@@ -229,87 +457,179 @@ def save_rules(parser: RuleParser, output_file: str):
         "updated": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         "total_rules": sum(len(v) for v in rules.values()),
         "sources": [s['name'] for s in RULE_SOURCES],
-        "rules": rules
+        "rules": rules,
+        # 每条 CIDR 的来源，供 ip_index.py 分析跨来源的重叠
+        "ip_cidr_sources": {k: sorted(v) for k, v in sorted(parser.ip_cidr_sources.items())},
     }
     
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
+        if parser.budget:
+            dump_json(output_data, f)
+        else:
+            json.dump(output_data, f, indent=2, ensure_ascii=False)
     
     print(f"💾 Rules saved to {output_file}")
     print(f"📊 Statistics:")
     print(f"   - Exact domains: {len(rules['domains'])}")
     print(f"   - Domain suffixes: {len(rules['domain_suffixes'])}")
     print(f"   - Domain keywords: {len(rules['domain_keywords'])}")
+    print(f"   - Domain regexes: {len(rules['domain_regexes'])}")
     print(f"   - IP CIDRs: {len(rules['ip_cidrs'])}")
     print(f"   - IP ASNs: {len(rules['ip_asns'])}")
     print(f"   - Total rules: {output_data['total_rules']}")
 
-def fetch_v2fly_rules() -> RuleParser:
-    """从 v2fly/domain-list-community 获取 AI 相关规则"""
-    base_url = "https://raw.githubusercontent.com/v2fly/domain-list-community/master/data/"
-    services = [
-        'openai',
-        'anthropic',
-        'google-deepmind',
-        'huggingface',
-        'perplexity',
-        'xai',
-        'groq',
-        'discord',
-        'midjourney',
-        'poe',
-        'character-ai',
-        'civitai',
-        'suno',
-        'udio',
-        'replicate',
-        'jasper',
-        'notion'
-    ]
+# v2fly 类别，支持 "name@attr" / "name@!attr" 属性过滤
+V2FLY_SERVICES = [
+    'openai',
+    'anthropic',
+    'google-deepmind',
+    'huggingface',
+    'perplexity',
+    'xai',
+    'groq',
+    'discord',
+    'midjourney',
+    'poe',
+    'character-ai',
+    'civitai',
+    'suno',
+    'udio',
+    'replicate',
+    'jasper',
+    'notion'
+]
+
+def add_v2fly_entries(parser: RuleParser, entries) -> int:
+    """把 v2fly 规则写入解析器，返回写入的条数"""
+    count = 0
+    for kind, value, _ in entries:
+        if kind == KIND_DOMAIN:
+            parser.add_suffix(value)
+        elif kind == KIND_FULL:
+            parser.domains.add(value)
+        elif kind == KIND_KEYWORD:
+            parser.domain_keywords.add(value)
+        elif kind == KIND_REGEXP:
+            parser.domain_regexes.add(value)
+        else:
+            continue
+        count += 1
+    return count
+
+def fetch_v2fly_rules(services: List[str] = None) -> RuleParser:
+    """从 v2fly/domain-list-community 获取 AI 相关规则（递归解析 include:）
+
+    只下载到期的分类；其余分类复用上次展开后的规则。
+    """
+    from refresh_schedule import get_scheduler
+    services = services or V2FLY_SERVICES
+    scheduler = get_scheduler()
+    parser = RuleParser('v2fly')
+    loader = V2flyLoader()
     
-    parser = RuleParser()
+    fingerprint = parse_fingerprint()
+    due = [service for service in services if scheduler.needs_fetch(f"v2fly:{service}", fingerprint)]
+    print(f"📥 Fetching v2fly rules for {len(due)}/{len(services)} categories...")
+    results = loader.load(due) if due else {}
+    
+    def fetch_entries(service: str) -> Optional[list]:
+        name = service.split('@')[0]
+        if loader.files.get(name) is None:
+            print(f"⚠️ v2fly rule file not available for {service} ({loader.errors.get(name)}), skipping.")
+            return None
+        # 展开 include: 后的规则排序再哈希，被包含文件的变化也能检测到
+        return sorted([kind, value, list(attrs)] for kind, value, attrs in results[service])
     
     for service in services:
-        url = base_url + service
-        print(f"📥 Fetching v2fly rules for {service}...")
-        try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 404:
-                print(f"⚠️ v2fly rule file not found for {service}, skipping.")
-                continue
-            response.raise_for_status()
-            
-            count = 0
-            for line in response.text.splitlines():
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                
-                # v2fly 格式: domain 或 include:other-file
-                parts = line.split()
-                domain = parts[0]
-                
-                # 处理属性 (e.g., full:example.com)
-                if ':' in domain:
-                    type_, value = domain.split(':', 1)
-                    if type_ == 'full':
-                        parser.domains.add(value)
-                    elif type_ == 'keyword':
-                        parser.domain_keywords.add(value)
-                    # 忽略 regex 和其他类型
-                else:
-                    parser.domain_suffixes.add(domain)
-                count += 1
-                
-            print(f"✅ Fetched {count} domains for {service}")
-            
-        except Exception as e:
-            print(f"❌ Failed to fetch v2fly rules for {service}: {e}")
-            
+        entries = scheduler.refresh(f"v2fly:{service}", lambda: fetch_entries(service), lambda entries: entries,
+                                    fingerprint=fingerprint)
+        if entries is None:
+            continue
+        count = add_v2fly_entries(parser, entries)
+        print(f"✅ Fetched {count} domains for {service}")
+    
+    for cycle in loader.cycles:
+        print(f"⚠️ v2fly include cycle skipped: {' -> '.join(cycle)}")
+    if due:
+        print(f"   📦 {len(loader.files)} data files loaded, {loader.cache_hits} parse cache hits")
+    
     return parser
 
+def load_local_v2fly_rules(source: str, services: List[str] = None) -> RuleParser:
+    """从本地 geosite.dat 或 domain-list-community 克隆加载 v2fly 规则（无需网络）"""
+    services = services or V2FLY_SERVICES
+    parser = RuleParser('v2fly')
+    source_path = Path(source)
+    
+    if source_path.is_file():
+        print(f"📥 Reading {len(services)} categories from {source_path}...")
+        results = read_geosite(str(source_path), services)
+    else:
+        data_dir = source_path / 'data' if (source_path / 'data').is_dir() else source_path
+        print(f"📥 Reading {len(services)} categories from {data_dir}...")
+        
+        def read_local(name: str) -> Optional[str]:
+            path = data_dir / name
+            return path.read_text(encoding='utf-8') if path.is_file() else None
+        
+        loader = V2flyLoader(fetch=read_local)
+        results = loader.load(services)
+        for cycle in loader.cycles:
+            print(f"⚠️ v2fly include cycle skipped: {' -> '.join(cycle)}")
+    
+    for service, entries in results.items():
+        if not entries:
+            print(f"⚠️ No local v2fly rules for {service}, skipping.")
+            continue
+        count = add_v2fly_entries(parser, entries)
+        print(f"✅ Loaded {count} domains for {service}")
+    
+    return parser
+
+def parse_list_text(text: str) -> dict:
+    """解析 Surge / Clash classical 格式的 .list 规则文本"""
+    parser = RuleParser()
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        
+        # 格式: DOMAIN-SUFFIX,example.com[,PROXY]
+        parts = line.split(',')
+        if len(parts) >= 2:
+            rule_type = parts[0].strip().upper()
+            value = parts[1].strip()
+            
+            if rule_type == 'DOMAIN-SUFFIX':
+                parser.add_suffix(value)
+            elif rule_type == 'DOMAIN':
+                parser.domains.add(value)
+            elif rule_type == 'DOMAIN-KEYWORD':
+                parser.domain_keywords.add(value)
+            elif rule_type == 'IP-CIDR' or rule_type == 'IP-CIDR6':
+                parser.ip_cidrs.add(value)
+            elif rule_type in ('DOMAIN-REGEX', 'URL-REGEX'):
+                parser.add_regex(rule_type, line.split(',', 1)[1])
+            # 忽略其他类型
+    return parser_result(parser)
+
+def fetch_list_text(url: str, label: str) -> Optional[str]:
+    """下载一个 .list 规则文件，失败或不存在时返回 None"""
+    from source_health import fetch
+    try:
+        response = fetch(url, timeout=10)
+        if response.status_code == 404:
+            print(f"⚠️ {label} rule file not found, skipping.")
+            return None
+        response.raise_for_status()
+        return response.text
+    except Exception as e:
+        print(f"❌ Failed to fetch {label} rules: {e}")
+        return None
+
 def fetch_blackmatrix7_rules() -> RuleParser:
     """从 blackmatrix7/ios_rule_script 获取 AI 规则"""
+    from refresh_schedule import get_scheduler
     base_url = "https://raw.githubusercontent.com/blackmatrix7/ios_rule_script/master/rule/"
     services = [
         "OpenAI",
@@ -324,121 +644,92 @@ def fetch_blackmatrix7_rules() -> RuleParser:
         "Perplexity"
     ]
     
-    parser = RuleParser()
+    scheduler = get_scheduler()
+    parser = RuleParser('blackmatrix7')
     
     for service in services:
         # URL 结构: base/Service/Service.list
         url = f"{base_url}{service}/{service}.list"
         print(f"📥 Fetching blackmatrix7 rules for {service}...")
-        try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 404:
-                print(f"⚠️ blackmatrix7 rule file not found for {service}, skipping.")
-                continue
-            response.raise_for_status()
-            
-            count = 0
-            for line in response.text.splitlines():
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                
-                # 格式: DOMAIN-SUFFIX,example.com,PROXY
-                parts = line.split(',')
-                if len(parts) >= 2:
-                    rule_type = parts[0].strip().upper()
-                    value = parts[1].strip()
-                    
-                    if rule_type == 'DOMAIN-SUFFIX':
-                        parser.domain_suffixes.add(value)
-                    elif rule_type == 'DOMAIN':
-                        parser.domains.add(value)
-                    elif rule_type == 'DOMAIN-KEYWORD':
-                        parser.domain_keywords.add(value)
-                    elif rule_type == 'IP-CIDR' or rule_type == 'IP-CIDR6':
-                        parser.ip_cidrs.add(value)
-                    # 忽略其他类型
-                    count += 1
-                
-            print(f"✅ Fetched {count} rules for {service}")
-            
-        except Exception as e:
-            print(f"❌ Failed to fetch blackmatrix7 rules for {service}: {e}")
+        result = scheduler.refresh(url, lambda: fetch_list_text(url, f"blackmatrix7 {service}"), parse_list_text,
+                                   fingerprint=parse_fingerprint())
+        if result:
+            update_parser(parser, result)
+            print(f"✅ Fetched {sum(len(values) for values in result.values())} rules for {service}")
             
     return parser
 
 def fetch_szkane_rules() -> RuleParser:
     """从 szkane/ClashRuleSet 获取 AI 规则"""
+    from refresh_schedule import get_scheduler
     url = "https://raw.githubusercontent.com/szkane/ClashRuleSet/main/Clash/Ruleset/AiDomain.list"
-    parser = RuleParser()
+    parser = RuleParser('szkane')
     
     print(f"📥 Fetching szkane rules from {url}...")
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        count = 0
-        for line in response.text.splitlines():
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            
-            # 格式: DOMAIN-SUFFIX,example.com
-            parts = line.split(',')
-            if len(parts) >= 2:
-                rule_type = parts[0].strip().upper()
-                value = parts[1].strip()
-                
-                if rule_type == 'DOMAIN-SUFFIX':
-                    parser.domain_suffixes.add(value)
-                elif rule_type == 'DOMAIN':
-                    parser.domains.add(value)
-                elif rule_type == 'DOMAIN-KEYWORD':
-                    parser.domain_keywords.add(value)
-                elif rule_type == 'IP-CIDR' or rule_type == 'IP-CIDR6':
-                    parser.ip_cidrs.add(value)
-                count += 1
-            
-        print(f"✅ Fetched {count} rules from szkane")
-        
-    except Exception as e:
-        print(f"❌ Failed to fetch szkane rules: {e}")
+    result = get_scheduler().refresh(url, lambda: fetch_list_text(url, 'szkane'), parse_list_text,
+                                     fingerprint=parse_fingerprint())
+    if result:
+        update_parser(parser, result)
+        print(f"✅ Fetched {sum(len(values) for values in result.values())} rules from szkane")
         
     return parser
 
-def main():
-    print("🚀 AI Proxy Rules Fetcher")
-    print("=" * 60)
-    print()
-    
-    # 获取脚本所在目录的父目录（项目根目录）
-    script_dir = Path(__file__).parent
-    project_root = script_dir.parent
+def fetch_merged_rules(project_root: Path, v2fly_source: str = None, offline: bool = False,
+                       budget: MemoryBudget = None, local_sources: List[str] = None) -> RuleParser:
+    """获取所有上游规则并与本地规则合并
+
+    v2fly_source 指向本地 geosite.dat 或 domain-list-community 克隆时不再下载 v2fly 数据；
+    offline 时跳过所有网络来源；budget 限制去重所用的内存；
+    local_sources 为额外的本地目录 / glob 规则源（见 local_sources.py）。
+    """
+    parsers = []
     
-    # 获取GitHub规则
-    github_parser = fetch_all_rules()
+    if not offline:
+        # 获取GitHub规则
+        parsers.append(fetch_all_rules(budget))
     
     # 获取 v2fly AI 规则
-    v2fly_parser = fetch_v2fly_rules()
+    if v2fly_source:
+        parsers.append(load_local_v2fly_rules(v2fly_source))
+    elif not offline:
+        parsers.append(fetch_v2fly_rules())
 
-    # 获取 blackmatrix7 规则
-    blackmatrix7_parser = fetch_blackmatrix7_rules()
+    if not offline:
+        # 获取 blackmatrix7 规则
+        parsers.append(fetch_blackmatrix7_rules())
 
-    # 获取 szkane 规则
-    szkane_parser = fetch_szkane_rules()
+        # 获取 szkane 规则
+        parsers.append(fetch_szkane_rules())
+
+        # 保存各主机的延迟和失败历史，下次运行据此设置超时、对冲延迟和熔断
+        from source_health import get_health
+        health = get_health()
+        health.report()
+        health.save()
+        
+        # 保存各来源的变化历史和下次拉取时间
+        from refresh_schedule import get_scheduler
+        scheduler = get_scheduler()
+        scheduler.report()
+        scheduler.save()
+    
+    # 加载本地目录规则源
+    if local_sources:
+        from local_sources import load_local_sources
+        parsers.append(load_local_sources(local_sources, budget))
     
     # 加载自定义规则
     custom_file = project_root / 'data' / 'custom_rules.txt'
-    custom_parser = load_custom_rules(str(custom_file))
+    custom_parser = load_custom_rules(str(custom_file), budget)
     
     # 加载 collected_projects.json 中的规则
     collected_file = project_root / 'data' / 'collected_projects.json'
-    collected_parser = RuleParser()
+    collected_parser = RuleParser('collected')
     if collected_file.exists():
         with open(collected_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
             for domain in data.get('domains', []):
-                collected_parser.domain_suffixes.add(domain)
+                collected_parser.add_suffix(domain)
             for keyword in data.get('keywords', []):
                 collected_parser.domain_keywords.add(keyword)
             for cidr in data.get('ip_cidrs', []):
@@ -448,13 +739,73 @@ def main():
     
     # 合并所有规则
     print("🔄 Merging all rules...")
-    final_parser = merge_parsers([github_parser, v2fly_parser, blackmatrix7_parser, szkane_parser, custom_parser, collected_parser])
+    merged = merge_parsers(parsers + [custom_parser, collected_parser], budget)
+    
+    # 能用域名 / 后缀表达的正则改写为更便宜的规则，其余正则只输出到支持正则的格式
+    report = simplify_regexes(merged)
+    if report['total']:
+        print(f"🧮 Regex rules: {report['rewritten']}/{report['total']} rewritten as "
+              f"{report['domains']} domains and {report['suffixes']} suffixes, {report['kept']} kept")
+    return merged
+
+def main():
+    from refresh_schedule import MAX_INTERVAL, MIN_INTERVAL, get_scheduler, parse_duration
+    arg_parser = argparse.ArgumentParser(description='Fetch and merge AI proxy rules')
+    arg_parser.add_argument('--v2fly-source', help='local geosite.dat file or domain-list-community checkout')
+    arg_parser.add_argument('--offline', action='store_true', help='skip all network sources')
+    arg_parser.add_argument('--asn-db', help='local ip-to-ASN dataset (iptoasn TSV or MMDB) used to expand ip_asns')
+    arg_parser.add_argument('--max-memory', type=parse_size,
+                            help='bounded-memory mode: peak memory limit such as 512M; rule sets spill to disk')
+    arg_parser.add_argument('--spill-dir', help='directory for sorted spill runs (default: system temp dir)')
+    arg_parser.add_argument('--local-source', action='append', default=[],
+                            help='local directory, glob or file of .list/.yaml rules; prefix v2fly: for v2fly data files')
+    arg_parser.add_argument('--history-db', help='rule history database (default: .cache/rule_history.sqlite3)')
+    arg_parser.add_argument('--no-history', action='store_true', help='do not record this run in the rule history')
+    arg_parser.add_argument('--refresh-all', action='store_true',
+                            help='fetch every source now, ignoring the per-source refresh schedule')
+    arg_parser.add_argument('--min-interval', type=parse_duration, default=MIN_INTERVAL,
+                            help='shortest per-source refresh interval such as 1h (default: 1h)')
+    arg_parser.add_argument('--max-interval', type=parse_duration, default=MAX_INTERVAL,
+                            help='longest per-source refresh interval such as 7d (default: 7d)')
+    args = arg_parser.parse_args()
+    
+    scheduler = get_scheduler()
+    scheduler.force = args.refresh_all
+    scheduler.min_interval = args.min_interval
+    scheduler.max_interval = max(args.min_interval, args.max_interval)
+    
+    print("🚀 AI Proxy Rules Fetcher")
+    print("=" * 60)
+    print()
+    
+    # 获取脚本所在目录的父目录（项目根目录）
+    script_dir = Path(__file__).parent
+    project_root = script_dir.parent
+    
+    budget = MemoryBudget(args.max_memory, args.spill_dir, enforce=True) if args.max_memory else None
+    final_parser = fetch_merged_rules(project_root, args.v2fly_source, args.offline, budget, args.local_source)
+    
+    # 用本地 IP-ASN 数据集把 ASN 展开为 CIDR，让不支持 IP-ASN 的格式也能路由这些网段
+    if args.asn_db:
+        expand_parser_asns(final_parser, args.asn_db)
     
     # 保存结果
     print()
     output_file = project_root / 'data' / 'ai_projects.json'
     save_rules(final_parser, str(output_file))
     
+    # 把本次运行的规范规则集写入历史库（见 history.py）
+    if not args.no_history:
+        from history import HISTORY_DB, RuleHistory, parser_sources
+        with RuleHistory(args.history_db or HISTORY_DB) as history:
+            run = history.record(final_parser.get_all_rules(), parser_sources(final_parser))
+            changes = history.diff(history.resolve_run('latest~1'), run) if run > 1 else None
+        summary = f": +{len(changes['added'])} -{len(changes['removed'])} rules" if changes else ''
+        print(f"🗂️  Recorded history run #{run}{summary}")
+    
+    if budget and not report_memory(budget):
+        sys.exit(1)
+    
     print()
     print("✨ Rule fetching completed!")
 
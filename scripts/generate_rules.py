@@ -4,11 +4,157 @@
 Generate proxy rules for multiple proxy tools
 """
 
+import re
+import sys
+import zlib
 import json
+import shutil
+import hashlib
+import argparse
+import ipaddress
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterable, Iterator
 from pathlib import Path
 
+from psl import get_psl
+from regex_rules import clash_compatible
+from external_sort import MemoryBudget, dump_json, iter_json_arrays, parse_size, report_memory
+
+# 压缩编码 -> 文件后缀
+COMPRESSED_SUFFIXES = {
+    'gzip': '.gz',
+    'br': '.br',
+    'zstd': '.zst',
+}
+
+# 内容哈希文件名中使用的哈希长度
+HASH_LENGTH = 12
+
+# 生成发布文件时每次读取的块大小
+STREAM_CHUNK = 1024 * 1024
+
+# 规则数据中的规则类型
+RULE_KINDS = ('domains', 'domain_suffixes', 'domain_keywords', 'domain_regexes', 'ip_cidrs', 'ip_asns')
+
+# 支持 DOMAIN-REGEX 的格式（Clash Meta、sing-box 与 Xray 均使用 Go RE2 语法，与 v2fly 的 regexp: 一致）
+REGEX_FORMATS = ('clash.yaml', 'sing-box.json', 'ai-geosite.dat')
+
+# Xray / V2Ray 外部规则文件：放入资源目录后以 ext:文件名:类别 引用
+XRAY_GEOSITE = 'ai-geosite.dat'
+XRAY_GEOIP = 'ai-geoip.dat'
+XRAY_ROUTING = 'xray-routing.json'
+XRAY_CATEGORY = 'ai'
+XRAY_OUTBOUND = 'proxy'
+
+# 嵌入式匹配器使用的最小完美哈希域名表（格式见 domain_table.py）
+DOMAIN_TABLE = 'ai-domains.mph'
+
+# DNS 层输出：匹配域名的查询转发到该上游（通常是经代理解析的本地 DNS 转发器）
+DNSMASQ_UPSTREAM = '127.0.0.1#5353'
+SMARTDNS_GROUP = 'ai'
+
+# 解析结果写入的 nftables 集合，与 nftables.nft 中定义的集合一致
+NFT_FAMILY = 'inet'
+NFT_TABLE = 'ai_proxy'
+NFT_SET_V4 = 'ai_proxy_v4'
+NFT_SET_V6 = 'ai_proxy_v6'
+
+# PAC 命中规则时返回的代理（未命中返回 DIRECT）
+PAC_PROXY = 'SOCKS5 127.0.0.1:7890; PROXY 127.0.0.1:7890; DIRECT'
+
+# 压缩后的 PAC 主体：O 为 主机名 -> 1（精确）/ 2（后缀）的对象哈希，加载时转成 Map（V8 中对运行时拼出的
+# 子串查 Map 比查对象属性快约两倍，没有 Map 的旧 PAC 引擎直接查对象），按标签逐级查找后缀；
+# K 为所有关键词合成的一个正则；R 为合并后的 IPv4 区间 [起, 止, 起, 止, ...]，对 IP 字面量二分查找。
+# 比较用 >0 而不是 in / hasOwnProperty，"constructor" 之类的原型属性不会误命中
+PAC_TEMPLATE = (
+    'var P={proxy},O={hosts},K={keywords},R={ranges},M=typeof Map==="function"?new Map():null,L;'
+    'if(M){{for(var x in O)M.set(x,O[x]);L=function(k){{return M.get(k)}}}}else L=function(k){{return O[k]}};'
+    'function FindProxyForURL(u,h){{'
+    'h=h.toLowerCase();'
+    'if(h.charCodeAt(h.length-1)===46)h=h.slice(0,-1);'
+    'if(L(h)>0)return P;'
+    'for(var i=h.indexOf(".");i>=0;i=h.indexOf(".",i+1))if(L(h.substring(i+1))>1)return P;'
+    'if(K&&K.test(h))return P;'
+    'if(R.length&&/^\\d+\\.\\d+\\.\\d+\\.\\d+$/.test(h)){{'
+    'var a=h.split("."),n=0,l=0,r=R.length/2-1,m;'
+    'for(m=0;m<4;m++)n=n*256+(+a[m]);'
+    'while(l<=r){{m=(l+r)>>1;if(n<R[2*m])r=m-1;else if(n>R[2*m+1])l=m+1;else return P}}'
+    '}}'
+    'return"DIRECT"}}'
+)
+
+# 逐行规则格式的表头信息、默认策略组和各类规则的行格式，generate_rules.py 与 tenants.py 共用
+# {value} 为规则值，{type} 为按地址族选择的 CIDR 规则类型，{policy} 为策略组
+LINE_FORMATS = {
+    'clash.yaml': {
+        'title': 'Clash',
+        'usage': '# 使用方法: 将以下规则添加到Clash配置文件的rules部分',
+        'preamble': ['payload:'],
+        'policy': None,  # rule-provider 由引用它的规则指定策略
+        'lines': {
+            'domains': '  - DOMAIN,{value}',
+            'domain_suffixes': '  - DOMAIN-SUFFIX,{value}',
+            'domain_keywords': '  - DOMAIN-KEYWORD,{value}',
+            'domain_regexes': '  - DOMAIN-REGEX,{value}',
+            'ip_cidrs': '  - {type},{value}',
+            'ip_asns': '  - IP-ASN,{value}',
+        },
+    },
+    'surge.conf': {
+        'title': 'Surge',
+        'usage': '# 使用方法: 将以下规则添加到Surge配置文件的[Rule]部分',
+        'policy': 'Proxy',
+        'lines': {
+            'domains': 'DOMAIN,{value},{policy}',
+            'domain_suffixes': 'DOMAIN-SUFFIX,{value},{policy}',
+            'domain_keywords': 'DOMAIN-KEYWORD,{value},{policy}',
+            'ip_cidrs': '{type},{value},{policy}',
+        },
+    },
+    'quantumult-x.conf': {
+        'title': 'Quantumult X',
+        'usage': '# 使用方法: 将以下规则添加到Quantumult X配置文件的[filter_remote]部分',
+        'policy': 'proxy',
+        'ipv6_type': 'IP6-CIDR',
+        'lines': {
+            'domains': 'HOST,{value},{policy}',
+            'domain_suffixes': 'HOST-SUFFIX,{value},{policy}',
+            'domain_keywords': 'HOST-KEYWORD,{value},{policy}',
+            'ip_cidrs': '{type},{value},{policy}',
+        },
+    },
+    'shadowrocket.conf': {
+        'title': 'Shadowrocket',
+        'usage': '# 使用方法: 将以下规则添加到Shadowrocket配置文件的[Rule]部分',
+        'policy': 'PROXY',
+        'lines': {
+            'domains': 'DOMAIN,{value},{policy}',
+            'domain_suffixes': 'DOMAIN-SUFFIX,{value},{policy}',
+            'domain_keywords': 'DOMAIN-KEYWORD,{value},{policy}',
+            'ip_cidrs': '{type},{value},{policy}',
+        },
+    },
+    'loon.conf': {
+        'title': 'Loon',
+        'usage': '# 使用方法: 将以下规则添加到Loon配置文件的[Rule]部分',
+        'policy': 'PROXY',
+        'lines': {
+            'domains': 'DOMAIN,{value},{policy}',
+            'domain_suffixes': 'DOMAIN-SUFFIX,{value},{policy}',
+            'domain_keywords': 'DOMAIN-KEYWORD,{value},{policy}',
+            'ip_cidrs': '{type},{value},{policy}',
+        },
+    },
+}
+
+# 非逐行规则的文件中，用于统计规则条数的行；带分组的模式直接读取文件头中记录的规则数
+RULE_LINE_PATTERNS = {
+    'dnsmasq.conf': re.compile(r'^server='),
+    'smartdns.conf': re.compile(r'^nameserver '),
+    'nftables.nft': re.compile(r'^\s+[0-9a-fA-F:.]+/\d+,?$'),
+    'proxy.pac': re.compile(r'^// 规则总数: (\d+)'),
+}
+
 def load_rules(data_file: str) -> dict:
     """从数据文件加载所有规则"""
     with open(data_file, 'r', encoding='utf-8') as f:
@@ -20,144 +166,108 @@ def load_rules(data_file: str) -> dict:
             'domain_suffixes': data.get('domains', []),
             'domains': [],
             'domain_keywords': [],
+            'domain_regexes': [],
             'ip_cidrs': [],
             'ip_asns': []
         }
     
     return data.get('rules', {})
 
-def generate_clash_rules(rules: dict, output_file: str):
-    """生成Clash规则"""
-    total_rules = sum(len(v) for v in rules.values())
-    content = [
-        "# AI网站代理规则 - Clash格式",
-        f"# 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+def load_rules_streaming(data_file: str, budget: MemoryBudget) -> dict:
+    """逐行读取规则数据到外部排序集合，内存占用受 budget 限制"""
+    rules = {kind: budget.new_set() for kind in RULE_KINDS}
+    psl = get_psl()
+    for keys, value in iter_json_arrays(data_file):
+        if len(keys) == 2 and keys[0] == 'rules' and keys[1] in rules:
+            # 公共后缀不能作为后缀规则输出
+            if keys[1] == 'domain_suffixes' and psl.is_public_suffix(value):
+                continue
+            rules[keys[1]].add(str(value))
+    return rules
+
+def cidr_rule_type(cidr: str, v4: str = 'IP-CIDR', v6: str = 'IP-CIDR6') -> str:
+    """按地址族选择 CIDR 规则类型（IPv6 需要单独的规则类型）"""
+    return v6 if ':' in cidr else v4
+
+def count_rules(rules: dict, exclude: Iterable[str] = ('domain_regexes',)) -> int:
+    """不支持正则的格式的规则总数"""
+    return sum(len(v) for kind, v in rules.items() if kind not in exclude)
+
+def write_lines(output_file: str, header: List[str], *sections: Iterable[str]):
+    """逐行写出规则文件，输出与 '\n'.join(...) 一致
+
+    规则来自外部排序集合等可迭代对象时全程流式，不在内存中拼接整个文件。
+    """
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(header))
+        for section in sections:
+            for line in section:
+                f.write('\n')
+                f.write(line)
+
+def line_values(rules: dict, kind: str) -> Iterable[str]:
+    """逐行格式中某类规则输出的值；Clash 按逗号切分规则，含逗号等字符的正则无法表达"""
+    values = rules.get(kind, [])
+    if kind == 'domain_regexes':
+        return [regex for regex in values if clash_compatible(regex)]
+    return values
+
+def line_total(name: str, rules: dict) -> int:
+    """逐行格式的规则总数；正则只计入能输出它的格式"""
+    total = count_rules(rules)
+    if 'domain_regexes' in LINE_FORMATS[name]['lines']:
+        total += len(line_values(rules, 'domain_regexes'))
+    return total
+
+def line_header(name: str, total_rules: int, updated: Optional[str] = None) -> List[str]:
+    """逐行格式的文件头；updated 只用于不进入发布清单的文件（如租户变体）"""
+    spec = LINE_FORMATS[name]
+    return [
+        f"# AI网站代理规则 - {spec['title']}格式",
+        *([f"# 更新时间: {updated}"] if updated else []),
         f"# 规则总数: {total_rules}",
-        "# 使用方法: 将以下规则添加到Clash配置文件的rules部分",
+        spec['usage'],
         "",
-        "payload:",
+        *spec.get('preamble', []),
     ]
-    
-    # 添加精确域名
-    for domain in rules.get('domains', []):
-        content.append(f"  - DOMAIN,{domain}")
-    
-    # 添加域名后缀
-    for domain in rules.get('domain_suffixes', []):
-        content.append(f"  - DOMAIN-SUFFIX,{domain}")
-    
-    # 添加域名关键词
-    for keyword in rules.get('domain_keywords', []):
-        content.append(f"  - DOMAIN-KEYWORD,{keyword}")
-    
-    # 添加IP CIDR
-    for cidr in rules.get('ip_cidrs', []):
-        content.append(f"  - IP-CIDR,{cidr}")
-    
-    # 添加IP ASN
-    for asn in rules.get('ip_asns', []):
-        content.append(f"  - IP-ASN,{asn}")
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(content))
-    
-    print(f"✅ Clash rules saved to {output_file} ({total_rules} rules)")
+
+def format_lines(name: str, kind: str, values: Iterable[str], policy: Optional[str]) -> Iterator[str]:
+    """按 LINE_FORMATS 中的行格式逐条格式化规则"""
+    spec = LINE_FORMATS[name]
+    pattern = spec['lines'][kind]
+    if '{type}' in pattern:
+        v6 = spec.get('ipv6_type', 'IP-CIDR6')
+        for value in values:
+            yield pattern.format(value=value, type=cidr_rule_type(value, v6=v6), policy=policy)
+    else:
+        for value in values:
+            yield pattern.format(value=value, policy=policy)
+
+def generate_line_rules(name: str, rules: dict, output_file: str):
+    """生成一种逐行格式的规则文件，规则按 LINE_FORMATS 中的顺序输出"""
+    spec = LINE_FORMATS[name]
+    total_rules = line_total(name, rules)
+    write_lines(
+        output_file, line_header(name, total_rules),
+        *(format_lines(name, kind, line_values(rules, kind), spec['policy']) for kind in spec['lines']),
+    )
+    print(f"✅ {spec['title']} rules saved to {output_file} ({total_rules} rules)")
+
+def generate_clash_rules(rules: dict, output_file: str):
+    """生成Clash规则"""
+    generate_line_rules('clash.yaml', rules, output_file)
 
 def generate_surge_rules(rules: dict, output_file: str):
     """生成Surge规则"""
-    total_rules = sum(len(v) for v in rules.values())
-    content = [
-        "# AI网站代理规则 - Surge格式",
-        f"# 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        f"# 规则总数: {total_rules}",
-        "# 使用方法: 将以下规则添加到Surge配置文件的[Rule]部分",
-        "",
-    ]
-    
-    # 添加精确域名
-    for domain in rules.get('domains', []):
-        content.append(f"DOMAIN,{domain},Proxy")
-    
-    # 添加域名后缀
-    for domain in rules.get('domain_suffixes', []):
-        content.append(f"DOMAIN-SUFFIX,{domain},Proxy")
-    
-    # 添加域名关键词
-    for keyword in rules.get('domain_keywords', []):
-        content.append(f"DOMAIN-KEYWORD,{keyword},Proxy")
-    
-    # 添加IP CIDR
-    for cidr in rules.get('ip_cidrs', []):
-        content.append(f"IP-CIDR,{cidr},Proxy")
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(content))
-    
-    print(f"✅ Surge rules saved to {output_file} ({total_rules} rules)")
+    generate_line_rules('surge.conf', rules, output_file)
 
 def generate_quantumult_x_rules(rules: dict, output_file: str):
     """生成Quantumult X规则"""
-    total_rules = sum(len(v) for v in rules.values())
-    content = [
-        "# AI网站代理规则 - Quantumult X格式",
-        f"# 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        f"# 规则总数: {total_rules}",
-        "# 使用方法: 将以下规则添加到Quantumult X配置文件的[filter_remote]部分",
-        "",
-    ]
-    
-    # 添加精确域名
-    for domain in rules.get('domains', []):
-        content.append(f"HOST,{domain},proxy")
-    
-    # 添加域名后缀
-    for domain in rules.get('domain_suffixes', []):
-        content.append(f"HOST-SUFFIX,{domain},proxy")
-    
-    # 添加域名关键词
-    for keyword in rules.get('domain_keywords', []):
-        content.append(f"HOST-KEYWORD,{keyword},proxy")
-    
-    # 添加IP CIDR
-    for cidr in rules.get('ip_cidrs', []):
-        content.append(f"IP-CIDR,{cidr},proxy")
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(content))
-    
-    print(f"✅ Quantumult X rules saved to {output_file} ({total_rules} rules)")
+    generate_line_rules('quantumult-x.conf', rules, output_file)
 
 def generate_shadowrocket_rules(rules: dict, output_file: str):
     """生成Shadowrocket规则"""
-    total_rules = sum(len(v) for v in rules.values())
-    content = [
-        "# AI网站代理规则 - Shadowrocket格式",
-        f"# 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        f"# 规则总数: {total_rules}",
-        "# 使用方法: 将以下规则添加到Shadowrocket配置文件的[Rule]部分",
-        "",
-    ]
-    
-    # 添加精确域名
-    for domain in rules.get('domains', []):
-        content.append(f"DOMAIN,{domain},PROXY")
-    
-    # 添加域名后缀
-    for domain in rules.get('domain_suffixes', []):
-        content.append(f"DOMAIN-SUFFIX,{domain},PROXY")
-    
-    # 添加域名关键词
-    for keyword in rules.get('domain_keywords', []):
-        content.append(f"DOMAIN-KEYWORD,{keyword},PROXY")
-    
-    # 添加IP CIDR
-    for cidr in rules.get('ip_cidrs', []):
-        content.append(f"IP-CIDR,{cidr},PROXY")
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(content))
-    
-    print(f"✅ Shadowrocket rules saved to {output_file} ({total_rules} rules)")
+    generate_line_rules('shadowrocket.conf', rules, output_file)
 
 def generate_singbox_rules(rules: dict, output_file: str):
     """生成Sing-box规则 (JSON格式)
@@ -183,7 +293,8 @@ def generate_singbox_rules(rules: dict, output_file: str):
     }
     
     # 添加域名规则
-    if rules.get('domains') or rules.get('domain_suffixes') or rules.get('domain_keywords'):
+    if rules.get('domains') or rules.get('domain_suffixes') or rules.get('domain_keywords') \
+            or rules.get('domain_regexes'):
         domain_rule = {}
         if rules.get('domains'):
             domain_rule["domain"] = rules['domains']
@@ -191,6 +302,8 @@ def generate_singbox_rules(rules: dict, output_file: str):
             domain_rule["domain_suffix"] = rules['domain_suffixes']
         if rules.get('domain_keywords'):
             domain_rule["domain_keyword"] = rules['domain_keywords']
+        if rules.get('domain_regexes'):
+            domain_rule["domain_regex"] = rules['domain_regexes']
         rule_set["rules"].append(domain_rule)
     
     # 添加IP规则
@@ -202,7 +315,8 @@ def generate_singbox_rules(rules: dict, output_file: str):
     # 添加ASN规则
     # 注意：Sing-box rule-set compile 目前似乎不支持 ip_asn 字段，会导致编译失败
     # 错误信息: rules[2].ip_asn: json: unknown field "ip_asn"
-    # 因此暂时禁用 ASN 规则生成
+    # 因此暂时禁用 ASN 规则生成；需要路由这些网段时，在 fetch_rules.py 中使用
+    # --asn-db 把 ASN 展开为 CIDR，即可通过上面的 ip_cidr 输出
     """
     if rules.get('ip_asns'):
         # 确保ASN是整数列表
@@ -220,7 +334,7 @@ def generate_singbox_rules(rules: dict, output_file: str):
     """
     
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(rule_set, f, indent=2, ensure_ascii=False)
+        dump_json(rule_set, f)
     
     print(f"✅ Sing-box rules saved to {output_file} ({total_rules} rules)")
     print(f"   💡 Tip: Compile to SRS for better performance:")
@@ -228,46 +342,270 @@ def generate_singbox_rules(rules: dict, output_file: str):
 
 def generate_loon_rules(rules: dict, output_file: str):
     """生成Loon规则"""
-    total_rules = sum(len(v) for v in rules.values())
-    content = [
-        "# AI网站代理规则 - Loon格式",
-        f"# 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+    generate_line_rules('loon.conf', rules, output_file)
+
+def dns_domains(rules: dict) -> tuple:
+    """DNS 转发规则只能按域名后缀匹配：精确域名放宽为后缀，已被更短后缀覆盖的条目去掉
+
+    返回 (排序后的域名列表, 放宽的精确域名数, 去掉的冗余条目数)。
+    """
+    suffixes = set(rules.get('domain_suffixes', []))
+    domains = [d for d in rules.get('domains', []) if d not in suffixes]
+    names = suffixes.union(domains)
+    
+    def covered(name: str) -> bool:
+        labels = name.split('.')
+        return any('.'.join(labels[i:]) in names for i in range(1, len(labels)))
+    
+    result = sorted(name for name in names if not covered(name))
+    kept = set(result)
+    widened = sum(1 for d in domains if d in kept)
+    redundant = len(names) - len(result)
+    return result, widened, redundant
+
+def collapsed_networks(cidrs: Iterable[str]) -> Dict[int, list]:
+    """按地址族合并相邻和重叠的 CIDR，减少内核集合中的区间数"""
+    networks = {4: [], 6: []}
+    for cidr in cidrs:
+        try:
+            network = ipaddress.ip_network(cidr, strict=False)
+        except ValueError:
+            continue
+        networks[network.version].append(network)
+    return {version: list(ipaddress.collapse_addresses(items)) for version, items in networks.items()}
+
+def unsupported_rules(rules: dict) -> str:
+    """DNS / 防火墙层无法表达关键词、正则和 ASN 规则（ASN 可在 fetch_rules.py 中用 --asn-db 展开为 CIDR）"""
+    parts = []
+    if len(rules.get('domain_keywords', [])):
+        parts.append(f"{len(rules['domain_keywords'])} DOMAIN-KEYWORD")
+    if len(rules.get('domain_regexes', [])):
+        parts.append(f"{len(rules['domain_regexes'])} DOMAIN-REGEX")
+    if len(rules.get('ip_asns', [])):
+        parts.append(f"{len(rules['ip_asns'])} IP-ASN")
+    return ', '.join(parts)
+
+def dns_header(title: str, total_rules: int, usage: str, rules: dict, widened: int) -> List[str]:
+    """DNS 层格式的文件头，列出无法表达而被跳过的规则"""
+    header = [
+        f"# AI网站代理规则 - {title}格式",
         f"# 规则总数: {total_rules}",
-        "# 使用方法: 将以下规则添加到Loon配置文件的[Rule]部分",
+        usage,
+    ]
+    if widened:
+        header.append(f"# 注意: {widened} 条精确域名按后缀输出（同时匹配其子域名）")
+    skipped = unsupported_rules(rules)
+    if skipped:
+        header.append(f"# 不支持的规则未输出: {skipped}")
+    header.append("")
+    return header
+
+def report_unsupported(title: str, rules: dict):
+    skipped = unsupported_rules(rules)
+    if skipped:
+        print(f"   ⚠️ {title}: skipped unsupported rules ({skipped})")
+
+def generate_dnsmasq_rules(rules: dict, output_file: str):
+    """生成dnsmasq规则：server= 转发查询，nftset= 把解析结果加入 nftables 集合"""
+    domains, widened, redundant = dns_domains(rules)
+    nftset = f"4#{NFT_FAMILY}#{NFT_TABLE}#{NFT_SET_V4},6#{NFT_FAMILY}#{NFT_TABLE}#{NFT_SET_V6}"
+    header = dns_header(
+        'dnsmasq', len(domains),
+        "# 使用方法: 放入 /etc/dnsmasq.d/（nftset= 需要 dnsmasq 2.87+，并加载 nftables.nft 中的集合）",
+        rules, widened,
+    )
+    
+    write_lines(
+        output_file, header,
+        (line for domain in domains
+         for line in (f"server=/{domain}/{DNSMASQ_UPSTREAM}", f"nftset=/{domain}/{nftset}")),
+    )
+    
+    print(f"✅ dnsmasq rules saved to {output_file} ({len(domains)} domains, {redundant} redundant dropped)")
+    report_unsupported('dnsmasq', rules)
+
+def generate_smartdns_rules(rules: dict, output_file: str):
+    """生成SmartDNS规则：nameserver 指定上游分组，nftset 把解析结果加入 nftables 集合"""
+    domains, widened, redundant = dns_domains(rules)
+    nftset = f"#4:{NFT_FAMILY}#{NFT_TABLE}#{NFT_SET_V4},#6:{NFT_FAMILY}#{NFT_TABLE}#{NFT_SET_V6}"
+    header = dns_header(
+        'SmartDNS', len(domains),
+        f"# 使用方法: 在 smartdns.conf 中 conf-file 引入，并定义 group 为 {SMARTDNS_GROUP} 的上游服务器",
+        rules, widened,
+    )
+    
+    write_lines(
+        output_file, header,
+        (line for domain in domains
+         for line in (f"nameserver /{domain}/{SMARTDNS_GROUP}", f"nftset /{domain}/{nftset}")),
+    )
+    
+    print(f"✅ SmartDNS rules saved to {output_file} ({len(domains)} domains, {redundant} redundant dropped)")
+    report_unsupported('SmartDNS', rules)
+
+def generate_nftables_rules(rules: dict, output_file: str):
+    """生成nftables集合定义：CIDR 合并后以 interval 集合保存，auto-merge 合并运行时加入的地址"""
+    networks = collapsed_networks(rules.get('ip_cidrs', []))
+    total_rules = len(networks[4]) + len(networks[6])
+    header = [
+        "# AI网站代理规则 - nftables格式",
+        f"# 规则总数: {total_rules}（由 {len(rules.get('ip_cidrs', []))} 条 CIDR 合并）",
+        "# 使用方法: nft -f nftables.nft，然后在路由 / 标记规则中引用 "
+        f"@{NFT_SET_V4} 与 @{NFT_SET_V6}",
         "",
+        f"table {NFT_FAMILY} {NFT_TABLE} {{",
     ]
     
-    # 添加精确域名
-    for domain in rules.get('domains', []):
-        content.append(f"DOMAIN,{domain},PROXY")
-    
-    # 添加域名后缀
-    for domain in rules.get('domain_suffixes', []):
-        content.append(f"DOMAIN-SUFFIX,{domain},PROXY")
+    def set_lines(name: str, address_type: str, items: list) -> Iterable[str]:
+        yield f"\tset {name} {{"
+        yield f"\t\ttype {address_type}"
+        yield "\t\tflags interval"
+        yield "\t\tauto-merge"
+        # nft 不接受空的 elements 块
+        if items:
+            yield "\t\telements = {"
+            for network in items:
+                yield f"\t\t\t{network},"
+            yield "\t\t}"
+        yield "\t}"
+    
+    write_lines(
+        output_file, header,
+        set_lines(NFT_SET_V4, 'ipv4_addr', networks[4]),
+        set_lines(NFT_SET_V6, 'ipv6_addr', networks[6]),
+        ["}"],
+    )
+    
+    print(f"✅ nftables sets saved to {output_file} ({total_rules} intervals)")
+    if rules.get('ip_asns'):
+        print(f"   ⚠️ nftables: skipped unsupported rules ({len(rules['ip_asns'])} IP-ASN)")
+
+def ipv4_ranges(cidrs: Iterable[str]) -> List[int]:
+    """把 IPv4 CIDR 合并为按起点排序、互不相邻的整数区间，展平为 [起, 止, 起, 止, ...]"""
+    ranges = []
+    for network in collapsed_networks(cidrs)[4]:
+        start, end = int(network.network_address), int(network.broadcast_address)
+        if ranges and start <= ranges[-1] + 1:
+            ranges[-1] = max(ranges[-1], end)
+        else:
+            ranges.extend((start, end))
+    return ranges
+
+def build_pac(rules: dict, proxy: str = PAC_PROXY) -> str:
+    """生成压缩后的 PAC 脚本主体（不含文件头）"""
+    hosts = dict.fromkeys(rules.get('domains', []), 1)
+    hosts.update(dict.fromkeys(rules.get('domain_suffixes', []), 2))
+    keywords = sorted(rules.get('domain_keywords', []))
+    pattern = '|'.join(re.escape(keyword) for keyword in keywords)
+    return PAC_TEMPLATE.format(
+        proxy=json.dumps(proxy),
+        hosts=json.dumps(hosts, ensure_ascii=False, separators=(',', ':')),
+        keywords=f"new RegExp({json.dumps(pattern, ensure_ascii=False)})" if keywords else 'null',
+        ranges=json.dumps(ipv4_ranges(rules.get('ip_cidrs', [])), separators=(',', ':')),
+    )
+
+def generate_pac_rules(rules: dict, output_file: str):
+    """生成PAC文件：域名用对象哈希按标签后缀查找，IPv4 CIDR 预先解析为整数区间"""
+    v6 = sum(1 for cidr in rules.get('ip_cidrs', []) if ':' in cidr)
+    total_rules = count_rules(rules, ('domain_regexes', 'ip_asns')) - v6
+    header = [
+        "// AI网站代理规则 - PAC格式",
+        f"// 规则总数: {total_rules}",
+        "// 使用方法: 在浏览器或系统代理设置中填写 PAC 地址；IP 规则只匹配 IPv4 字面量，不做 DNS 解析",
+    ]
+    # PAC 中的正则由浏览器的 JS 引擎编译，RE2 语法不兼容会让整个 PAC 加载失败，因此不输出
+    skipped = ', '.join(part for part in (
+        f"{len(rules['domain_regexes'])} DOMAIN-REGEX" if len(rules.get('domain_regexes', [])) else '',
+        f"{v6} IPv6 CIDR" if v6 else '',
+        f"{len(rules['ip_asns'])} IP-ASN" if len(rules.get('ip_asns', [])) else '',
+    ) if part)
+    if skipped:
+        header.append(f"// 不支持的规则未输出: {skipped}")
+    
+    write_lines(output_file, header, [build_pac(rules)])
+    
+    print(f"✅ PAC file saved to {output_file} ({total_rules} rules)")
+    if skipped:
+        print(f"   ⚠️ PAC: skipped unsupported rules ({skipped})")
+
+def generate_xray_geosite(rules: dict, output_file: str):
+    """生成geosite.dat：精确域名、后缀、关键词、正则分别对应 Full / RootDomain / Plain / Regex"""
+    from v2fly import KIND_DOMAIN, KIND_FULL, KIND_KEYWORD, KIND_REGEXP
+    from geosite import write_geosite
     
-    # 添加域名关键词
-    for keyword in rules.get('domain_keywords', []):
-        content.append(f"DOMAIN-KEYWORD,{keyword},PROXY")
+    kinds = (('domains', KIND_FULL), ('domain_suffixes', KIND_DOMAIN),
+             ('domain_keywords', KIND_KEYWORD), ('domain_regexes', KIND_REGEXP))
     
-    # 添加IP CIDR
-    for cidr in rules.get('ip_cidrs', []):
-        content.append(f"IP-CIDR,{cidr},PROXY")
+    def entries() -> Iterable[tuple]:
+        for key, kind in kinds:
+            for value in rules.get(key, []):
+                yield kind, value, ()
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(content))
+    total_rules = write_geosite(output_file, {XRAY_CATEGORY: entries})[XRAY_CATEGORY]
+    print(f"✅ Xray geosite saved to {output_file} ({total_rules} rules, category {XRAY_CATEGORY})")
+
+def generate_xray_geoip(rules: dict, output_file: str):
+    """生成geoip.dat：CIDR 合并后写入与 geosite 同名的类别"""
+    from geosite import write_geoip
     
-    print(f"✅ Loon rules saved to {output_file} ({total_rules} rules)")
+    networks = collapsed_networks(rules.get('ip_cidrs', []))
+    total_rules = write_geoip(output_file, {XRAY_CATEGORY: lambda: networks[4] + networks[6]})[XRAY_CATEGORY]
+    print(f"✅ Xray geoip saved to {output_file} ({total_rules} CIDRs, category {XRAY_CATEGORY})")
+    if rules.get('ip_asns'):
+        print(f"   ⚠️ Xray geoip: skipped unsupported rules ({len(rules['ip_asns'])} IP-ASN)")
 
-def main():
-    print("🚀 Starting rule generation...")
+def generate_xray_routing(rules: dict, output_file: str):
+    """生成引用 ai-geosite.dat / ai-geoip.dat 的Xray路由规则片段"""
+    routing_rules = [{
+        "type": "field",
+        "domain": [f"ext:{XRAY_GEOSITE}:{XRAY_CATEGORY}"],
+        "outboundTag": XRAY_OUTBOUND,
+    }]
+    # 空的 geoip 类别会让 Xray 启动报错，没有 CIDR 时不引用
+    if len(rules.get('ip_cidrs', [])):
+        routing_rules.append({
+            "type": "field",
+            "ip": [f"ext:{XRAY_GEOIP}:{XRAY_CATEGORY}"],
+            "outboundTag": XRAY_OUTBOUND,
+        })
+    routing = {
+        "routing": {
+            # 域名规则未命中时解析 IP 再匹配 geoip
+            "domainStrategy": "IPIfNonMatch",
+            "rules": routing_rules,
+        }
+    }
     
-    # 获取脚本所在目录的父目录（项目根目录）
-    script_dir = Path(__file__).parent
-    project_root = script_dir.parent
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(routing, f, indent=2, ensure_ascii=False)
     
+    print(f"✅ Xray routing saved to {output_file} (outbound {XRAY_OUTBOUND})")
+
+def generate_domain_table(rules: dict, output_file: str):
+    """生成最小完美哈希域名表：精确域名与后缀共用一张哈希表，关键词和 CIDR 区间放在表头之后"""
+    from domain_table import write_table
+    
+    counts = write_table(output_file, rules)
+    print(f"✅ Domain table saved to {output_file} ({counts['names']} names, {counts['keywords']} keywords, "
+          f"{counts['ipv4_ranges'] + counts['ipv6_ranges']} IP ranges)")
+    skipped = ', '.join(part for part in (
+        f"{len(rules['domain_regexes'])} DOMAIN-REGEX" if len(rules.get('domain_regexes', [])) else '',
+        f"{len(rules['ip_asns'])} IP-ASN" if len(rules.get('ip_asns', [])) else '',
+    ) if part)
+    if skipped:
+        print(f"   ⚠️ Domain table: skipped unsupported rules ({skipped})")
+
+def prepare_rules(project_root: Path, budget: MemoryBudget = None) -> dict:
+    """加载合并后的规则数据，并补充 collected_projects.json 中的规则
+
+    指定 budget 时规则保存在外部排序集合中，生成器以流的方式消费。
+    """
     # 加载规则数据
     data_file = project_root / 'data' / 'ai_projects.json'
-    rules = load_rules(str(data_file))
+    if budget:
+        rules = load_rules_streaming(str(data_file), budget)
+    else:
+        rules = load_rules(str(data_file))
 
     # 双重保险：直接加载 collected_projects.json 并合并
     collected_file = project_root / 'data' / 'collected_projects.json'
@@ -276,10 +614,22 @@ def main():
         with open(collected_file, 'r', encoding='utf-8') as f:
             collected_data = json.load(f)
             
+            if budget:
+                # 外部排序集合只能追加，公共后缀在写入前过滤
+                psl = get_psl()
+                rules['domain_suffixes'].update(
+                    d for d in collected_data.get('domains', []) if not psl.is_public_suffix(d))
+                rules['domain_keywords'].update(collected_data.get('keywords', []))
+                rules['ip_cidrs'].update(collected_data.get('ip_cidrs', []))
+                return rules
+            
             # 合并域名
             if 'domains' in collected_data:
                 current_domains = set(rules.get('domain_suffixes', []))
                 current_domains.update(collected_data['domains'])
+                # 公共后缀不能作为后缀规则输出
+                psl = get_psl()
+                current_domains = {d for d in current_domains if not psl.is_public_suffix(d)}
                 rules['domain_suffixes'] = sorted(list(current_domains))
             
             # 合并关键字
@@ -294,26 +644,223 @@ def main():
                 current_cidrs.update(collected_data['ip_cidrs'])
                 rules['ip_cidrs'] = sorted(list(current_cidrs))
     
+    return rules
+
+# 输出文件名 -> 生成函数
+ARTIFACTS = {
+    'clash.yaml': generate_clash_rules,
+    'surge.conf': generate_surge_rules,
+    'quantumult-x.conf': generate_quantumult_x_rules,
+    'shadowrocket.conf': generate_shadowrocket_rules,
+    'sing-box.json': generate_singbox_rules,
+    'loon.conf': generate_loon_rules,
+    'dnsmasq.conf': generate_dnsmasq_rules,
+    'smartdns.conf': generate_smartdns_rules,
+    'nftables.nft': generate_nftables_rules,
+    'proxy.pac': generate_pac_rules,
+    XRAY_GEOSITE: generate_xray_geosite,
+    XRAY_GEOIP: generate_xray_geoip,
+    XRAY_ROUTING: generate_xray_routing,
+    DOMAIN_TABLE: generate_domain_table,
+}
+
+def build_artifacts(rules: dict, rules_dir: Path) -> List[Path]:
+    """在指定目录生成所有格式的规则文件"""
+    # 确保输出目录存在
+    rules_dir = Path(rules_dir)
+    rules_dir.mkdir(parents=True, exist_ok=True)
+    
+    outputs = []
+    for name, generator in ARTIFACTS.items():
+        generator(rules, str(rules_dir / name))
+        outputs.append(rules_dir / name)
+    return outputs
+
+def _compressors() -> Dict[str, tuple]:
+    """为每种可用编码新建流式压缩器，返回 编码 -> (compress(chunk), flush())"""
+    # wbits=31 输出 gzip 容器且 mtime 固定为 0，与 gzip.compress(body, 9, mtime=0) 一致，保证输出可复现
+    deflate = zlib.compressobj(9, zlib.DEFLATED, 31)
+    compressors = {'gzip': (deflate.compress, deflate.flush)}
+    # brotli / zstandard 是可选依赖，只在写发布产物时才导入，不计入 generate 的导入时间
+    try:
+        import brotli
+    except ImportError:  # 未安装时不生成 .br
+        pass
+    else:
+        compressor = brotli.Compressor(quality=11)
+        compressors['br'] = (compressor.process, compressor.finish)
+    try:
+        import zstandard
+    except ImportError:  # 未安装时不生成 .zst
+        pass
+    else:
+        compressor = zstandard.ZstdCompressor(level=19).compressobj()
+        compressors['zstd'] = (compressor.compress, compressor.flush)
+    return compressors
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """生成所有可用的预压缩版本"""
+    return {encoding: feed(body) + flush() for encoding, (feed, flush) in _compressors().items()}
+
+def count_artifact_rules(path: Path) -> Optional[int]:
+    """流式统计规则文件中的规则条数，二进制格式返回 None"""
+    if path.name in (XRAY_GEOSITE, XRAY_GEOIP):
+        from geosite import count_entries
+        return count_entries(str(path))
+    if path.name == DOMAIN_TABLE:
+        from domain_table import DomainTable
+        with DomainTable(str(path)) as table:
+            return len(table)
+    if path.name == XRAY_ROUTING:
+        return None  # 只是引用 .dat 文件的路由片段
+    if path.suffix == '.json':
+        return sum(1 for keys, _ in iter_json_arrays(str(path)) if keys[:1] == ('rules',))
+    pattern = RULE_LINE_PATTERNS.get(path.name)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if pattern and pattern.groups:
+                return next((int(m.group(1)) for m in map(pattern.match, f) if m), None)
+            if pattern:
+                return sum(1 for line in f if pattern.match(line))
+            return sum(1 for line in f
+                       if line.strip() and not line.startswith('#') and line.strip() != 'payload:')
+    except UnicodeDecodeError:
+        return None
+
+def write_release_artifacts(rules_dir: Path, names: List[str]) -> dict:
+    """为规则文件生成内容哈希副本、预压缩版本和 manifest.json
+
+    文件按块读取，哈希与压缩都是流式的，内存占用与规则文件大小无关。
+    """
+    rules_dir = Path(rules_dir)
+    artifacts = {}
+    keep = set()
+    
+    for name in names:
+        path = rules_dir / name
+        if not path.exists():
+            continue
+        
+        # 一次读取同时计算哈希和各种压缩；压缩结果先写到临时文件，得到哈希后再改名
+        sha256 = hashlib.sha256()
+        compressors = _compressors()
+        outputs = {encoding: open(rules_dir / f".{name}{COMPRESSED_SUFFIXES[encoding]}.tmp", 'wb')
+                   for encoding in compressors}
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK), b''):
+                sha256.update(chunk)
+                for encoding, (feed, _) in compressors.items():
+                    outputs[encoding].write(feed(chunk))
+        for encoding, (_, flush) in compressors.items():
+            outputs[encoding].write(flush())
+            outputs[encoding].close()
+        
+        digest = sha256.hexdigest()
+        hashed_name = f"{path.stem}.{digest[:HASH_LENGTH]}{path.suffix}"
+        shutil.copyfile(path, rules_dir / hashed_name)
+        keep.add(hashed_name)
+        
+        rule_count = count_artifact_rules(path)
+        if rule_count is None:
+            # 二进制格式（如 SRS）沿用同名 JSON 源文件的规则数
+            rule_count = artifacts.get(f"{path.stem}.json", {}).get('rule_count')
+        
+        compressed = {}
+        for encoding, output in outputs.items():
+            suffix = COMPRESSED_SUFFIXES[encoding]
+            temp = Path(output.name)
+            shutil.copyfile(temp, rules_dir / f"{hashed_name}{suffix}")
+            temp.replace(rules_dir / f"{name}{suffix}")
+            keep.add(f"{hashed_name}{suffix}")
+            compressed[encoding] = {
+                'file': f"{hashed_name}{suffix}",
+                'size': (rules_dir / f"{name}{suffix}").stat().st_size,
+            }
+        
+        artifacts[name] = {
+            'file': hashed_name,
+            'sha256': digest,
+            'size': path.stat().st_size,
+            'rule_count': rule_count,
+            'compressed': compressed,
+        }
+    
+    # 清理上一次生成的过期哈希文件
+    for name in names:
+        stem, suffix = Path(name).stem, Path(name).suffix
+        pattern = re.compile(rf"^{re.escape(stem)}\.[0-9a-f]{{{HASH_LENGTH}}}{re.escape(suffix)}(\.gz|\.br|\.zst)?$")
+        for path in rules_dir.iterdir():
+            if pattern.match(path.name) and path.name not in keep:
+                path.unlink()
+    
+    # 规则文件不带时间戳，内容不变时哈希也不变；更新时间只记在 manifest 中，且只在有文件变化时更新
+    manifest_file = rules_dir / 'manifest.json'
+    updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous.get('artifacts') == artifacts:
+            updated = previous.get('updated', updated)
+    except (OSError, ValueError):
+        pass
+    manifest = {
+        'updated': updated,
+        'artifacts': artifacts,
+    }
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    
+    print(f"✅ Release manifest saved to {manifest_file} ({len(artifacts)} artifacts)")
+    return manifest
+
+def release_names(rules_dir: Path) -> List[str]:
+    """需要写入 manifest 的规则文件（SRS 由 sing-box 单独编译，存在时一并收录）"""
+    names = list(ARTIFACTS)
+    if (Path(rules_dir) / 'sing-box.srs').exists():
+        names.append('sing-box.srs')
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate proxy rules for multiple proxy tools')
+    parser.add_argument('--manifest-only', action='store_true',
+                        help='only refresh compressed variants and manifest.json (e.g. after SRS compilation)')
+    parser.add_argument('--max-memory', type=parse_size,
+                        help='bounded-memory mode: peak memory limit such as 512M; rule sets spill to disk')
+    parser.add_argument('--spill-dir', help='directory for sorted spill runs (default: system temp dir)')
+    args = parser.parse_args()
+    
+    # 获取脚本所在目录的父目录（项目根目录）
+    script_dir = Path(__file__).parent
+    project_root = script_dir.parent
+    rules_dir = project_root / 'rules'
+    
+    if args.manifest_only:
+        write_release_artifacts(rules_dir, release_names(rules_dir))
+        return
+    
+    print("🚀 Starting rule generation...")
+    
+    budget = MemoryBudget(args.max_memory, args.spill_dir, enforce=True) if args.max_memory else None
+    rules = prepare_rules(project_root, budget)
+
     total_rules = sum(len(v) for v in rules.values())
     print(f"📊 Total rules: {total_rules}")
     print(f"   - Exact domains: {len(rules.get('domains', []))}")
     print(f"   - Domain suffixes: {len(rules.get('domain_suffixes', []))}")
     print(f"   - Domain keywords: {len(rules.get('domain_keywords', []))}")
+    print(f"   - Domain regexes: {len(rules.get('domain_regexes', []))} (only in {', '.join(REGEX_FORMATS)})")
     print(f"   - IP CIDRs: {len(rules.get('ip_cidrs', []))}")
     print(f"   - IP ASNs: {len(rules.get('ip_asns', []))}")
     print()
     
-    # 确保输出目录存在
-    rules_dir = project_root / 'rules'
-    rules_dir.mkdir(parents=True, exist_ok=True)
-    
     # 生成各种格式的规则
-    generate_clash_rules(rules, str(rules_dir / 'clash.yaml'))
-    generate_surge_rules(rules, str(rules_dir / 'surge.conf'))
-    generate_quantumult_x_rules(rules, str(rules_dir / 'quantumult-x.conf'))
-    generate_shadowrocket_rules(rules, str(rules_dir / 'shadowrocket.conf'))
-    generate_singbox_rules(rules, str(rules_dir / 'sing-box.json'))
-    generate_loon_rules(rules, str(rules_dir / 'loon.conf'))
+    build_artifacts(rules, rules_dir)
+    
+    # 生成内容哈希副本、预压缩版本和发布清单
+    write_release_artifacts(rules_dir, release_names(rules_dir))
+    
+    if budget and not report_memory(budget):
+        sys.exit(1)
     
     print("\n✨ Rule generation completed!")
 
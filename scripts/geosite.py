@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+geosite.dat / geoip.dat（v2ray routercommon protobuf）流式读写
+Streaming reader and writer for v2ray/xray geosite.dat and geoip.dat files
+"""
+
+import sys
+import mmap
+import ipaddress
+from typing import List, Dict, Tuple, Iterator, Iterable, Callable
+
+from v2fly import (
+    Entry, KIND_DOMAIN, KIND_FULL, KIND_KEYWORD, KIND_REGEXP,
+    matches_filter, parse_spec,
+)
+
+# routercommon.Domain.Type -> v2fly 规则类型
+GEOSITE_TYPES = {
+    0: KIND_KEYWORD,  # Plain：子串匹配
+    1: KIND_REGEXP,   # Regex
+    2: KIND_DOMAIN,   # Domain：后缀匹配
+    3: KIND_FULL,     # Full：完整匹配
+}
+GEOSITE_CODES = {kind: code for code, kind in GEOSITE_TYPES.items()}
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_BYTES = 2
+WIRE_FIXED32 = 5
+
+
+def read_varint(buf, pos: int) -> Tuple[int, int]:
+    """读取 varint，返回 (值, 新位置)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def iter_fields(buf, pos: int, end: int) -> Iterator[Tuple[int, int, int, int]]:
+    """遍历 [pos, end) 内的字段，产出 (字段号, 线类型, 值或起点, 终点)
+
+    长度分隔字段只返回区间，不复制内容。
+    """
+    while pos < end:
+        key, pos = read_varint(buf, pos)
+        field, wire = key >> 3, key & 0x07
+        if wire == WIRE_VARINT:
+            value, pos = read_varint(buf, pos)
+            yield field, wire, value, pos
+        elif wire == WIRE_BYTES:
+            length, pos = read_varint(buf, pos)
+            yield field, wire, pos, pos + length
+            pos += length
+        elif wire == WIRE_FIXED64:
+            pos += 8
+        elif wire == WIRE_FIXED32:
+            pos += 4
+        else:
+            raise ValueError(f"unsupported wire type {wire} at offset {pos}")
+
+
+def encode_varint(value: int) -> bytes:
+    """编码 varint"""
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _key(field: int, wire: int) -> bytes:
+    return encode_varint(field << 3 | wire)
+
+
+def _bytes_field(field: int, payload: bytes) -> bytes:
+    return _key(field, WIRE_BYTES) + encode_varint(len(payload)) + payload
+
+
+def iter_categories(buf) -> Iterator[Tuple[str, int, int]]:
+    """遍历 GeoSiteList，产出 (类别名, 起点, 终点)，不解码其中的域名"""
+    for field, wire, start, end in iter_fields(buf, 0, len(buf)):
+        if field != 1 or wire != WIRE_BYTES:
+            continue
+        code = ''
+        for sub_field, sub_wire, sub_start, sub_end in iter_fields(buf, start, end):
+            if sub_field == 1 and sub_wire == WIRE_BYTES:
+                code = bytes(buf[sub_start:sub_end]).decode('utf-8')
+                break
+        yield code, start, end
+
+
+def decode_domains(buf, start: int, end: int) -> Iterator[Entry]:
+    """解码一个 GeoSite 中的全部 Domain"""
+    for field, wire, d_start, d_end in iter_fields(buf, start, end):
+        if field != 2 or wire != WIRE_BYTES:
+            continue
+        kind, value, attrs = KIND_KEYWORD, '', []
+        for sub_field, sub_wire, s_start, s_end in iter_fields(buf, d_start, d_end):
+            if sub_field == 1 and sub_wire == WIRE_VARINT:
+                kind = GEOSITE_TYPES.get(s_start, KIND_KEYWORD)
+            elif sub_field == 2 and sub_wire == WIRE_BYTES:
+                value = bytes(buf[s_start:s_end]).decode('utf-8')
+            elif sub_field == 3 and sub_wire == WIRE_BYTES:
+                for a_field, a_wire, a_start, a_end in iter_fields(buf, s_start, s_end):
+                    if a_field == 1 and a_wire == WIRE_BYTES:
+                        attrs.append(bytes(buf[a_start:a_end]).decode('utf-8').lower())
+        if value:
+            if kind != KIND_REGEXP:
+                value = value.lower()
+            yield kind, value, tuple(sorted(attrs))
+
+
+def decode_cidrs(buf, start: int, end: int) -> Iterator[str]:
+    """解码一个 GeoIP 中的全部 CIDR"""
+    for field, wire, c_start, c_end in iter_fields(buf, start, end):
+        if field != 2 or wire != WIRE_BYTES:
+            continue
+        ip, prefix = b'', 0
+        for sub_field, sub_wire, s_start, s_end in iter_fields(buf, c_start, c_end):
+            if sub_field == 1 and sub_wire == WIRE_BYTES:
+                ip = bytes(buf[s_start:s_end])
+            elif sub_field == 2 and sub_wire == WIRE_VARINT:
+                prefix = s_start
+        if len(ip) in (4, 16):
+            yield str(ipaddress.ip_network((ip, prefix), strict=False))
+
+
+def read_geosite(path: str, specs: Iterable[str]) -> Dict[str, List[Entry]]:
+    """从 geosite.dat 中只解码请求的类别（支持 "name@attr" 过滤）
+
+    文件通过 mmap 映射，未请求的类别按长度直接跳过。
+    """
+    specs = list(specs)
+    wanted = {}
+    for spec in specs:
+        name, attr_filter = parse_spec(spec)
+        wanted.setdefault(name.lower(), []).append((spec, attr_filter))
+
+    results = {spec: [] for spec in specs}
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return results
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for code, start, end in iter_categories(buf):
+                targets = wanted.get(code.lower())
+                if not targets:
+                    continue
+                entries = list(decode_domains(buf, start, end))
+                for spec, attr_filter in targets:
+                    results[spec] = [e for e in entries if matches_filter(e[2], attr_filter)]
+    return results
+
+
+def read_geoip(path: str, codes: Iterable[str]) -> Dict[str, List[str]]:
+    """从 geoip.dat 中只解码请求的类别"""
+    codes = list(codes)
+    wanted = {code.lower(): code for code in codes}
+    results = {code: [] for code in codes}
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return results
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for code, start, end in iter_categories(buf):
+                if code.lower() in wanted:
+                    results[wanted[code.lower()]] = list(decode_cidrs(buf, start, end))
+    return results
+
+
+def count_entries(path: str) -> int:
+    """统计文件中所有类别的条目数（geosite 的 Domain 与 geoip 的 CIDR 都是字段 2）"""
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return sum(1 for _, start, end in iter_categories(buf)
+                       for field, wire, _, _ in iter_fields(buf, start, end)
+                       if field == 2 and wire == WIRE_BYTES)
+
+
+def encode_domain(entry: Entry) -> bytes:
+    """编码一个 routercommon.Domain 消息（v2fly 属性编码为 bool 属性）"""
+    kind, value, attrs = entry
+    code = GEOSITE_CODES[kind]
+    message = _key(1, WIRE_VARINT) + encode_varint(code) if code else b''
+    message += _bytes_field(2, value.encode('utf-8'))
+    for attr in attrs:
+        message += _bytes_field(3, _bytes_field(1, attr.encode('utf-8')) + _key(2, WIRE_VARINT) + b'\x01')
+    return message
+
+
+def encode_cidr(network) -> bytes:
+    """编码一个 routercommon.CIDR 消息"""
+    network = ipaddress.ip_network(network, strict=False)
+    message = _bytes_field(1, network.network_address.packed)
+    if network.prefixlen:
+        message += _key(2, WIRE_VARINT) + encode_varint(network.prefixlen)
+    return message
+
+
+def _write_list(path: str, categories: Dict[str, Callable[[], Iterable]],
+                encode: Callable[[object], bytes]) -> Dict[str, int]:
+    """流式写出 GeoSiteList / GeoIPList，返回 类别 -> 条目数
+
+    嵌套消息必须先写长度，因此每个类别遍历两遍：第一遍只累计编码后的长度，第二遍逐条写出，
+    内存占用与类别大小无关。categories 的值是返回条目迭代器的函数，会被调用两次。
+    类别名写在每个类别的最前面：Xray 按这个位置直接扫描类别名，跳过其余类别。
+    """
+    counts = {}
+    with open(path, 'wb') as f:
+        for code, entries in categories.items():
+            head = _bytes_field(1, code.upper().encode('utf-8'))
+            size, count = len(head), 0
+            for entry in entries():
+                length = len(encode(entry))
+                size += 1 + len(encode_varint(length)) + length
+                count += 1
+            f.write(_key(1, WIRE_BYTES) + encode_varint(size) + head)
+            for entry in entries():
+                f.write(_bytes_field(2, encode(entry)))
+            counts[code] = count
+    return counts
+
+
+def write_geosite(path: str, categories: Dict[str, Callable[[], Iterable[Entry]]]) -> Dict[str, int]:
+    """写出 geosite.dat；类别名按 v2fly 惯例大写"""
+    return _write_list(path, categories, encode_domain)
+
+
+def write_geoip(path: str, categories: Dict[str, Callable[[], Iterable[str]]]) -> Dict[str, int]:
+    """写出 geoip.dat；条目为 CIDR 字符串或 ip_network"""
+    return _write_list(path, categories, encode_cidr)
+
+
+def list_categories(path: str) -> List[str]:
+    """列出文件中的所有类别名"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        return [code for code, _, _ in iter_categories(buf)]
+
+
+def main():
+    geoip = '--geoip' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--geoip']
+    if not args:
+        print("Usage: python geosite.py [--geoip] file.dat [category ...]")
+        sys.exit(1)
+
+    path, specs = args[0], args[1:]
+    if not specs:
+        categories = list_categories(path)
+        print(f"📦 {len(categories)} categories: {', '.join(categories)}")
+        return
+
+    results = read_geoip(path, specs) if geoip else read_geosite(path, specs)
+    for spec, entries in results.items():
+        print(f"✅ {spec}: {len(entries)} entries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+规则历史库：每次运行的规范规则集写入本地 SQLite，规则只存一次，成员关系按运行区间压缩记录
+Rule history in SQLite: interned rules, per-source membership intervals and indexed queries
+"""
+
+import sys
+import json
+import sqlite3
+import argparse
+import subprocess
+from datetime import datetime
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 默认的历史库位置
+HISTORY_DB = PROJECT_ROOT / '.cache' / 'rule_history.sqlite3'
+
+# 规范规则集（最终输出的 ai_projects.json）使用的来源名，其余来源名与 RuleParser.name 一致
+CANONICAL_SOURCE = '*'
+
+RULE_KINDS = ('domains', 'domain_suffixes', 'domain_keywords', 'domain_regexes', 'ip_cidrs', 'ip_asns')
+
+# intervals 中 [first_run, last_run] 为规则连续出现的运行区间，last_run 为 NULL 表示仍在最新一次运行中；
+# 未变化的规则在新运行中不产生任何写入
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    label TEXT,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE (value, kind)
+);
+CREATE INDEX IF NOT EXISTS rules_kind ON rules (kind);
+CREATE TABLE IF NOT EXISTS intervals (
+    rule_id INTEGER NOT NULL,
+    source_id INTEGER NOT NULL,
+    first_run INTEGER NOT NULL,
+    last_run INTEGER,
+    PRIMARY KEY (rule_id, source_id, first_run)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS intervals_first ON intervals (source_id, first_run);
+CREATE INDEX IF NOT EXISTS intervals_last ON intervals (source_id, last_run);
+"""
+
+Rule = Tuple[str, str]
+
+
+def parser_sources(parser) -> Dict[Rule, Iterable[str]]:
+    """从合并后的 RuleParser 取出每条规则的来源"""
+    sources = dict(parser.rule_sources)
+    sources.update((('ip_cidrs', cidr), names) for cidr, names in parser.ip_cidr_sources.items())
+    return sources
+
+
+def file_sources(data: dict) -> Dict[Rule, Iterable[str]]:
+    """ai_projects.json 中只保存了 CIDR 的来源"""
+    return {('ip_cidrs', cidr): names for cidr, names in data.get('ip_cidr_sources', {}).items()}
+
+
+class RuleHistory:
+    """规则历史库"""
+
+    def __init__(self, path: Path = HISTORY_DB):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> 'RuleHistory':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _source_id(self, name: str) -> Optional[int]:
+        row = self.conn.execute("SELECT id FROM sources WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, rules: Dict[str, Iterable[str]], sources: Optional[Dict[Rule, Iterable[str]]] = None,
+               label: Optional[str] = None, created_at: Optional[str] = None) -> int:
+        """记录一次运行，返回运行编号
+
+        规则先写入临时表，再用集合运算关闭消失规则的区间、为新出现的规则打开区间，
+        写入量只与变化量成正比。
+        """
+        sources = sources or {}
+        total = 0
+
+        def memberships() -> Iterator[Tuple[str, str, str]]:
+            nonlocal total
+            for kind in RULE_KINDS:
+                for value in rules.get(kind, ()):
+                    total += 1
+                    yield kind, value, CANONICAL_SOURCE
+                    for name in sources.get((kind, value), ()):
+                        yield kind, value, name
+
+        conn = self.conn
+        with conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS current (kind TEXT, value TEXT, source TEXT)")
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS current_ids "
+                         "(rule_id INTEGER, source_id INTEGER, PRIMARY KEY (rule_id, source_id)) WITHOUT ROWID")
+            conn.execute("DELETE FROM current")
+            conn.execute("DELETE FROM current_ids")
+            conn.executemany("INSERT INTO current VALUES (?, ?, ?)", memberships())
+            conn.execute("INSERT OR IGNORE INTO rules (kind, value) SELECT DISTINCT kind, value FROM current")
+            conn.execute("INSERT OR IGNORE INTO sources (name) SELECT DISTINCT source FROM current")
+            conn.execute("""
+                INSERT OR IGNORE INTO current_ids
+                SELECT r.id, s.id FROM current c
+                JOIN rules r ON r.value = c.value AND r.kind = c.kind
+                JOIN sources s ON s.name = c.source
+            """)
+
+            previous = conn.execute("SELECT max(id) FROM runs").fetchone()[0]
+            run = conn.execute(
+                "INSERT INTO runs (created_at, label, total) VALUES (?, ?, ?)",
+                (created_at or datetime.now().isoformat(timespec='seconds'), label, total),
+            ).lastrowid
+            conn.execute("""
+                UPDATE intervals SET last_run = ?
+                WHERE last_run IS NULL AND NOT EXISTS (
+                    SELECT 1 FROM current_ids c
+                    WHERE c.rule_id = intervals.rule_id AND c.source_id = intervals.source_id)
+            """, (previous,))
+            conn.execute("""
+                INSERT INTO intervals (rule_id, source_id, first_run)
+                SELECT c.rule_id, c.source_id, ? FROM current_ids c
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM intervals i
+                    WHERE i.rule_id = c.rule_id AND i.source_id = c.source_id AND i.last_run IS NULL)
+            """, (run,))
+            conn.execute("DELETE FROM current")
+            conn.execute("DELETE FROM current_ids")
+        return run
+
+    def resolve_run(self, ref: Optional[str] = None) -> int:
+        """解析运行引用：编号、latest、latest~N 或日期（取该日最后一次运行）"""
+        ref = (ref or 'latest').strip()
+        latest = self.conn.execute("SELECT max(id) FROM runs").fetchone()[0]
+        if latest is None:
+            raise ValueError("history is empty")
+        if ref.startswith('latest'):
+            offset = int(ref[len('latest~'):] or 0) if ref != 'latest' else 0
+            row = self.conn.execute("SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?", (offset,)).fetchone()
+        elif ref.isdigit():
+            row = self.conn.execute("SELECT id FROM runs WHERE id = ?", (int(ref),)).fetchone()
+        else:
+            try:
+                datetime.fromisoformat(ref)
+            except ValueError:
+                raise ValueError(f"invalid run reference {ref!r}") from None
+            row = self.conn.execute("SELECT max(id) FROM runs WHERE substr(created_at, 1, ?) <= ?",
+                                    (len(ref), ref)).fetchone()
+            row = row if row and row[0] is not None else None
+        if not row:
+            raise ValueError(f"no run matches {ref!r}")
+        return row[0]
+
+    def runs(self, limit: int = 20) -> List[dict]:
+        rows = self.conn.execute(
+            "SELECT id, created_at, label, total FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [{'run': r[0], 'created_at': r[1], 'label': r[2], 'total': r[3]} for r in rows]
+
+    def diff(self, old: int, new: int, source: str = CANONICAL_SOURCE) -> Dict[str, List[Rule]]:
+        """两次运行之间新增和移除的规则
+
+        新增的规则必然有一个区间开始于 (old, new]，移除的规则必然有一个区间结束于 [old, new)，
+        两个查询都只扫描索引上的一段范围。
+        """
+        source_id = self._source_id(source)
+        if source_id is None or old == new:
+            return {'added': [], 'removed': []}
+        if old > new:
+            old, new = new, old
+        added = self.conn.execute("""
+            SELECT r.kind, r.value FROM intervals i JOIN rules r ON r.id = i.rule_id
+            WHERE i.source_id = :s AND i.first_run > :old AND i.first_run <= :new
+              AND (i.last_run IS NULL OR i.last_run >= :new)
+              AND NOT EXISTS (SELECT 1 FROM intervals j
+                              WHERE j.rule_id = i.rule_id AND j.source_id = :s AND j.first_run <= :old
+                                AND (j.last_run IS NULL OR j.last_run >= :old))
+            ORDER BY r.kind, r.value
+        """, {'s': source_id, 'old': old, 'new': new}).fetchall()
+        removed = self.conn.execute("""
+            SELECT r.kind, r.value FROM intervals i JOIN rules r ON r.id = i.rule_id
+            WHERE i.source_id = :s AND i.last_run >= :old AND i.last_run < :new AND i.first_run <= :old
+              AND NOT EXISTS (SELECT 1 FROM intervals j
+                              WHERE j.rule_id = i.rule_id AND j.source_id = :s AND j.first_run <= :new
+                                AND (j.last_run IS NULL OR j.last_run >= :new))
+            ORDER BY r.kind, r.value
+        """, {'s': source_id, 'old': old, 'new': new}).fetchall()
+        return {'added': added, 'removed': removed}
+
+    def lifetime(self, value: str, kind: Optional[str] = None) -> List[dict]:
+        """规则的所有出现区间（按来源），removed_at 为规则消失的那次运行"""
+        rows = self.conn.execute("""
+            SELECT r.kind, s.name, i.first_run, i.last_run, f.created_at,
+                   (SELECT min(n.id) FROM runs n WHERE n.id > i.last_run)
+            FROM rules r
+            JOIN intervals i ON i.rule_id = r.id
+            JOIN sources s ON s.id = i.source_id
+            JOIN runs f ON f.id = i.first_run
+            WHERE r.value = ? AND (? IS NULL OR r.kind = ?)
+            ORDER BY r.kind, s.name != ?, s.name, i.first_run
+        """, (value, kind, kind, CANONICAL_SOURCE)).fetchall()
+        result = []
+        for rule_kind, source, first_run, last_run, first_at, removed_run in rows:
+            removed_at = None
+            if removed_run is not None:
+                removed_at = self.conn.execute("SELECT created_at FROM runs WHERE id = ?",
+                                               (removed_run,)).fetchone()[0]
+            result.append({
+                'kind': rule_kind,
+                'source': source,
+                'first_run': first_run,
+                'added_at': first_at,
+                'last_run': last_run,
+                'removed_run': removed_run,
+                'removed_at': removed_at,
+            })
+        return result
+
+    def churn(self, old: int, new: int) -> List[dict]:
+        """每个来源在 (old, new] 之间新增和移除的规则数"""
+        rows = self.conn.execute("""
+            SELECT s.name,
+                   (SELECT count(*) FROM intervals i
+                    WHERE i.source_id = s.id AND i.first_run > :old AND i.first_run <= :new),
+                   (SELECT count(*) FROM intervals i
+                    WHERE i.source_id = s.id AND i.last_run >= :old AND i.last_run < :new)
+            FROM sources s ORDER BY s.name != :canonical, s.name
+        """, {'old': old, 'new': new, 'canonical': CANONICAL_SOURCE}).fetchall()
+        return [{'source': name, 'added': added, 'removed': removed}
+                for name, added, removed in rows if added or removed]
+
+
+def backfill_from_git(history: RuleHistory, data_file: Path) -> int:
+    """按提交顺序把 git 历史中的 ai_projects.json 导入空的历史库，返回导入的运行数"""
+    if history.conn.execute("SELECT count(*) FROM runs").fetchone()[0]:
+        raise ValueError("backfill requires an empty history database")
+    relative = data_file.resolve().relative_to(PROJECT_ROOT.resolve()).as_posix()
+    log = subprocess.run(['git', 'log', '--reverse', '--format=%H %cI', '--', relative],
+                         cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout
+    count = 0
+    for line in log.splitlines():
+        commit, committed_at = line.split(' ', 1)
+        shown = subprocess.run(['git', 'show', f"{commit}:{relative}"],
+                               cwd=PROJECT_ROOT, capture_output=True, text=True)
+        if shown.returncode != 0:
+            continue
+        try:
+            data = json.loads(shown.stdout)
+        except ValueError:
+            continue
+        history.record(data.get('rules', {}), file_sources(data), label=commit[:12], created_at=committed_at)
+        count += 1
+    return count
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--db', default=str(HISTORY_DB), help='history database path')
+    common.add_argument('--json', action='store_true', help='print results as JSON')
+    parser = argparse.ArgumentParser(description='Query the rule history database')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', parents=[common], help='record data/ai_projects.json as a new run')
+    record.add_argument('--label', help='label for the run, e.g. a commit hash')
+    commands.add_parser('backfill', parents=[common],
+                        help='import every committed data/ai_projects.json into an empty database')
+    runs = commands.add_parser('runs', parents=[common], help='list recent runs')
+    runs.add_argument('--limit', type=int, default=20)
+    diff = commands.add_parser('diff', parents=[common], help='rules added and removed between two runs')
+    diff.add_argument('old', nargs='?', default='latest~1', help='run id, latest~N or date (default: latest~1)')
+    diff.add_argument('new', nargs='?', default='latest')
+    diff.add_argument('--source', default=CANONICAL_SOURCE, help="source name ('*' is the merged output)")
+    lifetime = commands.add_parser('lifetime', parents=[common], help='when a rule entered and left the list, per source')
+    lifetime.add_argument('value')
+    lifetime.add_argument('--kind', choices=RULE_KINDS)
+    churn = commands.add_parser('churn', parents=[common], help='rules added and removed per source')
+    churn.add_argument('old', nargs='?', default=None, help='run id, latest~N or date (default: first run)')
+    churn.add_argument('new', nargs='?', default='latest')
+    args = parser.parse_args()
+
+    data_file = PROJECT_ROOT / 'data' / 'ai_projects.json'
+    with RuleHistory(args.db) as history:
+        try:
+            if args.command == 'record':
+                with open(data_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                result = {'run': history.record(data.get('rules', {}), file_sources(data), args.label)}
+            elif args.command == 'backfill':
+                result = {'runs': backfill_from_git(history, data_file)}
+            elif args.command == 'runs':
+                result = history.runs(args.limit)
+            elif args.command == 'diff':
+                old, new = history.resolve_run(args.old), history.resolve_run(args.new)
+                result = {'old': old, 'new': new, **history.diff(old, new, args.source)}
+            elif args.command == 'lifetime':
+                result = history.lifetime(args.value.lower(), args.kind)
+            else:
+                old = history.resolve_run(args.old) if args.old else 0
+                new = history.resolve_run(args.new)
+                result = {'old': old, 'new': new, 'sources': history.churn(old, new)}
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+
+    if args.command == 'record':
+        print(f"🗂️  Recorded history run #{result['run']} in {args.db}")
+    elif args.command == 'backfill':
+        print(f"🗂️  Imported {result['runs']} runs from git history into {args.db}")
+    elif args.command == 'runs':
+        for run in result:
+            print(f"   #{run['run']:<6} {run['created_at']}  {run['total']:>6} rules  {run['label'] or ''}")
+    elif args.command == 'diff':
+        print(f"🔀 Run #{result['old']} -> #{result['new']}: "
+              f"+{len(result['added'])} -{len(result['removed'])}")
+        for kind, value in result['added']:
+            print(f"   + {kind:<16} {value}")
+        for kind, value in result['removed']:
+            print(f"   - {kind:<16} {value}")
+    elif args.command == 'lifetime':
+        if not result:
+            print(f"ℹ️  {args.value} never appeared in the recorded runs")
+        for item in result:
+            until = f"removed at #{item['removed_run']} ({item['removed_at']})" if item['removed_run'] \
+                else ('present' if item['last_run'] is None else f"last seen #{item['last_run']}")
+            print(f"   {item['kind']:<16} {item['source']:<14} added #{item['first_run']} ({item['added_at']}), {until}")
+    else:
+        print(f"📈 Churn between run #{result['old']} and #{result['new']}:")
+        for item in result['sources']:
+            print(f"   {item['source']:<20} +{item['added']:<6} -{item['removed']}")
+
+
+if __name__ == '__main__':
+    main()
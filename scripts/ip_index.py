@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+IP 前缀基数树索引：最长前缀匹配与跨来源的重叠分析
+Packed patricia tree over IPv4/IPv6 prefixes with overlap and conflict analysis
+"""
+
+import json
+import bisect
+import socket
+import argparse
+from array import array
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 来源缺失时使用的名称
+DEFAULT_SOURCE = 'merged'
+
+_FAMILIES = {4: (socket.AF_INET, 32, 4), 6: (socket.AF_INET6, 128, 16)}
+
+
+def parse_address(ip: str) -> Tuple[int, int]:
+    """解析 IP 地址为 (版本, 整数)；比 ipaddress 模块快一个数量级"""
+    version = 6 if ':' in ip else 4
+    return version, int.from_bytes(socket.inet_pton(_FAMILIES[version][0], ip), 'big')
+
+
+def parse_prefix(cidr: str) -> Tuple[int, int, int]:
+    """解析 CIDR 为 (版本, 网络地址整数, 前缀长度)，主机位会被清零"""
+    address, _, length = cidr.partition('/')
+    version, value = parse_address(address)
+    width = _FAMILIES[version][1]
+    length = int(length) if length else width
+    if not 0 <= length <= width:
+        raise ValueError(cidr)
+    host_bits = width - length
+    return version, value >> host_bits << host_bits, length
+
+
+def format_prefix(version: int, value: int, length: int) -> str:
+    family, _, size = _FAMILIES[version]
+    return f"{socket.inet_ntop(family, value.to_bytes(size, 'big'))}/{length}"
+
+
+class PatriciaTree:
+    """路径压缩的二叉基数树，节点以并行数组存储
+
+    每个节点保存前缀（左对齐到 width 位的整数）、前缀长度、左右子节点下标
+    和值下标；没有值的节点只是分叉点。
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self.keys = [0]
+        self.lengths = array('B', [0])
+        self.left = array('i', [-1])
+        self.right = array('i', [-1])
+        self.values = array('i', [-1])
+        # 值下标 -> 节点下标
+        self._value_nodes = {}
+
+    def __len__(self) -> int:
+        return sum(1 for v in self.values if v >= 0)
+
+    def _new_node(self, key: int, length: int, value: int) -> int:
+        self.keys.append(key)
+        self.lengths.append(length)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.values.append(value)
+        if value >= 0:
+            self._value_nodes[value] = len(self.keys) - 1
+        return len(self.keys) - 1
+
+    def insert(self, key: int, length: int, value: int):
+        """插入前缀；前缀已存在时覆盖其值"""
+        width = self.width
+        keys, lengths, left, right = self.keys, self.lengths, self.left, self.right
+        node = 0
+        while True:
+            node_length = lengths[node]
+            if length == node_length:
+                self.values[node] = value
+                self._value_nodes[value] = node
+                return
+            children = right if (key >> (width - 1 - node_length)) & 1 else left
+            child = children[node]
+            if child < 0:
+                children[node] = self._new_node(key, length, value)
+                return
+
+            child_key, child_length = keys[child], lengths[child]
+            diff = key ^ child_key
+            common = width - diff.bit_length() if diff else width
+            if common >= child_length and length >= child_length:
+                node = child
+                continue
+
+            common = min(common, length)
+            if common == length:
+                # 新前缀是子节点的祖先
+                new = self._new_node(key, length, value)
+            else:
+                # 在公共前缀处分叉
+                mask = ((1 << common) - 1) << (width - common) if common else 0
+                new = self._new_node(key & mask, common, -1)
+                leaf = self._new_node(key, length, value)
+                (right if (key >> (width - 1 - common)) & 1 else left)[new] = leaf
+            (right if (child_key >> (width - 1 - common)) & 1 else left)[new] = child
+            children[node] = new
+            return
+
+    def longest_match(self, address: int) -> int:
+        """最长前缀匹配，返回值下标，未命中返回 -1"""
+        width = self.width
+        keys, lengths, left, right, values = self.keys, self.lengths, self.left, self.right, self.values
+        best = -1
+        node = 0
+        while node >= 0:
+            length = lengths[node]
+            if (address ^ keys[node]) >> (width - length):
+                break
+            if values[node] >= 0:
+                best = values[node]
+            if length == width:
+                break
+            node = right[node] if (address >> (width - 1 - length)) & 1 else left[node]
+        return best
+
+    def flatten(self) -> Tuple[List[int], array]:
+        """把嵌套的前缀展开为互不重叠的区间表 (起点列表, 最具体前缀的值下标)
+
+        批量查询时对区间表做二分查找，比逐层遍历树快一个数量级。
+        """
+        starts, values = [], array('i')
+
+        def emit(position: int, value: int):
+            if starts and starts[-1] == position:
+                values[-1] = value
+            else:
+                starts.append(position)
+                values.append(value)
+
+        width = self.width
+        open_ranges = []
+        # walk() 按前序遍历，前缀按起点升序、同起点时由宽到窄
+        for value, _ in self.walk():
+            node = self._value_nodes[value]
+            start = self.keys[node]
+            end = start | ((1 << (width - self.lengths[node])) - 1)
+            while open_ranges and open_ranges[-1][0] < start:
+                closed, _ = open_ranges.pop()
+                emit(closed + 1, open_ranges[-1][1] if open_ranges else -1)
+            open_ranges.append((end, value))
+            emit(start, value)
+        while open_ranges:
+            closed, _ = open_ranges.pop()
+            emit(closed + 1, open_ranges[-1][1] if open_ranges else -1)
+        return starts, values
+
+    def walk(self) -> Iterator[Tuple[int, List[int]]]:
+        """深度优先遍历有值节点，产出 (值下标, 祖先值下标列表)"""
+        stack = [(0, ())]
+        while stack:
+            node, ancestors = stack.pop()
+            value = self.values[node]
+            if value >= 0:
+                yield value, list(ancestors)
+                ancestors = ancestors + (value,)
+            for child in (self.right[node], self.left[node]):
+                if child >= 0:
+                    stack.append((child, ancestors))
+
+
+class PrefixIndex:
+    """合并模型中所有 IPv4/IPv6 前缀的索引，记录每个前缀的来源"""
+
+    def __init__(self):
+        self.trees = {4: PatriciaTree(32), 6: PatriciaTree(128)}
+        self.networks = []
+        self.sources = []
+        self._positions = {}
+        # 批量查询用的区间表，插入新前缀后失效
+        self._flat = None
+
+    def add(self, cidr: str, sources: Iterable[str] = (DEFAULT_SOURCE,)) -> bool:
+        """添加前缀，同一前缀多次添加时合并来源"""
+        try:
+            prefix = parse_prefix(cidr.strip())
+        except (ValueError, OSError):
+            return False
+        position = self._positions.get(prefix)
+        if position is None:
+            position = len(self.networks)
+            self._positions[prefix] = position
+            self.networks.append(format_prefix(*prefix))
+            self.sources.append(set())
+            version, value, length = prefix
+            self.trees[version].insert(value, length, position)
+            self._flat = None
+        self.sources[position].update(sources)
+        return True
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """返回包含该 IP 的最长前缀"""
+        version, value = parse_address(ip)
+        position = self.trees[version].longest_match(value)
+        return self.networks[position] if position >= 0 else None
+
+    def lookup_many(self, ips: Iterable[str]) -> Dict[str, Optional[str]]:
+        """批量最长前缀匹配，使用展开后的区间表做二分查找"""
+        if self._flat is None:
+            self._flat = {version: tree.flatten() for version, tree in self.trees.items()}
+        flat, networks = self._flat, self.networks
+        results = {}
+        for ip in ips:
+            try:
+                version, value = parse_address(ip.strip())
+            except (ValueError, OSError):
+                results[ip] = None
+                continue
+            starts, values = flat[version]
+            i = bisect.bisect_right(starts, value) - 1
+            position = values[i] if i >= 0 else -1
+            results[ip] = networks[position] if position >= 0 else None
+        return results
+
+    def overlaps(self) -> List[dict]:
+        """列出被更宽前缀包含的前缀（CIDR 之间的重叠只有包含关系）"""
+        result = []
+        for tree in self.trees.values():
+            for position, ancestors in tree.walk():
+                if not ancestors:
+                    continue
+                outer = ancestors[-1]
+                inner_sources, outer_sources = self.sources[position], self.sources[outer]
+                result.append({
+                    'prefix': self.networks[position],
+                    'sources': sorted(inner_sources),
+                    'contained_in': self.networks[outer],
+                    'contained_in_sources': sorted(outer_sources),
+                    'all_containing': [self.networks[a] for a in ancestors],
+                    'cross_source': not inner_sources & outer_sources,
+                })
+        return sorted(result, key=lambda item: item['prefix'])
+
+    def duplicates(self) -> List[dict]:
+        """同一前缀由多个来源提供"""
+        return [
+            {'prefix': network, 'sources': sorted(sources)}
+            for network, sources in zip(self.networks, self.sources) if len(sources) > 1
+        ]
+
+    def report(self) -> dict:
+        overlaps = self.overlaps()
+        return {
+            'total_prefixes': len(self.networks),
+            'ipv4_prefixes': len(self.trees[4]),
+            'ipv6_prefixes': len(self.trees[6]),
+            'redundant': overlaps,
+            'cross_source_redundant': [o for o in overlaps if o['cross_source']],
+            'duplicates': self.duplicates(),
+        }
+
+
+def build_index_from_data(data: dict, extra: Dict[str, Iterable[str]] = None) -> PrefixIndex:
+    """从 ai_projects.json 的内容构建索引，可附加额外的来源"""
+    index = PrefixIndex()
+    cidr_sources = data.get('ip_cidr_sources', {})
+    for cidr in data.get('rules', {}).get('ip_cidrs', []):
+        index.add(cidr, cidr_sources.get(cidr) or [DEFAULT_SOURCE])
+    for source, cidrs in (extra or {}).items():
+        for cidr in cidrs:
+            index.add(cidr, [source])
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prefix overlap report and longest-prefix lookups')
+    parser.add_argument('--lookup', nargs='*', default=[], help='IP addresses to look up')
+    parser.add_argument('--lookup-file', help='file with one IP address per line')
+    args = parser.parse_args()
+
+    print("🚀 IP Prefix Index")
+    print("=" * 60)
+
+    data_file = PROJECT_ROOT / 'data' / 'ai_projects.json'
+    report_file = PROJECT_ROOT / 'data' / 'ip_overlap_report.json'
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    from collect_ai_projects import BUILT_IN_CIDRS
+    index = build_index_from_data(data, {'built-in': BUILT_IN_CIDRS})
+    report = index.report()
+
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"📊 {report['total_prefixes']} prefixes "
+          f"({report['ipv4_prefixes']} IPv4, {report['ipv6_prefixes']} IPv6)")
+    print(f"   - Contained in a broader prefix: {len(report['redundant'])}")
+    print(f"   - Contained across sources: {len(report['cross_source_redundant'])}")
+    print(f"   - Same prefix from several sources: {len(report['duplicates'])}")
+    for item in report['cross_source_redundant']:
+        print(f"   ⚠️  {item['prefix']} ({', '.join(item['sources'])}) ⊂ "
+              f"{item['contained_in']} ({', '.join(item['contained_in_sources'])})")
+    print(f"💾 Report saved to {report_file}")
+
+    ips = list(args.lookup)
+    if args.lookup_file:
+        with open(args.lookup_file, 'r', encoding='utf-8') as f:
+            ips.extend(line.strip() for line in f if line.strip())
+    for ip, match in index.lookup_many(ips).items():
+        print(f"   🔎 {ip} -> {match or 'no match'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+关键词规则成本分析：找出可被后缀规则替代的 DOMAIN-KEYWORD
+Analyse DOMAIN-KEYWORD cost and rewrite keywords confined to a few sites into suffix rules
+"""
+
+import json
+import argparse
+from typing import List, Set
+from pathlib import Path
+
+from psl import get_psl
+from rule_matcher import RuleMatcher, iter_suffixes
+
+# 关键词在语料中至少命中这么多主机名才允许改写，避免语料不足时误删
+DEFAULT_MIN_MATCHES = 10
+
+# 命中的主机名最多分布在这么多个可注册域名下；分散在更多站点的关键词承担着发现未知域名的作用，不能删除
+DEFAULT_MAX_DOMAINS = 3
+
+
+def load_corpus(corpus_file: str) -> List[str]:
+    """读取主机名语料（每行一个，# 开头为注释）"""
+    hosts = set()
+    with open(corpus_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            host = line.strip().lower().rstrip('.')
+            if host and not host.startswith('#'):
+                hosts.add(host)
+    return sorted(hosts)
+
+
+def _covering_suffix(host: str, keyword: str) -> str:
+    """为命中关键词的主机名选择包含该关键词的最短后缀
+
+    后缀本身包含关键词，因此新规则命中的范围永远不会超出关键词原本的范围；
+    后缀至少取到可注册域名，避免生成公共后缀规则。
+    """
+    registrable = get_psl().registrable_domain(host) or host
+    for suffix in reversed(list(iter_suffixes(host))):
+        if len(suffix) >= len(registrable) and keyword in suffix:
+            return suffix
+    return host
+
+
+def _minimize_suffixes(suffixes: Set[str]) -> List[str]:
+    """去掉已被更短后缀覆盖的后缀"""
+    result = []
+    for suffix in sorted(suffixes, key=len):
+        if not any(s in suffixes and s != suffix for s in iter_suffixes(suffix)):
+            result.append(suffix)
+    return sorted(result)
+
+
+def analyze_keywords(rules: dict, corpus: List[str], min_matches: int = DEFAULT_MIN_MATCHES,
+                     max_domains: int = DEFAULT_MAX_DOMAINS) -> dict:
+    """分析每个关键词的覆盖情况、冗余规则和改写方案
+
+    后缀改写只在语料内与关键词等价，语料之外含关键词的主机名会失去覆盖。因此只改写满足以下条件的关键词：
+    命中足够多的语料主机名，且这些主机名集中在少数几个可注册域名下、关键词就是这些站点名的一部分
+    （关键词没有出现在这些站点之外）。替换后缀就是这些可注册域名。
+    """
+    psl = get_psl()
+    matcher = RuleMatcher(rules)
+    # 关键词扫描的成本按每次连接需要比较的字符数估算；后缀查找是 O(标签数) 的哈希查找，
+    # 由所有后缀规则共享，新增后缀的边际成本可以忽略
+    avg_host_len = sum(len(h) for h in corpus) / len(corpus) if corpus else 0.0
+
+    keywords = []
+    for keyword in sorted(rules.get('domain_keywords', [])):
+        matched = [h for h in corpus if keyword in h]
+        uncovered = [h for h in matched if matcher.match_suffix(h) is None]
+        registrables = {psl.registrable_domain(h) or h for h in matched}
+        confined = bool(matched) and len(registrables) <= max_domains and \
+            all(keyword in registrable for registrable in registrables)
+        replacement = _minimize_suffixes({_covering_suffix(h, keyword) for h in uncovered})
+        rewritable = confined and len(matched) >= min_matches
+
+        item = {
+            'keyword': keyword,
+            'corpus_matches': len(matched),
+            'fully_covered': bool(matched) and not uncovered,
+            'registrable_domains': len(registrables),
+            'confined': confined,
+            'redundant_domains': sorted(d for d in rules.get('domains', []) if keyword in d),
+            'redundant_suffixes': sorted(s for s in rules.get('domain_suffixes', []) if keyword in s),
+            'replacement_suffixes': replacement,
+            'rewritable': rewritable,
+        }
+        if rewritable:
+            item['estimated_chars_saved_per_lookup'] = round(avg_host_len, 2)
+        keywords.append(item)
+
+    rewritable = [k for k in keywords if k['rewritable']]
+    return {
+        'corpus_size': len(corpus),
+        'avg_host_length': round(avg_host_len, 2),
+        'keywords': keywords,
+        'rewritable': [k['keyword'] for k in rewritable],
+        'estimated_cost': {
+            # 每次连接的关键词扫描字符数：改写前 / 改写后
+            'keyword_chars_per_lookup_before': round(avg_host_len * len(keywords), 2),
+            'keyword_chars_per_lookup_after': round(avg_host_len * (len(keywords) - len(rewritable)), 2),
+            'corpus_chars_saved': sum(len(h) for h in corpus) * len(rewritable),
+        },
+    }
+
+
+def rewrite_keywords(rules: dict, report: dict) -> dict:
+    """把可改写的关键词替换为等价的后缀规则"""
+    rewritable = {k['keyword']: k['replacement_suffixes'] for k in report['keywords'] if k['rewritable']}
+    rewritten = dict(rules)
+    rewritten['domain_keywords'] = sorted(k for k in rules.get('domain_keywords', []) if k not in rewritable)
+    suffixes = set(rules.get('domain_suffixes', []))
+    for replacement in rewritable.values():
+        suffixes.update(replacement)
+    rewritten['domain_suffixes'] = sorted(suffixes)
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse and rewrite DOMAIN-KEYWORD rules')
+    parser.add_argument('corpus', help='hostname corpus, one hostname per line')
+    parser.add_argument('--min-matches', type=int, default=DEFAULT_MIN_MATCHES,
+                        help='minimum corpus hosts a keyword must match before it can be rewritten')
+    parser.add_argument('--max-domains', type=int, default=DEFAULT_MAX_DOMAINS,
+                        help='maximum registrable domains the matches may span')
+    parser.add_argument('--apply', action='store_true',
+                        help='rewrite confined keywords into suffix rules in data/ai_projects.json')
+    args = parser.parse_args()
+
+    print("🚀 Keyword Cost Analysis")
+    print("=" * 60)
+
+    # 获取脚本所在目录的父目录（项目根目录）
+    script_dir = Path(__file__).parent
+    project_root = script_dir.parent
+    data_file = project_root / 'data' / 'ai_projects.json'
+    report_file = project_root / 'data' / 'keyword_report.json'
+
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    rules = data.get('rules', {})
+    corpus = load_corpus(args.corpus)
+
+    report = analyze_keywords(rules, corpus, args.min_matches, args.max_domains)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"📄 Corpus: {report['corpus_size']} hostnames")
+    for item in report['keywords']:
+        status = '✅ rewritable' if item['rewritable'] else '➖ keep'
+        print(f"   {status:<15} {item['keyword']:<24} matches={item['corpus_matches']:<6} "
+              f"sites={item['registrable_domains']:<4} covered={item['fully_covered']} "
+              f"-> {len(item['replacement_suffixes'])} suffixes")
+    cost = report['estimated_cost']
+    print(f"💰 Keyword scan cost per lookup: {cost['keyword_chars_per_lookup_before']} -> "
+          f"{cost['keyword_chars_per_lookup_after']} chars")
+    print(f"💾 Report saved to {report_file}")
+
+    if args.apply and report['rewritable']:
+        data['rules'] = rewrite_keywords(rules, report)
+        data['total_rules'] = sum(len(v) for v in data['rules'].values())
+        with open(data_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        print(f"✏️  Rewrote {len(report['rewritable'])} keywords in {data_file}")
+
+
+if __name__ == '__main__':
+    main()
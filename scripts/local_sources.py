@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+本地目录规则源：扫描目录 / glob 中的 .list、.yaml 和 v2fly 数据文件
+Local directory rule source with mmap line scanning and a persistent mtime/hash index
+"""
+
+import sys
+import json
+import mmap
+import glob
+import hashlib
+from typing import List, Dict, Iterator, Optional, Tuple
+from pathlib import Path
+
+from fetch_rules import RuleParser, add_v2fly_entries, merge_parsers, parse_fingerprint
+from refresh_schedule import code_fingerprint, content_digest
+from v2fly import V2flyLoader, parse_data_lines
+from external_sort import MemoryBudget
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 文件索引与单文件解析结果的缓存目录
+LOCAL_CACHE_DIR = PROJECT_ROOT / '.cache' / 'local_sources'
+
+FORMAT_LIST = 'list'
+FORMAT_YAML = 'yaml'
+FORMAT_V2FLY = 'v2fly'
+
+# 扩展名 -> 格式；v2fly 数据文件没有扩展名，需用 "v2fly:" 前缀指定目录或 glob
+SUFFIX_FORMATS = {
+    '.list': FORMAT_LIST,
+    '.txt': FORMAT_LIST,
+    '.conf': FORMAT_LIST,
+    '.yaml': FORMAT_YAML,
+    '.yml': FORMAT_YAML,
+}
+
+V2FLY_PREFIX = 'v2fly:'
+
+RULE_KINDS = ('domains', 'domain_suffixes', 'domain_keywords', 'domain_regexes', 'ip_cidrs', 'ip_asns')
+
+
+def _is_hidden(path: Path, root: Path) -> bool:
+    """跳过 .git 等隐藏目录和文件"""
+    return any(part.startswith('.') for part in path.relative_to(root).parts)
+
+
+def collect_files(targets: List[str]) -> List[Tuple[Path, str]]:
+    """把目录（递归）、glob 和文件展开为 (路径, 格式) 列表"""
+    files = []
+    for target in targets:
+        v2fly = target.startswith(V2FLY_PREFIX)
+        target = target[len(V2FLY_PREFIX):] if v2fly else target
+        path = Path(target)
+        if path.is_dir():
+            candidates = sorted(p for p in path.rglob('*') if p.is_file() and not _is_hidden(p, path))
+        elif glob.has_magic(target):
+            candidates = sorted(Path(p) for p in glob.glob(target, recursive=True) if Path(p).is_file())
+        else:
+            candidates = [path] if path.is_file() else []
+
+        for candidate in candidates:
+            if v2fly:
+                if not candidate.suffix:
+                    files.append((candidate.resolve(), FORMAT_V2FLY))
+            elif candidate.suffix.lower() in SUFFIX_FORMATS:
+                files.append((candidate.resolve(), SUFFIX_FORMATS[candidate.suffix.lower()]))
+    return list(dict.fromkeys(files))
+
+
+def iter_lines(buf) -> Iterator[str]:
+    """逐行扫描映射的文件，每次只复制一行"""
+    find = buf.find
+    size = len(buf)
+    pos = 0
+    while pos < size:
+        end = find(b'\n', pos)
+        if end < 0:
+            end = size
+        yield buf[pos:end].decode('utf-8', 'replace')
+        pos = end + 1
+
+
+def _normalize_yaml_line(line: str) -> str:
+    """把 Clash rule-provider 的 domain / ipcidr 行为写法转为经典规则行"""
+    value = line.strip()
+    if value.startswith('-'):
+        value = value[1:].strip()
+    value = value.strip('\'"')
+    if not value or ',' in value or value.endswith(':'):
+        return value
+    if value.startswith('+.'):
+        return f"DOMAIN-SUFFIX,{value[2:]}"
+    if '/' in value:
+        return f"IP-CIDR,{value}"
+    if '*' not in value and '.' in value:
+        return f"DOMAIN,{value}"
+    return value
+
+
+def parse_lines(lines: Iterator[str], fmt: str) -> dict:
+    """解析单个文件的内容，返回可 JSON 序列化的结果"""
+    if fmt == FORMAT_V2FLY:
+        return parse_data_lines(lines)
+    parser = RuleParser()
+    for line in lines:
+        parser.parse_line(_normalize_yaml_line(line) if fmt == FORMAT_YAML else line, 'clash')
+    return {kind: sorted(getattr(parser, kind)) for kind in RULE_KINDS}
+
+
+def local_fingerprint() -> str:
+    """本地文件解析结果的指纹：规则解析逻辑（见 parse_fingerprint）加上本文件的 YAML 行转换"""
+    return content_digest([parse_fingerprint(), code_fingerprint(Path(__file__))])
+
+
+class LocalSourceIndex:
+    """持久化的文件索引：路径 -> (mtime, 大小, 内容哈希)，解析结果按内容哈希缓存
+
+    mtime 与大小未变时直接复用缓存结果，不再读取文件；mtime 变化但内容哈希相同时
+    只需一次哈希计算。解析结果记录解析逻辑的指纹，指纹变化时重新解析。
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = LOCAL_CACHE_DIR, fingerprint: Optional[str] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.fingerprint = fingerprint or local_fingerprint()
+        self.entries: Dict[str, dict] = {}
+        self.parsed = 0
+        self.rehashed = 0
+        self.unchanged = 0
+        if self.cache_dir and (self.cache_dir / 'index.json').exists():
+            try:
+                with open(self.cache_dir / 'index.json', 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+            except (OSError, ValueError):
+                pass
+
+    def _result_file(self, digest: str, fmt: str) -> Optional[Path]:
+        return self.cache_dir / f"{digest}.{fmt}.json" if self.cache_dir else None
+
+    def _load_result(self, digest: str, fmt: str) -> Optional[dict]:
+        result_file = self._result_file(digest, fmt)
+        if not result_file or not result_file.exists():
+            return None
+        try:
+            with open(result_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(cached, dict) or cached.get('fingerprint') != self.fingerprint:
+            return None
+        return cached.get('result')
+
+    def _save_result(self, digest: str, fmt: str, result: dict):
+        result_file = self._result_file(digest, fmt)
+        if result_file:
+            result_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(result_file, 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': self.fingerprint, 'result': result}, f, ensure_ascii=False)
+
+    def load(self, path: Path, fmt: str) -> dict:
+        """返回文件的解析结果，优先使用索引和缓存"""
+        stat = path.stat()
+        key = str(path)
+        entry = self.entries.get(key)
+        if entry and entry['format'] == fmt and entry['mtime_ns'] == stat.st_mtime_ns \
+                and entry['size'] == stat.st_size:
+            result = self._load_result(entry['sha256'], fmt)
+            if result is not None:
+                self.unchanged += 1
+                return result
+
+        if stat.st_size == 0:
+            # 空文件无法映射
+            digest, result = hashlib.sha256().hexdigest(), parse_lines(iter(()), fmt)
+            self._save_result(digest, fmt, result)
+            self.parsed += 1
+        else:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                digest = hashlib.sha256(buf).hexdigest()
+                result = self._load_result(digest, fmt)
+                if result is not None:
+                    self.rehashed += 1
+                else:
+                    result = parse_lines(iter_lines(buf), fmt)
+                    self._save_result(digest, fmt, result)
+                    self.parsed += 1
+
+        self.entries[key] = {
+            'format': fmt,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': digest,
+        }
+        return result
+
+    def save(self):
+        if not self.cache_dir:
+            return
+        # 清理已删除文件的索引项
+        self.entries = {k: v for k, v in self.entries.items() if Path(k).exists()}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / 'index.json', 'w', encoding='utf-8') as f:
+            json.dump({'files': self.entries}, f, indent=2, ensure_ascii=False)
+
+
+def _source_name(path: Path) -> str:
+    return f"local:{path.name}"
+
+
+def load_local_sources(targets: List[str], budget: MemoryBudget = None,
+                       cache_dir: Optional[Path] = LOCAL_CACHE_DIR) -> RuleParser:
+    """加载本地目录 / glob 中的规则文件，结果与远程规则源一样参与合并"""
+    files = collect_files(targets)
+    print(f"📂 Scanning {len(files)} local rule files...")
+    index = LocalSourceIndex(cache_dir)
+    parsers = []
+    v2fly_dirs: Dict[Path, Dict[str, dict]] = {}
+
+    for path, fmt in files:
+        try:
+            result = index.load(path, fmt)
+        except (OSError, ValueError) as e:
+            print(f"  ❌ {path}: {e}")
+            continue
+        if fmt == FORMAT_V2FLY:
+            v2fly_dirs.setdefault(path.parent, {})[path.name] = result
+            continue
+        parser = RuleParser(_source_name(path), budget)
+        for kind in RULE_KINDS:
+            getattr(parser, kind).update(result[kind])
+        parsers.append(parser)
+
+    # v2fly 文件按目录解析 include:，目录内已扫描的文件直接复用解析结果
+    for directory, parsed_files in v2fly_dirs.items():
+        def read_sibling(name: str, directory: Path = directory) -> Optional[str]:
+            path = directory / name
+            return path.read_text(encoding='utf-8') if path.is_file() else None
+
+        loader = V2flyLoader(fetch=read_sibling, cache_dir=None)
+        for name, parsed in parsed_files.items():
+            loader.files[name] = {
+                'entries': [(k, v, tuple(a)) for k, v, a in parsed['entries']],
+                'includes': [(n, (tuple(i), tuple(e))) for n, (i, e) in parsed['includes']],
+            }
+        for name, entries in loader.load(sorted(parsed_files)).items():
+            parser = RuleParser(_source_name(directory / name), budget)
+            add_v2fly_entries(parser, entries)
+            parsers.append(parser)
+        for cycle in loader.cycles:
+            print(f"⚠️ v2fly include cycle skipped: {' -> '.join(cycle)}")
+
+    index.save()
+    print(f"✅ Local sources: {index.parsed} parsed, {index.rehashed} rehashed, "
+          f"{index.unchanged} unchanged since last run")
+    merged = merge_parsers(parsers, budget)
+    merged.name = 'local'
+    return merged
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python local_sources.py <dir | glob | file | v2fly:dir> ...")
+        sys.exit(1)
+
+    print("🚀 Local Rule Sources")
+    print("=" * 60)
+    parser = load_local_sources(sys.argv[1:])
+    for kind in RULE_KINDS:
+        print(f"   - {kind}: {len(getattr(parser, kind))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+流式日志分析：在代理 / DNS 日志中找出未被规则覆盖的高流量主机，按可注册域名分组并给出 AI 相关的规则建议
+Stream proxy/DNS logs in fixed memory, count unmatched hosts with a count-min sketch and suggest new rules
+"""
+
+import re
+import sys
+import gzip
+import json
+import math
+import hashlib
+import argparse
+from array import array
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+from pathlib import Path
+
+from psl import get_psl
+from rule_matcher import RuleMatcher
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 默认的建议输出文件（custom_rules.txt 语法，审核后再合并）
+SUGGESTIONS_FILE = PROJECT_ROOT / 'data' / 'log_suggestions.txt'
+
+# count-min sketch 默认误差：估计值最多高出 EPSILON × 总数，概率不低于 1 - DELTA
+DEFAULT_EPSILON = 1e-4
+DEFAULT_DELTA = 1e-3
+
+# 高频分组的容量和每组保留的示例主机数
+DEFAULT_CAPACITY = 512
+SAMPLE_HOSTS = 8
+
+# 主机名分类结果的缓存大小，日志中同一主机名会反复出现
+CLASSIFY_CACHE = 1 << 16
+
+# 写入 sketch 前在内存中合并计数的主机名上限，高频主机名只需更新一次 sketch
+FLUSH_SIZE = 1 << 14
+
+# 建议的最低相关度得分、最少的独立信号数和默认条数；
+# chat / agent / bot 这类通用词单独出现太常见（如 chat.whatsapp.com），必须有第二个信号佐证
+DEFAULT_MIN_SCORE = 2
+DEFAULT_MIN_SIGNALS = 2
+DEFAULT_LIMIT = 50
+
+# 从日志行中提取主机名的正则，按顺序尝试，每个分支恰好一个捕获组
+HOST_PATTERNS = [
+    r'\bquery\[[A-Za-z0-9]+\]\s+(\S+)',                       # dnsmasq
+    r'-->\s*([^\s:\[\]]+)',                                   # Clash / mihomo
+    r'\bCONNECT\s+([^\s:/]+)',                                # HTTP 代理 / squid
+    r'://([^\s/:?#@]+)',                                      # 含 URL 的访问日志
+    r'"(?:host|domain|server_name|sni)"\s*:\s*"([^"]+)"',     # JSON 日志
+    r'^\s*([^\s#]+)\s*$',                                     # 每行一个主机名
+]
+
+_VALID_HOST = re.compile(r'^(?=.*[a-z])[a-z0-9_-]+(?:\.[a-z0-9_-]+)+$')
+_IPV4 = re.compile(r'^\d+(?:\.\d+){3}$')
+
+# 常被 AI 服务共用的 CDN / 托管平台；这些域名下按完整主机名分组
+CDN_PROVIDERS = {
+    'akamaihd.net', 'akamaized.net', 'amazonaws.com', 'azureedge.net', 'azurefd.net',
+    'b-cdn.net', 'cloudflare.net', 'cloudfront.net', 'edgekey.net', 'edgesuite.net',
+    'fastly.net', 'fastlylb.net', 'googleusercontent.com', 'trafficmanager.net',
+}
+
+# 主机名中出现时视为 AI 相关的词：整词匹配 / 子串匹配
+AI_WORDS = {'ai', 'ml', 'llm', 'gpt', 'chat', 'chatbot', 'bot', 'agent', 'agents', 'model', 'models', 'genai'}
+AI_SUBSTRINGS = ('gpt', 'llm', 'genai', 'copilot', 'diffusion', 'inference', 'neural', 'chatbot')
+
+# 从现有规则提取特征词时忽略的通用词
+GENERIC_WORDS = {
+    'www', 'api', 'apis', 'app', 'apps', 'cdn', 'static', 'assets', 'cloud', 'edge', 'auth', 'login',
+    'mail', 'media', 'images', 'content', 'service', 'services', 'online', 'global', 'data', 'user',
+    'web', 'site', 'help', 'support', 'status', 'docs', 'blog', 'news', 'video', 'store', 'google',
+    'microsoft', 'azure', 'amazon', 'apple', 'live', 'labs', 'tech', 'network', 'platform',
+}
+
+# 各类相关度信号的权重
+SIGNAL_WEIGHTS = {
+    'rule-token': 3,
+    'ai-word': 2,
+    'ai-tld': 2,
+    'shared-domain': 1,
+    'shared-cdn': 1,
+}
+
+
+class CountMinSketch:
+    """count-min sketch（保守更新），内存只取决于宽度和深度"""
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.table = [array('Q', [0]) * width for _ in range(depth)]
+        self.total = 0
+
+    @classmethod
+    def from_error(cls, epsilon: float = DEFAULT_EPSILON, delta: float = DEFAULT_DELTA) -> 'CountMinSketch':
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def _indexes(self, key: str) -> List[int]:
+        # 双重哈希：一次 blake2b 得到两个 64 位哈希，派生出每行的下标
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """计数并返回新的估计值；只提升达到最小值的计数器，降低高估"""
+        self.total += count
+        cells = list(zip(self.table, self._indexes(key)))
+        estimate = min(row[j] for row, j in cells) + count
+        for row, j in cells:
+            if row[j] < estimate:
+                row[j] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(self.table[i][j] for i, j in enumerate(self._indexes(key)))
+
+    @property
+    def error_bound(self) -> float:
+        """估计值高出真实值的上界（以概率 1 - e^-depth 成立）"""
+        return math.e / self.width * self.total
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.width * self.depth * self.table[0].itemsize
+
+
+class HeavyHitters:
+    """固定容量的高频项列表，配合 sketch 的估计值淘汰最小项"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, sample_limit: int = SAMPLE_HOSTS):
+        self.capacity = capacity
+        self.sample_limit = sample_limit
+        self.counts: Dict[str, int] = {}
+        self.samples: Dict[str, List[str]] = {}
+        # 列表中最小计数的下界：计数只增不减，且淘汰时换入的项更大，下界始终有效
+        self._floor = 0
+
+    def offer(self, key: str, estimate: int, sample: Optional[str] = None):
+        if key not in self.counts:
+            if len(self.counts) >= self.capacity:
+                if estimate <= self._floor:
+                    return
+                smallest = min(self.counts, key=self.counts.__getitem__)
+                self._floor = self.counts[smallest]
+                if estimate <= self._floor:
+                    return
+                del self.counts[smallest]
+                del self.samples[smallest]
+            self.samples[key] = []
+        self.counts[key] = estimate
+        samples = self.samples[key]
+        if sample and sample not in samples and len(samples) < self.sample_limit:
+            samples.append(sample)
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in re.split(r'[^a-z]+', text) if w]
+
+
+class RuleProfile:
+    """现有规则的特征：可注册域名、特征词和使用的 CDN，用于判断新主机是否与 AI 服务相关"""
+
+    def __init__(self, rules: dict):
+        psl = get_psl()
+        self.registrables = set()
+        # 特征词 -> 来源可注册域名；只有来自其他域名的特征词才算新证据
+        self.tokens: Dict[str, set] = {k: {''} for k in rules.get('domain_keywords', []) if len(k) >= 4}
+        for domain in list(rules.get('domains', [])) + list(rules.get('domain_suffixes', [])):
+            registrable = psl.registrable_domain(domain)
+            if not registrable:
+                continue
+            self.registrables.add(registrable)
+            if registrable not in CDN_PROVIDERS:
+                label = registrable.split('.')[0]
+                for word in _words(label):
+                    if len(word) >= 4 and word not in GENERIC_WORDS:
+                        self.tokens.setdefault(word, set()).add(registrable)
+        self.cdns = self.registrables & CDN_PROVIDERS
+
+    def word_signals(self, names: str, registrable: str) -> List[str]:
+        """返回名称中的特征词 / AI 相关词信号；同一个词只算一个信号"""
+        words = set(_words(names))
+        signals = []
+        token = None
+        for candidate in sorted(self.tokens):
+            if self.tokens[candidate] == {registrable}:
+                continue
+            if candidate in words or (len(candidate) >= 5 and candidate in names):
+                token = candidate
+                signals.append(f"rule-token:{token}")
+                break
+        ai_words = sorted(words & AI_WORDS) or [s for s in AI_SUBSTRINGS if s in names]
+        ai_words = [w for w in ai_words if w != token]
+        if ai_words:
+            signals.append(f"ai-word:{ai_words[0]}")
+        return signals
+
+    def signals(self, key: str, hosts: Iterable[str]) -> List[str]:
+        """返回分组的相关度信号，形如 "ai-word:chat" """
+        psl = get_psl()
+        registrable = psl.registrable_domain(key) or key
+        suffix = psl.public_suffix(key)
+        names = ' '.join([key[:len(key) - len(suffix)]] + [h[:len(h) - len(suffix)] for h in hosts])
+        signals = self.word_signals(names, registrable)
+        if suffix == 'ai' or suffix.endswith('.ai'):
+            signals.append('ai-tld')
+        if registrable in self.cdns:
+            signals.append(f"shared-cdn:{registrable}")
+        elif registrable in self.registrables:
+            signals.append(f"shared-domain:{registrable}")
+        return signals
+
+    def evidence_hosts(self, key: str, hosts: List[str]) -> Optional[List[str]]:
+        """特征词只出现在个别子域名中时返回这些主机；出现在可注册域名本身或没有词信号时返回 None"""
+        psl = get_psl()
+        registrable = psl.registrable_domain(key) or key
+        suffix = psl.public_suffix(key)
+        if self.word_signals(registrable[:len(registrable) - len(suffix)], registrable):
+            return None
+        carriers = [h for h in hosts if self.word_signals(h[:len(h) - len(registrable)], registrable)]
+        return carriers or None
+
+    @staticmethod
+    def score(signals: List[str]) -> int:
+        return sum(SIGNAL_WEIGHTS[s.split(':')[0]] for s in signals)
+
+
+def group_key(host: str) -> str:
+    """按可注册域名分组；CDN 上的主机各属不同客户，按完整主机名分组"""
+    registrable = get_psl().registrable_domain(host) or host
+    return host if registrable in CDN_PROVIDERS else registrable
+
+
+def open_log(path: str) -> Iterator[str]:
+    if path == '-':
+        yield from sys.stdin
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        yield from f
+
+
+class LogAnalyzer:
+    """逐行处理日志，内存占用与日志大小无关"""
+
+    def __init__(self, rules: dict, sketch: CountMinSketch, hitters: HeavyHitters,
+                 patterns: List[str] = HOST_PATTERNS):
+        self.matcher = RuleMatcher(rules)
+        self.sketch = sketch
+        self.hitters = hitters
+        self.pattern = re.compile('|'.join(f'(?:{p})' for p in patterns))
+        self.lines = 0
+        self.hosts = 0
+        self.matched = 0
+        self.unmatched = 0
+        self.classify = lru_cache(maxsize=CLASSIFY_CACHE)(self._classify)
+        # 未命中主机名 -> [分组键, 计数]，达到 FLUSH_SIZE 时批量写入 sketch
+        self.pending: Dict[str, list] = {}
+
+    def _classify(self, host: str) -> Optional[str]:
+        """返回未命中主机名的分组键；命中规则时返回空字符串"""
+        if self.matcher.match(host):
+            return ''
+        return group_key(host)
+
+    def extract_host(self, line: str) -> Optional[str]:
+        match = self.pattern.search(line)
+        if not match:
+            return None
+        host = match.group(match.lastindex).lower().rstrip('.')
+        if not _VALID_HOST.match(host) or _IPV4.match(host):
+            return None
+        return host
+
+    def feed(self, lines: Iterable[str]):
+        for line in lines:
+            self.lines += 1
+            host = self.extract_host(line)
+            if host is None:
+                continue
+            self.hosts += 1
+            key = self.classify(host)
+            if not key:
+                self.matched += 1
+                continue
+            self.unmatched += 1
+            entry = self.pending.get(host)
+            if entry is None:
+                if len(self.pending) >= FLUSH_SIZE:
+                    self.flush()
+                self.pending[host] = [key, 1]
+            else:
+                entry[1] += 1
+        self.flush()
+
+    def flush(self):
+        for host, (key, count) in self.pending.items():
+            if host != key:
+                # 分组内各主机的计数也进入 sketch，用于给示例主机排序
+                self.sketch.add(host, count)
+            self.hitters.offer(key, self.sketch.add(key, count), host)
+        self.pending = {}
+
+    def suggestions(self, profile: RuleProfile, min_score: int = DEFAULT_MIN_SCORE,
+                    limit: int = DEFAULT_LIMIT, min_signals: int = DEFAULT_MIN_SIGNALS) -> List[dict]:
+        """按流量排序的规则建议"""
+        results = []
+        for key, count in self.hitters.top():
+            hosts = sorted(self.hitters.samples[key], key=lambda h: (-self.sketch.estimate(h), h))
+            signals = profile.signals(key, hosts)
+            score = profile.score(signals)
+            if score < min_score or len(signals) < min_signals:
+                continue
+            registrable = get_psl().registrable_domain(key) or key
+            carriers = profile.evidence_hosts(key, hosts) if key == registrable else None
+            if key == registrable and registrable in profile.registrables:
+                # 现有规则只覆盖了该域名的一部分（如 google.com 下的个别服务），只建议具体主机
+                rules = [f"DOMAIN,{host}" for host in hosts]
+            elif carriers:
+                # 证据只来自个别子域名（如 chat.example.ai），不能推广到整个可注册域名
+                rules = [f"DOMAIN,{host}" for host in carriers]
+            else:
+                rules = [f"DOMAIN-SUFFIX,{key}"]
+            results.append({
+                'group': key,
+                'requests': count,
+                'score': score,
+                'signals': signals,
+                'hosts': {host: self.sketch.estimate(host) for host in hosts},
+                'rules': rules,
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+def format_suggestions(suggestions: List[dict], analyzer: LogAnalyzer, sources: List[str]) -> str:
+    """按 custom_rules.txt 的语法输出建议"""
+    lines = [
+        "# AI all in one - Log Suggestions",
+        "# 由 log_analytics.py 根据访问日志生成，审核后可复制到 custom_rules.txt",
+        f"# 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        f"# 日志: {', '.join(sources)}",
+        f"# 共 {analyzer.lines} 行, {analyzer.hosts} 个主机名, {analyzer.unmatched} 次未命中规则",
+        "",
+        "payload:",
+    ]
+    for item in suggestions:
+        lines.append(f"# {item['group']} ~{item['requests']} requests ({', '.join(item['signals'])})")
+        lines.extend(f"  - {rule}" for rule in item['rules'])
+        lines.append("")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suggest rules for AI hosts seen in proxy/DNS logs')
+    parser.add_argument('logs', nargs='+', help="log files (.gz supported, '-' for stdin)")
+    parser.add_argument('--output', default=str(SUGGESTIONS_FILE), help='suggestions in custom_rules.txt syntax')
+    parser.add_argument('--pattern', action='append',
+                        help='regex with one capture group for the hostname (repeatable, replaces the defaults)')
+    parser.add_argument('--epsilon', type=float, default=DEFAULT_EPSILON, help='count-min sketch relative error')
+    parser.add_argument('--delta', type=float, default=DEFAULT_DELTA, help='count-min sketch failure probability')
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY, help='heavy-hitter groups to track')
+    parser.add_argument('--min-score', type=int, default=DEFAULT_MIN_SCORE)
+    parser.add_argument('--min-signals', type=int, default=DEFAULT_MIN_SIGNALS,
+                        help='independent relevance signals a group needs')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    print("🚀 Log Analytics")
+    print("=" * 60)
+
+    data_file = PROJECT_ROOT / 'data' / 'ai_projects.json'
+    with open(data_file, 'r', encoding='utf-8') as f:
+        rules = json.load(f).get('rules', {})
+
+    sketch = CountMinSketch.from_error(args.epsilon, args.delta)
+    analyzer = LogAnalyzer(rules, sketch, HeavyHitters(args.capacity), args.pattern or HOST_PATTERNS)
+    for path in args.logs:
+        print(f"📄 Reading {path}...")
+        analyzer.feed(open_log(path))
+
+    print(f"✅ {analyzer.lines} lines, {analyzer.hosts} hostnames: "
+          f"{analyzer.matched} matched, {analyzer.unmatched} unmatched")
+    print(f"🧮 Sketch {sketch.width}x{sketch.depth} ({sketch.memory_bytes // 1024} KiB), "
+          f"overestimate <= {sketch.error_bound:.0f} requests")
+
+    suggestions = analyzer.suggestions(RuleProfile(rules), args.min_score, args.limit, args.min_signals)
+    for item in suggestions:
+        print(f"   {item['requests']:>8}  {item['group']:<40} {', '.join(item['signals'])}")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(format_suggestions(suggestions, analyzer, args.logs))
+    print(f"💾 {len(suggestions)} suggestions saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+公共后缀列表（PSL）：提取可注册域名，判断公共后缀
+Public Suffix List aware registrable domain extraction backed by precompiled hash tables
+"""
+
+import sys
+import time
+import marshal
+import hashlib
+from typing import Optional
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 随仓库附带的 PSL 快照（含 ICANN 与 PRIVATE 两部分）
+PSL_FILE = PROJECT_ROOT / 'data' / 'public_suffix_list.dat'
+# 预编译的规则表缓存，源文件哈希变化时自动重建
+PSL_CACHE_FILE = PROJECT_ROOT / '.cache' / 'psl.marshal'
+# 可注册域名缓存的条目上限，避免逐行处理超大规则集时缓存本身占满内存
+MEMO_LIMIT = 1 << 16
+
+# 预编译缓存的格式版本，与源文件哈希一起校验
+FORMAT_VERSION = 3
+
+_PRIVATE_BEGIN = '// ===BEGIN PRIVATE DOMAINS==='
+
+
+def compile_psl(text: str) -> tuple:
+    """将 PSL 文本编译为平铺的表：(普通规则, 通配规则的父域, 例外规则, 分支)
+
+    前两张表的值标记规则所在的部分：True 为 ICANN 部分，False 为 PRIVATE 部分（github.io 等）；
+    分支是下面还挂着更长规则的后缀，查询时只需沿着分支向左扩展。
+    """
+    rules, wildcards, exceptions, branches = {}, {}, set(), set()
+    icann = True
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith(_PRIVATE_BEGIN):
+            icann = False
+        if not line or line.startswith('//'):
+            continue
+        rule = line.split()[0].lower()
+        rule = rule.encode('idna').decode('ascii') if not rule.isascii() else rule
+        if rule.startswith('!'):
+            rule = rule[1:]
+            exceptions.add(rule)
+        elif rule.startswith('*.'):
+            wildcards[rule[2:]] = wildcards.get(rule[2:], False) or icann
+        else:
+            rules[rule] = rules.get(rule, False) or icann
+        dot = rule.find('.')
+        while dot != -1:
+            branches.add(rule[dot + 1:])
+            dot = rule.find('.', dot + 1)
+    return rules, wildcards, exceptions, branches
+
+
+class PublicSuffixList:
+    """基于平铺哈希表的公共后缀查询：从顶级域向左逐级查表，离开规则分支即停止"""
+
+    def __init__(self, tables: tuple):
+        self.rules, self.wildcards, self.exceptions, self.branches = tables
+        # 可注册域名缓存，按是否包含 PRIVATE 部分分开
+        self._memo = {True: {}, False: {}}
+
+    def _registrable(self, host: str, private: bool) -> Optional[str]:
+        rules, wildcards, branches = self.rules, self.wildcards, self.branches
+        # 未命中任何规则时按默认规则 "*" 处理：最后一个标签是公共后缀
+        public = start = host.rfind('.') + 1
+        while start and host[start:] in branches:
+            child = host.rfind('.', 0, start - 1) + 1
+            suffix = host[child:]
+            if suffix in self.exceptions:
+                # 例外规则优先：该域名本身可注册
+                return suffix
+            section = rules.get(suffix)
+            if section is None or not (section or private):
+                section = wildcards.get(host[start:])
+            if section is not None and (section or private):
+                public = child
+            start = child
+        if not public:
+            return None
+        return host[host.rfind('.', 0, public - 1) + 1:]
+
+    def registrable_domain(self, domain: str, private: bool = True) -> Optional[str]:
+        """返回可注册域名（公共后缀 + 一级标签），本身为公共后缀时返回 None
+
+        默认包含 PRIVATE 部分：user.github.io 与 other.github.io 是两个不同的站点。
+        """
+        memo = self._memo[private]
+        result = memo.get(domain, False)
+        if result is not False:
+            return result
+        result = self._registrable(domain.lower().strip('.'), private)
+        if len(memo) < MEMO_LIMIT:
+            memo[domain] = result
+        return result
+
+    def public_suffix(self, domain: str, private: bool = True) -> str:
+        """返回域名的公共后缀"""
+        registrable = self.registrable_domain(domain, private)
+        if registrable is None:
+            return domain.lower().strip('.')
+        return registrable.partition('.')[2]
+
+    def is_public_suffix(self, domain: str, private: bool = False) -> bool:
+        """判断域名本身是否为公共后缀（如 co.uk）
+
+        默认只看 ICANN 部分：googleapis.com、azurewebsites.net 等 PRIVATE 条目是真实的服务域名，
+        上游把它们写成后缀规则是有意的，不能丢弃。
+        """
+        return self.registrable_domain(domain, private) is None
+
+
+def load_psl(psl_file: Path = PSL_FILE, cache_file: Path = PSL_CACHE_FILE) -> PublicSuffixList:
+    """加载 PSL，优先使用与源文件哈希一致的预编译缓存"""
+    raw = Path(psl_file).read_bytes()
+    digest = f"{FORMAT_VERSION}:{hashlib.sha256(raw).hexdigest()}"
+
+    cache_path = Path(cache_file) if cache_file else None
+    if cache_path and cache_path.exists():
+        try:
+            cached_digest, tables = marshal.loads(cache_path.read_bytes())
+            if cached_digest == digest:
+                return PublicSuffixList(tables)
+        except (ValueError, EOFError, TypeError):
+            pass
+
+    tables = compile_psl(raw.decode('utf-8'))
+    if cache_path:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_bytes(marshal.dumps((digest, tables)))
+    return PublicSuffixList(tables)
+
+
+_default_psl = None
+
+
+def get_psl() -> PublicSuffixList:
+    """获取进程内共享的 PSL 实例"""
+    global _default_psl
+    if _default_psl is None:
+        _default_psl = load_psl()
+    return _default_psl
+
+
+def main():
+    print("🚀 Public Suffix List")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    psl = load_psl()
+    print(f"✅ Loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for domain in sys.argv[1:]:
+        print(f"   {domain} -> suffix={psl.public_suffix(domain)} "
+              f"registrable={psl.registrable_domain(domain)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+按来源自适应的刷新调度：记录每个来源的内容哈希历史，估计变化率并据此安排下次拉取
+Adaptive per-source refresh scheduling from observed content-hash history
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 跨运行保存的调度状态，以及按来源缓存的解析结果
+SCHEDULE_FILE = PROJECT_ROOT / '.cache' / 'refresh_schedule.json'
+SOURCE_CACHE_DIR = PROJECT_ROOT / '.cache' / 'sources'
+
+# 缓存文件格式版本；解析逻辑的变化由调用方传入的指纹（见 code_fingerprint）检测
+CACHE_VERSION = 2
+
+# 两次拉取的间隔上下限（秒），可用命令行参数覆盖
+MIN_INTERVAL = 3600
+MAX_INTERVAL = 7 * 86400
+
+# 每个来源保留的最近观测数
+HISTORY_SIZE = 50
+
+# 变化率的先验：相当于已观测到一个变化的区间和一个未变化的区间，长度均为一天。
+# 观测很少时间隔保持在一天左右，观测增多后先验的影响随之消失
+PRIOR_INTERVAL = 86400
+
+# 期望每次拉取之间发生的变化次数；越小拉取越频繁
+CHANGES_PER_POLL = 0.5
+
+# 拉取失败后的重试间隔取下限
+RETRY_INTERVAL = MIN_INTERVAL
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_duration(text: str) -> int:
+    """解析 90m、6h、7d 形式的时长，返回秒数"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*', text.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid duration: {text}")
+    return int(float(match.group(1)) * DURATION_UNITS[match.group(2) or 's'])
+
+
+def format_duration(seconds: float) -> str:
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{seconds / size:.1f}{unit}"
+    return f"{seconds:.0f}s"
+
+
+def content_digest(content) -> str:
+    """原始内容的哈希；非文本内容先序列化为规范 JSON"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    elif not isinstance(content, bytes):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def code_fingerprint(*paths) -> str:
+    """解析结果所依赖的代码和数据文件的指纹，任一文件变化都会使缓存的解析结果失效"""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            digest.update(Path(path).read_bytes())
+        except OSError:
+            digest.update(str(path).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def estimate_rate(observations: List[Tuple[float, bool]]) -> float:
+    """由不规则间隔的轮询结果估计变化率（次 / 秒）
+
+    把变化看作泊松过程，间隔 I 内至少变化一次的概率为 1 - exp(-λI)，λ 取最大似然估计：
+    Σ_变化 I / (exp(λI) - 1) = Σ_未变化 I。左边随 λ 单调递减，在对数尺度上二分求解。
+    """
+    observations = list(observations) + [(PRIOR_INTERVAL, True), (PRIOR_INTERVAL, False)]
+    changed = [interval for interval, hit in observations if hit and interval > 0]
+    unchanged = sum(interval for interval, hit in observations if not hit)
+
+    def score(rate: float) -> float:
+        return sum(interval / math.expm1(min(rate * interval, 700)) for interval in changed) - unchanged
+
+    low, high = math.log(1e-10), math.log(1.0)
+    for _ in range(60):
+        mid = (low + high) / 2
+        if score(math.exp(mid)) > 0:
+            low = mid
+        else:
+            high = mid
+    return math.exp((low + high) / 2)
+
+
+class RefreshScheduler:
+    """每个来源的拉取历史、下次拉取时间和缓存的解析结果
+
+    来源用一个字符串键标识（通常是 URL）。未到期的来源直接返回缓存的解析结果；
+    到期的来源重新拉取并解析，内容哈希只用于估计变化率。解析逻辑的指纹变化时缓存失效，到期与否都会重新拉取。
+    """
+
+    def __init__(self, path: Optional[Path] = SCHEDULE_FILE, cache_dir: Optional[Path] = SOURCE_CACHE_DIR,
+                 min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL,
+                 force: bool = False, clock: Callable[[], float] = time.time):
+        self.path = Path(path) if path else None
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.force = force
+        self.clock = clock
+        self.sources: Dict[str, dict] = {}
+        # 本次运行的统计：fetched / changed / cached / failed
+        self.run: Dict[str, int] = {'fetched': 0, 'changed': 0, 'cached': 0, 'failed': 0}
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.sources = json.load(f).get('sources', {})
+            except (OSError, ValueError):
+                pass
+
+    def _state(self, key: str) -> dict:
+        return self.sources.setdefault(key, {
+            'history': [],
+            'digest': None,
+            'checked': 0,
+            'next': 0,
+            'failures': 0,
+        })
+
+    def _cache_file(self, key: str) -> Optional[Path]:
+        if not self.cache_dir:
+            return None
+        return self.cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.json"
+
+    def load_cached(self, key: str, fingerprint: Optional[str] = '') -> Optional[Any]:
+        """返回缓存的解析结果；没有缓存或缓存已失效时返回 None。fingerprint 为 None 时不检查解析逻辑指纹"""
+        cache_file = self._cache_file(key)
+        if not cache_file or not cache_file.exists():
+            return None
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get('version') != CACHE_VERSION or cached.get('key') != key:
+            return None
+        if cached.get('digest') != self.sources.get(key, {}).get('digest'):
+            return None
+        if fingerprint is not None and cached.get('fingerprint') != fingerprint:
+            return None
+        return cached.get('result')
+
+    def _store_cached(self, key: str, digest: str, fingerprint: str, result: Any):
+        cache_file = self._cache_file(key)
+        if not cache_file:
+            return
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'key': key, 'digest': digest, 'fingerprint': fingerprint,
+                       'result': result}, f, ensure_ascii=False)
+
+    def is_due(self, key: str) -> bool:
+        state = self.sources.get(key)
+        return self.force or not state or not state.get('digest') or self.clock() >= state.get('next', 0)
+
+    def needs_fetch(self, key: str, fingerprint: str = '') -> bool:
+        """到期或没有可用的缓存结果时需要拉取"""
+        return self.is_due(key) or self.load_cached(key, fingerprint) is None
+
+    def change_rate(self, key: str) -> float:
+        history = self.sources.get(key, {}).get('history', [])
+        return estimate_rate([(interval, changed) for interval, changed in history])
+
+    def next_interval(self, key: str) -> float:
+        rate = self.change_rate(key)
+        return min(self.max_interval, max(self.min_interval, CHANGES_PER_POLL / rate))
+
+    def record(self, key: str, digest: str) -> bool:
+        """记录一次成功拉取并安排下次拉取，返回内容是否变化"""
+        now = self.clock()
+        state = self._state(key)
+        changed = digest != state['digest']
+        if state['digest'] is not None and state['checked']:
+            state['history'] = state['history'][-(HISTORY_SIZE - 1):] + [[round(now - state['checked']), changed]]
+        state['digest'] = digest
+        state['checked'] = round(now)
+        state['failures'] = 0
+        state['next'] = round(now + self.next_interval(key))
+        return changed
+
+    def record_failure(self, key: str):
+        """拉取失败：不计入变化历史，稍后重试"""
+        state = self._state(key)
+        state['failures'] += 1
+        state['next'] = round(self.clock() + min(self.max_interval, max(self.min_interval, RETRY_INTERVAL)))
+
+    def refresh(self, key: str, fetch: Callable[[], Any], parse: Callable[[Any], Any],
+                digest: Callable[[Any], str] = content_digest, fingerprint: str = '') -> Optional[Any]:
+        """按调度获取一个来源的解析结果
+
+        fetch() 返回原始内容，失败时返回 None；parse(内容) 返回可 JSON 序列化的解析结果；
+        fingerprint 标识解析逻辑及其配置，与缓存不一致时视为没有缓存。
+        未到期时直接返回缓存结果；拉取失败时退回缓存结果（可能为 None）。
+        """
+        cached = self.load_cached(key, fingerprint)
+        if cached is not None and not self.is_due(key):
+            self.run['cached'] += 1
+            next_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.sources[key]['next']))
+            print(f"  ⏭️  Not due until {next_at}, using cached result: {key}")
+            return cached
+
+        content = fetch()
+        if content is None:
+            self.run['failed'] += 1
+            self.record_failure(key)
+            # 解析逻辑变化后的旧结果也好过丢掉整个来源
+            return self.load_cached(key, None)
+
+        self.run['fetched'] += 1
+        new_digest = digest(content)
+        self.run['changed'] += self.record(key, new_digest)
+        # 拉取到的内容总是重新解析：解析很便宜，结果也不会落后于解析逻辑或内容中哈希之外的字段
+        result = parse(content)
+        self._store_cached(key, new_digest, fingerprint, result)
+        return result
+
+    def next_due(self) -> Optional[float]:
+        """最早到期的来源的到期时间"""
+        return min((state['next'] for state in self.sources.values()), default=None)
+
+    def save(self):
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'sources': self.sources}, f, indent=2, ensure_ascii=False)
+
+    def describe(self, key: str) -> str:
+        state = self.sources.get(key, {})
+        history = state.get('history', [])
+        rate = self.change_rate(key)
+        parts = [
+            f"{sum(1 for _, changed in history if changed)}/{len(history)} checks changed",
+            f"~{rate * 86400:.2f} changes/day",
+            f"interval {format_duration(self.next_interval(key))}",
+            f"next {time.strftime('%Y-%m-%d %H:%M', time.localtime(state.get('next', 0)))}",
+        ]
+        if state.get('failures'):
+            parts.append(f"{state['failures']} failures")
+        return ', '.join(parts)
+
+    def report(self):
+        """打印本次运行的统计并清空（常驻服务每轮刷新各打印一次）"""
+        if not any(self.run.values()):
+            return
+        print(f"🗓️  Refresh schedule: {self.run['fetched']} fetched ({self.run['changed']} changed), "
+              f"{self.run['cached']} not due, {self.run['failed']} failed")
+        for key in self.run:
+            self.run[key] = 0
+
+
+_default_scheduler = None
+
+
+def get_scheduler() -> RefreshScheduler:
+    """获取进程内共享的调度器"""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = RefreshScheduler()
+    return _default_scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show or reset the per-source refresh schedule')
+    parser.add_argument('--reset', nargs='*', metavar='SOURCE',
+                        help='forget history for sources (all if none given); they are fetched on the next run')
+    args = parser.parse_args()
+
+    print("🚀 Refresh Schedule")
+    print("=" * 60)
+
+    scheduler = RefreshScheduler()
+    if args.reset is not None:
+        for key in args.reset or list(scheduler.sources):
+            scheduler.sources.pop(key, None)
+        scheduler.save()
+        print("🧹 Schedule reset")
+        return
+
+    if not scheduler.sources:
+        print("ℹ️  No history yet; run fetch_rules.py first")
+        sys.exit(0)
+    now = time.time()
+    for key in sorted(scheduler.sources, key=lambda k: scheduler.sources[k].get('next', 0)):
+        marker = '🔴' if scheduler.sources[key].get('next', 0) <= now else '🟢'
+        print(f"   {marker} {key}: {scheduler.describe(key)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+正则规则：把等价于有限个域名 / 后缀的正则改写为更便宜的规则，其余正则合成一个交替表达式匹配
+Regex rules: rewrite finite regexes into domain/suffix rules and match the rest with one alternation
+"""
+
+import re
+import sys
+from typing import List, Dict, Iterable, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as C
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants as C
+
+# 展开有限正则时最多产生的候选串数，超过则视为无法改写
+MAX_EXPANSIONS = 256
+
+# 有界重复（如 {1,3}）最多展开的次数
+MAX_REPEAT_EXPANSION = 8
+
+# 主机名标签中可能出现的字符；字符集覆盖它们的重复才算"任意标签"
+LABEL_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789-'
+
+_VALID_HOST = re.compile(r'^(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?\.)*[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$')
+
+# URL-REGEX 中协议部分：^https?:// 及其转义写法
+_URL_SCHEME = re.compile(r'^\^?(?:https?\??|http)(?::|\\:)(?:/|\\/){2}')
+
+# 规则行末尾的策略组或选项（如 ,PROXY / ,no-resolve）
+_RULE_OPTION = re.compile(r'^[A-Za-z][\w-]*$')
+
+# 展开后的记号：字符、^、$、任意标签串（携带最少重复次数）、可选 / 必需的子域名前缀
+_BEGIN = ('^',)
+_END = ('$',)
+_DOT = ('c', '.')
+
+
+class _NotFinite(Exception):
+    """正则的语言不是有限个域名 / 后缀"""
+
+
+def _in_accepts(items, ch: str) -> bool:
+    """字符集 [..] 是否接受字符 ch"""
+    negate = False
+    accepted = False
+    for op, av in items:
+        if op is C.NEGATE:
+            negate = True
+        elif op is C.LITERAL:
+            accepted = accepted or chr(av) == ch
+        elif op is C.RANGE:
+            accepted = accepted or av[0] <= ord(ch) <= av[1]
+        elif op is C.CATEGORY:
+            if av is C.CATEGORY_WORD:
+                accepted = accepted or ch.isalnum() or ch == '_'
+            elif av is C.CATEGORY_DIGIT:
+                accepted = accepted or ch.isdigit()
+            else:
+                raise _NotFinite
+        else:
+            raise _NotFinite
+    return accepted != negate
+
+
+def _label_run(item) -> Optional[Tuple[int, bool]]:
+    """`.+` / `[^.]*` / `[a-z0-9-]+` 这类可以匹配任意标签的无界重复
+
+    返回 (最少重复次数, 能否跨过 ".")：`.+` 可以匹配多级子域名，`[^.]+` / `[a-z0-9-]+` 只能匹配一个标签。
+    """
+    op, av = item
+    if op not in (C.MAX_REPEAT, C.MIN_REPEAT) or av[1] is not C.MAXREPEAT or len(av[2]) != 1:
+        return None
+    inner_op, inner_av = av[2][0]
+    if inner_op is C.ANY:
+        return av[0], True
+    if inner_op is C.NOT_LITERAL and chr(inner_av) not in LABEL_CHARS:
+        return av[0], chr(inner_av) != '.'
+    if inner_op is C.IN and all(_in_accepts(inner_av, ch) for ch in LABEL_CHARS):
+        return av[0], _in_accepts(inner_av, '.')
+    return None
+
+
+def _unwrap(items) -> list:
+    """去掉只包一层的分组"""
+    items = list(items)
+    while len(items) == 1 and items[0][0] is C.SUBPATTERN:
+        items = list(items[0][1][-1])
+    return items
+
+
+def _subdomain_prefix(item) -> Optional[tuple]:
+    """`(.+\\.)?` / `([^.]+\\.)*` 之类的子域名前缀：可选时返回 ('sub', 0)，至少一级时返回 ('sub', 1)
+
+    前缀必须能覆盖任意多级子域名：`([^.]+\\.)?` 只多出一级，不等价于后缀，无法改写。
+    """
+    op, av = item
+    if op not in (C.MAX_REPEAT, C.MIN_REPEAT) or av[0] > 1 or av[1] not in (1, C.MAXREPEAT):
+        return None
+    inner = _unwrap(av[2])
+    if len(inner) != 2 or inner[1] != (C.LITERAL, ord('.')):
+        return None
+    run = _label_run(inner[0])
+    if run is None:
+        return None
+    if not run[1] and av[1] is not C.MAXREPEAT:
+        raise _NotFinite
+    return ('sub', av[0])
+
+
+def _expand(items) -> List[tuple]:
+    """把解析树展开为记号序列的列表（分支和有界重复逐一展开）"""
+    results = [()]
+    for item in items:
+        options = _expand_item(item)
+        results = [r + o for r in results for o in options]
+        if len(results) > MAX_EXPANSIONS:
+            raise _NotFinite
+    return results
+
+
+def _expand_item(item) -> List[tuple]:
+    op, av = item
+    if op is C.LITERAL:
+        return [(('c', chr(av)),)]
+    if op is C.AT:
+        if av in (C.AT_BEGINNING, C.AT_BEGINNING_STRING):
+            return [(_BEGIN,)]
+        if av in (C.AT_END, C.AT_END_STRING):
+            return [(_END,)]
+        raise _NotFinite
+    if op is C.IN:
+        chars = [chr(c) for c in range(32, 127) if _in_accepts(av, chr(c))]
+        if not chars or len(chars) > 16:
+            raise _NotFinite
+        return [(('c', ch),) for ch in chars]
+    if op is C.SUBPATTERN:
+        return _expand(av[-1])
+    if op is C.BRANCH:
+        return [seq for branch in av[1] for seq in _expand(branch)]
+    if op in (C.MAX_REPEAT, C.MIN_REPEAT):
+        prefix = _subdomain_prefix(item)
+        if prefix:
+            return [(prefix,)]
+        run = _label_run(item)
+        if run is not None:
+            return [(('run',) + run,)]
+        low, high, inner = av
+        if high is C.MAXREPEAT or high > MAX_REPEAT_EXPANSION:
+            raise _NotFinite
+        once = _expand(inner)
+        results = []
+        for count in range(low, high + 1):
+            sequences = [()]
+            for _ in range(count):
+                sequences = [s + o for s in sequences for o in once]
+                if len(sequences) > MAX_EXPANSIONS:
+                    raise _NotFinite
+            results.extend(sequences)
+        return results
+    raise _NotFinite
+
+
+def _literal(tokens: tuple) -> str:
+    if any(token[0] != 'c' for token in tokens):
+        raise _NotFinite
+    return ''.join(token[1] for token in tokens)
+
+
+def _classify(tokens: tuple) -> Tuple[str, str]:
+    """把一条展开后的记号序列归类为 ('exact' | 'suffix' | 'subdomains', 域名)
+
+    匹配使用 search 语义：没有 ^ 时前面可以是任意内容，因此只有以 "." 开头的尾部才有确定含义。
+    """
+    if not tokens or tokens[-1] != _END or _END in tokens[:-1]:
+        raise _NotFinite
+    tokens = tokens[:-1]
+    anchored = bool(tokens) and tokens[0] == _BEGIN
+    if anchored:
+        tokens = tokens[1:]
+    if _BEGIN in tokens:
+        raise _NotFinite
+
+    head = tokens[0] if tokens else None
+    if head and head[0] == 'sub':
+        if not anchored:
+            raise _NotFinite
+        return ('suffix' if head[1] == 0 else 'subdomains'), _literal(tokens[1:])
+    if head and head[0] == 'run':
+        # .*\.example\.com：主机名不会以 "." 开头，因此与 .+\.example\.com 相同，都是严格子域名
+        if len(tokens) < 2 or tokens[1] != _DOT:
+            raise _NotFinite
+        # ^[^.]+\.example\.com 只匹配一级子域名；不锚定开头时 search 可以从任意标签开始，不受此限
+        if anchored and not head[2]:
+            raise _NotFinite
+        return 'subdomains', _literal(tokens[2:])
+    if not anchored:
+        if head != _DOT:
+            raise _NotFinite
+        return 'subdomains', _literal(tokens[1:])
+    return 'exact', _literal(tokens)
+
+
+def analyze(pattern: str) -> Optional[Tuple[Set[str], Set[str]]]:
+    """若正则在合法主机名上等价于有限个精确域名和后缀，返回 (精确域名, 后缀)，否则返回 None
+
+    例如 ^(.+\\.)?openai\\.com$、(^|\\.)openai\\.com$ 为后缀 openai.com，
+    ^(api|chat)\\.openai\\.com$ 为两个精确域名；^.+\\.openai\\.com$（只匹配子域名）无法改写。
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+        ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+        forms = {}
+        for tokens in _expand(parsed):
+            kind, name = _classify(tokens)
+            if ignore_case:
+                name = name.lower()
+            if not _VALID_HOST.match(name):
+                raise _NotFinite
+            forms.setdefault(name, set()).add(kind)
+    except (_NotFinite, re.error, RecursionError, OverflowError):
+        return None
+
+    domains, suffixes = set(), set()
+    for name, kinds in forms.items():
+        if 'suffix' in kinds or {'exact', 'subdomains'} <= kinds:
+            suffixes.add(name)
+        elif kinds == {'exact'}:
+            domains.add(name)
+        else:
+            # 只匹配子域名的正则没有对应的规则类型
+            return None
+    return domains, suffixes
+
+
+def reduce_regexes(patterns: Iterable[str]) -> Tuple[Dict[str, Tuple[Set[str], Set[str]]], List[str]]:
+    """改写所有可以改写的正则，返回 (正则 -> (精确域名, 后缀), 保留的正则)"""
+    rewrites, kept = {}, []
+    for pattern in patterns:
+        result = analyze(pattern)
+        if result is None:
+            kept.append(pattern)
+        else:
+            rewrites[pattern] = result
+    return rewrites, kept
+
+
+def strip_rule_options(value: str) -> str:
+    """去掉 DOMAIN-REGEX 行末尾的策略组 / 选项；正则本身可能含逗号（如 {1,3}），只剥离像名称的尾部"""
+    value = value.strip().strip('\'"')
+    while ',' in value:
+        head, tail = value.rsplit(',', 1)
+        if not _RULE_OPTION.match(tail.strip()):
+            break
+        value = head.strip()
+    return value
+
+
+def url_regex_to_domain_regex(pattern: str) -> Optional[str]:
+    """把 URL-REGEX 的主机部分提取为域名正则；没有协议前缀或主机边界时返回 None
+
+    代理按连接路由，HTTPS 下看不到路径，因此只保留主机部分（路径限定的规则会放宽到整个主机）。
+    """
+    match = _URL_SCHEME.match(pattern)
+    if not match:
+        return None
+    host = []
+    rest = pattern[match.end():]
+    i = 0
+    depth = 0
+    while i < len(rest):
+        ch = rest[i]
+        if ch == '\\' and i + 1 < len(rest):
+            if rest[i + 1] in '/?:' and depth == 0:
+                break
+            host.append(rest[i:i + 2])
+            i += 2
+            continue
+        if ch in '[(':
+            depth += 1
+        elif ch in '])':
+            depth = max(depth - 1, 0)
+        elif depth == 0 and ch in '/:':
+            break
+        host.append(ch)
+        i += 1
+    else:
+        return None
+    return f"^{''.join(host)}$" if host else None
+
+
+def clash_compatible(pattern: str) -> bool:
+    """Clash 按逗号切分规则行，且规则行是 YAML 纯量，含逗号、": " 或 " #" 的正则无法输出"""
+    return ',' not in pattern and ': ' not in pattern and ' #' not in pattern
+
+
+def _scoped(pattern: str) -> str:
+    """包成非捕获分组；开头的全局标志（如 (?i)）改为只作用于本分组，便于拼接"""
+    match = re.match(r'^\(\?([aiLmsux]+)\)', pattern)
+    if match:
+        return f"(?{match.group(1)}:{pattern[match.end():]})"
+    return f"(?:{pattern})"
+
+
+class RegexSet:
+    """多条正则合成一个交替表达式：未命中时只需扫描一次主机名，命中后再逐条确定是哪一条
+
+    Python 无法编译的正则（如 RE2 专有语法）不参与匹配，但仍会输出到支持正则的格式。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = []
+        for pattern in sorted(set(patterns)):
+            try:
+                self.patterns.append((pattern, re.compile(pattern)))
+            except re.error:
+                continue
+        self.combined = None
+        if self.patterns:
+            try:
+                self.combined = re.compile('|'.join(_scoped(p) for p, _ in self.patterns))
+            except re.error:
+                # 含反向引用等无法拼接的正则时退化为逐条匹配
+                self.combined = None
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def search(self, host: str) -> Optional[str]:
+        """返回第一条匹配主机名的正则"""
+        if not self.patterns or (self.combined is not None and not self.combined.search(host)):
+            return None
+        return next((p for p, compiled in self.patterns if compiled.search(host)), None)
+
+
+def main():
+    patterns = sys.argv[1:] or [line.strip() for line in sys.stdin if line.strip()]
+    if not patterns:
+        print("Usage: python regex_rules.py <regex> ...  (or one regex per line on stdin)")
+        sys.exit(1)
+
+    print("🚀 Regex Rule Analysis")
+    print("=" * 60)
+    for pattern in patterns:
+        result = analyze(pattern)
+        if result is None:
+            print(f"   ➖ {pattern}  (kept as DOMAIN-REGEX)")
+            continue
+        rewritten = [f"DOMAIN,{d}" for d in sorted(result[0])] + \
+                    [f"DOMAIN-SUFFIX,{s}" for s in sorted(result[1])]
+        print(f"   ✅ {pattern}  ->  {', '.join(rewritten)}")
+    rewrites, kept = reduce_regexes(patterns)
+    print(f"\n📊 {len(rewrites)}/{len(patterns)} regexes rewritten, {len(kept)} kept")
+
+
+if __name__ == '__main__':
+    main()
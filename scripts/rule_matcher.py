@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+域名规则匹配器：按代理客户端的语义判断主机名命中哪条规则
+Hostname matcher with proxy-client semantics (DOMAIN / DOMAIN-SUFFIX / DOMAIN-KEYWORD / DOMAIN-REGEX)
+"""
+
+from typing import Optional, Tuple, Iterable
+
+from regex_rules import RegexSet
+
+# 匹配结果中的规则类型
+KIND_DOMAIN = 'domain'
+KIND_SUFFIX = 'domain_suffix'
+KIND_KEYWORD = 'domain_keyword'
+KIND_REGEX = 'domain_regex'
+
+
+def iter_suffixes(host: str) -> Iterable[str]:
+    """按标签由长到短枚举主机名的后缀：a.b.c -> a.b.c, b.c, c"""
+    yield host
+    index = host.find('.')
+    while index != -1:
+        yield host[index + 1:]
+        index = host.find('.', index + 1)
+
+
+class RuleMatcher:
+    """精确域名和后缀用哈希查找（O(标签数)），关键词退化为逐条子串扫描，正则合成一个交替表达式"""
+
+    def __init__(self, rules: dict):
+        self.domains = frozenset(rules.get('domains', []))
+        self.suffixes = frozenset(rules.get('domain_suffixes', []))
+        self.keywords = tuple(sorted(rules.get('domain_keywords', [])))
+        self.regexes = RegexSet(rules.get('domain_regexes', []))
+
+    def match_suffix(self, host: str) -> Optional[Tuple[str, str]]:
+        """只用精确域名和后缀规则匹配，返回 (规则类型, 规则值)"""
+        if host in self.domains:
+            return KIND_DOMAIN, host
+        for suffix in iter_suffixes(host):
+            if suffix in self.suffixes:
+                return KIND_SUFFIX, suffix
+        return None
+
+    def match_keyword(self, host: str) -> Optional[Tuple[str, str]]:
+        for keyword in self.keywords:
+            if keyword in host:
+                return KIND_KEYWORD, keyword
+        return None
+
+    def match_regex(self, host: str) -> Optional[Tuple[str, str]]:
+        pattern = self.regexes.search(host)
+        return (KIND_REGEX, pattern) if pattern is not None else None
+
+    def match(self, host: str) -> Optional[Tuple[str, str]]:
+        """返回首条命中的规则，未命中时返回 None"""
+        host = host.lower().rstrip('.')
+        return self.match_suffix(host) or self.match_keyword(host) or self.match_regex(host)
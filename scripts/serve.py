@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+常驻服务模式：定时刷新规则并通过 HTTP 提供规则文件
+Long-running daemon that rebuilds rules on a jittered schedule and serves artifacts over HTTP
+"""
+
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import mimetypes
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional, Tuple
+from pathlib import Path
+
+from generate_rules import build_artifacts, compress_variants, prepare_rules
+
+# 默认刷新间隔（秒）与抖动比例，避免整个集群同时回源
+DEFAULT_INTERVAL = 6 * 3600
+DEFAULT_JITTER = 0.1
+
+# 有来源提前到期时最短的刷新等待（秒）
+MIN_REFRESH_DELAY = 60
+
+CONTENT_TYPES = {
+    '.yaml': 'text/yaml; charset=utf-8',
+    '.conf': 'text/plain; charset=utf-8',
+    '.nft': 'text/plain; charset=utf-8',
+    '.pac': 'application/x-ns-proxy-autoconfig',
+    '.json': 'application/json; charset=utf-8',
+    '.srs': 'application/octet-stream',
+    '.dat': 'application/octet-stream',
+    '.mph': 'application/octet-stream',
+}
+
+
+class Artifact:
+    """一个规则文件在内存中的全部表示（原始 + 预压缩）"""
+
+    def __init__(self, name: str, body: bytes, modified: datetime):
+        self.name = name
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.modified = modified
+        self.content_type = CONTENT_TYPES.get(Path(name).suffix) or \
+            mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        # 编码 -> 内容；强 ETag 必须按表示区分，因此每种编码各自带后缀
+        self.bodies = {'identity': body}
+        self.bodies.update(compress_variants(body))
+
+    def etag(self, encoding: str) -> str:
+        suffix = '' if encoding == 'identity' else f'-{encoding}'
+        return f'"{self.digest[:32]}{suffix}"'
+
+
+class ArtifactStore:
+    """线程安全的规则文件集合，整体替换以保证读到一致的版本"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._artifacts = {}
+        self.rules_digest = None
+
+    def get(self, name: str) -> Optional[Artifact]:
+        with self._lock:
+            return self._artifacts.get(name)
+
+    def names(self):
+        with self._lock:
+            return sorted(self._artifacts)
+
+    def update(self, files: Dict[str, bytes], rules_digest: str) -> list:
+        """替换内容有变化的文件，返回变化的文件名"""
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with self._lock:
+            artifacts = dict(self._artifacts)
+            changed = []
+            for name, body in files.items():
+                current = artifacts.get(name)
+                if current is not None and current.digest == hashlib.sha256(body).hexdigest():
+                    continue
+                artifacts[name] = Artifact(name, body, now)
+                changed.append(name)
+            self._artifacts = artifacts
+            self.rules_digest = rules_digest
+        return changed
+
+
+def rules_fingerprint(rules: dict) -> str:
+    """规则模型的内容哈希，与生成时间无关"""
+    canonical = json.dumps({k: sorted(v) for k, v in rules.items()}, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def render_artifacts(rules: dict) -> Dict[str, bytes]:
+    """在临时目录生成所有格式并读回内存"""
+    with tempfile.TemporaryDirectory() as tmp:
+        return {path.name: path.read_bytes() for path in build_artifacts(rules, Path(tmp))}
+
+
+class RuleService:
+    """持有内存中的规则模型，按需刷新并重建规则文件"""
+
+    def __init__(self, project_root: Path, store: ArtifactStore, offline: bool = False,
+                 interval: float = DEFAULT_INTERVAL, jitter: float = DEFAULT_JITTER):
+        self.project_root = project_root
+        self.store = store
+        self.offline = offline
+        self.interval = interval
+        self.jitter = jitter
+        self.rules = None
+        self._stop = threading.Event()
+
+    def load_rules(self) -> dict:
+        """获取最新规则模型；离线模式只读取本地 data/ 文件"""
+        if not self.offline:
+            from fetch_rules import fetch_merged_rules, save_rules
+            parser = fetch_merged_rules(self.project_root)
+            save_rules(parser, str(self.project_root / 'data' / 'ai_projects.json'))
+        return prepare_rules(self.project_root)
+
+    def refresh(self) -> list:
+        """刷新一次；模型未变化时不重建任何文件"""
+        rules = self.load_rules()
+        digest = rules_fingerprint(rules)
+        if digest == self.store.rules_digest:
+            print("ℹ️  Rules unchanged, skipping rebuild")
+            return []
+        self.rules = rules
+        changed = self.store.update(render_artifacts(rules), digest)
+        print(f"✅ Rebuilt {len(changed)} artifacts: {', '.join(changed)}")
+        return changed
+
+    def next_delay(self) -> float:
+        delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+        if not self.offline:
+            # 有来源在间隔内到期时提前刷新；刷新只拉取到期的来源，其余复用缓存的解析结果
+            from refresh_schedule import get_scheduler
+            due = get_scheduler().next_due()
+            if due is not None:
+                wait = (due - time.time()) * (1 + random.uniform(0, self.jitter))
+                delay = min(delay, max(MIN_REFRESH_DELAY, wait))
+        return delay
+
+    def run_forever(self):
+        while not self._stop.wait(self.next_delay()):
+            try:
+                self.refresh()
+            except Exception as e:
+                # 刷新失败时继续提供上一版本
+                print(f"❌ Refresh failed: {e}")
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run_forever, name='rule-refresh', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """解析单区间 Range 头，返回闭区间 (start, end)
+
+    无法满足时返回 None（416），格式不支持时抛出 ValueError（忽略 Range）。
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition('-')
+    if not first:
+        length = int(last)
+        if length <= 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        return None
+    if start > end:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def negotiate_encoding(accept: str, available) -> str:
+    """按 Accept-Encoding 选择最小的可用编码"""
+    accepted = {}
+    for item in accept.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ('br', 'zstd', 'gzip'):
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return 'identity'
+
+
+def make_handler(store: ArtifactStore):
+    """构造绑定到指定 store 的请求处理类"""
+
+    class ArtifactHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        server_version = 'ai-rules'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            self.handle_get(send_body=False)
+
+        def do_GET(self):
+            self.handle_get(send_body=True)
+
+        def _send(self, status: int, headers: dict, body: bytes = b'', send_body: bool = True):
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if send_body and body:
+                self.wfile.write(body)
+
+        def handle_get(self, send_body: bool):
+            path = self.path.split('?', 1)[0].lstrip('/')
+            if path == 'healthz':
+                ready = store.rules_digest is not None
+                self._send(200 if ready else 503, {'Content-Type': 'text/plain', 'Cache-Control': 'no-store'},
+                           b'ok\n' if ready else b'starting\n', send_body)
+                return
+            if path.startswith('rules/'):
+                path = path[len('rules/'):]
+            artifact = store.get(path)
+            if artifact is None:
+                self._send(404, {'Content-Type': 'text/plain'}, b'not found\n', send_body)
+                return
+
+            encoding = negotiate_encoding(self.headers.get('Accept-Encoding', ''), artifact.bodies)
+            body = artifact.bodies[encoding]
+            etag = artifact.etag(encoding)
+            headers = {
+                'Content-Type': artifact.content_type,
+                'ETag': etag,
+                'Last-Modified': format_datetime(artifact.modified, usegmt=True),
+                'Cache-Control': 'public, max-age=300',
+                'Vary': 'Accept-Encoding',
+                'Accept-Ranges': 'bytes',
+            }
+            if encoding != 'identity':
+                headers['Content-Encoding'] = encoding
+
+            if_none_match = self.headers.get('If-None-Match')
+            if if_none_match and (if_none_match.strip() == '*' or
+                                  etag in [t.strip() for t in if_none_match.split(',')]):
+                headers.pop('Content-Type')
+                self.send_response(304)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                return
+
+            range_header = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+            if range_header and (not if_range or if_range.strip() == etag):
+                try:
+                    byte_range = parse_range(range_header, len(body))
+                except ValueError:
+                    # 无法解析的 Range 按规范忽略，返回完整内容
+                    self._send(200, headers, body, send_body)
+                    return
+                if byte_range is None:
+                    headers['Content-Range'] = f'bytes */{len(body)}'
+                    self._send(416, headers, b'', send_body)
+                    return
+                start, end = byte_range
+                headers['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+                self._send(206, headers, body[start:end + 1], send_body)
+                return
+
+            self._send(200, headers, body, send_body)
+
+    return ArtifactHandler
+
+
+def create_server(store: ArtifactStore, host: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve rule artifacts and refresh them on a schedule')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='longest refresh interval in seconds; sources due earlier refresh sooner')
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, help='random jitter ratio of the interval')
+    parser.add_argument('--offline', action='store_true', help='rebuild from local data/ files only')
+    args = parser.parse_args()
+
+    print("🚀 AI Proxy Rules Server")
+    print("=" * 60)
+
+    # 获取脚本所在目录的父目录（项目根目录）
+    script_dir = Path(__file__).parent
+    project_root = script_dir.parent
+
+    store = ArtifactStore()
+    service = RuleService(project_root, store, args.offline, args.interval, args.jitter)
+    service.refresh()
+    service.start()
+
+    server = create_server(store, args.host, args.port)
+    print(f"🌐 Serving {len(store.names())} artifacts on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+规则源健康度：跨运行记录每个主机的延迟分位数和失败历史，据此设置超时、向镜像发出对冲请求并熔断失效主机
+Per-host source health: adaptive timeouts, hedged mirror requests and a circuit breaker
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from typing import List, Dict, Optional
+from pathlib import Path
+from urllib.parse import urlsplit
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 跨运行保存的主机健康记录
+HEALTH_FILE = PROJECT_ROOT / '.cache' / 'source_health.json'
+
+# 每个主机保留的最近请求记录条数和最长保留时间（秒）
+HISTORY_SIZE = 100
+HISTORY_MAX_AGE = 14 * 86400
+
+# 成功样本少于该数量时不使用历史分位数，超时和对冲延迟取默认值
+MIN_SAMPLES = 5
+
+# 超时 = 历史 p95 延迟 × 倍数，限制在 [MIN_TIMEOUT, 调用方给出的默认超时] 之间
+TIMEOUT_PERCENTILE = 95
+TIMEOUT_MULTIPLIER = 4
+MIN_TIMEOUT = 3.0
+
+# 请求耗时超过历史 p90 后向镜像发出对冲请求
+HEDGE_PERCENTILE = 90
+DEFAULT_HEDGE_DELAY = 2.0
+MIN_HEDGE_DELAY = 0.2
+
+# 保存记录前最多等待仍在进行的落后请求多少秒（它们的真实结果计入历史）
+SETTLE_TIMEOUT = 30
+
+# 连续失败达到阈值后熔断该主机，冷却时间随连续熔断次数翻倍
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 300
+BREAKER_MAX_COOLDOWN = 86400
+
+# 镜像规则：(匹配原始 URL 的正则, 镜像 URL 模板列表)，按顺序作为对冲 / 故障转移的候选
+# 注意 jsDelivr 对分支内容有缓存，镜像返回的内容可能比源站稍旧
+MIRRORS = [
+    (re.compile(r'^https://raw\.githubusercontent\.com/([^/]+)/([^/]+)/([^/]+)/(.+)$'), [
+        'https://cdn.jsdelivr.net/gh/{0}/{1}@{2}/{3}',
+        'https://fastly.jsdelivr.net/gh/{0}/{1}@{2}/{3}',
+    ]),
+]
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+class FetchError(Exception):
+    """原始 URL 和所有镜像都请求失败"""
+
+    def __init__(self, url: str, errors: List[str]):
+        super().__init__(f"all sources failed for {url}: {'; '.join(errors)}")
+        self.url = url
+        self.errors = errors
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def mirror_urls(url: str, mirrors=MIRRORS) -> List[str]:
+    """返回 URL 的镜像地址列表"""
+    for pattern, templates in mirrors:
+        match = pattern.match(url)
+        if match:
+            return [template.format(*match.groups()) for template in templates]
+    return []
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class SourceHealth:
+    """每个主机的请求历史与熔断状态，可在多个线程中共享"""
+
+    def __init__(self, path: Optional[Path] = HEALTH_FILE):
+        self.path = Path(path) if path else None
+        self.hosts: Dict[str, dict] = {}
+        # 本次运行的统计：主机 -> {requests, failures, hedges, served}
+        self.run: Dict[str, Dict[str, int]] = {}
+        self.lock = threading.Lock()
+        # 被对冲请求超越后仍在后台进行的请求，结束时按真实结果记录
+        self.outstanding = set()
+        self.settled = threading.Condition(self.lock)
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.hosts = json.load(f).get('hosts', {})
+            except (OSError, ValueError):
+                pass
+
+    def _state(self, host: str) -> dict:
+        return self.hosts.setdefault(host, {
+            'history': [],
+            'consecutive_failures': 0,
+            'trips': 0,
+            'open_until': 0,
+            'last_error': None,
+        })
+
+    def count(self, host: str, key: str):
+        with self.lock:
+            stats = self.run.setdefault(host, {'requests': 0, 'failures': 0, 'hedges': 0, 'served': 0})
+            stats[key] += 1
+
+    def record(self, host: str, latency: Optional[float], error: Optional[str] = None):
+        """记录一次请求结果；error 不为空表示失败"""
+        now = time.time()
+        with self.lock:
+            state = self._state(host)
+            history = [e for e in state['history'][-(HISTORY_SIZE - 1):] if now - e[0] <= HISTORY_MAX_AGE]
+            history.append([round(now), None if latency is None else round(latency, 3), error is None])
+            state['history'] = history
+            if error is None:
+                state['consecutive_failures'] = 0
+                state['trips'] = 0
+                state['open_until'] = 0
+                return
+            state['consecutive_failures'] += 1
+            state['last_error'] = error
+            # 半开状态下的试探请求失败会再次熔断，冷却时间翻倍
+            if state['consecutive_failures'] >= BREAKER_THRESHOLD and now >= state['open_until']:
+                state['trips'] += 1
+                cooldown = min(BREAKER_COOLDOWN * 2 ** (state['trips'] - 1), BREAKER_MAX_COOLDOWN)
+                state['open_until'] = now + cooldown
+
+    def latencies(self, host: str) -> List[float]:
+        with self.lock:
+            history = self.hosts.get(host, {}).get('history', [])
+            return [latency for _, latency, ok in history if ok and latency is not None]
+
+    def latency_percentile(self, host: str, q: float) -> Optional[float]:
+        samples = self.latencies(host)
+        return percentile(samples, q) if len(samples) >= MIN_SAMPLES else None
+
+    def timeout_for(self, host: str, default: float) -> float:
+        p = self.latency_percentile(host, TIMEOUT_PERCENTILE)
+        return default if p is None else min(default, max(MIN_TIMEOUT, p * TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self, host: str) -> float:
+        p = self.latency_percentile(host, HEDGE_PERCENTILE)
+        return DEFAULT_HEDGE_DELAY if p is None else max(MIN_HEDGE_DELAY, p)
+
+    def is_open(self, host: str) -> bool:
+        """熔断器是否打开；冷却结束后进入半开状态，允许一次试探请求"""
+        with self.lock:
+            return time.time() < self.hosts.get(host, {}).get('open_until', 0)
+
+    def track(self, future, host: str, start: float):
+        """跟踪一个被超越的请求：完成时记录真实延迟，失败或超时时计入连续失败"""
+        def settle(future):
+            try:
+                if future.cancelled():
+                    return
+                try:
+                    response = future.result()
+                except Exception as e:
+                    self.record(host, None, str(e) or type(e).__name__)
+                else:
+                    self.record(host, time.monotonic() - start)
+                    response.close()
+            finally:
+                with self.settled:
+                    self.outstanding.discard(future)
+                    self.settled.notify_all()
+
+        with self.lock:
+            self.outstanding.add(future)
+        future.add_done_callback(settle)
+
+    def settle(self, timeout: float = SETTLE_TIMEOUT):
+        """等待被超越的请求结束，让它们的结果进入历史"""
+        with self.settled:
+            self.settled.wait_for(lambda: not self.outstanding, timeout)
+
+    def save(self):
+        if not self.path:
+            return
+        self.settle()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = {'hosts': self.hosts}
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+
+    def describe(self, host: str) -> str:
+        p50 = self.latency_percentile(host, 50)
+        p95 = self.latency_percentile(host, 95)
+        state = self.hosts.get(host, {})
+        history = state.get('history', [])
+        failures = sum(1 for _, _, ok in history if not ok)
+        parts = [
+            f"p50 {p50:.2f}s, p95 {p95:.2f}s" if p50 is not None else f"{len(self.latencies(host))} samples",
+            f"timeout {self.timeout_for(host, 30):.1f}s",
+            f"{failures}/{len(history)} failed",
+        ]
+        if self.is_open(host):
+            parts.append(f"circuit open until {time.strftime('%Y-%m-%d %H:%M', time.localtime(state['open_until']))}")
+        return ', '.join(parts)
+
+    def report(self):
+        """打印本次运行用到的主机的健康概况，并清空本次运行的统计（常驻服务每轮刷新各打印一次）"""
+        if not self.run:
+            return
+        print("🩺 Source health:")
+        for host, stats in sorted(self.run.items()):
+            mirror = f", {stats['hedges']} hedged, {stats['served']} served" if stats['hedges'] or stats['served'] else ''
+            print(f"   {host}: {stats['requests']} requests, {stats['failures']} failed{mirror}; "
+                  f"{self.describe(host)}")
+        self.run.clear()
+
+
+_default_health = None
+_default_health_lock = threading.Lock()
+
+
+def get_health() -> SourceHealth:
+    """获取进程内共享的健康记录（v2fly 等来源会在多个线程中并发请求）"""
+    global _default_health
+    with _default_health_lock:
+        if _default_health is None:
+            _default_health = SourceHealth()
+    return _default_health
+
+
+def _attempt(url: str, timeout: float, stream: bool):
+    import requests
+    response = requests.get(url, headers={'User-Agent': USER_AGENT}, timeout=timeout, stream=stream)
+    if response.status_code != 404:
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+    return response
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def fetch(url: str, timeout: float = 30, stream: bool = False, health: Optional[SourceHealth] = None,
+          mirrors=MIRRORS):
+    """带对冲和故障转移的 GET，返回最先成功的 requests.Response
+
+    请求耗时超过该主机历史 p90 时向下一个镜像发出对冲请求，请求失败或超时时立即切换；
+    熔断中的主机直接跳过。404 视为确定的结果（镜像的 404 只在没有其他结果时采用）。
+    所有候选都失败时抛出 FetchError。
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    health = health or get_health()
+    candidates = [url] + mirror_urls(url, mirrors)
+    # 全部熔断时仍然试探原始 URL
+    queue = [c for c in candidates if not health.is_open(host_of(c))] or candidates[:1]
+    if queue[0] != url:
+        print(f"  ⛔ Circuit open for {host_of(url)}, using mirror")
+
+    pool = ThreadPoolExecutor(max_workers=len(queue))
+    pending = {}  # future -> (url, 开始时间, 超时)
+    errors = []
+    winner = fallback = None
+
+    def launch(hedge: bool = False):
+        candidate = queue.pop(0)
+        host = host_of(candidate)
+        limit = health.timeout_for(host, timeout)
+        health.count(host, 'requests')
+        if hedge:
+            health.count(host, 'hedges')
+        pending[pool.submit(_attempt, candidate, limit, stream)] = (candidate, time.monotonic(), limit)
+
+    def fail(candidate: str, message: str):
+        health.record(host_of(candidate), None, message)
+        health.count(host_of(candidate), 'failures')
+        errors.append(f"{host_of(candidate)}: {message}")
+
+    launch()
+    next_hedge = time.monotonic() + health.hedge_delay(host_of(url))
+    try:
+        while pending and winner is None:
+            wake = [start + limit for _, start, limit in pending.values()]
+            if queue:
+                wake.append(next_hedge)
+            done, _ = wait(pending, timeout=max(0.0, min(wake) - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                candidate, start, _ = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    fail(candidate, str(e) or type(e).__name__)
+                    if queue:
+                        launch()
+                        next_hedge = time.monotonic() + health.hedge_delay(host_of(url))
+                    continue
+                health.record(host_of(candidate), time.monotonic() - start)
+                if response.status_code == 404 and candidate != url:
+                    # 镜像可能还没同步新文件，继续等待其他候选
+                    fallback = fallback or response
+                    continue
+                winner = candidate, response
+                break
+            if winner:
+                break
+
+            now = time.monotonic()
+            for future, (candidate, start, limit) in list(pending.items()):
+                if now >= start + limit:
+                    del pending[future]
+                    future.add_done_callback(_close_response)
+                    fail(candidate, f"timed out after {limit:.1f}s")
+                    if queue:
+                        launch()
+            if queue and now >= next_hedge:
+                launch(hedge=True)
+                next_hedge = now + health.hedge_delay(host_of(url))
+    finally:
+        for future, (candidate, start, _) in pending.items():
+            # 被对冲请求超越的请求继续在后台运行到自己的超时，按真实结果记录：
+            # 挂起的主机会累计失败并熔断，慢但可用的主机留下真实的延迟样本
+            health.track(future, host_of(candidate), start)
+        pool.shutdown(wait=False)
+
+    if winner is None:
+        if fallback is not None:
+            return fallback
+        raise FetchError(url, errors)
+    candidate, response = winner
+    if candidate != url:
+        health.count(host_of(candidate), 'served')
+        print(f"  ↪️  Served by mirror {host_of(candidate)}")
+    if fallback is not None and fallback is not response:
+        fallback.close()
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show or reset per-host source health')
+    parser.add_argument('--reset', nargs='*', metavar='HOST', help='forget history for hosts (all if none given)')
+    args = parser.parse_args()
+
+    print("🚀 Source Health")
+    print("=" * 60)
+
+    health = SourceHealth()
+    if args.reset is not None:
+        for host in args.reset or list(health.hosts):
+            health.hosts.pop(host, None)
+        health.save()
+        print("🧹 History reset")
+        return
+
+    if not health.hosts:
+        print("ℹ️  No history yet; run fetch_rules.py first")
+        sys.exit(0)
+    for host in sorted(health.hosts):
+        print(f"   {host}: {health.describe(host)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+多租户规则渲染：每种格式只序列化一次规则正文，按租户替换策略组名并选择规则子集
+Render per-tenant rule variants from templates serialized once per format
+"""
+
+import re
+import sys
+import argparse
+from datetime import datetime
+from typing import List, Dict, Iterable, Optional
+from pathlib import Path
+
+import yaml
+
+from generate_rules import LINE_FORMATS, RULE_KINDS, format_lines, line_header, line_values, prepare_rules
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 默认的租户配置文件，可参考 data/tenants.example.yaml
+TENANTS_FILE = PROJECT_ROOT / 'data' / 'tenants.yaml'
+
+# 默认输出目录，每个租户一个子目录
+TENANTS_DIR = PROJECT_ROOT / 'rules' / 'tenants'
+
+# 正文中的策略组占位符；规则值中不可能出现 NUL
+POLICY_PLACEHOLDER = '\x00'
+
+_SAFE_NAME = re.compile(r'^[\w.-]+$')
+
+
+def _excluded(kind: str, value: str, exclude: set) -> bool:
+    """排除列表中的域名同时排除其子域名，其他类型按值精确匹配"""
+    if value in exclude:
+        return True
+    if kind in ('domains', 'domain_suffixes'):
+        labels = value.split('.')
+        return any('.'.join(labels[i:]) in exclude for i in range(1, len(labels)))
+    return False
+
+
+class RuleTemplate:
+    """一种格式的预序列化规则正文
+
+    每类规则的正文只格式化一次，策略组以占位符代替；渲染租户时只需拼接所选的
+    规则块并替换占位符，成本与一次字符串复制相当。
+    """
+
+    def __init__(self, name: str, rules: Dict[str, List[str]]):
+        if name not in LINE_FORMATS:
+            raise ValueError(f"unsupported format: {name}")
+        self.name = name
+        self.spec = LINE_FORMATS[name]
+        # 行格式、正则过滤和文件头都来自 generate_rules.py，租户变体与主规则文件逐行一致
+        self.rules = {kind: list(line_values(rules, kind)) for kind in RULE_KINDS}
+        self.counts = {kind: len(self.rules[kind]) for kind in RULE_KINDS}
+        self.blocks = {kind: self._block(kind, self.rules[kind]) for kind in self.spec['lines']}
+
+    def _block(self, kind: str, values: Iterable[str]) -> str:
+        return ''.join('\n' + line for line in format_lines(self.name, kind, values, POLICY_PLACEHOLDER))
+
+    def header(self, total_rules: int, updated: str) -> str:
+        return '\n'.join(line_header(self.name, total_rules, updated))
+
+    def render(self, policy: Optional[str] = None, kinds: Iterable[str] = RULE_KINDS,
+               exclude: Iterable[str] = (), updated: Optional[str] = None) -> str:
+        """渲染一个租户变体：policy 为策略组名，kinds 为保留的规则类型，exclude 为排除的规则值"""
+        policy = policy or self.spec['policy'] or ''
+        if any(c in policy for c in ',\n\r'):
+            raise ValueError(f"invalid policy name: {policy!r}")
+        # 正则规则只计入能输出它的格式，与 generate_rules.py 的规则总数一致
+        kinds = [k for k in RULE_KINDS if k in set(kinds)
+                 and (k != 'domain_regexes' or k in self.spec['lines'])]
+        exclude = {e.lower() for e in exclude}
+        updated = updated or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        if exclude:
+            # 有排除项时只重新格式化受影响的规则块，其余规则块照常复用
+            values = {kind: [v for v in self.rules[kind] if not _excluded(kind, v, exclude)]
+                      for kind in kinds}
+            total = sum(len(v) for v in values.values())
+            blocks = [
+                self._block(kind, values[kind]) if len(values[kind]) != self.counts[kind] else self.blocks[kind]
+                for kind in kinds if kind in self.blocks
+            ]
+        else:
+            total = sum(self.counts[kind] for kind in kinds)
+            blocks = [self.blocks[kind] for kind in kinds if kind in self.blocks]
+        return (self.header(total, updated) + ''.join(blocks)).replace(POLICY_PLACEHOLDER, policy)
+
+
+def load_tenants(config_file: str) -> List[dict]:
+    """读取并校验租户配置"""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+
+    tenants = []
+    for entry in config.get('tenants', []):
+        name = str(entry.get('name', ''))
+        if not _SAFE_NAME.match(name):
+            raise ValueError(f"invalid tenant name: {name!r}")
+        formats = entry.get('formats') or list(LINE_FORMATS)
+        unknown = [f for f in formats if f not in LINE_FORMATS]
+        if unknown:
+            raise ValueError(f"tenant {name}: unsupported formats {unknown}")
+        kinds = entry.get('rule_types') or list(RULE_KINDS)
+        unknown = [k for k in kinds if k not in RULE_KINDS]
+        if unknown:
+            raise ValueError(f"tenant {name}: unknown rule types {unknown}")
+        # policy 可以是所有格式共用的字符串，也可以是 格式 -> 策略组 的映射
+        policy = entry.get('policy')
+        policies = dict(policy) if isinstance(policy, dict) else {f: policy for f in formats}
+        tenants.append({
+            'name': name,
+            'formats': formats,
+            'policies': policies,
+            'rule_types': kinds,
+            'exclude': [str(e) for e in entry.get('exclude', [])],
+        })
+    return tenants
+
+
+def render_tenants(rules: Dict[str, List[str]], tenants: List[dict], output_dir: Path) -> List[Path]:
+    """为所有租户渲染规则文件，每种格式只构建一次模板"""
+    output_dir = Path(output_dir)
+    updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    templates = {}
+    outputs = []
+    for tenant in tenants:
+        tenant_dir = output_dir / tenant['name']
+        tenant_dir.mkdir(parents=True, exist_ok=True)
+        for name in tenant['formats']:
+            if name not in templates:
+                templates[name] = RuleTemplate(name, rules)
+            body = templates[name].render(
+                tenant['policies'].get(name), tenant['rule_types'], tenant['exclude'], updated)
+            path = tenant_dir / name
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(body)
+            outputs.append(path)
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render per-tenant rule variants')
+    parser.add_argument('config', nargs='?', default=str(TENANTS_FILE), help='tenant YAML config')
+    parser.add_argument('--output-dir', default=str(TENANTS_DIR))
+    args = parser.parse_args()
+
+    print("🚀 Tenant Rule Rendering")
+    print("=" * 60)
+
+    if not Path(args.config).exists():
+        print(f"❌ Tenant config not found: {args.config} (see data/tenants.example.yaml)")
+        sys.exit(1)
+
+    tenants = load_tenants(args.config)
+    rules = prepare_rules(PROJECT_ROOT)
+    outputs = render_tenants(rules, tenants, Path(args.output_dir))
+
+    for tenant in tenants:
+        print(f"✅ {tenant['name']}: {', '.join(tenant['formats'])}")
+    print(f"💾 {len(outputs)} files saved to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
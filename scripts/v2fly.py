@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+v2fly/domain-list-community 数据文件加载器：递归解析 include 并按属性过滤
+v2fly domain-list-community loader with include: resolution and @attr filtering
+"""
+
+import json
+import hashlib
+from typing import List, Dict, Tuple, Optional, Callable, Iterable
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+V2FLY_BASE_URL = "https://raw.githubusercontent.com/v2fly/domain-list-community/master/data/"
+
+# 按内容哈希缓存的单文件解析结果，跨运行复用
+V2FLY_CACHE_DIR = PROJECT_ROOT / '.cache' / 'v2fly'
+
+# 并发下载数
+DEFAULT_FETCH_WORKERS = 8
+
+# 规则类型；无前缀的条目等价于 domain:（后缀匹配）
+KIND_DOMAIN = 'domain'
+KIND_FULL = 'full'
+KIND_KEYWORD = 'keyword'
+KIND_REGEXP = 'regexp'
+KINDS = {KIND_DOMAIN, KIND_FULL, KIND_KEYWORD, KIND_REGEXP}
+
+# 一条规则：(类型, 值, 属性元组)
+Entry = Tuple[str, str, Tuple[str, ...]]
+# 属性过滤：(必须包含的属性, 必须不包含的属性)
+AttrFilter = Tuple[Tuple[str, ...], Tuple[str, ...]]
+
+
+def parse_attr_filter(tokens: Iterable[str]) -> AttrFilter:
+    """解析 @attr / @!attr（兼容 @-attr）形式的属性过滤"""
+    include, exclude = [], []
+    for token in tokens:
+        if not token.startswith('@'):
+            continue
+        attr = token[1:]
+        if attr[:1] in ('!', '-'):
+            exclude.append(attr[1:].lower())
+        elif attr:
+            include.append(attr.lower())
+    return tuple(include), tuple(exclude)
+
+
+def parse_spec(spec: str) -> Tuple[str, AttrFilter]:
+    """解析 "openai" 或 "google@!cn" 这样的类别名称"""
+    name, *attrs = spec.split('@')
+    return name.strip(), parse_attr_filter('@' + a for a in attrs)
+
+
+def matches_filter(attrs: Tuple[str, ...], attr_filter: AttrFilter) -> bool:
+    include, exclude = attr_filter
+    return all(a in attrs for a in include) and not any(a in attrs for a in exclude)
+
+
+def parse_data_file(text: str) -> dict:
+    """解析单个数据文件，返回 {'entries': [...], 'includes': [(名称, 过滤)]}"""
+    return parse_data_lines(text.splitlines())
+
+
+def parse_data_lines(lines: Iterable[str]) -> dict:
+    """逐行解析数据文件，供不想持有整个文件字符串的调用方使用"""
+    entries = []
+    includes = []
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        rule, attrs = parts[0], [p for p in parts[1:] if p.startswith('@')]
+
+        kind, sep, value = rule.partition(':')
+        if not sep:
+            kind, value = KIND_DOMAIN, rule
+        kind = kind.lower()
+
+        if kind == 'include':
+            includes.append((value.strip(), parse_attr_filter(attrs)))
+        elif kind in KINDS and value:
+            # 正则区分大小写，其他类型统一小写
+            if kind != KIND_REGEXP:
+                value = value.lower()
+            entries.append((kind, value, tuple(sorted(a[1:].lower() for a in attrs))))
+    return {'entries': entries, 'includes': includes}
+
+
+def fetch_v2fly_file(name: str, base_url: str = V2FLY_BASE_URL, timeout: int = 10) -> Optional[str]:
+    """下载单个数据文件，不存在时返回 None"""
+    from source_health import fetch
+    response = fetch(base_url + name, timeout=timeout)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.text
+
+
+class V2flyLoader:
+    """带依赖图缓存的 v2fly 加载器
+
+    - 每个数据文件在一次运行中只下载、解析一次
+    - 缺失的文件按依赖图逐层并发下载
+    - 单文件解析结果按内容哈希持久化缓存
+    - 检测 include 环并跳过成环的边
+    """
+
+    def __init__(self, fetch: Callable[[str], Optional[str]] = fetch_v2fly_file,
+                 cache_dir: Optional[Path] = V2FLY_CACHE_DIR, workers: int = DEFAULT_FETCH_WORKERS):
+        self.fetch = fetch
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.workers = workers
+        self.files: Dict[str, Optional[dict]] = {}
+        self.resolved: Dict[str, List[Entry]] = {}
+        self.cycles: List[List[str]] = []
+        self.errors: Dict[str, str] = {}
+        self.cache_hits = 0
+
+    def _parse_cached(self, text: str) -> dict:
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        cache_file = self.cache_dir / f"{digest}.json" if self.cache_dir else None
+        if cache_file and cache_file.exists():
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                self.cache_hits += 1
+                return {
+                    'entries': [(k, v, tuple(a)) for k, v, a in cached['entries']],
+                    'includes': [(n, (tuple(i), tuple(e))) for n, (i, e) in cached['includes']],
+                }
+            except (OSError, ValueError, KeyError):
+                pass
+        parsed = parse_data_file(text)
+        if cache_file:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump(parsed, f, ensure_ascii=False)
+        return parsed
+
+    def _load_one(self, name: str) -> Optional[dict]:
+        try:
+            text = self.fetch(name)
+        except Exception as e:
+            self.errors[name] = str(e)
+            return None
+        if text is None:
+            self.errors[name] = 'not found'
+            return None
+        return self._parse_cached(text)
+
+    def prefetch(self, names: Iterable[str]):
+        """按 include 依赖图逐层并发下载所有需要的文件"""
+        pending = {n for n in names if n not in self.files}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending:
+                batch = sorted(pending)
+                for name, parsed in zip(batch, pool.map(self._load_one, batch)):
+                    self.files[name] = parsed
+                pending = {
+                    child
+                    for name in batch if self.files[name]
+                    for child, _ in self.files[name]['includes']
+                    if child not in self.files
+                }
+
+    def _resolve(self, name: str, stack: List[str]) -> List[Entry]:
+        if name in self.resolved:
+            return self.resolved[name]
+        parsed = self.files.get(name)
+        if parsed is None:
+            return []
+
+        stack.append(name)
+        entries = list(parsed['entries'])
+        for child, attr_filter in parsed['includes']:
+            if child in stack:
+                self.cycles.append(stack[stack.index(child):] + [child])
+                continue
+            if child not in self.files:
+                self.prefetch([child])
+            entries.extend(e for e in self._resolve(child, stack) if matches_filter(e[2], attr_filter))
+        stack.pop()
+
+        # 去重并保持顺序
+        self.resolved[name] = list(dict.fromkeys(entries))
+        return self.resolved[name]
+
+    def load(self, specs: Iterable[str]) -> Dict[str, List[Entry]]:
+        """加载类别（支持 "name@attr" / "name@!attr" 过滤），返回 类别 -> 规则列表"""
+        specs = list(specs)
+        parsed_specs = [parse_spec(s) for s in specs]
+        self.prefetch(name for name, _ in parsed_specs)
+        return {
+            spec: [e for e in self._resolve(name, []) if matches_filter(e[2], attr_filter)]
+            for spec, (name, attr_filter) in zip(specs, parsed_specs)
+        }
@@ -0,0 +1,91 @@
+import gzip
+
+import pytest
+
+import asn_expand
+from asn_expand import AsnIndex, expand_asns, load_asn_index
+from fetch_rules import RuleParser, expand_parser_asns
+
+TSV = """\
+104.16.0.0\t104.16.255.255\t13335\tUS\tCLOUDFLARENET
+104.17.0.0\t104.17.255.255\t13335\tUS\tCLOUDFLARENET
+1.1.1.0\t1.1.1.255\t13335\tUS\tCLOUDFLARENET
+2606:4700::\t2606:4700:ffff:ffff:ffff:ffff:ffff:ffff\t13335\tUS\tCLOUDFLARENET
+10.0.0.0\t10.0.0.5\t64500\tZZ\tODD-RANGE
+10.0.0.6\t10.0.0.7\t64500\tZZ\tODD-RANGE
+160.79.104.0\t160.79.105.255\t399358\tUS\tANTHROPIC
+192.0.2.0\t192.0.2.255\t0\tNone\tNot routed
+not-an-ip\t1.2.3.4\t1\tZZ\tBROKEN
+"""
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / 'ip2asn-combined.tsv.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(TSV)
+    return path
+
+
+def test_build_and_expand(dataset):
+    index = load_asn_index(str(dataset), cache_dir=None)
+    assert list(index.asns) == [13335, 64500, 399358]
+    # 相邻区间聚合为更大的网段，IPv4 在前，IPv6 在后
+    assert index.expand(13335) == ['1.1.1.0/24', '104.16.0.0/15', '2606:4700::/32']
+    # 非 CIDR 对齐的相邻区间合并后恰好是一个 /29
+    assert index.expand(64500) == ['10.0.0.0/29']
+    assert index.expand(399358) == ['160.79.104.0/23']
+    # AS0 与格式错误的行被跳过
+    assert index.expand(0) == []
+    assert index.expand(1) == []
+
+
+def test_unaligned_range_is_split():
+    index = AsnIndex.build([(64501, int.from_bytes(bytes([10, 0, 0, 1]), 'big'),
+                             int.from_bytes(bytes([10, 0, 0, 6]), 'big'), 4)])
+    assert index.expand(64501) == ['10.0.0.1/32', '10.0.0.2/31', '10.0.0.4/31', '10.0.0.6/32']
+
+
+def test_expand_asns_accepts_prefixes(dataset):
+    index = load_asn_index(str(dataset), cache_dir=None)
+    result = expand_asns(index, ['AS399358', 'as64500', '13335', 'ASX', '99999'])
+    assert result == {
+        'AS399358': ['160.79.104.0/23'],
+        'as64500': ['10.0.0.0/29'],
+        '13335': ['1.1.1.0/24', '104.16.0.0/15', '2606:4700::/32'],
+        '99999': [],
+    }
+
+
+def test_cache_round_trip(dataset, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    built = load_asn_index(str(dataset), cache_dir)
+    assert len(list(cache_dir.glob('*.idx'))) == 1
+
+    loaded = AsnIndex.loads(built.dumps())
+    for asn in (13335, 64500, 399358, 7):
+        assert loaded.ranges(asn) == built.ranges(asn)
+
+    # 数据集未变化时读取缓存，不再解析数据集
+    monkeypatch.setattr(asn_expand, '_iter_tsv', None)
+    cached = load_asn_index(str(dataset), cache_dir)
+    assert cached.expand(13335) == built.expand(13335)
+
+
+def test_stale_cache_is_rebuilt(dataset, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    load_asn_index(str(dataset), cache_dir)
+    cache_file, = cache_dir.glob('*.idx')
+    cache_file.write_bytes(b'garbage')
+    assert load_asn_index(str(dataset), cache_dir).expand(399358) == ['160.79.104.0/23']
+    assert AsnIndex.loads(cache_file.read_bytes()).expand(399358) == ['160.79.104.0/23']
+
+
+def test_expand_parser_asns_tags_sources(dataset, monkeypatch):
+    index = load_asn_index(str(dataset), cache_dir=None)
+    monkeypatch.setattr(asn_expand, 'load_asn_index', lambda path: index)
+    parser = RuleParser()
+    parser.ip_asns.update(['AS399358', '64500'])
+    expand_parser_asns(parser, str(dataset))
+    assert parser.ip_cidrs == {'160.79.104.0/23', '10.0.0.0/29'}
+    assert parser.ip_cidr_sources == {'160.79.104.0/23': {'AS399358'}, '10.0.0.0/29': {'AS64500'}}
@@ -0,0 +1,99 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+import compile_srs
+from compile_srs import cache_path, compile_many, prune_cache
+
+FAKE_SING_BOX = """#!{python}
+import os, sys
+if sys.argv[1] == 'version':
+    print(os.environ.get('FAKE_SING_BOX_VERSION', 'sing-box version 1.0.0'))
+    sys.exit(0)
+# rule-set compile --output <out> <src>
+out, src = sys.argv[4], sys.argv[5]
+with open(os.environ['FAKE_SING_BOX_LOG'], 'a') as log:
+    log.write(src + '\\n')
+with open(src, 'rb') as f, open(out, 'wb') as o:
+    o.write(b'SRS' + f.read()[::-1])
+"""
+
+
+@pytest.fixture
+def sing_box(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    tool = bin_dir / 'sing-box'
+    tool.write_text(FAKE_SING_BOX.format(python=sys.executable))
+    tool.chmod(0o755)
+    log = tmp_path / 'compiles.log'
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('FAKE_SING_BOX_LOG', str(log))
+
+    def compiles():
+        return log.read_text().splitlines() if log.exists() else []
+    return compiles
+
+
+def write_rules(rules_dir, domains):
+    rules_dir.mkdir(exist_ok=True)
+    path = rules_dir / 'sing-box.json'
+    path.write_text(json.dumps({'version': 2, 'rules': [{'domain_suffix': domains}]}))
+    return path
+
+
+def test_cache_survives_cleaned_rules_dir(sing_box, tmp_path):
+    rules_dir, cache_dir = tmp_path / 'rules', tmp_path / 'cache'
+    source = write_rules(rules_dir, ['openai.com'])
+    first = compile_many([source], 1, cache_dir)
+    assert first[0]['status'] == 'compiled'
+    output = source.with_suffix('.srs').read_bytes()
+
+    # 工作流在生成前执行 rm -rf rules/*
+    for path in rules_dir.iterdir():
+        path.unlink()
+    source = write_rules(rules_dir, ['openai.com'])
+    second = compile_many([source], 1, cache_dir)
+    assert second[0]['status'] == 'cached'
+    assert source.with_suffix('.srs').read_bytes() == output
+    assert second[0]['srs_sha256'] == first[0]['srs_sha256']
+    assert len(sing_box()) == 1
+
+
+def test_changed_source_is_recompiled(sing_box, tmp_path):
+    rules_dir, cache_dir = tmp_path / 'rules', tmp_path / 'cache'
+    compile_many([write_rules(rules_dir, ['openai.com'])], 1, cache_dir)
+    result = compile_many([write_rules(rules_dir, ['anthropic.com'])], 1, cache_dir)
+    assert result[0]['status'] == 'compiled'
+    assert len(sing_box()) == 2
+
+
+def test_sing_box_upgrade_invalidates_cache(sing_box, tmp_path, monkeypatch):
+    rules_dir, cache_dir = tmp_path / 'rules', tmp_path / 'cache'
+    source = write_rules(rules_dir, ['openai.com'])
+    compile_many([source], 1, cache_dir)
+    monkeypatch.setenv('FAKE_SING_BOX_VERSION', 'sing-box version 1.1.0')
+    assert compile_many([source], 1, cache_dir)[0]['status'] == 'compiled'
+    assert compile_many([source], 1, cache_dir)[0]['status'] == 'cached'
+    assert len(sing_box()) == 2
+
+
+def test_disabled_cache_always_compiles(sing_box, tmp_path):
+    source = write_rules(tmp_path / 'rules', ['openai.com'])
+    compile_many([source], 1, None)
+    assert compile_many([source], 1, None)[0]['status'] == 'compiled'
+    assert len(sing_box()) == 2
+
+
+def test_prune_removes_stale_entries(tmp_path):
+    stale = cache_path(tmp_path, 'a' * 64, 'v1')
+    fresh = cache_path(tmp_path, 'b' * 64, 'v1')
+    stale.write_bytes(b'old')
+    fresh.write_bytes(b'new')
+    now = time.time()
+    os.utime(stale, (now - compile_srs.CACHE_MAX_AGE - 60,) * 2)
+    assert prune_cache(tmp_path, now=now) == 1
+    assert not stale.exists() and fresh.exists()
@@ -0,0 +1,141 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawl_homepages import HomepageCrawler, is_generic, promotable, rank_candidates
+
+PAGE = """<!doctype html>
+<html><head>
+<meta http-equiv="Content-Security-Policy" content="default-src 'self'; connect-src https://api.{ai}">
+<script async src="https://www.googletagmanager.com/gtag/js?id=G-1"></script>
+<link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Inter">
+<link rel="preconnect" href="https://fonts.gstatic.com">
+<script src="https://cdn.jsdelivr.net/npm/marked/marked.min.js"></script>
+<script src="/static/app.js"></script>
+<script>window.analytics = "https://cdn.segment.com/analytics.js";</script>
+</head><body><a href="https://news.example.com/">news</a></body></html>
+"""
+
+APP_JS = 'fetch("https://auth.{ai}/login"); new WebSocket("wss://stream.{ai}/v1");'
+
+
+class StandInSite:
+    """本地替身站点：主页、同站脚本、robots.txt，带 ETag 支持条件请求"""
+
+    def __init__(self, ai_domain, disallow=''):
+        self.requests = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests.append((self.path, self.headers.get('If-None-Match')))
+                if self.path == '/robots.txt':
+                    body = f"User-agent: *\nDisallow: {disallow}\n"
+                elif self.path == '/':
+                    if self.headers.get('If-None-Match') == '"home"':
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    body = PAGE.format(ai=ai_domain)
+                elif self.path == '/static/app.js':
+                    body = APP_JS.format(ai=ai_domain)
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                if self.path == '/':
+                    self.send_header('ETag', '"home"')
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.server.handle_error = lambda *args: None
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, host='127.0.0.1'):
+        return f"http://{host}:{self.server.server_address[1]}/"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def sites():
+    started = [StandInSite('shared-llm.dev'), StandInSite('shared-llm.dev')]
+    yield started
+    for site in started:
+        site.close()
+
+
+def crawl(sites, tmp_path, **kwargs):
+    crawler = HomepageCrawler(delay=0, timeout=5, cache_file=tmp_path / 'crawl_cache.json', **kwargs)
+    # 两个替身站点用不同的主机名，保证它们是两个不同的可注册域名
+    return crawler, crawler.run([sites[0].url('127.0.0.1'), sites[1].url('localhost')])
+
+
+def test_crawl_extracts_third_party_hosts(sites, tmp_path):
+    _, results = crawl(sites, tmp_path)
+    assert len(results) == 2
+    hosts = results[0]['hosts']
+    assert hosts['api.shared-llm.dev'] == ['csp']
+    assert hosts['auth.shared-llm.dev'] == ['script']
+    assert hosts['stream.shared-llm.dev'] == ['script']
+    assert hosts['www.googletagmanager.com'] == ['script']
+    assert hosts['fonts.gstatic.com'] == ['link']
+    assert hosts['cdn.segment.com'] == ['inline-script']
+    # 导航链接不是依赖
+    assert 'news.example.com' not in hosts
+
+
+def test_promotion_skips_generic_infrastructure(sites, tmp_path):
+    _, results = crawl(sites, tmp_path)
+    candidates = rank_candidates(results, known=['known-ai.com'])
+    ranked = {c['domain']: c for c in candidates}
+    for domain in ('googletagmanager.com', 'fonts.googleapis.com', 'gstatic.com', 'jsdelivr.net', 'segment.com'):
+        assert ranked[domain]['sites'] == 2
+        assert ranked[domain]['generic']
+    assert not ranked['shared-llm.dev']['generic']
+    assert promotable(candidates, 2) == ['shared-llm.dev']
+    assert promotable(candidates, 3) == []
+
+
+def test_known_domains_are_not_promoted(sites, tmp_path):
+    _, results = crawl(sites, tmp_path)
+    assert promotable(rank_candidates(results, known=['shared-llm.dev']), 2) == []
+
+
+def test_robots_txt_is_respected(tmp_path):
+    site = StandInSite('blocked-llm.dev', disallow='/')
+    try:
+        crawler = HomepageCrawler(delay=0, timeout=5, cache_file=tmp_path / 'crawl_cache.json')
+        assert crawler.run([site.url()]) == []
+        assert crawler.stats['disallowed'] == 1
+        assert [path for path, _ in site.requests] == ['/robots.txt']
+    finally:
+        site.close()
+
+
+def test_unchanged_homepage_is_revalidated_from_cache(sites, tmp_path):
+    crawl(sites, tmp_path)
+    crawler, results = crawl(sites, tmp_path)
+    assert crawler.stats['not_modified'] == 2
+    assert ('/', '"home"') in sites[0].requests
+    assert 'auth.shared-llm.dev' in results[0]['hosts']
+
+
+def test_denylist_is_matched_by_suffix():
+    assert is_generic('googletagmanager.com')
+    assert is_generic('fonts.googleapis.com')
+    assert is_generic('cdn.jsdelivr.net')
+    assert not is_generic('shared-llm.dev')
+    assert not is_generic('notgstatic.com')
@@ -0,0 +1,146 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from dns_probe import (DNSProber, ProbeCache, RCODE_NOERROR, RCODE_NXDOMAIN, STATUS_ALIVE, STATUS_DEAD,
+                       STATUS_UNKNOWN, probe_rules)
+
+DAY = 86400
+RCODE_SERVFAIL = 2
+
+
+class StandInDNS:
+    """本地替身 DNS 服务器：按域名返回配置的 rcode，未配置的域名不应答（模拟超时）"""
+
+    def __init__(self):
+        self.answers = {}
+        self.queries = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.1)
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.sock.getsockname()[1]}"
+
+    def serve(self):
+        while self.running:
+            try:
+                data, addr = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            query_id = struct.unpack('>H', data[:2])[0]
+            end = data.index(b'\x00', 12) + 5
+            question = data[12:end]
+            labels, offset = [], 12
+            while data[offset]:
+                labels.append(data[offset + 1:offset + 1 + data[offset]].decode())
+                offset += data[offset] + 1
+            domain = '.'.join(labels)
+            self.queries.append(domain)
+            rcode = self.answers.get(domain)
+            if rcode is None:
+                continue
+            answer = b''
+            if rcode == RCODE_NOERROR:
+                answer = struct.pack('>HHHIH', 0xC00C, 1, 1, 600, 4) + bytes([192, 0, 2, 1])
+            header = struct.pack('>HHHHHH', query_id, 0x8180 | rcode, 1, 1 if answer else 0, 0, 0)
+            self.sock.sendto(header + question + answer, addr)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def dns():
+    server = StandInDNS()
+    yield server
+    server.close()
+
+
+def make_prober(dns) -> DNSProber:
+    return DNSProber([dns.address], concurrency=8, timeout=0.2, attempts=1)
+
+
+def run_probe(dns, cache, now, domains=('example.com',)):
+    return probe_rules({'domains': list(domains), 'domain_suffixes': []}, make_prober(dns), cache, now=now)
+
+
+def test_resolve_statuses(dns):
+    dns.answers = {'alive.test': RCODE_NOERROR, 'dead.test': RCODE_NXDOMAIN, 'broken.test': RCODE_SERVFAIL}
+    import asyncio
+    results = asyncio.run(make_prober(dns).resolve_all(['alive.test', 'dead.test', 'broken.test', 'silent.test']))
+    assert results['alive.test'] == (STATUS_ALIVE, 600)
+    assert results['dead.test'][0] == STATUS_DEAD
+    assert results['broken.test'][0] == STATUS_UNKNOWN
+    assert results['silent.test'][0] == STATUS_UNKNOWN
+
+
+def test_nxdomain_is_pruned_after_grace(dns):
+    cache = ProbeCache()
+    dns.answers['example.com'] = RCODE_NXDOMAIN
+    pruned, report = run_probe(dns, cache, now=0)
+    assert report['in_grace'] == ['example.com'] and pruned['domains'] == ['example.com']
+    pruned, report = run_probe(dns, cache, now=8 * DAY)
+    assert report['dropped'] == ['example.com'] and pruned['domains'] == []
+
+
+def test_timeouts_never_prune(dns):
+    cache = ProbeCache()
+    dns.answers['example.com'] = RCODE_NXDOMAIN
+    run_probe(dns, cache, now=0)
+    # 之后一直超时：保留规则，只报告为 unknown
+    del dns.answers['example.com']
+    pruned, report = run_probe(dns, cache, now=8 * DAY)
+    assert report['dropped'] == [] and report['in_grace'] == []
+    assert report['unknown'] == ['example.com']
+    assert pruned['domains'] == ['example.com']
+
+
+def test_servfail_never_prunes(dns):
+    cache = ProbeCache()
+    dns.answers['example.com'] = RCODE_NXDOMAIN
+    run_probe(dns, cache, now=0)
+    dns.answers['example.com'] = RCODE_SERVFAIL
+    pruned, report = run_probe(dns, cache, now=8 * DAY)
+    assert report['dropped'] == [] and pruned['domains'] == ['example.com']
+
+
+def test_dead_streak_survives_timeouts(dns):
+    cache = ProbeCache()
+    dns.answers['example.com'] = RCODE_NXDOMAIN
+    run_probe(dns, cache, now=0)
+    del dns.answers['example.com']
+    run_probe(dns, cache, now=3 * DAY)
+    dns.answers['example.com'] = RCODE_NXDOMAIN
+    pruned, report = run_probe(dns, cache, now=8 * DAY)
+    assert report['dropped'] == ['example.com']
+
+
+def test_alive_resets_streak(dns):
+    cache = ProbeCache()
+    dns.answers['example.com'] = RCODE_NXDOMAIN
+    run_probe(dns, cache, now=0)
+    dns.answers['example.com'] = RCODE_NOERROR
+    run_probe(dns, cache, now=2 * DAY)
+    dns.answers['example.com'] = RCODE_NXDOMAIN
+    pruned, report = run_probe(dns, cache, now=8 * DAY)
+    assert report['in_grace'] == ['example.com'] and report['dropped'] == []
+
+
+def test_fresh_cache_skips_queries(dns):
+    cache = ProbeCache()
+    dns.answers['example.com'] = RCODE_NOERROR
+    run_probe(dns, cache, now=0)
+    _, report = run_probe(dns, cache, now=60)
+    assert report['queried'] == 0 and report['cached'] == 1
+    assert dns.queries == ['example.com']
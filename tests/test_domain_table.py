@@ -0,0 +1,156 @@
+import pytest
+
+import domain_table
+from domain_table import FLAG_DOMAIN, FLAG_SUFFIX, DomainTable, build_table, write_table
+from rule_matcher import RuleMatcher
+
+RULES = {
+    'domains': ['chat.openai.com', 'claude.ai', 'api.example.com'],
+    'domain_suffixes': ['openai.com', 'anthropic.com', 'example.com', 'api.example.com', '中文.cn'],
+    'domain_keywords': ['gemini', 'copilot'],
+    'domain_regexes': [r'^ignored\.example$'],
+    'ip_cidrs': ['160.79.104.0/24', '160.79.105.0/24', '1.1.1.1', '10.0.0.0/8', '10.1.0.0/16',
+                 '2607:6bc0::/48', '2607:6bc0:1::/48', '2001:db8::1'],
+    'ip_asns': ['AS399358'],
+}
+
+
+@pytest.fixture
+def table(tmp_path):
+    path = tmp_path / 'ai-domains.mph'
+    counts = write_table(str(path), RULES)
+    assert counts == {'names': 7, 'keywords': 2, 'ipv4_ranges': 3, 'ipv6_ranges': 2}
+    with DomainTable(str(path)) as table:
+        yield table
+
+
+@pytest.mark.parametrize('host, expected', [
+    ('chat.openai.com', ('domain', 'chat.openai.com')),
+    ('openai.com', ('domain_suffix', 'openai.com')),
+    ('a.b.openai.com', ('domain_suffix', 'openai.com')),
+    ('OpenAI.com.', ('domain_suffix', 'openai.com')),
+    ('claude.ai', ('domain', 'claude.ai')),
+    ('www.claude.ai', None),
+    ('api.example.com', ('domain', 'api.example.com')),
+    ('v1.api.example.com', ('domain_suffix', 'api.example.com')),
+    ('www.中文.cn', ('domain_suffix', '中文.cn')),
+    ('gemini.google.com', ('domain_keyword', 'gemini')),
+    ('github-copilot.dev', ('domain_keyword', 'copilot')),
+    # 后缀匹配以标签为边界
+    ('xopenai.com', None),
+    ('openai.com.evil', None),
+    ('anthropic', None),
+    ('ignored.example', None),
+])
+def test_match(table, host, expected):
+    assert table.match(host) == expected
+    assert RuleMatcher({**RULES, 'domain_regexes': []}).match(host) == expected
+
+
+def test_flags(table):
+    assert table.flags('api.example.com') == FLAG_DOMAIN | FLAG_SUFFIX
+    assert table.flags('claude.ai') == FLAG_DOMAIN
+    assert table.flags('openai.com') == FLAG_SUFFIX
+    assert table.flags('missing.com') == 0
+    assert table.keywords == ('copilot', 'gemini')
+    assert len(table) == 7 + 2 + 3 + 2
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('160.79.104.0', True),
+    ('160.79.105.255', True),
+    ('160.79.106.0', False),
+    ('1.1.1.1', True),
+    ('1.1.1.2', False),
+    ('10.255.255.255', True),
+    ('11.0.0.0', False),
+    ('0.0.0.0', False),
+    ('2607:6bc0::1', True),
+    ('2607:6bc0:1:ffff::1', True),
+    ('2607:6bc0:2::', False),
+    ('2001:db8::1', True),
+    ('2001:db8::2', False),
+    ('::', False),
+])
+def test_contains_ip(table, address, expected):
+    assert table.contains_ip(address) is expected
+
+
+def test_struct_fallback(table):
+    # 非小端机器上不映射数组，逐条 struct 解包
+    table._disp.release()
+    table._slots.release()
+    table._disp = table._slots = None
+    assert table.match('a.openai.com') == ('domain_suffix', 'openai.com')
+    assert table.flags('missing.com') == 0
+
+
+def test_empty_table(tmp_path):
+    path = tmp_path / 'empty.mph'
+    write_table(str(path), {})
+    with DomainTable(str(path)) as table:
+        assert len(table) == 0
+        assert table.match('openai.com') is None
+        assert not table.contains_ip('1.1.1.1')
+        assert not table.contains_ip('::1')
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'bad.mph'
+    path.write_bytes(b'not a table' * 20)
+    with pytest.raises(ValueError):
+        DomainTable(str(path))
+    path.write_bytes(build_table(RULES)[:-1])
+    with pytest.raises(ValueError):
+        DomainTable(str(path))
+
+
+def large_rules(count):
+    return {
+        'domains': [f"host{i}.svc{i % 97}.example.com" for i in range(0, count, 2)],
+        'domain_suffixes': [f"zone{i}.example.net" for i in range(1, count, 2)],
+    }
+
+
+@pytest.mark.parametrize('failures', [0, 3])
+def test_large_table_with_seed_retries(tmp_path, monkeypatch, failures):
+    place = domain_table._place
+    tried = []
+
+    def flaky_place(keys, seed):
+        # 前 failures 个种子构造失败，迫使换种子重试
+        tried.append(seed)
+        return None if seed < failures else place(keys, seed)
+
+    monkeypatch.setattr(domain_table, '_place', flaky_place)
+    rules = large_rules(20000)
+    path = tmp_path / 'large.mph'
+    write_table(str(path), rules)
+    assert tried == list(range(failures + 1))
+    with DomainTable(str(path)) as table:
+        assert table.seed == failures
+        assert all(table.flags(name) == FLAG_DOMAIN for name in rules['domains'])
+        assert all(table.flags(name) == FLAG_SUFFIX for name in rules['domain_suffixes'])
+        assert table.match('a.zone1.example.net') == ('domain_suffix', 'zone1.example.net')
+        assert not any(table.flags(f"host{i}.svc{i % 97}.example.com") for i in range(1, 2000, 2))
+
+
+def test_natural_seed_retry(tmp_path):
+    # 只有几个键时同一个桶里的键在所有位移下都可能冲突，构造需要换种子
+    for i in range(5000):
+        names = [f"k{i}-{j}.example.com" for j in range(3)]
+        if domain_table._place(sorted(n.encode() for n in names), 0) is None:
+            break
+    else:
+        pytest.skip('no key set needs a seed retry')
+    path = tmp_path / 'small.mph'
+    write_table(str(path), {'domain_suffixes': names})
+    with DomainTable(str(path)) as table:
+        assert table.seed > 0
+        assert all(table.flags(name) == FLAG_SUFFIX for name in names)
+
+
+def test_seed_exhaustion(monkeypatch):
+    monkeypatch.setattr(domain_table, '_place', lambda keys, seed: None)
+    with pytest.raises(ValueError):
+        build_table(RULES)
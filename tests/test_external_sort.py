@@ -0,0 +1,94 @@
+import io
+import json
+import random
+
+import pytest
+
+import external_sort
+from external_sort import MemoryBudget, dump_json, iter_json_arrays, unique_merge
+
+
+@pytest.fixture
+def budget(monkeypatch, tmp_path):
+    # 每个缓冲区只能放十几条，每 4 个有序段就触发一次归并
+    monkeypatch.setattr(external_sort, 'MIN_BUFFER_BYTES', 2048)
+    monkeypatch.setattr(external_sort, 'MAX_OPEN_RUNS', 4)
+    with MemoryBudget(1, spill_dir=str(tmp_path)) as budget:
+        yield budget
+
+
+def sample_domains(count, seed=0):
+    rng = random.Random(seed)
+    return [f"host{rng.randrange(count // 2)}.example{rng.randrange(5)}.com" for _ in range(count)]
+
+
+def test_external_set_spills_and_compacts(budget):
+    values = sample_domains(2000)
+    external = budget.new_set()
+    external.update(values)
+    assert budget.spills > external_sort.MAX_OPEN_RUNS
+    assert len(external.runs) < external_sort.MAX_OPEN_RUNS
+    assert len(external) == len(set(values))
+    assert list(external) == sorted(set(values))
+    # 计数后再次迭代和追加仍然正确
+    assert list(external) == sorted(set(values))
+    external.add('aaa.example.com')
+    assert len(external) == len(set(values)) + 1
+    assert next(iter(external)) == 'aaa.example.com'
+
+
+def test_sets_share_one_budget(budget):
+    first, second = budget.new_set(), budget.new_set()
+    first.update(sample_domains(600, seed=1))
+    second.update(sample_domains(600, seed=2))
+    assert first.runs and second.runs
+    assert list(first) == sorted(set(sample_domains(600, seed=1)))
+    assert list(second) == sorted(set(sample_domains(600, seed=2)))
+
+
+def test_small_set_stays_in_memory(budget):
+    external = budget.new_set()
+    external.update(['b', 'a', 'b'])
+    assert not external.runs
+    assert len(external) == 2
+    assert list(external) == ['a', 'b']
+
+
+def test_unique_merge():
+    assert list(unique_merge(['a', 'c', 'c'], ['a', 'b'], [], ['d'])) == ['a', 'b', 'c', 'd']
+    assert list(unique_merge()) == []
+
+
+def test_dump_json_matches_json_dump(budget):
+    external = budget.new_set()
+    external.update(sample_domains(300))
+    obj = {'domains': sorted(set(sample_domains(300))), 'empty': [], 'meta': {'n': 1, 'ok': True, 'x': None},
+           'nested': [['a', 'b'], []], 'text': '中文'}
+    out = io.StringIO()
+    dump_json(obj, out)
+    assert out.getvalue() == json.dumps(obj, indent=2, ensure_ascii=False)
+
+    # ExternalSet 逐项写出，结果与展开后的列表一致
+    streamed = io.StringIO()
+    dump_json({'domains': external}, streamed)
+    assert streamed.getvalue() == json.dumps({'domains': list(external)}, indent=2, ensure_ascii=False)
+
+
+def test_json_array_round_trip(budget, tmp_path):
+    external = budget.new_set()
+    external.update(sample_domains(500))
+    path = tmp_path / 'rules.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        dump_json({'domains': external, 'ips': ['1.2.3.0/24'], 'empty': [],
+                   'groups': {'ai': ['中文.com', 'a"b']}, 'count': 3}, f)
+    items = list(iter_json_arrays(str(path)))
+    assert [v for k, v in items if k == ('domains',)] == list(external)
+    assert [v for k, v in items if k == ('ips',)] == ['1.2.3.0/24']
+    assert [v for k, v in items if k == ('groups', 'ai')] == ['中文.com', 'a"b']
+    assert not [k for k, _ in items if k in (('empty',), ('count',))]
+
+
+def test_iter_json_arrays_falls_back_to_json_load(tmp_path):
+    path = tmp_path / 'compact.json'
+    path.write_text(json.dumps({'domains': ['a', 'b'], 'groups': {'ai': ['c']}}), encoding='utf-8')
+    assert list(iter_json_arrays(str(path))) == [(('domains',), 'a'), (('domains',), 'b'), (('groups', 'ai'), 'c')]
@@ -0,0 +1,45 @@
+from fetch_rules import RULE_KINDS, parse_content, parser_result
+
+REGEX_CONTENT = '\n'.join([
+    'payload:',
+    '  - DOMAIN-SUFFIX,openai.com',
+    '  - DOMAIN-REGEX,^foo\\.bar$',
+    '  - URL-REGEX,^https?://api\\.example\\.com/v1',
+    '  - DOMAIN,chat.openai.com',
+] * 3)
+
+
+def test_sharded_parse_keeps_regex_rules():
+    serial = parse_content(REGEX_CONTENT, workers=1)
+    sharded = parse_content(REGEX_CONTENT, workers=2, threshold=1)
+    assert serial.domain_regexes
+    assert parser_result(sharded) == parser_result(serial)
+
+
+def mixed_content(count):
+    lines = ['payload:', '# comment', '']
+    for i in range(count):
+        lines += [
+            f'  - DOMAIN-SUFFIX,svc{i}.openai.com',
+            f'  - DOMAIN,api{i}.anthropic.com',
+            f'  - DOMAIN-KEYWORD,keyword{i % 7}',
+            f'HOST-SUFFIX,host{i}.example.org,proxy',
+            f'HOST,exact{i}.example.org,proxy',
+            f'HOST-KEYWORD,qx{i % 5},proxy',
+            f'  - IP-CIDR,10.{i % 256}.0.0/16,no-resolve',
+            f'  - IP-CIDR6,2001:db8:{i:x}::/48',
+            f'  - IP-ASN,{13335 + i % 3}',
+            f'  - DOMAIN-REGEX,^r{i}\\.example\\.net$',
+            f'plain{i}.example.io  # trailing comment',
+            '  - DOMAIN-SUFFIX,co.uk',
+        ]
+    return '\n'.join(lines)
+
+
+def test_sharded_parse_matches_serial_for_every_rule_kind():
+    content = mixed_content(200)
+    serial = parse_content(content, workers=1)
+    sharded = parse_content(content, workers=2, threshold=1)
+    result = parser_result(serial)
+    assert all(result[kind] for kind in RULE_KINDS), result
+    assert parser_result(sharded) == result
@@ -0,0 +1,97 @@
+import pytest
+
+from generate_rules import dns_domains, generate_dnsmasq_rules, generate_nftables_rules, generate_smartdns_rules
+
+RULES = {
+    'domains': ['api.anthropic.com', 'chat.openai.com', 'claude.ai'],
+    'domain_suffixes': ['anthropic.com', 'cdn.anthropic.com', 'oaistatic.com', 'openai.com'],
+    'domain_keywords': ['openai'],
+    'domain_regexes': [],
+    'ip_cidrs': ['1.1.1.1', '10.0.0.0/8', '10.1.0.0/16', '160.79.104.0/24', '160.79.105.0/24',
+                 '2607:6bc0::/48', '2607:6bc0:1::/48'],
+    'ip_asns': ['AS399358'],
+}
+
+DNSMASQ = """\
+# AI网站代理规则 - dnsmasq格式
+# 规则总数: 4
+# 使用方法: 放入 /etc/dnsmasq.d/（nftset= 需要 dnsmasq 2.87+，并加载 nftables.nft 中的集合）
+# 注意: 1 条精确域名按后缀输出（同时匹配其子域名）
+# 不支持的规则未输出: 1 DOMAIN-KEYWORD, 1 IP-ASN
+
+server=/anthropic.com/127.0.0.1#5353
+nftset=/anthropic.com/4#inet#ai_proxy#ai_proxy_v4,6#inet#ai_proxy#ai_proxy_v6
+server=/claude.ai/127.0.0.1#5353
+nftset=/claude.ai/4#inet#ai_proxy#ai_proxy_v4,6#inet#ai_proxy#ai_proxy_v6
+server=/oaistatic.com/127.0.0.1#5353
+nftset=/oaistatic.com/4#inet#ai_proxy#ai_proxy_v4,6#inet#ai_proxy#ai_proxy_v6
+server=/openai.com/127.0.0.1#5353
+nftset=/openai.com/4#inet#ai_proxy#ai_proxy_v4,6#inet#ai_proxy#ai_proxy_v6"""
+
+SMARTDNS = """\
+# AI网站代理规则 - SmartDNS格式
+# 规则总数: 4
+# 使用方法: 在 smartdns.conf 中 conf-file 引入，并定义 group 为 ai 的上游服务器
+# 注意: 1 条精确域名按后缀输出（同时匹配其子域名）
+# 不支持的规则未输出: 1 DOMAIN-KEYWORD, 1 IP-ASN
+
+nameserver /anthropic.com/ai
+nftset /anthropic.com/#4:inet#ai_proxy#ai_proxy_v4,#6:inet#ai_proxy#ai_proxy_v6
+nameserver /claude.ai/ai
+nftset /claude.ai/#4:inet#ai_proxy#ai_proxy_v4,#6:inet#ai_proxy#ai_proxy_v6
+nameserver /oaistatic.com/ai
+nftset /oaistatic.com/#4:inet#ai_proxy#ai_proxy_v4,#6:inet#ai_proxy#ai_proxy_v6
+nameserver /openai.com/ai
+nftset /openai.com/#4:inet#ai_proxy#ai_proxy_v4,#6:inet#ai_proxy#ai_proxy_v6"""
+
+NFTABLES = """\
+# AI网站代理规则 - nftables格式
+# 规则总数: 4（由 7 条 CIDR 合并）
+# 使用方法: nft -f nftables.nft，然后在路由 / 标记规则中引用 @ai_proxy_v4 与 @ai_proxy_v6
+
+table inet ai_proxy {
+\tset ai_proxy_v4 {
+\t\ttype ipv4_addr
+\t\tflags interval
+\t\tauto-merge
+\t\telements = {
+\t\t\t1.1.1.1/32,
+\t\t\t10.0.0.0/8,
+\t\t\t160.79.104.0/23,
+\t\t}
+\t}
+\tset ai_proxy_v6 {
+\t\ttype ipv6_addr
+\t\tflags interval
+\t\tauto-merge
+\t\telements = {
+\t\t\t2607:6bc0::/47,
+\t\t}
+\t}
+}"""
+
+
+@pytest.mark.parametrize('generator, expected', [
+    (generate_dnsmasq_rules, DNSMASQ),
+    (generate_smartdns_rules, SMARTDNS),
+    (generate_nftables_rules, NFTABLES),
+])
+def test_golden_output(tmp_path, generator, expected):
+    path = tmp_path / 'out'
+    generator(RULES, str(path))
+    assert path.read_text(encoding='utf-8') == expected
+
+
+def test_dns_domains_collapses_suffixes():
+    # chat.openai.com、api.anthropic.com 与 cdn.anthropic.com 已被更短的后缀覆盖；claude.ai 放宽为后缀
+    assert dns_domains(RULES) == (['anthropic.com', 'claude.ai', 'oaistatic.com', 'openai.com'], 1, 3)
+    # 精确域名与后缀重复时不算放宽
+    assert dns_domains({'domains': ['a.com'], 'domain_suffixes': ['a.com']}) == (['a.com'], 0, 0)
+
+
+def test_nftables_omits_empty_elements(tmp_path):
+    path = tmp_path / 'nftables.nft'
+    generate_nftables_rules({'ip_cidrs': ['2001:db8::/32']}, str(path))
+    text = path.read_text(encoding='utf-8')
+    assert '\tset ai_proxy_v4 {\n\t\ttype ipv4_addr\n\t\tflags interval\n\t\tauto-merge\n\t}' in text
+    assert '\t\t\t2001:db8::/32,' in text
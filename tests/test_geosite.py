@@ -0,0 +1,153 @@
+import shutil
+import subprocess
+
+import pytest
+
+from geosite import count_entries, list_categories, read_geoip, read_geosite, write_geoip, write_geosite
+from generate_rules import XRAY_CATEGORY, generate_xray_geoip, generate_xray_geosite
+from fetch_rules import load_local_v2fly_rules, parser_result
+from v2fly import V2flyLoader
+
+ENTRIES = [
+    ('full', 'chat.openai.com', ()),
+    ('domain', 'openai.com', ()),
+    ('domain', 'openai.cn', ('cn',)),
+    ('domain', 'oaistatic.com', ('ads', 'cn')),
+    ('keyword', 'openai', ()),
+    ('regexp', r'^[A-Za-z0-9-]+\.OpenAI\.azure\.com$', ()),
+]
+
+
+def test_geosite_round_trip(tmp_path):
+    path = str(tmp_path / 'geosite.dat')
+    counts = write_geosite(path, {
+        'openai': lambda: ENTRIES,
+        'empty': lambda: [],
+        'other': lambda: [('domain', 'example.com', ())],
+    })
+    assert counts == {'openai': 6, 'empty': 0, 'other': 1}
+    assert list_categories(path) == ['OPENAI', 'EMPTY', 'OTHER']
+    assert count_entries(path) == 7
+
+    result = read_geosite(path, ['openai', 'OpenAI@cn', 'openai@!cn', 'openai@cn@!ads', 'empty', 'missing'])
+    assert result['openai'] == ENTRIES
+    assert result['OpenAI@cn'] == [ENTRIES[2], ENTRIES[3]]
+    assert result['openai@!cn'] == [ENTRIES[0], ENTRIES[1], ENTRIES[4], ENTRIES[5]]
+    assert result['openai@cn@!ads'] == [ENTRIES[2]]
+    assert result['empty'] == []
+    assert result['missing'] == []
+
+
+def test_geoip_round_trip(tmp_path):
+    path = str(tmp_path / 'geoip.dat')
+    cidrs = ['1.1.1.1/32', '10.0.0.0/8', '0.0.0.0/0', '2001:db8::/32', '2606:4700:4700::1111/128', '::/0']
+    counts = write_geoip(path, {'ai': lambda: cidrs + ['192.168.1.7/16'], 'v6': lambda: ['fe80::1/10']})
+    assert counts == {'ai': 7, 'v6': 1}
+    result = read_geoip(path, ['AI', 'v6'])
+    assert result['AI'] == cidrs + ['192.168.0.0/16']
+    assert result['v6'] == ['fe80::/10']
+
+
+def test_generated_xray_files_match_rule_model(tmp_path, capsys):
+    rules = {
+        'domains': ['chat.openai.com'],
+        'domain_suffixes': ['anthropic.com', 'openai.com'],
+        'domain_keywords': ['openai'],
+        'domain_regexes': [r'^gpt-\d+\.example\.com$'],
+        'ip_cidrs': ['160.79.104.0/23', '160.79.105.0/24', '2607:6bc0::/48', '1.1.1.1'],
+    }
+    geosite, geoip = str(tmp_path / 'ai-geosite.dat'), str(tmp_path / 'ai-geoip.dat')
+    generate_xray_geosite(rules, geosite)
+    generate_xray_geoip(rules, geoip)
+
+    entries = read_geosite(geosite, [XRAY_CATEGORY])[XRAY_CATEGORY]
+    assert sorted(v for k, v, _ in entries if k == 'full') == rules['domains']
+    assert sorted(v for k, v, _ in entries if k == 'domain') == rules['domain_suffixes']
+    assert [v for k, v, _ in entries if k == 'keyword'] == rules['domain_keywords']
+    assert [v for k, v, _ in entries if k == 'regexp'] == rules['domain_regexes']
+    # 相邻 / 包含的 CIDR 合并，单个地址补全前缀长度
+    assert read_geoip(geoip, [XRAY_CATEGORY])[XRAY_CATEGORY] == ['1.1.1.1/32', '160.79.104.0/23', '2607:6bc0::/48']
+
+
+@pytest.mark.skipif(not shutil.which('protoc'), reason='protoc not installed')
+def test_geosite_is_valid_protobuf(tmp_path):
+    # 不依赖本模块的解码器，用 protoc 检查线格式：类别名是字段 1，Domain 是字段 2，属性是嵌套的字段 3
+    path = tmp_path / 'geosite.dat'
+    write_geosite(str(path), {'openai': lambda: ENTRIES[2:4]})
+    decoded = subprocess.run(['protoc', '--decode_raw'], input=path.read_bytes(),
+                             capture_output=True, check=True).stdout.decode()
+    assert decoded.split() == [
+        '1', '{', '1:', '"OPENAI"',
+        '2', '{', '1:', '2', '2:', '"openai.cn"', '3', '{', '1:', '"cn"', '2:', '1', '}', '}',
+        '2', '{', '1:', '2', '2:', '"oaistatic.com"',
+        '3', '{', '1:', '"ads"', '2:', '1', '}', '3', '{', '1:', '"cn"', '2:', '1', '}', '}',
+        '}',
+    ]
+
+
+DATA_FILES = {
+    'openai': 'openai.com\nfull:chat.openai.com\nopenai.cn @cn\ninclude:openai-extra @!ads\n',
+    'openai-extra': 'oaistatic.com\nkeyword:chatgpt\ntracker.openai.com @ads\n',
+    'anthropic': 'anthropic.com\nregexp:^claude-[0-9]+\\.example\\.com$\n',
+    'unrelated': 'example.com\n',
+}
+
+EXPECTED_LOCAL = {
+    'domains': ['chat.openai.com'],
+    'domain_suffixes': ['anthropic.com', 'oaistatic.com', 'openai.cn', 'openai.com'],
+    'domain_keywords': ['chatgpt'],
+    'domain_regexes': [r'^claude-[0-9]+\.example\.com$'],
+    'ip_cidrs': [],
+    'ip_asns': [],
+}
+
+
+def write_checkout(root):
+    data = root / 'data'
+    data.mkdir(parents=True)
+    for name, text in DATA_FILES.items():
+        (data / name).write_text(text, encoding='utf-8')
+    return root
+
+
+def test_read_geosite_filters_categories(tmp_path):
+    path = str(tmp_path / 'geosite.dat')
+    write_geosite(path, {
+        'openai': lambda: ENTRIES,
+        'anthropic': lambda: [('domain', 'anthropic.com', ()), ('domain', 'claude.cn', ('cn',))],
+        'unrelated': lambda: [('domain', 'example.com', ())],
+    })
+    result = read_geosite(path, ['ANTHROPIC@!cn', 'openai@ads', 'anthropic'])
+    # 只返回请求的类别；同一类别的不同过滤互不影响，类别名不区分大小写
+    assert list(result) == ['ANTHROPIC@!cn', 'openai@ads', 'anthropic']
+    assert result['ANTHROPIC@!cn'] == [('domain', 'anthropic.com', ())]
+    assert result['anthropic'] == [('domain', 'anthropic.com', ()), ('domain', 'claude.cn', ('cn',))]
+    assert result['openai@ads'] == [ENTRIES[3]]
+
+
+def test_read_geosite_empty_file(tmp_path):
+    path = tmp_path / 'empty.dat'
+    path.write_bytes(b'')
+    assert read_geosite(str(path), ['openai']) == {'openai': []}
+
+
+@pytest.mark.parametrize('subdir', ['', 'data'])
+def test_local_checkout_source(tmp_path, subdir, capsys):
+    root = write_checkout(tmp_path / 'domain-list-community')
+    # 既可以指向克隆根目录，也可以直接指向 data/
+    parser = load_local_v2fly_rules(str(root / subdir), ['openai', 'anthropic', 'missing'])
+    assert parser_result(parser) == EXPECTED_LOCAL
+    assert 'No local v2fly rules for missing' in capsys.readouterr().out
+
+
+def test_local_geosite_source_matches_checkout(tmp_path):
+    root = write_checkout(tmp_path / 'domain-list-community')
+    loader = V2flyLoader(fetch=lambda name: DATA_FILES.get(name), cache_dir=None)
+    resolved = loader.load(list(DATA_FILES))
+    path = tmp_path / 'geosite.dat'
+    write_geosite(str(path), {name: (lambda name=name: resolved[name]) for name in DATA_FILES})
+
+    services = ['openai', 'anthropic']
+    from_dat = load_local_v2fly_rules(str(path), services)
+    from_checkout = load_local_v2fly_rules(str(root), services)
+    assert parser_result(from_dat) == parser_result(from_checkout) == EXPECTED_LOCAL
@@ -0,0 +1,112 @@
+import pytest
+
+from history import CANONICAL_SOURCE, RuleHistory
+
+# 每次运行：(创建时间, 规则, 来源)；b.com 在第 2 次运行中被移除，第 3 次运行中重新加入
+RUNS = [
+    ('2026-01-01T08:00:00', {'domains': ['a.com', 'b.com'], 'ip_cidrs': ['1.1.1.0/24']},
+     {('domains', 'a.com'): ['src1'], ('domains', 'b.com'): ['src1', 'src2']}),
+    ('2026-01-02T08:00:00', {'domains': ['a.com', 'c.com'], 'ip_cidrs': ['1.1.1.0/24']},
+     {('domains', 'a.com'): ['src1'], ('domains', 'c.com'): ['src2']}),
+    ('2026-01-02T20:00:00', {'domains': ['a.com', 'b.com', 'c.com'], 'ip_cidrs': ['1.1.1.0/24']},
+     {('domains', 'a.com'): ['src1'], ('domains', 'b.com'): ['src2'], ('domains', 'c.com'): ['src2']}),
+    ('2026-01-03T08:00:00', {'domains': ['a.com', 'b.com', 'c.com'], 'ip_cidrs': ['1.1.1.0/24']},
+     {('domains', 'a.com'): ['src1'], ('domains', 'b.com'): ['src2'], ('domains', 'c.com'): ['src2']}),
+]
+
+
+@pytest.fixture
+def history(tmp_path):
+    with RuleHistory(tmp_path / 'history.sqlite3') as history:
+        for created_at, rules, sources in RUNS:
+            history.record(rules, sources, created_at=created_at)
+        yield history
+
+
+def intervals(history, value, source=CANONICAL_SOURCE):
+    return history.conn.execute("""
+        SELECT i.first_run, i.last_run FROM intervals i
+        JOIN rules r ON r.id = i.rule_id JOIN sources s ON s.id = i.source_id
+        WHERE r.value = ? AND s.name = ? ORDER BY i.first_run
+    """, (value, source)).fetchall()
+
+
+def test_record_reopens_interval(history):
+    assert intervals(history, 'a.com') == [(1, None)]
+    assert intervals(history, 'b.com') == [(1, 1), (3, None)]
+    assert intervals(history, 'b.com', 'src1') == [(1, 1)]
+    assert intervals(history, 'b.com', 'src2') == [(1, 1), (3, None)]
+    assert intervals(history, 'c.com') == [(2, None)]
+    assert [run['total'] for run in history.runs()] == [4, 4, 3, 3]
+
+
+def test_unchanged_run_writes_no_intervals(history):
+    before = history.conn.execute("SELECT count(*) FROM intervals").fetchone()[0]
+    history.record(*RUNS[-1][1:])
+    assert history.conn.execute("SELECT count(*) FROM intervals").fetchone()[0] == before
+
+
+@pytest.mark.parametrize('old, new, added, removed', [
+    (1, 2, [('domains', 'c.com')], [('domains', 'b.com')]),
+    (2, 3, [('domains', 'b.com')], []),
+    # b.com 在两端都存在，中间的移除与重新加入不算变化
+    (1, 3, [('domains', 'c.com')], []),
+    (3, 1, [('domains', 'c.com')], []),
+    (3, 4, [], []),
+    (2, 2, [], []),
+])
+def test_diff(history, old, new, added, removed):
+    assert history.diff(old, new) == {'added': added, 'removed': removed}
+
+
+def test_diff_by_source(history):
+    assert history.diff(1, 3, 'src1') == {'added': [], 'removed': [('domains', 'b.com')]}
+    assert history.diff(1, 3, 'missing') == {'added': [], 'removed': []}
+
+
+def test_lifetime(history):
+    lifetime = [entry for entry in history.lifetime('b.com') if entry['source'] == CANONICAL_SOURCE]
+    assert lifetime == [
+        {'kind': 'domains', 'source': CANONICAL_SOURCE, 'first_run': 1, 'added_at': '2026-01-01T08:00:00',
+         'last_run': 1, 'removed_run': 2, 'removed_at': '2026-01-02T08:00:00'},
+        {'kind': 'domains', 'source': CANONICAL_SOURCE, 'first_run': 3, 'added_at': '2026-01-02T20:00:00',
+         'last_run': None, 'removed_run': None, 'removed_at': None},
+    ]
+    # 规范来源排在最前，其余按名称排序
+    assert [e['source'] for e in history.lifetime('b.com', 'domains')] == ['*', '*', 'src1', 'src2', 'src2']
+    assert history.lifetime('b.com', 'ip_cidrs') == []
+
+
+def test_churn(history):
+    assert history.churn(1, 2) == [
+        {'source': CANONICAL_SOURCE, 'added': 1, 'removed': 1},
+        {'source': 'src1', 'added': 0, 'removed': 1},
+        {'source': 'src2', 'added': 1, 'removed': 1},
+    ]
+    assert history.churn(3, 4) == []
+
+
+@pytest.mark.parametrize('ref, expected', [
+    (None, 4),
+    ('latest', 4),
+    ('latest~1', 3),
+    ('latest~3', 1),
+    ('2', 2),
+    ('2026-01-02', 3),
+    ('2026-01-02T09:00', 2),
+    ('2026-12-31', 4),
+])
+def test_resolve_run(history, ref, expected):
+    assert history.resolve_run(ref) == expected
+
+
+@pytest.mark.parametrize('ref', ['latest~4', '99', '2025-12-31', 'yesterday'])
+def test_resolve_run_rejects(history, ref):
+    with pytest.raises(ValueError):
+        history.resolve_run(ref)
+
+
+def test_resolve_run_empty_history(tmp_path):
+    with RuleHistory(tmp_path / 'empty.sqlite3') as history:
+        with pytest.raises(ValueError):
+            history.resolve_run()
@@ -0,0 +1,19 @@
+import pytest
+
+from check_importtime import BUDGETS_MS, FORBIDDEN, measure
+
+RUNS = 5
+
+
+@pytest.mark.parametrize('command', sorted(BUDGETS_MS))
+def test_import_time_within_budget(command):
+    samples = [measure(command) for _ in range(RUNS)]
+    best, modules = min(samples, key=lambda sample: sample[0])
+    assert modules, 'no import timings were recorded'
+    assert best <= BUDGETS_MS[command], sorted(modules.items(), key=lambda item: item[1], reverse=True)[:10]
+
+
+@pytest.mark.parametrize('command', sorted(FORBIDDEN))
+def test_no_forbidden_imports(command):
+    _, modules = measure(command)
+    assert [m for m in FORBIDDEN[command] if m in modules] == []
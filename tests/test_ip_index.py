@@ -0,0 +1,121 @@
+import random
+import ipaddress
+
+import pytest
+
+from ip_index import PatriciaTree, PrefixIndex, build_index_from_data, parse_prefix
+
+PREFIXES = {
+    '10.0.0.0/8': ['a'],
+    '10.1.0.0/16': ['b'],
+    '10.1.2.0/24': ['a', 'b'],
+    '10.1.2.128/25': ['c'],
+    '160.79.104.0/23': ['a'],
+    '0.0.0.0/0': ['default'],
+    '2001:db8::/32': ['a'],
+    '2001:db8:1::/48': ['b'],
+    '2001:db8:1:2::/64': ['b'],
+    '2607:6bc0::/48': ['c'],
+}
+
+
+@pytest.fixture
+def index():
+    index = PrefixIndex()
+    for cidr, sources in PREFIXES.items():
+        assert index.add(cidr, sources)
+    return index
+
+
+@pytest.mark.parametrize('ip, expected', [
+    ('10.1.2.200', '10.1.2.128/25'),
+    ('10.1.2.1', '10.1.2.0/24'),
+    ('10.1.3.1', '10.1.0.0/16'),
+    ('10.200.0.1', '10.0.0.0/8'),
+    ('160.79.105.255', '160.79.104.0/23'),
+    ('8.8.8.8', '0.0.0.0/0'),
+    ('2001:db8:1:2::1', '2001:db8:1:2::/64'),
+    ('2001:db8:1:3::1', '2001:db8:1::/48'),
+    ('2001:db8:ffff::1', '2001:db8::/32'),
+    ('2607:6bc0::10', '2607:6bc0::/48'),
+    ('2607:6bc1::10', None),
+    ('::1', None),
+])
+def test_lookup(index, ip, expected):
+    assert index.lookup(ip) == expected
+    assert index.lookup_many([ip]) == {ip: expected}
+
+
+def test_lookup_many_skips_invalid_and_refreshes_after_add(index):
+    assert index.lookup_many(['not-an-ip', '10.1.2.3']) == {'not-an-ip': None, '10.1.2.3': '10.1.2.0/24'}
+    index.add('10.1.2.0/30', ['d'])
+    assert index.lookup_many(['10.1.2.3'])['10.1.2.3'] == '10.1.2.0/30'
+
+
+def test_add_normalizes_and_merges_sources(index):
+    assert index.add('10.1.2.7/24', ['d'])
+    assert not index.add('10.0.0.0/33')
+    assert not index.add('garbage')
+    assert len(index.networks) == len(PREFIXES)
+    assert index.sources[index.networks.index('10.1.2.0/24')] == {'a', 'b', 'd'}
+
+
+def test_overlaps(index):
+    overlaps = {o['prefix']: o for o in index.overlaps()}
+    assert set(overlaps) == set(PREFIXES) - {'0.0.0.0/0', '2001:db8::/32', '2607:6bc0::/48'}
+    inner = overlaps['10.1.2.128/25']
+    assert inner['contained_in'] == '10.1.2.0/24'
+    assert inner['all_containing'] == ['0.0.0.0/0', '10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24']
+    assert inner['cross_source']
+    # 与直接包含它的前缀共享来源时不算跨来源
+    assert not overlaps['10.1.2.0/24']['cross_source']
+    assert not overlaps['2001:db8:1:2::/64']['cross_source']
+    assert overlaps['2001:db8:1::/48']['cross_source']
+
+
+def test_report():
+    report = build_index_from_data({
+        'rules': {'ip_cidrs': ['10.0.0.0/8', '2001:db8::/32']},
+        'ip_cidr_sources': {'10.0.0.0/8': ['a']},
+    }, {'built-in': ['10.0.0.0/8', '10.9.0.0/16']}).report()
+    assert (report['total_prefixes'], report['ipv4_prefixes'], report['ipv6_prefixes']) == (3, 2, 1)
+    assert report['duplicates'] == [{'prefix': '10.0.0.0/8', 'sources': ['a', 'built-in']}]
+    assert [o['prefix'] for o in report['cross_source_redundant']] == []
+    assert [o['prefix'] for o in report['redundant']] == ['10.9.0.0/16']
+
+
+@pytest.mark.parametrize('version, width', [(4, 32), (6, 128)])
+def test_matches_brute_force(version, width):
+    rng = random.Random(version)
+    network = ipaddress.IPv4Network if version == 4 else ipaddress.IPv6Network
+    address = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+    # 前缀集中在一小块地址空间里，产生大量嵌套和分叉
+    base = 10 << (width - 8)
+    cidrs = set()
+    for _ in range(300):
+        length = rng.randint(8, min(width, 28))
+        value = base | rng.getrandbits(20) << (width - 28)
+        cidrs.add(str(network((value, length), strict=False)))
+    index = PrefixIndex()
+    for cidr in cidrs:
+        index.add(cidr)
+    networks = [network(c) for c in cidrs]
+    ips = [str(address(base | rng.getrandbits(width - 8))) for _ in range(300)]
+    ips += [str(n.network_address) for n in networks] + [str(n.broadcast_address) for n in networks]
+
+    batch = index.lookup_many(ips)
+    for ip in ips:
+        containing = [n for n in networks if address(ip) in n]
+        expected = str(max(containing, key=lambda n: n.prefixlen)) if containing else None
+        assert index.lookup(ip) == expected
+        assert batch[ip] == expected
+
+
+def test_tree_insert_overwrites_value():
+    tree = PatriciaTree(32)
+    version, value, length = parse_prefix('192.168.0.0/16')
+    tree.insert(value, length, 1)
+    tree.insert(value, length, 2)
+    assert len(tree) == 1
+    assert tree.longest_match(parse_prefix('192.168.1.1')[1]) == 2
+    assert tree.longest_match(parse_prefix('192.169.1.1')[1]) == -1
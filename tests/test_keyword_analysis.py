@@ -0,0 +1,38 @@
+from keyword_analysis import analyze_keywords, rewrite_keywords
+
+
+def corpus_for(*sites, per_site=10):
+    return [f"host{i}.{site}" for site in sites for i in range(per_site)]
+
+
+def item(report, keyword):
+    return next(k for k in report['keywords'] if k['keyword'] == keyword)
+
+
+def test_confined_keyword_is_rewritten_to_registrable_domain():
+    rules = {'domain_keywords': ['anthropic'], 'domain_suffixes': []}
+    report = analyze_keywords(rules, corpus_for('anthropic.com') + ['example.com'])
+    entry = item(report, 'anthropic')
+    assert entry['rewritable'] and entry['replacement_suffixes'] == ['anthropic.com']
+    assert 'estimated_chars_saved_per_lookup' in entry
+    assert rewrite_keywords(rules, report) == {'domain_keywords': [], 'domain_suffixes': ['anthropic.com']}
+
+
+def test_single_hit_is_kept():
+    report = analyze_keywords({'domain_keywords': ['anthropic']}, ['api.anthropic.com', 'example.com'])
+    entry = item(report, 'anthropic')
+    assert not entry['rewritable']
+    assert 'estimated_chars_saved_per_lookup' not in entry
+    assert report['rewritable'] == []
+
+
+def test_keyword_spread_across_sites_is_kept():
+    report = analyze_keywords({'domain_keywords': ['gpt']},
+                              corpus_for('gpt-a.com', 'mygpt.net', 'gptzero.me', 'chatgpt.com'))
+    assert not item(report, 'gpt')['rewritable']
+
+
+def test_keyword_only_in_subdomain_labels_is_kept():
+    # 关键词只出现在共享平台的子域名里，改写为后缀无法覆盖平台上的其他同名站点
+    report = analyze_keywords({'domain_keywords': ['openai']}, corpus_for('openai.azureedge.net'))
+    assert not item(report, 'openai')['confined']
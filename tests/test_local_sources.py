@@ -0,0 +1,55 @@
+import os
+
+from local_sources import LocalSourceIndex, load_local_sources
+
+
+def counters(index):
+    return index.unchanged, index.rehashed, index.parsed
+
+
+def load_once(path, cache_dir, fingerprint='v1'):
+    index = LocalSourceIndex(cache_dir, fingerprint)
+    result = index.load(path, 'list')
+    index.save()
+    return index, result
+
+
+def test_index_counters(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    rules = tmp_path / 'ai.list'
+    rules.write_text('DOMAIN-SUFFIX,openai.com\nDOMAIN,claude.ai\n', encoding='utf-8')
+
+    index, result = load_once(rules, cache_dir)
+    assert counters(index) == (0, 0, 1)
+    assert result['domain_suffixes'] == ['openai.com']
+
+    index, _ = load_once(rules, cache_dir)
+    assert counters(index) == (1, 0, 0)
+
+    # 只改 mtime：重新哈希，复用解析结果
+    stat = rules.stat()
+    os.utime(rules, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    index, _ = load_once(rules, cache_dir)
+    assert counters(index) == (0, 1, 0)
+
+    # 改内容：重新解析
+    rules.write_text('DOMAIN-SUFFIX,anthropic.com\n', encoding='utf-8')
+    index, result = load_once(rules, cache_dir)
+    assert counters(index) == (0, 0, 1)
+    assert result['domain_suffixes'] == ['anthropic.com']
+
+    # 解析逻辑指纹变化：文件未变也要重新解析
+    index, _ = load_once(rules, cache_dir, fingerprint='v2')
+    assert counters(index) == (0, 0, 1)
+    index, _ = load_once(rules, cache_dir, fingerprint='v2')
+    assert counters(index) == (1, 0, 0)
+
+
+def test_load_local_sources_merges_files(tmp_path):
+    (tmp_path / 'rules').mkdir()
+    (tmp_path / 'rules' / 'a.list').write_text('DOMAIN-SUFFIX,openai.com\n', encoding='utf-8')
+    (tmp_path / 'rules' / 'b.yaml').write_text("payload:\n  - '+.anthropic.com'\n  - '1.2.3.0/24'\n",
+                                               encoding='utf-8')
+    parser = load_local_sources([str(tmp_path / 'rules')], cache_dir=tmp_path / 'cache')
+    assert parser.domain_suffixes == {'openai.com', 'anthropic.com'}
+    assert parser.ip_cidrs == {'1.2.3.0/24'}
@@ -0,0 +1,40 @@
+from log_analytics import CountMinSketch, HeavyHitters, LogAnalyzer, RuleProfile
+
+RULES = {
+    'domains': ['api.openai.com'],
+    'domain_suffixes': ['anthropic.com', 'openai.com', 'perplexity.ai'],
+    'domain_keywords': [],
+}
+
+
+def suggest(lines, rules=RULES):
+    analyzer = LogAnalyzer(rules, CountMinSketch(4096, 4), HeavyHitters())
+    analyzer.feed(lines)
+    return {item['group']: item for item in analyzer.suggestions(RuleProfile(rules))}
+
+
+def test_single_generic_word_is_not_enough():
+    suggestions = suggest(['chat.whatsapp.com'] * 50 + ['agent.example.com'] * 50 + ['bot.example.org'] * 50)
+    assert suggestions == {}
+
+
+def test_two_signals_on_registrable_label_suggest_suffix():
+    suggestions = suggest(['api.gpt-tools.ai'] * 20)
+    assert suggestions['gpt-tools.ai']['rules'] == ['DOMAIN-SUFFIX,gpt-tools.ai']
+    assert len(suggestions['gpt-tools.ai']['signals']) >= 2
+
+
+def test_evidence_from_subdomain_suggests_hosts_only():
+    suggestions = suggest(['chat.example.ai'] * 20 + ['www.example.ai'] * 20)
+    assert suggestions['example.ai']['rules'] == ['DOMAIN,chat.example.ai']
+
+
+def test_rule_token_and_ai_word_from_same_word_count_once():
+    rules = dict(RULES, domain_suffixes=RULES['domain_suffixes'] + ['genai-labs.com'])
+    suggestions = suggest(['genai.example.net'] * 20, rules)
+    assert suggestions == {}
+
+
+def test_rule_token_in_subdomain_with_ai_word():
+    suggestions = suggest(['anthropic-chat.example.net'] * 20 + ['mail.example.net'] * 20)
+    assert suggestions['example.net']['rules'] == ['DOMAIN,anthropic-chat.example.net']
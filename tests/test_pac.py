@@ -0,0 +1,78 @@
+import json
+import shutil
+import ipaddress
+import subprocess
+
+import pytest
+
+from generate_rules import build_pac
+from rule_matcher import RuleMatcher
+
+RULES = {
+    'domains': ['chat.openai.com', 'claude.ai', 'api.example.com'],
+    'domain_suffixes': ['openai.com', 'anthropic.com', 'example.com', 'co.jp.example.org'],
+    'domain_keywords': ['gemini', 'c++'],
+    'domain_regexes': [],
+    'ip_cidrs': ['160.79.104.0/23', '1.1.1.1', '10.0.0.0/8', '10.1.0.0/16', '2607:6bc0::/48'],
+    'ip_asns': [],
+}
+
+HOSTS = [
+    'openai.com', 'chat.openai.com', 'a.b.openai.com', 'OpenAI.com.', 'xopenai.com', 'openai.co',
+    'claude.ai', 'www.claude.ai', 'ai', 'anthropic.com', 'api.anthropic.com',
+    'api.example.com', 'x.api.example.com', 'example.com', 'example.org', 'co.jp.example.org', 'jp.example.org',
+    'gemini.google.com', 'notgemini', 'c++.dev', 'cxx.dev',
+    'constructor', 'tostring', '__proto__', 'hasownproperty.com', '',
+]
+
+IPS = {
+    '160.79.104.1': True, '160.79.105.255': True, '160.79.106.0': False,
+    '1.1.1.1': True, '1.1.1.2': False, '10.200.3.4': True, '11.0.0.0': False, '0.0.0.0': False,
+}
+
+# 在隔离的上下文中加载 PAC，逐个主机调用 FindProxyForURL；no_map 模拟没有 Map 的旧 PAC 引擎
+RUNNER = """
+const vm = require('vm');
+const [pac, hosts, noMap] = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const context = noMap ? {Map: undefined} : {};
+vm.runInNewContext(pac, context);
+console.log(JSON.stringify(hosts.map(h => context.FindProxyForURL('http://' + h + '/', h))));
+"""
+
+
+def run_pac(pac, hosts, no_map=False):
+    result = subprocess.run(['node', '-e', RUNNER], input=json.dumps([pac, hosts, no_map]),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def expected_proxy(matcher, host):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return matcher.match(host) is not None
+    return any(address in ipaddress.ip_network(c) for c in RULES['ip_cidrs'] if ':' not in c)
+
+
+@pytest.mark.skipif(not shutil.which('node'), reason='node not installed')
+@pytest.mark.parametrize('no_map', [False, True])
+def test_pac_agrees_with_rule_matcher(no_map):
+    matcher = RuleMatcher(RULES)
+    hosts = HOSTS + list(IPS)
+    results = run_pac(build_pac(RULES, proxy='PROXY p'), hosts, no_map)
+    mismatches = [(host, result) for host, result in zip(hosts, results)
+                  if (result == 'PROXY p') != expected_proxy(matcher, host) or result not in ('PROXY p', 'DIRECT')]
+    assert mismatches == []
+    assert {ip: expected_proxy(matcher, ip) for ip in IPS} == IPS
+
+
+def test_pac_tables():
+    pac = build_pac(RULES)
+    hosts = json.loads(pac[pac.index(',O=') + 3:pac.index(',K=')])
+    # 精确域名为 1，后缀为 2；同时是精确域名和后缀时按后缀
+    assert hosts == {'chat.openai.com': 1, 'claude.ai': 1, 'api.example.com': 1, 'openai.com': 2,
+                     'anthropic.com': 2, 'example.com': 2, 'co.jp.example.org': 2}
+    assert 'K=new RegExp("c\\\\+\\\\+|gemini")' in pac
+    ranges = json.loads(pac[pac.index(',R=') + 3:pac.index(',M=')])
+    assert ranges == [int(ipaddress.ip_address(ip)) for ip in
+                      ('1.1.1.1', '1.1.1.1', '10.0.0.0', '10.255.255.255', '160.79.104.0', '160.79.105.255')]
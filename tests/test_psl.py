@@ -0,0 +1,79 @@
+import pytest
+
+from psl import PSL_FILE, PublicSuffixList, compile_psl, load_psl
+from fetch_rules import RuleParser
+
+SNIPPET = """
+// ===BEGIN ICANN DOMAINS===
+uk
+co.uk
+jp
+*.kawasaki.jp
+!city.kawasaki.jp
+*.ck
+!www.ck
+// ===END ICANN DOMAINS===
+// ===BEGIN PRIVATE DOMAINS===
+github.io
+*.compute.amazonaws.com
+// ===END PRIVATE DOMAINS===
+"""
+
+
+@pytest.fixture(scope='module')
+def psl():
+    return PublicSuffixList(compile_psl(SNIPPET))
+
+
+@pytest.mark.parametrize('host, expected', [
+    ('a.b.example.co.uk', 'example.co.uk'),
+    ('co.uk', None),
+    ('uk', None),
+    ('foo.bar', 'foo.bar'),
+    ('bar', None),
+    ('a.b.c.kawasaki.jp', 'b.c.kawasaki.jp'),
+    ('x.kawasaki.jp', None),
+    ('a.city.kawasaki.jp', 'city.kawasaki.jp'),
+    ('www.ck', 'www.ck'),
+    ('x.y.ck', 'x.y.ck'),
+    ('user.github.io', 'user.github.io'),
+    ('a.ec2.compute.amazonaws.com', 'a.ec2.compute.amazonaws.com'),
+    ('WWW.Example.CO.UK.', 'example.co.uk'),
+])
+def test_registrable_domain(psl, host, expected):
+    assert psl.registrable_domain(host) == expected
+
+
+def test_private_section_can_be_ignored(psl):
+    assert psl.registrable_domain('user.github.io', private=False) == 'github.io'
+    assert psl.public_suffix('user.github.io') == 'github.io'
+    assert psl.public_suffix('user.github.io', private=False) == 'io'
+
+
+def test_guard_only_applies_to_icann_section(psl):
+    assert psl.is_public_suffix('co.uk') and psl.is_public_suffix('x.kawasaki.jp')
+    assert not psl.is_public_suffix('github.io')
+    assert psl.is_public_suffix('github.io', private=True)
+    assert not psl.is_public_suffix('city.kawasaki.jp')
+
+
+@pytest.mark.parametrize('suffix', ['googleapis.com', 'azurewebsites.net', 'discordsays.com', 'github.io'])
+def test_private_entries_survive_the_suffix_guard(suffix):
+    parser = RuleParser()
+    assert parser.add_suffix(suffix)
+    assert suffix in parser.domain_suffixes
+
+
+def test_icann_suffix_is_still_rejected():
+    parser = RuleParser()
+    assert not parser.add_suffix('co.uk')
+    assert not parser.add_suffix('com')
+
+
+def test_marshal_cache_round_trip(tmp_path):
+    cache = tmp_path / 'psl.marshal'
+    fresh = load_psl(PSL_FILE, cache)
+    cached = load_psl(PSL_FILE, cache)
+    assert cache.exists()
+    for host in ['a.b.example.co.uk', 'user.github.io', 'storage.googleapis.com']:
+        assert cached.registrable_domain(host) == fresh.registrable_domain(host)
@@ -0,0 +1,78 @@
+from refresh_schedule import RefreshScheduler, estimate_rate
+
+DAY = 86400
+
+
+class Source:
+    """可控的来源：记录拉取次数，body 为 None 表示拉取失败"""
+
+    def __init__(self, body='a'):
+        self.body = body
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return self.body
+
+
+def make_scheduler(tmp_path, now):
+    return RefreshScheduler(tmp_path / 'schedule.json', tmp_path / 'sources', clock=lambda: now[0])
+
+
+def test_not_due_source_reuses_cache(tmp_path):
+    now = [1000.0]
+    scheduler = make_scheduler(tmp_path, now)
+    source = Source()
+    assert scheduler.refresh('k', source.fetch, str.upper) == 'A'
+    now[0] += 60
+    assert scheduler.refresh('k', source.fetch, str.upper) == 'A'
+    assert source.fetches == 1
+
+
+def test_fingerprint_change_invalidates_cache(tmp_path):
+    now = [1000.0]
+    scheduler = make_scheduler(tmp_path, now)
+    source = Source()
+    scheduler.refresh('k', source.fetch, str.upper, fingerprint='v1')
+    now[0] += 60
+    assert scheduler.refresh('k', source.fetch, str.lower, fingerprint='v2') == 'a'
+    assert source.fetches == 2
+
+
+def test_unchanged_digest_still_returns_fresh_parse(tmp_path):
+    now = [1000.0]
+    scheduler = make_scheduler(tmp_path, now)
+    source = Source({'name': 'x', 'stars': 1})
+    ignore_stars = lambda item: item['name']
+    scheduler.refresh('k', source.fetch, dict, ignore_stars)
+    source.body = {'name': 'x', 'stars': 2}
+    now[0] += 2 * DAY
+    assert scheduler.refresh('k', source.fetch, dict, ignore_stars) == {'name': 'x', 'stars': 2}
+    assert scheduler.sources['k']['history'] == [[2 * DAY, False]]
+
+
+def test_failure_falls_back_to_cache(tmp_path):
+    now = [1000.0]
+    scheduler = make_scheduler(tmp_path, now)
+    source = Source()
+    scheduler.refresh('k', source.fetch, str.upper)
+    source.body = None
+    now[0] += 8 * DAY
+    assert scheduler.refresh('k', source.fetch, str.upper, fingerprint='new') == 'A'
+    assert scheduler.sources['k']['failures'] == 1
+
+
+def test_schedule_persists(tmp_path):
+    now = [1000.0]
+    scheduler = make_scheduler(tmp_path, now)
+    scheduler.refresh('k', Source().fetch, str.upper)
+    scheduler.save()
+    reloaded = make_scheduler(tmp_path, now)
+    assert not reloaded.needs_fetch('k')
+
+
+def test_rate_tracks_change_frequency():
+    hot = estimate_rate([(3600, True)] * 40)
+    cold = estimate_rate([(DAY, False)] * 40)
+    assert hot * DAY > 10
+    assert cold * DAY < 0.1
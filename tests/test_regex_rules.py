@@ -0,0 +1,62 @@
+import re
+
+import pytest
+
+from regex_rules import analyze
+
+# 多级子域名、相邻但不同的域名，用来对比改写结果与 re.search
+HOSTS = [
+    'openai.com',
+    'api.openai.com',
+    'chat.openai.com',
+    'a.b.openai.com',
+    'x.api.openai.com',
+    'a.b.c.openai.com',
+    'xopenai.com',
+    'openai.com.cn',
+    'openai.co',
+    'example.com',
+]
+
+
+def rewrite_matches(result, host: str) -> bool:
+    domains, suffixes = result
+    return host in domains or any(host == s or host.endswith('.' + s) for s in suffixes)
+
+
+@pytest.mark.parametrize('pattern', [
+    r'^(.+\.)?openai\.com$',
+    r'(^|\.)openai\.com$',
+    r'^([^.]+\.)*openai\.com$',
+    r'^(openai\.com|.+\.openai\.com)$',
+    r'^(api|chat)\.openai\.com$',
+    r'^openai\.com$',
+    r'^([^.]+\.)?openai\.com$',
+    r'^([a-z0-9-]+\.)?openai\.com$',
+    r'^(openai\.com|[^.]+\.openai\.com)$',
+    r'^[^.]+\.openai\.com$',
+    r'[^.]+\.openai\.com$',
+    r'^.+\.openai\.com$',
+    r'openai\.com$',
+])
+def test_rewrite_agrees_with_re_search(pattern):
+    result = analyze(pattern)
+    if result is None:
+        return
+    compiled = re.compile(pattern)
+    for host in HOSTS:
+        assert rewrite_matches(result, host) == bool(compiled.search(host)), host
+
+
+@pytest.mark.parametrize('pattern', [
+    r'^([^.]+\.)?openai\.com$',
+    r'^([a-z0-9-]+\.)?openai\.com$',
+    r'^(openai\.com|[^.]+\.openai\.com)$',
+])
+def test_single_label_prefix_is_kept(pattern):
+    assert analyze(pattern) is None
+
+
+def test_multi_label_prefix_is_suffix():
+    assert analyze(r'^(.+\.)?openai\.com$') == (set(), {'openai.com'})
+    assert analyze(r'^([^.]+\.)*openai\.com$') == (set(), {'openai.com'})
@@ -0,0 +1,34 @@
+import contextlib
+import io
+
+from generate_rules import ARTIFACTS, build_artifacts, write_release_artifacts
+
+RULES = {
+    'domains': ['chat.openai.com'],
+    'domain_suffixes': ['anthropic.com', 'openai.com'],
+    'domain_keywords': ['openai'],
+    'domain_regexes': [r'^api[0-9]+\.example\.com$'],
+    'ip_cidrs': ['1.2.3.0/24', '2001:db8::/32'],
+    'ip_asns': ['13335'],
+}
+
+
+def release(rules_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_artifacts(RULES, rules_dir)
+        return write_release_artifacts(rules_dir, list(ARTIFACTS))
+
+
+def test_identical_rules_give_identical_manifest(tmp_path):
+    first = release(tmp_path / 'a')
+    second = release(tmp_path / 'b')
+    assert first['artifacts'] == second['artifacts']
+
+
+def test_updated_only_changes_with_artifacts(tmp_path):
+    rules_dir = tmp_path / 'rules'
+    first = release(rules_dir)
+    (rules_dir / 'manifest.json').write_text(
+        (rules_dir / 'manifest.json').read_text(encoding='utf-8').replace(first['updated'], '2000-01-01 00:00:00'),
+        encoding='utf-8')
+    assert release(rules_dir)['updated'] == '2000-01-01 00:00:00'
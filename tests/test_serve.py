@@ -0,0 +1,136 @@
+import gzip
+import http.client
+import threading
+
+import pytest
+
+from serve import ArtifactStore, create_server, negotiate_encoding, parse_range
+
+BODY = b'payload:\n' + b''.join(b'  - DOMAIN-SUFFIX,site%d.example.com\n' % i for i in range(200))
+
+
+@pytest.fixture
+def served():
+    store = ArtifactStore()
+    server = create_server(store, '127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def request(path, headers=None, method='GET'):
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+        conn.request(method, path, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response, body
+
+    yield store, request
+    server.shutdown()
+    server.server_close()
+
+
+def fill(store):
+    store.update({'clash.yaml': BODY}, 'digest-1')
+
+
+def test_healthz_reports_ready_after_first_update(served):
+    store, request = served
+    response, _ = request('/healthz')
+    assert response.status == 503
+    fill(store)
+    response, body = request('/healthz')
+    assert response.status == 200 and body == b'ok\n'
+
+
+def test_full_response_and_not_modified(served):
+    store, request = served
+    fill(store)
+    response, body = request('/rules/clash.yaml')
+    assert response.status == 200 and body == BODY
+    etag = response.getheader('ETag')
+    assert response.getheader('Vary') == 'Accept-Encoding'
+    assert response.getheader('Content-Encoding') is None
+
+    response, body = request('/clash.yaml', {'If-None-Match': etag})
+    assert response.status == 304 and body == b''
+    assert response.getheader('ETag') == etag
+    response, _ = request('/clash.yaml', {'If-None-Match': '"other"'})
+    assert response.status == 200
+
+
+def test_gzip_negotiation(served):
+    store, request = served
+    fill(store)
+    identity, _ = request('/clash.yaml')
+    response, body = request('/clash.yaml', {'Accept-Encoding': 'gzip'})
+    assert response.status == 200
+    assert response.getheader('Content-Encoding') == 'gzip'
+    assert response.getheader('Vary') == 'Accept-Encoding'
+    assert response.getheader('ETag') == identity.getheader('ETag')[:-1] + '-gzip"'
+    assert gzip.decompress(body) == BODY
+
+
+def test_ranges(served):
+    store, request = served
+    fill(store)
+    response, body = request('/clash.yaml', {'Range': 'bytes=0-9'})
+    assert response.status == 206
+    assert response.getheader('Content-Range') == f'bytes 0-9/{len(BODY)}'
+    assert body == BODY[:10]
+
+    response, _ = request('/clash.yaml', {'Range': 'bytes=999999-'})
+    assert response.status == 416
+    assert response.getheader('Content-Range') == f'bytes */{len(BODY)}'
+
+
+def test_stale_if_range_returns_full_body(served):
+    store, request = served
+    fill(store)
+    etag = request('/clash.yaml')[0].getheader('ETag')
+    response, body = request('/clash.yaml', {'Range': 'bytes=0-9', 'If-Range': etag})
+    assert response.status == 206 and body == BODY[:10]
+    response, body = request('/clash.yaml', {'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status == 200 and body == BODY
+
+
+def test_unknown_artifact_is_404(served):
+    store, request = served
+    fill(store)
+    assert request('/missing.conf')[0].status == 404
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-9', (0, 9)),
+    ('bytes=5-', (5, 99)),
+    ('bytes=-10', (90, 99)),
+    ('bytes=-1000', (0, 99)),
+    ('bytes=90-1000', (90, 99)),
+    ('bytes=100-', None),
+    ('bytes=-0', None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize('header', ['items=0-9', 'bytes=0-1,5-9', 'bytes=9-0', 'bytes=a-b'])
+def test_parse_range_rejects_unsupported(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 100)
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('', 'identity'),
+    ('gzip', 'gzip'),
+    ('gzip, br', 'br'),
+    ('br;q=0, gzip', 'gzip'),
+    ('*', 'br'),
+    ('*;q=0', 'identity'),
+    ('zstd, gzip;q=0.5', 'zstd'),
+    ('GZIP;q=bogus', 'identity'),
+])
+def test_negotiate_encoding(accept, expected):
+    assert negotiate_encoding(accept, {'identity', 'gzip', 'br', 'zstd'}) == expected
+
+
+def test_negotiate_encoding_only_offers_available():
+    assert negotiate_encoding('br, zstd, gzip', {'identity', 'gzip'}) == 'gzip'
@@ -0,0 +1,136 @@
+import re
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import source_health
+from source_health import BREAKER_THRESHOLD, SourceHealth, fetch, host_of
+
+
+class StandIn:
+    """本地替身源站：每个请求先等待 delay 秒，再返回 status"""
+
+    def __init__(self, body: bytes = b'DOMAIN-SUFFIX,openai.com\n'):
+        self.delay = 0.0
+        self.status = 200
+        self.body = body
+        self.hits = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.hits += 1
+                time.sleep(stand_in.delay)
+                self.send_response(stand_in.status)
+                self.send_header('Content-Length', str(len(stand_in.body)))
+                self.end_headers()
+                self.wfile.write(stand_in.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.server.handle_error = lambda request, address: None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def sites(monkeypatch):
+    # 缩短对冲延迟，让测试在一两秒内完成
+    monkeypatch.setattr(source_health, 'DEFAULT_HEDGE_DELAY', 0.1)
+    primary, mirror = StandIn(b'primary'), StandIn(b'mirror')
+    mirrors = [(re.compile('^' + re.escape(primary.base) + '(.+)$'), [mirror.base + '{0}'])]
+    yield primary, mirror, mirrors
+    primary.close()
+    mirror.close()
+
+
+def test_fast_primary_is_not_hedged(sites, monkeypatch):
+    primary, mirror, mirrors = sites
+    monkeypatch.setattr(source_health, 'DEFAULT_HEDGE_DELAY', 1.0)
+    health = SourceHealth(None)
+    response = fetch(primary.base + 'rules.list', timeout=2, health=health, mirrors=mirrors)
+    assert response.content == b'primary'
+    assert mirror.hits == 0
+    assert len(health.latencies(host_of(primary.base))) == 1
+
+
+def test_hung_primary_opens_breaker(sites):
+    primary, mirror, mirrors = sites
+    primary.delay = 1.5
+    health = SourceHealth(None)
+    host = host_of(primary.base)
+    for _ in range(BREAKER_THRESHOLD):
+        response = fetch(primary.base + 'rules.list', timeout=0.5, health=health, mirrors=mirrors)
+        assert response.content == b'mirror'
+        # 落后的请求在自己的超时后失败，计入连续失败
+        health.settle()
+    state = health.hosts[host]
+    assert state['consecutive_failures'] == BREAKER_THRESHOLD
+    assert health.is_open(host)
+    assert health.latencies(host) == []
+
+    hits = primary.hits
+    response = fetch(primary.base + 'rules.list', timeout=0.5, health=health, mirrors=mirrors)
+    assert response.content == b'mirror'
+    assert primary.hits == hits
+
+
+def test_slow_primary_loser_records_real_latency(sites):
+    primary, mirror, mirrors = sites
+    primary.delay = 0.4
+    health = SourceHealth(None)
+    host = host_of(primary.base)
+    response = fetch(primary.base + 'rules.list', timeout=5, health=health, mirrors=mirrors)
+    assert response.content == b'mirror'
+    health.settle()
+    # 被超越的请求最终成功，留下的是真实延迟而不是被截断的耗时
+    assert health.latencies(host)[0] >= 0.4
+    assert health.hosts[host]['consecutive_failures'] == 0
+
+
+def test_superseded_request_does_not_reset_failures(sites):
+    primary, mirror, mirrors = sites
+    health = SourceHealth(None)
+    host = host_of(primary.base)
+    health.record(host, None, 'boom')
+    health.record(host, None, 'boom')
+    primary.delay = 1.5
+    fetch(primary.base + 'rules.list', timeout=0.5, health=health, mirrors=mirrors)
+    assert health.hosts[host]['consecutive_failures'] == 2
+    health.settle()
+    assert health.hosts[host]['consecutive_failures'] == 3
+    assert health.is_open(host)
+
+
+def test_error_fails_over_immediately(sites):
+    primary, mirror, mirrors = sites
+    primary.status = 500
+    health = SourceHealth(None)
+    start = time.monotonic()
+    response = fetch(primary.base + 'rules.list', timeout=2, health=health, mirrors=mirrors)
+    assert response.content == b'mirror'
+    assert time.monotonic() - start < 1.0
+    assert health.hosts[host_of(primary.base)]['consecutive_failures'] == 1
+
+
+def test_timeout_adapts_to_history():
+    health = SourceHealth(None)
+    for _ in range(5):
+        health.record('fast.example', 0.05)
+    assert health.timeout_for('fast.example', 30) == source_health.MIN_TIMEOUT
+    for _ in range(5):
+        health.record('slow.example', 5.0)
+    assert health.timeout_for('slow.example', 30) == 20.0
+    assert health.timeout_for('new.example', 30) == 30
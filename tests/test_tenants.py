@@ -0,0 +1,36 @@
+import pytest
+
+from generate_rules import ARTIFACTS, LINE_FORMATS
+from tenants import RuleTemplate
+
+RULES = {
+    'domains': ['chat.openai.com'],
+    'domain_suffixes': ['anthropic.com', 'openai.com'],
+    'domain_keywords': ['openai'],
+    'domain_regexes': [r'^gpt-\d+\.example\.com$', r'^a{1,2}\.example\.com$'],
+    'ip_cidrs': ['160.79.104.0/23', '2607:6bc0::/48'],
+    'ip_asns': ['13335'],
+}
+
+
+@pytest.mark.parametrize('name', list(LINE_FORMATS))
+def test_default_tenant_matches_generated_file(name, tmp_path, capsys):
+    output = tmp_path / name
+    ARTIFACTS[name](RULES, str(output))
+    rendered = RuleTemplate(name, RULES).render(updated='2024-01-01 00:00:00')
+    lines = [line for line in rendered.split('\n') if not line.startswith('# 更新时间')]
+    assert '\n'.join(lines) == output.read_text(encoding='utf-8')
+
+
+def test_policy_and_exclusions_only_change_affected_lines():
+    template = RuleTemplate('surge.conf', RULES)
+    body = template.render('Team-A', exclude=['openai.com'], updated='x')
+    assert 'DOMAIN-SUFFIX,anthropic.com,Team-A' in body
+    assert 'openai.com' not in body.replace('DOMAIN-KEYWORD,openai', '')
+    assert 'IP-CIDR6,2607:6bc0::/48,Team-A' in body
+    assert 'DOMAIN-REGEX' not in body
+
+
+def test_unsupported_format_is_rejected():
+    with pytest.raises(ValueError):
+        RuleTemplate('sing-box.json', RULES)
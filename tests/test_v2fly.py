@@ -0,0 +1,137 @@
+import pytest
+
+from v2fly import V2flyLoader, parse_data_file, parse_spec
+
+FILES = {
+    'openai': """
+# OpenAI
+openai.com
+full:chat.openai.com @cn
+keyword:chatgpt
+regexp:^API\\.openai\\.com$ @ads
+include:openai-extra
+""",
+    'openai-extra': """
+oaistatic.com @cn
+domain:oaiusercontent.com
+""",
+    'google': """
+google.com
+google.cn @cn
+include:youtube @!cn
+""",
+    'youtube': """
+youtube.com
+youtube.cn @cn
+ytimg.com @ads
+""",
+    'loop-a': """
+a.example
+include:loop-b
+""",
+    'loop-b': """
+b.example
+include:loop-a
+""",
+    'broken': """
+broken.example
+include:missing
+""",
+}
+
+
+class Fetcher:
+    """内存中的数据目录，记录每个文件的下载次数"""
+
+    def __init__(self, files):
+        self.files = files
+        self.calls = []
+
+    def __call__(self, name):
+        self.calls.append(name)
+        return self.files.get(name)
+
+
+@pytest.fixture
+def fetcher():
+    return Fetcher(FILES)
+
+
+def make_loader(fetcher, tmp_path=None):
+    return V2flyLoader(fetch=fetcher, cache_dir=tmp_path, workers=2)
+
+
+def values(entries):
+    return [value for _, value, _ in entries]
+
+
+def test_parse_data_file():
+    parsed = parse_data_file(FILES['openai'])
+    assert parsed['entries'] == [
+        ('domain', 'openai.com', ()),
+        ('full', 'chat.openai.com', ('cn',)),
+        ('keyword', 'chatgpt', ()),
+        ('regexp', '^API\\.openai\\.com$', ('ads',)),
+    ]
+    assert parsed['includes'] == [('openai-extra', ((), ()))]
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('openai', ('openai', ((), ()))),
+    ('google@cn', ('google', (('cn',), ()))),
+    ('google@!cn', ('google', ((), ('cn',)))),
+    ('google@-cn@ads', ('google', (('ads',), ('cn',)))),
+])
+def test_parse_spec(spec, expected):
+    assert parse_spec(spec) == expected
+
+
+def test_include_resolution(fetcher):
+    loader = make_loader(fetcher)
+    result = loader.load(['openai'])
+    assert values(result['openai']) == ['openai.com', 'chat.openai.com', 'chatgpt', '^API\\.openai\\.com$',
+                                        'oaistatic.com', 'oaiusercontent.com']
+    assert sorted(fetcher.calls) == ['openai', 'openai-extra']
+
+
+def test_include_attr_filter(fetcher):
+    result = make_loader(fetcher).load(['google'])
+    # include:youtube @!cn 只引入不带 @cn 的条目
+    assert values(result['google']) == ['google.com', 'google.cn', 'youtube.com', 'ytimg.com']
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('google@cn', ['google.cn']),
+    ('google@!cn', ['google.com', 'youtube.com', 'ytimg.com']),
+    ('google@!cn@ads', ['ytimg.com']),
+    ('openai@!cn@!ads', ['openai.com', 'chatgpt', 'oaiusercontent.com']),
+])
+def test_spec_attr_filter(fetcher, spec, expected):
+    assert values(make_loader(fetcher).load([spec])[spec]) == expected
+
+
+def test_shared_file_fetched_once(fetcher):
+    loader = make_loader(fetcher)
+    result = loader.load(['google@cn', 'google@!cn', 'youtube'])
+    assert values(result['youtube']) == ['youtube.com', 'youtube.cn', 'ytimg.com']
+    assert sorted(fetcher.calls) == ['google', 'youtube']
+
+
+def test_include_cycle_is_skipped(fetcher):
+    loader = make_loader(fetcher)
+    result = loader.load(['loop-a'])
+    assert values(result['loop-a']) == ['a.example', 'b.example']
+    assert loader.cycles == [['loop-a', 'loop-b', 'loop-a']]
+
+
+def test_missing_include_is_recorded(fetcher):
+    loader = make_loader(fetcher)
+    assert values(loader.load(['broken'])['broken']) == ['broken.example']
+    assert loader.errors == {'missing': 'not found'}
+
+
+def test_parse_cache_reused_across_loaders(fetcher, tmp_path):
+    first = make_loader(fetcher, tmp_path).load(['google'])
+    loader = make_loader(fetcher, tmp_path)
+    assert loader.load(['google']) == first
+    assert loader.cache_hits == 2